@@ -283,6 +283,7 @@ KWARGS = OrderedDict(
     wbia-convert-hsdb = wbia.cli.convert_hsdb:main
     wbia-migrate-sqlite-to-postgres = wbia.cli.migrate_sqlite_to_postgres:main
     wbia-compare-databases = wbia.cli.compare_databases:main
+    wbia-migrate-extern-storage = wbia.cli.migrate_extern_storage:main
     """,
 )
 
@@ -2,8 +2,9 @@
 """
 IBEIS: main package init
 
-TODO: LAZY IMPORTS?
-    http://code.activestate.com/recipes/473888-lazy-module-imports/
+Plugin modules (detection, training, web APIs, SMK, ...) are imported on
+first use when --lazy-plugins or WBIA_LAZY_PLUGINS=ON is given. See
+wbia.control.plugin_manifest
 """
 # flake8: noqa
 
@@ -92,7 +93,10 @@ try:
     from wbia.templates import generate_notebook
     from wbia.control.controller_inject import register_preprocs
     from wbia import core_annots
-    from wbia import core_images
+
+    if not const.LAZY_PLUGINS:
+        # Imported on first use with lazy plugins
+        from wbia import core_images
 
     try:
         from wbia.scripts import postdoc
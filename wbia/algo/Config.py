@@ -245,6 +245,11 @@ class NNConfig(ConfigBase):
         # nn_cfg.max_subindexers = 2
         # nn_cfg.valid_index_methods = ['single', 'multi', 'name']
         nn_cfg.valid_index_methods = ['single']
+        # Search the descriptors of all queries in stacked chunks instead of
+        # one knn call per query. Does not change results.
+        nn_cfg.batch_knn = True
+        # Number of threads searching chunks (None uses every cpu)
+        nn_cfg.nn_workers = None
         nn_cfg.update(**kwargs)
 
     def make_feasible(nn_cfg):
@@ -298,6 +303,11 @@ class SpatialVerifyConfig(ConfigBase):
         sv_cfg.refine_method = 'homog'
         # weight feature scores with sver errors
         sv_cfg.weight_inliers = True
+        # Number of workers used to verify shortlisted pairs. Does not change
+        # results, so it is not part of the cfgstr. (0 or 1 runs serially)
+        sv_cfg.sver_workers = 0
+        # Pool used by the sver workers (thread or process)
+        sv_cfg.sver_pool = 'thread'
         sv_cfg.update(**kwargs)
 
     def get_cfgstr_list(sv_cfg, **kwargs):
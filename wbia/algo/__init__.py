@@ -2,10 +2,16 @@
 # Autogenerated on 13:37:34 2015/12/30
 # flake8: noqa
 import logging
+from wbia import constants as const
 from wbia.algo import Config
-from wbia.algo import detect
+
+if not const.LAZY_PLUGINS:
+    # Imported on first use with lazy plugins (see wbia.control.plugin_manifest)
+    from wbia.algo import detect
 from wbia.algo import hots
-from wbia.algo import smk
+
+if not const.LAZY_PLUGINS:
+    from wbia.algo import smk
 from wbia.algo import preproc
 import utool
 
@@ -30,7 +36,9 @@ def reassign_submodule_attributes(verbose=True):
         if len(tup) > 2 and tup[2]:
             continue  # dont import package names
         submodname, fromimports = tup[0:2]
-        submod = getattr(wbia.algo, submodname)
+        submod = getattr(wbia.algo, submodname, None)
+        if submod is None:
+            continue  # not imported yet with lazy plugins
         for attr in dir(submod):
             if attr.startswith('_'):
                 continue
@@ -70,7 +78,8 @@ def reload_subs(verbose=True):
         return getattr(mod, 'reload_subs', wrap_fbrrr(mod))
 
     get_rrr(Config)(verbose=verbose)
-    get_reload_subs(detect)(verbose=verbose)
+    if 'detect' in globals():
+        get_reload_subs(detect)(verbose=verbose)
     get_reload_subs(hots)(verbose=verbose)
     get_reload_subs(preproc)(verbose=verbose)
     rrr(verbose=verbose)
@@ -1392,10 +1392,7 @@ class NonDynamicUpdate(object):
                 else:
                     rev_graph[key] = rev_graph[key].subgraph(nodes)
 
-        # TODO: Rebalance union find to ensure parents is a single lookup
-        # infr.pos_graph._union_find.rebalance(nodes)
-        # node_to_label = infr.pos_graph._union_find.parents
-        node_to_label = infr.pos_graph._union_find
+        node_to_label = infr.pos_graph.node_to_label()
 
         # Get reviewed edges using fast lookup structures
         ne_to_edges = {
@@ -3,6 +3,7 @@ import logging
 import utool as ut
 import networkx as nx
 import itertools as it
+import heapq
 from wbia.algo.graph.nx_utils import edges_inside, e_
 
 print, rrr, profile = ut.inject2(__name__)
@@ -117,6 +118,30 @@ class nx_UnionFind(object):
                 self.parents[x] = x
 
 
+class _DynComponent(object):
+    """
+    Node set of a single connected component of a DynConnGraph.
+
+    The label of a component is its smallest node. The heap lazily tracks the
+    minimum under removals: entries for nodes that left the component are
+    discarded when they reach the top.
+    """
+
+    __slots__ = ('nodes', 'heap')
+
+    def __init__(self, nodes):
+        self.nodes = set(nodes)
+        self.heap = list(self.nodes)
+        heapq.heapify(self.heap)
+
+    def label(self):
+        heap = self.heap
+        nodes = self.nodes
+        while heap[0] not in nodes:
+            heapq.heappop(heap)
+        return heap[0]
+
+
 class DynConnGraph(nx.Graph, GraphHelperMixin):
     """
     Dynamically connected graph.
@@ -131,6 +156,17 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     * UnionFind        | lg(n)     |    n     |  No
     * UnionFind2       |    n*     |    n     |  1
     * EulerTourForest  | lg^2(n)   | lg^2(n)  |  lg(n) / lglg(n) - - Ammortized
+    * SpanningForest   | lg(n)*    |  1 / s   |  1
+
+    The current implementation uses the SpanningForest approach. A spanning
+    forest of the graph is maintained next to a component index. Inserting an
+    edge between two components merges the smaller component into the larger
+    one (amortized lg(n) relabels per node). Removing a non-tree edge is
+    constant time. Removing a tree edge walks both halves of the broken tree
+    in lockstep, so only the smaller half (of size s) is visited, and then
+    scans the edges of the smaller half for a replacement edge. The component
+    is only split when no replacement exists. Component labels are always the
+    smallest node in the component, so labels are preserved through cuts.
 
     * it seems to be very quick
 
@@ -169,15 +205,19 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     """
 
     def __init__(self, *args, **kwargs):
-        # raise NotImplementedError('unfinished')
+        # maps component labels to the set of nodes in the component
         self._ccs = {}
-        self._union_find = nx_UnionFind()
+        # maps each node to its component
+        self._node_to_cc = {}
+        # adjacency of the spanning forest
+        self._forest = {}
         super(DynConnGraph, self).__init__(*args, **kwargs)
 
     def clear(self):
         super(DynConnGraph, self).clear()
         self._ccs = {}
-        self._union_find.clear()
+        self._node_to_cc = {}
+        self._forest = {}
 
     def __nice__(self):
         return 'nNodes={}, nEdges={}, nCCs={}'.format(
@@ -193,7 +233,7 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
     component_nodes = component
 
     def connected_to(self, node):
-        return self._ccs[self._union_find[node]]
+        return self._node_to_cc[node].nodes
 
     def node_label(self, node):
         """
@@ -205,13 +245,31 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
             >>> assert self.node_label(2) == self.node_label(1)
             >>> assert self.node_label(2) != self.node_label(4)
         """
-        return self._union_find[node]
+        return self._node_to_cc[node].label()
 
     def node_labels(self, *nodes):
-        return [self._union_find[node] for node in nodes]
+        return [self._node_to_cc[node].label() for node in nodes]
+
+    def node_to_label(self):
+        """
+        Returns a dictionary mapping every node to its component label
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.graph.nx_dynamic_graph import *  # NOQA
+            >>> self = DynConnGraph()
+            >>> self.add_edges_from([(1, 2), (2, 3), (4, 5)])
+            >>> self.add_node(6)
+            >>> self.remove_edge(1, 2)
+            >>> node_to_label = self.node_to_label()
+            >>> result = 'node_to_label = {}'.format(ut.repr2(node_to_label, nl=0))
+            >>> print(result)
+            node_to_label = {1: 1, 2: 2, 3: 2, 4: 4, 5: 4, 6: 6}
+        """
+        return {node: label for label, cc in self._ccs.items() for node in cc}
 
     def are_nodes_connected(self, u, v):
-        return ut.allsame(self.node_labels(u, v))
+        return self._node_to_cc[u] is self._node_to_cc[v]
 
     def connected_components(self):
         """
@@ -234,49 +292,100 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
 
     # -----
 
+    def _smaller_tree_half(self, u, v):
+        """
+        Given a tree edge (u, v) that was just removed from the forest, walks
+        the trees containing u and v in lockstep and returns the nodes of the
+        smaller one. Runs in time proportional to the smaller tree.
+        """
+        forest = self._forest
+        seen1, seen2 = {u}, {v}
+        stack1, stack2 = [u], [v]
+        while True:
+            for seen, stack in ((seen1, stack1), (seen2, stack2)):
+                if not stack:
+                    return seen
+                node = stack.pop()
+                for nbr in forest[node]:
+                    if nbr not in seen:
+                        seen.add(nbr)
+                        stack.append(nbr)
+
+    def _find_replacement(self, half):
+        """ Finds an edge leaving the nodes in half if one exists """
+        adj = self._adj
+        for x in half:
+            for y in adj[x]:
+                if y not in half:
+                    return x, y
+        return None
+
     def _cut(self, u, v):
-        """ Decremental connectivity (slow) """
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        if old_nid1 != old_nid2:
+        """ Decremental connectivity (fast for non-tree edges and small cuts) """
+        forest = self._forest
+        if v not in forest.get(u, ()):
+            # Removing a non-tree edge never changes connectivity
             return
-        # Need to break appart entire component and then reconstruct it
-        old_cc = self._ccs[old_nid1]
-        del self._ccs[old_nid1]
-        self._union_find.remove_entire_cc(old_cc)
-        # Might be faster to just do DFS to find the CC
-        internal_edges = edges_inside(self, old_cc)
-        # Add nodes in case there are no edges to it
-        for n in old_cc:
-            self._add_node(n)
-        for edge in internal_edges:
-            self._union(*edge)
+        forest[u].remove(v)
+        forest[v].remove(u)
+        half = self._smaller_tree_half(u, v)
+        replacement = self._find_replacement(half)
+        if replacement is not None:
+            x, y = replacement
+            forest[x].add(y)
+            forest[y].add(x)
+            return
+        # No replacement edge, split off the smaller half as its own component
+        old_cc = self._node_to_cc[u]
+        old_label = old_cc.label()
+        old_cc.nodes.difference_update(half)
+        new_cc = _DynComponent(half)
+        node_to_cc = self._node_to_cc
+        for x in half:
+            node_to_cc[x] = new_cc
+        del self._ccs[old_label]
+        self._ccs[old_cc.label()] = old_cc.nodes
+        self._ccs[new_cc.label()] = new_cc.nodes
 
     def _union(self, u, v):
         """ Incremental connectivity (fast) """
         # logger.info('Union ({})'.format((u, v)))
         self._add_node(u)
         self._add_node(v)
-        old_nid1 = self._union_find[u]
-        old_nid2 = self._union_find[v]
-        self._union_find.union(u, v)
-        new_nid = self._union_find[u]
-        for old_nid in [old_nid1, old_nid2]:
-            if new_nid != old_nid:
-                parts = self._ccs.pop(old_nid)
-                # FIXME: this step can be quite bad for time complexity.
-                # An Euler Tour Tree might solve the issue
-                self._ccs[new_nid].update(parts)
+        cc1 = self._node_to_cc[u]
+        cc2 = self._node_to_cc[v]
+        if cc1 is cc2:
+            return
+        # The edge joins two trees of the spanning forest
+        self._forest[u].add(v)
+        self._forest[v].add(u)
+        label1 = cc1.label()
+        label2 = cc2.label()
+        # Merge the smaller component into the larger one
+        if len(cc1.nodes) < len(cc2.nodes):
+            cc1, cc2 = cc2, cc1
+        node_to_cc = self._node_to_cc
+        for x in cc2.nodes:
+            node_to_cc[x] = cc1
+            heapq.heappush(cc1.heap, x)
+        cc1.nodes.update(cc2.nodes)
+        del self._ccs[label1]
+        del self._ccs[label2]
+        self._ccs[min(label1, label2)] = cc1.nodes
 
     def _add_node(self, n):
-        if self._union_find.add_element(n):
+        if n not in self._node_to_cc:
             # logger.info('Add ({})'.format((n)))
-            self._ccs[n] = {n}
+            cc = _DynComponent([n])
+            self._node_to_cc[n] = cc
+            self._forest[n] = set()
+            self._ccs[n] = cc.nodes
 
     def _remove_node(self, n):
-        if n in self._union_find.parents:
-            del self._union_find.weights[n]
-            del self._union_find.parents[n]
+        # Assumes all edges incident to n have already been cut
+        if n in self._node_to_cc:
+            del self._node_to_cc[n]
+            del self._forest[n]
             del self._ccs[n]
 
     def add_edge(self, u, v, **attr):
@@ -387,3 +496,76 @@ class DynConnGraph(nx.Graph, GraphHelperMixin):
             for u, v in H.edges():
                 H._union(u, v)
         return H
+
+
+def random_edge_stream(num_nodes=1000, num_ops=10000, pcc_size=20, p_remove=0.4, seed=0):
+    """
+    Generates a stream of ('add' | 'remove', u, v) operations that resembles
+    review sessions: nodes are grouped into dense clusters, most new edges
+    land inside a cluster, and removals are drawn from the current edges.
+    """
+    import random
+
+    rng = random.Random(seed)
+    edges = []
+    edge_to_idx = {}
+    for _ in range(num_ops):
+        if edges and rng.random() < p_remove:
+            idx = rng.randrange(len(edges))
+            edge = edges[idx]
+            # swap-remove from the list of current edges
+            last = edges.pop()
+            if idx < len(edges):
+                edges[idx] = last
+                edge_to_idx[last] = idx
+            del edge_to_idx[edge]
+            yield ('remove',) + edge
+        else:
+            u = rng.randrange(num_nodes)
+            if rng.random() < 0.9:
+                base = (u // pcc_size) * pcc_size
+                v = min(base + rng.randrange(pcc_size), num_nodes - 1)
+            else:
+                v = rng.randrange(num_nodes)
+            edge = e_(u, v)
+            if u != v and edge not in edge_to_idx:
+                edge_to_idx[edge] = len(edges)
+                edges.append(edge)
+            yield ('add',) + edge
+
+
+def benchmark_dynamic_connectivity(num_nodes=100000, num_ops=200000, seed=0):
+    """
+    Times a mixed stream of edge insertions and deletions on a DynConnGraph
+    and checks the final components against networkx.
+
+    CommandLine:
+        python -m wbia.algo.graph.nx_dynamic_graph benchmark_dynamic_connectivity
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.graph.nx_dynamic_graph import *  # NOQA
+        >>> result = benchmark_dynamic_connectivity(num_nodes=500, num_ops=2000)
+        >>> assert result['correct']
+    """
+    ops = list(random_edge_stream(num_nodes, num_ops, seed=seed))
+    graph = DynConnGraph()
+    graph.add_nodes_from(range(num_nodes))
+    with ut.Timer(verbose=False) as timer:
+        for op, u, v in ops:
+            if op == 'add':
+                graph.add_edge(u, v)
+            else:
+                graph.remove_edge(u, v)
+    expected = {min(cc): cc for cc in nx.connected_components(nx.Graph(graph))}
+    result = {
+        'num_nodes': num_nodes,
+        'num_ops': len(ops),
+        'seconds': timer.ellapsed,
+        'ops_per_sec': len(ops) / max(timer.ellapsed, 1e-9),
+        'num_ccs': graph.number_of_components(),
+        'correct': graph._ccs == expected,
+    }
+    logger.info('benchmark_dynamic_connectivity: %s' % (ut.repr2(result, precision=2),))
+    return result
+
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import logging
+import networkx as nx
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+def _check_components(graph):
+    expected = {min(cc): cc for cc in nx.connected_components(nx.Graph(graph))}
+    assert graph._ccs == expected
+    for node in graph.nodes():
+        assert graph.node_label(node) == min(graph.connected_to(node))
+
+
+def test_dynamic_graph_random_stream():
+    """
+    Components and labels of a DynConnGraph agree with networkx after every
+    operation in a random stream of edge insertions and deletions
+    """
+    from wbia.algo.graph.nx_dynamic_graph import DynConnGraph, random_edge_stream
+
+    graph = DynConnGraph()
+    graph.add_nodes_from(range(100))
+    for op, u, v in random_edge_stream(100, 1500, pcc_size=10, p_remove=0.45):
+        if op == 'add':
+            graph.add_edge(u, v)
+        else:
+            graph.remove_edge(u, v)
+        _check_components(graph)
+
+
+def test_dynamic_graph_bulk_remove():
+    """
+    Removing several tree edges at once splits components correctly
+    """
+    from wbia.algo.graph.nx_dynamic_graph import DynConnGraph
+
+    graph = DynConnGraph()
+    graph.add_edges_from([(1, 2), (2, 3), (3, 4), (4, 1), (4, 5), (5, 6), (6, 7)])
+    graph.remove_edges_from([(2, 3), (4, 1), (5, 6), (8, 9)])
+    _check_components(graph)
+    assert graph._ccs == {1: {1, 2}, 3: {3, 4, 5}, 6: {6, 7}}
+    graph.remove_nodes_from([4])
+    _check_components(graph)
+    assert graph._ccs == {1: {1, 2}, 3: {3}, 5: {5}, 6: {6, 7}}
+
+
+def test_categorize_edges():
+    """
+    Non-dynamic edge categorization groups edges by the labels of the
+    positive components and agrees with the dynamic bookkeeping
+    """
+    from wbia.algo.graph import demo
+    from wbia.algo.graph.state import POSTV, NEGTV, INCMP, UNREV, UNKWN
+
+    infr = demo.demodata_infr(num_pccs=20, p_incon=0.3, infer=False)
+    node_to_label = infr.pos_graph.node_to_label()
+    pos_graph = nx.Graph(infr.pos_graph)
+    for cc in nx.connected_components(pos_graph):
+        assert {node_to_label[node] for node in cc} == {min(cc)}
+
+    cat = infr.categorize_edges()
+    for label, edges in cat[POSTV].items():
+        assert all(node_to_label[u] == node_to_label[v] == label for u, v in edges)
+    for (label1, label2), edges in cat[NEGTV].items():
+        assert label1 != label2
+        assert all(
+            {node_to_label[u], node_to_label[v]} == {label1, label2} for u, v in edges
+        )
+    num_edges = sum(
+        len(edges)
+        for key in (POSTV, NEGTV, INCMP, UNREV, UNKWN)
+        for edges in cat[key].values()
+    )
+    num_edges += sum(len(edges) for edges in cat['inconsistent_internal'].values())
+    num_edges += sum(len(edges) for edges in cat['inconsistent_external'].values())
+    assert num_edges == infr.graph.number_of_edges()
+
+    infr.apply_nondynamic_update()
+    infr.assert_neg_metagraph()
@@ -4,10 +4,14 @@ python -m utool.util_inspect check_module_usage --pat="chip_match.py"
 """
 import logging
 import copy
+import os
+import pickle
+import time
+import uuid
 import numpy as np
 import utool as ut
 import vtool as vt
-from os.path import join
+from os.path import basename, exists, join
 from operator import xor
 import six
 from wbia.algo.hots import hstypes
@@ -30,6 +34,8 @@ DEBUG_CHIPMATCH = False
 
 MAX_FNAME_LEN = 80 if ut.WIN32 else 200
 TRUNCATE_UUIDS = ut.get_argflag(('--truncate-uuids', '--trunc-uuids'))
+# Cache query results in a ChipMatchStore instead of a pickle file per query
+USE_CHIPMATCH_STORE = not ut.get_argflag(('--no-cmstore', '--nocache-cmstore'))
 
 
 def safeop(op_, xs, *args, **kwargs):
@@ -2920,6 +2926,448 @@ class ChipMatch(
         return cm
 
 
+# -----
+# Storage
+# -----
+
+
+def _is_numeric_array(arr):
+    return isinstance(arr, np.ndarray) and arr.ndim > 0 and arr.dtype.kind in 'biuf'
+
+
+def _is_numeric_array_list(arr_list):
+    if not isinstance(arr_list, list) or len(arr_list) == 0:
+        return False
+    if not all(_is_numeric_array(arr) for arr in arr_list):
+        return False
+    first = arr_list[0]
+    return all(
+        arr.dtype == first.dtype and arr.shape[1:] == first.shape[1:] for arr in arr_list
+    )
+
+
+class _ChipMatchStoreSegment(object):
+    """
+    An immutable segment of a ChipMatchStore. Columns are memory mapped the
+    first time they are needed.
+    """
+
+    def __init__(seg, dpath):
+        seg.dpath = dpath
+        with np.load(join(dpath, 'index.npz')) as data:
+            seg.index = {key: data[key] for key in data.files}
+        seg._columns = {}
+
+    def column(seg, colname):
+        if colname not in seg._columns:
+            fpath = join(seg.dpath, colname + '.npy')
+            seg._columns[colname] = np.load(fpath, mmap_mode='r')
+        return seg._columns[colname]
+
+    def take_items(seg, colname, start, num):
+        """ Returns copies of num consecutive items of a column """
+        data = seg.column(colname)
+        offsets = seg.index['offsets:' + colname][start : start + num + 1]
+        return [np.array(data[lx:rx]) for lx, rx in zip(offsets[:-1], offsets[1:])]
+
+
+class ChipMatchStore(ut.NiceRepr):
+    """
+    Columnar, append-only storage for the chipmatches of one query
+    configuration.
+
+    Every call to append writes a segment directory with one .npy file per
+    array attribute, where the arrays of all appended chipmatches are
+    concatenated, and an index with the offsets of each array. The other
+    attributes of each chipmatch are pickled into a byte column. Segments are
+    renamed into place once they are complete, so readers never see partial
+    writes. Later segments take precedence and removals are recorded as
+    tombstones. Columns are memory mapped, so loading only reads the requested
+    chipmatches. Appends can be buffered to write fewer segments, and the
+    newest small segments are merged once there are several of them.
+
+    Args:
+        dpath (str): directory that holds the stores (e.g. the qres dir)
+        cfgstr (str): identifies the query configuration
+        cls (type): class of the stored objects (defaults to ChipMatch)
+
+    CommandLine:
+        python -m wbia.algo.hots.chip_match ChipMatchStore
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.chip_match import *  # NOQA
+        >>> import uuid
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'cmstore')
+        >>> store = ChipMatchStore(dpath, 'doctest_cfgstr')
+        >>> store.clear()
+        >>> fm_list = [np.array([[0, 1], [2, 3]]), np.zeros((0, 2), dtype=np.int64)]
+        >>> fsv_list = [np.array([[.5], [.25]]), np.zeros((0, 1))]
+        >>> cm1 = ChipMatch(qaid=1, daid_list=[2, 3], fm_list=fm_list,
+        >>>                 fsv_list=fsv_list, fsv_col_lbls=['lnbnn'])
+        >>> cm2 = ChipMatch(qaid=4, daid_list=[5], fm_list=fm_list[0:1],
+        >>>                 fsv_list=fsv_list[0:1], fsv_col_lbls=['lnbnn'])
+        >>> quuids = [uuid.UUID(int=1), uuid.UUID(int=4)]
+        >>> store.append(quuids, [cm1, cm2])
+        >>> assert len(store) == 2
+        >>> missing_quuid = uuid.UUID(int=9)
+        >>> cm1_, missing, cm2_ = store.load([quuids[0], missing_quuid, quuids[1]])
+        >>> assert missing is None
+        >>> assert cm1_ == cm1 and cm2_ == cm2
+        >>> assert np.all(cm1_.fsv_list[0] == cm1.fsv_list[0])
+        >>> assert cm1_.daid2_idx == cm1.daid2_idx
+        >>> assert store.load(quuids[0:1], qaids=[7]) == [None]
+        >>> store.remove(quuids[0:1])
+        >>> assert store.load(quuids)[0] is None and len(store) == 1
+        >>> store.compact()
+        >>> assert len(store.get_segment_names()) == 1
+        >>> assert store.load(quuids[1:])[0] == cm2
+        >>> # Buffered appends are written once the buffer is large enough
+        >>> store.small_segment_size = 4
+        >>> store.append(quuids, [cm1, cm2], buffered=True)
+        >>> assert len(store.get_segment_names()) == 1
+        >>> assert store.load(quuids) == [cm1, cm2]
+        >>> store.flush()
+        >>> assert len(store.get_segment_names()) == 2
+        >>> # Small segments are merged
+        >>> store.max_small_segments = 3
+        >>> store.remove(quuids[0:1])
+        >>> assert len(store.get_segment_names()) == 1
+        >>> assert store.load(quuids) == [None, cm2]
+        >>> store.clear()
+    """
+
+    # Rewrite all segments once there are more than this many
+    max_segments = 32
+    # Segments with fewer chipmatches are merged once there are
+    # max_small_segments of them after the last large segment
+    small_segment_size = 64
+    max_small_segments = 8
+
+    def __init__(store, dpath, cfgstr, cls=None):
+        store.cfgstr = cfgstr
+        store.dpath = join(dpath, 'cmstore_' + ut.hashstr27(cfgstr))
+        store.cls = ChipMatch if cls is None else cls
+        store._segments = {}
+        store._index = {}
+        store._index_segnames = []
+        # Chipmatches of buffered appends that are not written yet
+        store._buffer = ut.odict()
+
+    def __nice__(store):
+        return '%s nQ=%d' % (basename(store.dpath), len(store))
+
+    def __len__(store):
+        return len(store._refresh().keys() | store._buffer.keys())
+
+    def __contains__(store, quuid):
+        return quuid in store._buffer or quuid in store._refresh()
+
+    def get_segment_names(store):
+        if not exists(store.dpath):
+            return []
+        segnames = [
+            name
+            for name in os.listdir(store.dpath)
+            if name.startswith('seg_') and not name.endswith('.tmp')
+        ]
+        return sorted(segnames)
+
+    def _get_segment(store, segname):
+        if segname not in store._segments:
+            store._segments[segname] = _ChipMatchStoreSegment(join(store.dpath, segname))
+        return store._segments[segname]
+
+    def _refresh(store):
+        """ Updates the mapping from query uuids to (segment, index) """
+        segnames = store.get_segment_names()
+        num_known = len(store._index_segnames)
+        if segnames[:num_known] != store._index_segnames:
+            # Segments were compacted or deleted
+            store._index = {}
+            store._index_segnames = []
+            store._segments = {}
+            num_known = 0
+        for segname in segnames[num_known:]:
+            index = store._get_segment(segname).index
+            _iter = zip(index['quuids'], index['deleted'])
+            for idx, (quuid_bytes, deleted) in enumerate(_iter):
+                quuid = uuid.UUID(bytes=quuid_bytes.tobytes())
+                if deleted:
+                    store._index.pop(quuid, None)
+                else:
+                    store._index[quuid] = (segname, idx)
+            store._index_segnames.append(segname)
+        return store._index
+
+    def _write_segment(store, quuids, qaids, deleted, meta_list, columns, lengths):
+        segname = 'seg_%017d_%s' % (int(time.time() * 1e6), uuid.uuid4().hex[0:8])
+        tmp_dpath = ut.ensuredir(join(store.dpath, segname + '.tmp'))
+        index = {
+            'quuids': np.array(
+                [np.frombuffer(quuid.bytes, dtype=np.uint8) for quuid in quuids]
+            ).reshape(-1, 16),
+            'qaids': np.array(qaids, dtype=np.int64),
+            'deleted': np.full(len(quuids), deleted, dtype=bool),
+        }
+        columns = dict(
+            columns, meta=[np.frombuffer(blob, np.uint8) for blob in meta_list]
+        )
+        for colname, item_list in columns.items():
+            sizes = [item.size for item in item_list]
+            index['offsets:' + colname] = np.cumsum([0] + sizes, dtype=np.int64)
+            if colname in lengths:
+                index['lengths:' + colname] = np.array(lengths[colname], dtype=np.int64)
+            if len(item_list) == 0:
+                data = np.empty(0, dtype=np.uint8)
+            else:
+                data = np.concatenate([item.ravel() for item in item_list])
+            np.save(join(tmp_dpath, colname + '.npy'), data)
+        np.savez(join(tmp_dpath, 'index.npz'), **index)
+        os.rename(tmp_dpath, join(store.dpath, segname))
+
+    def append(store, quuids, cm_list, buffered=False):
+        """
+        Writes a segment with the chipmatches of the given query uuids
+
+        Args:
+            quuids (list): query uuids
+            cm_list (list): chipmatches
+            buffered (bool): if True the chipmatches are only written once
+                small_segment_size of them are buffered or on flush
+        """
+        assert len(quuids) == len(cm_list), 'not aligned'
+        if len(cm_list) == 0:
+            return
+        if buffered:
+            store._buffer.update(zip(quuids, cm_list))
+            if len(store._buffer) >= store.small_segment_size:
+                store.flush()
+            return
+        for quuid in quuids:
+            store._buffer.pop(quuid, None)
+        meta_list, columns, lengths = store._encode(cm_list)
+        qaids = [-1 if cm.qaid is None else cm.qaid for cm in cm_list]
+        store._write_segment(quuids, qaids, False, meta_list, columns, lengths)
+        store._maybe_merge()
+
+    def flush(store):
+        """ Writes the buffered chipmatches """
+        if len(store._buffer) == 0:
+            return
+        quuids = list(store._buffer.keys())
+        cm_list = list(store._buffer.values())
+        store.append(quuids, cm_list)
+
+    def _encode(store, cm_list):
+        """
+        Returns:
+            tuple: (meta_list, columns, lengths) of the given chipmatches
+        """
+        columns = ut.ddict(list)
+        lengths = ut.ddict(list)
+        meta_list = []
+        for cm in cm_list:
+            state = cm.__getstate__().copy()
+            # Rebuilt on load
+            rebuild_daid_index = state.pop('daid2_idx', None) is not None
+            colspecs = []
+            paths = [(key,) for key in sorted(state.keys())]
+            paths += [
+                (key, count)
+                for key in ['filtnorm_aids', 'filtnorm_fxs']
+                if isinstance(state.get(key, None), list)
+                for count in range(len(state[key]))
+            ]
+            for path in paths:
+                if len(path) == 1:
+                    value = state[path[0]]
+                else:
+                    value = state[path[0]][path[1]]
+                if _is_numeric_array(value):
+                    kind, arr_list = 'array', [value]
+                elif _is_numeric_array_list(value):
+                    kind, arr_list = 'list', value
+                else:
+                    continue
+                colname = '.'.join(map(str, path))
+                colspecs.append(
+                    {
+                        'path': path,
+                        'colname': colname,
+                        'kind': kind,
+                        'start': len(columns[colname]),
+                        'num': len(arr_list),
+                        'dtype': arr_list[0].dtype.str,
+                        'shape': arr_list[0].shape[1:],
+                    }
+                )
+                columns[colname].extend(arr_list)
+                lengths[colname].extend([len(arr) for arr in arr_list])
+                if len(path) == 1:
+                    state[path[0]] = None
+                else:
+                    state[path[0]] = list(state[path[0]])
+                    state[path[0]][path[1]] = None
+            meta = (state, colspecs, rebuild_daid_index)
+            meta_list.append(pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL))
+        return meta_list, columns, lengths
+
+    def remove(store, quuids):
+        """ Records that the chipmatches of the given query uuids are invalid """
+        if len(quuids) == 0:
+            return
+        for quuid in quuids:
+            store._buffer.pop(quuid, None)
+        qaids = [-1] * len(quuids)
+        meta_list = [b''] * len(quuids)
+        store._write_segment(quuids, qaids, True, meta_list, {}, {})
+        store._maybe_merge()
+
+    def _materialize(store, seg, idx):
+        meta_offsets = seg.index['offsets:meta']
+        blob = seg.column('meta')[meta_offsets[idx] : meta_offsets[idx + 1]]
+        state, colspecs, rebuild_daid_index = pickle.loads(blob.tobytes())
+        for spec in colspecs:
+            colname = spec['colname']
+            start, num = spec['start'], spec['num']
+            item_lens = seg.index['lengths:' + colname][start : start + num]
+            item_list = seg.take_items(colname, start, num)
+            arr_list = [
+                item.astype(spec['dtype'], copy=False).reshape((len_,) + spec['shape'])
+                for item, len_ in zip(item_list, item_lens)
+            ]
+            value = arr_list[0] if spec['kind'] == 'array' else arr_list
+            path = spec['path']
+            if len(path) == 1:
+                state[path[0]] = value
+            else:
+                state[path[0]][path[1]] = value
+        cm = store.cls()
+        cm.__setstate__(state)
+        if rebuild_daid_index:
+            cm._update_daid_index()
+        return cm
+
+    def load(store, quuids, qaids=None):
+        """
+        Bulk loads the chipmatches of the given query uuids. Only the
+        requested chipmatches are read.
+
+        Args:
+            quuids (list): query uuids
+            qaids (list): if given, a stored chipmatch of a different query
+                annotation is treated as missing
+
+        Returns:
+            list: cm_list - with None for each missing chipmatch
+        """
+        index = store._refresh()
+        cm_list = [None] * len(quuids)
+        for count, quuid in enumerate(quuids):
+            cm = store._buffer.get(quuid, None)
+            if cm is not None:
+                if qaids is None or cm.qaid == qaids[count]:
+                    cm_list[count] = cm
+                continue
+            loc = index.get(quuid, None)
+            if loc is None:
+                continue
+            segname, idx = loc
+            seg = store._get_segment(segname)
+            if qaids is not None and seg.index['qaids'][idx] != qaids[count]:
+                continue
+            cm_list[count] = store._materialize(seg, idx)
+        return cm_list
+
+    def _merge_segments(store, segnames):
+        """
+        Rewrites consecutive segments, which include the newest one, into a
+        single segment. Tombstones are kept unless all segments are merged.
+        """
+        keep_tombstones = segnames != store._index_segnames
+        final = {}
+        for segname in segnames:
+            seg = store._get_segment(segname)
+            _iter = zip(seg.index['quuids'], seg.index['deleted'])
+            for idx, (quuid_bytes, deleted) in enumerate(_iter):
+                quuid = uuid.UUID(bytes=quuid_bytes.tobytes())
+                final[quuid] = (segname, idx, deleted)
+        live = [(quuid, loc) for quuid, loc in final.items() if not loc[2]]
+        dead = [quuid for quuid, loc in final.items() if loc[2]]
+        if not keep_tombstones:
+            dead = []
+        cm_list = []
+        qaids = []
+        for quuid, (segname, idx, _) in live:
+            seg = store._get_segment(segname)
+            cm_list.append(store._materialize(seg, idx))
+            qaids.append(seg.index['qaids'][idx])
+        meta_list, columns, lengths = store._encode(cm_list)
+        quuids = [quuid for quuid, _ in live] + dead
+        qaids += [-1] * len(dead)
+        meta_list += [b''] * len(dead)
+        deleted_list = [False] * len(live) + [True] * len(dead)
+        if len(quuids) > 0:
+            store._write_segment(quuids, qaids, deleted_list, meta_list, columns, lengths)
+        for segname in segnames:
+            ut.delete(join(store.dpath, segname), verbose=False)
+            store._segments.pop(segname, None)
+        # The new segment overrides the merged ones, so the index only needs
+        # to be rebuilt if tombstones were dropped
+        store._index_segnames = [
+            segname for segname in store._index_segnames if segname not in segnames
+        ]
+        if not keep_tombstones:
+            store._index = {}
+        store._refresh()
+
+    def _maybe_merge(store):
+        """ Keeps the number of segments small when there are many appends """
+        store._refresh()
+        segnames = list(store._index_segnames)
+        if len(segnames) > store.max_segments:
+            store.compact()
+            return
+        num_small = 0
+        for segname in segnames[::-1]:
+            num = len(store._get_segment(segname).index['quuids'])
+            if num >= store.small_segment_size:
+                break
+            num_small += 1
+        if num_small >= store.max_small_segments:
+            store._merge_segments(segnames[len(segnames) - num_small :])
+
+    def compact(store):
+        """ Rewrites the live chipmatches into a single segment """
+        store.flush()
+        store._refresh()
+        if len(store._index_segnames) < 2:
+            return
+        store._merge_segments(list(store._index_segnames))
+
+    def clear(store):
+        store._buffer.clear()
+        ut.delete(store.dpath, verbose=False)
+        store._refresh()
+
+
+# Stores are reused between requests, so only new segments are read and
+# buffered chipmatches are not lost
+_CHIPMATCH_STORES = {}
+
+
+def get_chipmatch_store(dpath, cfgstr, cls=None):
+    """
+    Returns the ChipMatchStore of a query configuration. The same instance is
+    returned for the same arguments.
+    """
+    key = (dpath, cfgstr, cls)
+    if key not in _CHIPMATCH_STORES:
+        _CHIPMATCH_STORES[key] = ChipMatchStore(dpath, cfgstr, cls=cls)
+    return _CHIPMATCH_STORES[key]
+
+
 # -----
 # Misc
 # -----
@@ -129,7 +129,7 @@ def submit_query_request(
             invalidate_supercache=invalidate_supercache,
         )
         # ------------
-        if save_qcache and is_big:
+        if save_qcache and is_big and not _uses_augmented_indexer(qreq_):
             cacher.save(qaid2_cm)
 
         cm_list = [qaid2_cm[qaid] for qaid in qreq_.qaids]
@@ -223,20 +223,13 @@ def execute_query_and_save_L1(
         >>> qaid2_cm = execute_query_and_save_L1(qreq_, use_cache,
         >>>                                      save_qcache, verbose,
         >>>                                      batch_size=3)
-        >>> cm = qaid2_cm[1]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[4]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[5]
-        >>> ut.delete(cm.get_fpath(qreq_))
-        >>> cm = qaid2_cm[6]
-        >>> ut.delete(cm.get_fpath(qreq_))
+        >>> _delete_cached_chipmatches(qreq_, [1, 4, 5, 6])
         >>> print('Re-execute')
         >>> qaid2_cm_ = execute_query_and_save_L1(qreq_, use_cache,
         >>>                                       save_qcache, verbose,
         >>>                                       batch_size=3)
         >>> assert all([qaid2_cm_[qaid] == qaid2_cm[qaid] for qaid in qreq_.qaids])
-        >>> [ut.delete(fpath) for fpath in qreq_.get_chipmatch_fpaths(qreq_.qaids)]
+        >>> _delete_cached_chipmatches(qreq_, qreq_.qaids)
 
     Ignore:
         other = cm_ = qaid2_cm_[qaid]
@@ -247,6 +240,7 @@ def execute_query_and_save_L1(
         fpath_list = ut.glob('%s/*_cm_supercache_*' % (dpath,))
         for fpath in fpath_list:
             ut.delete(fpath)
+        qreq_.get_chipmatch_store(super_qres_cache=True).clear()
 
     if use_cache:
         if verbose:
@@ -254,54 +248,8 @@ def execute_query_and_save_L1(
         if use_supercache:
             logger.info('[mc4] supercache-query is on')
         # Try loading as many cached results as possible
-        qaid2_cm_hit = {}
         external_qaids = qreq_.qaids
-        fpath_list = list(
-            qreq_.get_chipmatch_fpaths(external_qaids, super_qres_cache=use_supercache)
-        )
-        exists_flags = [exists(fpath) for fpath in fpath_list]
-        qaids_hit = ut.compress(external_qaids, exists_flags)
-        fpaths_hit = ut.compress(fpath_list, exists_flags)
-        fpath_iter = ut.ProgIter(
-            fpaths_hit,
-            length=len(fpaths_hit),
-            enabled=len(fpaths_hit) > 1,
-            label='loading cache hits',
-            adjust=True,
-            freq=1,
-        )
-        try:
-            cm_hit_list = [
-                chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
-                for fpath in fpath_iter
-            ]
-            assert all(
-                [qaid == cm.qaid for qaid, cm in zip(qaids_hit, cm_hit_list)]
-            ), 'inconsistent qaid and cm.qaid'
-            qaid2_cm_hit = {cm.qaid: cm for cm in cm_hit_list}
-        except chip_match.NeedRecomputeError:
-            logger.info('NeedRecomputeError: Some cached chips need to recompute')
-            fpath_iter = ut.ProgIter(
-                fpaths_hit,
-                length=len(fpaths_hit),
-                enabled=len(fpaths_hit) > 1,
-                label='checking chipmatch cache',
-                adjust=True,
-                freq=1,
-            )
-            # Recompute those that fail loading
-            qaid2_cm_hit = {}
-            for fpath in fpath_iter:
-                try:
-                    cm = chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
-                except chip_match.NeedRecomputeError:
-                    pass
-                else:
-                    qaid2_cm_hit[cm.qaid] = cm
-            logger.info(
-                '%d / %d cached matches need to be recomputed'
-                % (len(qaids_hit) - len(qaid2_cm_hit), len(qaids_hit))
-            )
+        qaid2_cm_hit = _load_cached_chipmatches(qreq_, use_supercache)
         if len(qaid2_cm_hit) == len(external_qaids):
             return qaid2_cm_hit
         else:
@@ -325,6 +273,68 @@ def execute_query_and_save_L1(
     return qaid2_cm
 
 
+def _load_cached_chipmatches(qreq_, use_supercache=False):
+    """
+    Returns:
+        dict: qaid2_cm_hit - the chipmatches of qreq_ that are in the cache
+    """
+    qaid2_cm_hit = {}
+    external_qaids = qreq_.qaids
+    if chip_match.USE_CHIPMATCH_STORE:
+        store = qreq_.get_chipmatch_store(super_qres_cache=use_supercache)
+        quuids = list(qreq_.get_qreq_pcc_uuids(external_qaids))
+        cm_list = store.load(quuids, qaids=external_qaids)
+        qaid2_cm_hit = {cm.qaid: cm for cm in cm_list if cm is not None}
+        return qaid2_cm_hit
+    fpath_list = list(
+        qreq_.get_chipmatch_fpaths(external_qaids, super_qres_cache=use_supercache)
+    )
+    exists_flags = [exists(fpath) for fpath in fpath_list]
+    qaids_hit = ut.compress(external_qaids, exists_flags)
+    fpaths_hit = ut.compress(fpath_list, exists_flags)
+    fpath_iter = ut.ProgIter(
+        fpaths_hit,
+        length=len(fpaths_hit),
+        enabled=len(fpaths_hit) > 1,
+        label='loading cache hits',
+        adjust=True,
+        freq=1,
+    )
+    try:
+        cm_hit_list = [
+            chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
+            for fpath in fpath_iter
+        ]
+        assert all(
+            [qaid == cm.qaid for qaid, cm in zip(qaids_hit, cm_hit_list)]
+        ), 'inconsistent qaid and cm.qaid'
+        qaid2_cm_hit = {cm.qaid: cm for cm in cm_hit_list}
+    except chip_match.NeedRecomputeError:
+        logger.info('NeedRecomputeError: Some cached chips need to recompute')
+        fpath_iter = ut.ProgIter(
+            fpaths_hit,
+            length=len(fpaths_hit),
+            enabled=len(fpaths_hit) > 1,
+            label='checking chipmatch cache',
+            adjust=True,
+            freq=1,
+        )
+        # Recompute those that fail loading
+        qaid2_cm_hit = {}
+        for fpath in fpath_iter:
+            try:
+                cm = chip_match.ChipMatch.load_from_fpath(fpath, verbose=False)
+            except chip_match.NeedRecomputeError:
+                pass
+            else:
+                qaid2_cm_hit[cm.qaid] = cm
+        logger.info(
+            '%d / %d cached matches need to be recomputed'
+            % (len(qaids_hit) - len(qaid2_cm_hit), len(qaids_hit))
+        )
+    return qaid2_cm_hit
+
+
 @profile
 def execute_query2(qreq_, verbose, save_qcache, batch_size=None, use_supercache=False):
     """
@@ -343,16 +353,7 @@ def execute_query2(qreq_, verbose, save_qcache, batch_size=None, use_supercache=
     all_qaids = qreq_.qaids
     logger.info('len(missed_qaids) = %r' % (len(all_qaids),))
     qaid2_cm = {}
-    # vsone must have a chunksize of 1
-    if batch_size is None:
-        if HOTS_BATCH_SIZE is None:
-            hots_batch_size = qreq_.ibs.cfg.other_cfg.hots_batch_size
-            # hots_batch_size = 256
-        else:
-            hots_batch_size = HOTS_BATCH_SIZE
-    else:
-        hots_batch_size = batch_size
-    chunksize = 1 if qreq_.qparams.vsone else hots_batch_size
+    chunksize = _get_query_chunksize(qreq_, batch_size)
 
     # Iterate over vsone queries in chunks.
     n_total_chunks = ut.get_num_chunks(len(all_qaids), chunksize)
@@ -376,23 +377,185 @@ def execute_query2(qreq_, verbose, save_qcache, batch_size=None, use_supercache=
             [qaid == cm.qaid for qaid, cm in zip(sub_qreq_.qaids, sub_cm_list)]
         ), 'not corresonding'
         if save_qcache:
-            fpath_list = list(
-                qreq_.get_chipmatch_fpaths(
-                    sub_qreq_.qaids, super_qres_cache=use_supercache
-                )
-            )
-            _iter = zip(sub_cm_list, fpath_list)
-            _iter = ut.ProgIter(
-                _iter,
-                length=len(sub_cm_list),
-                label='saving chip matches',
-                adjust=True,
-                freq=1,
+            _save_chipmatches(
+                qreq_, sub_qreq_.qaids, sub_cm_list, use_supercache, buffered=True
             )
-            for cm, fpath in _iter:
-                cm.save_to_fpath(fpath, verbose=False)
         else:
             if ut.VERBOSE:
                 logger.info('[mc4] not saving vsmany chunk')
         qaid2_cm.update({cm.qaid: cm for cm in sub_cm_list})
+    if save_qcache:
+        _flush_chipmatches(qreq_, use_supercache)
     return qaid2_cm
+
+
+def _get_query_chunksize(qreq_, batch_size=None):
+    # vsone must have a chunksize of 1
+    if batch_size is None:
+        if HOTS_BATCH_SIZE is None:
+            hots_batch_size = qreq_.ibs.cfg.other_cfg.hots_batch_size
+            # hots_batch_size = 256
+        else:
+            hots_batch_size = HOTS_BATCH_SIZE
+    else:
+        hots_batch_size = batch_size
+    chunksize = 1 if qreq_.qparams.vsone else hots_batch_size
+    return chunksize
+
+
+def _uses_augmented_indexer(qreq_):
+    # Results of an index that is still being rebuilt are not final
+    indexer = getattr(qreq_, 'indexer', None)
+    return getattr(indexer, 'is_augmented', False)
+
+
+def _save_chipmatches(qreq_, qaids, cm_list, use_supercache=False, buffered=False):
+    if _uses_augmented_indexer(qreq_):
+        return
+    if chip_match.USE_CHIPMATCH_STORE:
+        # Buffered chipmatches are written by _flush_chipmatches
+        store = qreq_.get_chipmatch_store(super_qres_cache=use_supercache)
+        quuids = list(qreq_.get_qreq_pcc_uuids(qaids))
+        store.append(quuids, cm_list, buffered=buffered)
+        return
+    fpath_list = list(qreq_.get_chipmatch_fpaths(qaids, super_qres_cache=use_supercache))
+    _iter = zip(cm_list, fpath_list)
+    _iter = ut.ProgIter(
+        _iter,
+        length=len(cm_list),
+        label='saving chip matches',
+        adjust=True,
+        freq=1,
+    )
+    for cm, fpath in _iter:
+        cm.save_to_fpath(fpath, verbose=False)
+
+
+def _flush_chipmatches(qreq_, use_supercache=False):
+    if chip_match.USE_CHIPMATCH_STORE:
+        qreq_.get_chipmatch_store(super_qres_cache=use_supercache).flush()
+
+
+def _delete_cached_chipmatches(qreq_, qaids, use_supercache=False):
+    if chip_match.USE_CHIPMATCH_STORE:
+        store = qreq_.get_chipmatch_store(super_qres_cache=use_supercache)
+        store.remove(list(qreq_.get_qreq_pcc_uuids(qaids)))
+    else:
+        fpath_list = qreq_.get_chipmatch_fpaths(qaids, super_qres_cache=use_supercache)
+        for fpath in fpath_list:
+            ut.delete(fpath)
+
+
+@profile
+def submit_query_request_group(
+    qreq_list, use_cache=None, save_qcache=None, verbose=None, batch_size=None
+):
+    """
+    Executes several query requests that only differ in their spatial
+    verification and scoring parameters (they have the same inputs and the
+    same ``qparams.presver_cfgstr``).
+
+    The nearest neighbor, weighting, and chipmatch building stages run once
+    per chunk of queries and each request only runs spatial verification and
+    scoring on a copy of the shared chipmatches. Individual chipmatch caches
+    are used like in :func:`submit_query_request`, the big cache is not.
+
+    Args:
+        qreq_list (list): of wbia.QueryRequest
+
+    Returns:
+        list: cm_list of each query request
+
+    CommandLine:
+        python -m wbia.algo.hots.match_chips4 --test-submit_query_request_group
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.match_chips4 import *  # NOQA
+        >>> import wbia
+        >>> import numpy as np
+        >>> a = ['default:qindex=0:3,dindex=0:10']
+        >>> p_list = ['default', 'default:sv_on=False', 'default:score_method=csum']
+        >>> qreq_list = [wbia.testdata_qreq_(a=a, p=[p]) for p in p_list]
+        >>> cm_list_list = submit_query_request_group(qreq_list, use_cache=False,
+        >>>                                           save_qcache=False)
+        >>> for qreq_, cm_list in zip(qreq_list, cm_list_list):
+        >>>     cm_list2 = qreq_.execute(use_cache=False)
+        >>>     for cm1, cm2 in zip(cm_list, cm_list2):
+        >>>         assert cm1.qaid == cm2.qaid
+        >>>         assert np.all(cm1.daid_list == cm2.daid_list)
+        >>>         assert np.allclose(cm1.annot_score_list, cm2.annot_score_list)
+    """
+    if verbose is None:
+        verbose = pipeline.VERB_PIPELINE
+    if use_cache is None:
+        use_cache = USE_CACHE
+    if save_qcache is None:
+        save_qcache = SAVE_CACHE
+    qreq0_ = qreq_list[0]
+    input_cfgstr = qreq0_.get_cfgstr(with_input=True, with_pipe=False)
+    for qreq_ in qreq_list:
+        assert (
+            qreq_.qparams.presver_cfgstr == qreq0_.qparams.presver_cfgstr
+        ), 'query requests do not share the stages before spatial verification'
+        assert (
+            qreq_.get_cfgstr(with_input=True, with_pipe=False) == input_cfgstr
+        ), 'query requests do not share inputs'
+
+    if use_cache:
+        qaid2_cm_list = [_load_cached_chipmatches(qreq_) for qreq_ in qreq_list]
+    else:
+        qaid2_cm_list = [{} for qreq_ in qreq_list]
+    missed_qaids_list = [
+        set(qreq_.qaids) - set(qaid2_cm.keys())
+        for qreq_, qaid2_cm in zip(qreq_list, qaid2_cm_list)
+    ]
+    missed_qaids = set.union(*missed_qaids_list)
+    all_qaids = [qaid for qaid in qreq0_.qaids if qaid in missed_qaids]
+    logger.info(
+        '[mc4] sharing %d missed queries between %d requests'
+        % (len(all_qaids), len(qreq_list))
+    )
+
+    if len(all_qaids) > 0:
+        for qreq_ in qreq_list:
+            qreq_.lazy_preload(verbose=verbose and ut.NOT_QUIET)
+        chunksize = _get_query_chunksize(qreq0_, batch_size)
+        qaid_chunk_iter = ut.ProgIter(
+            ut.ichunks(all_qaids, chunksize),
+            length=ut.get_num_chunks(len(all_qaids), chunksize),
+            freq=1,
+            label='[mc4] shared query chunk: ',
+        )
+        for qaids in qaid_chunk_iter:
+            sub_qreq0_ = qreq0_.shallowcopy(qaids=qaids)
+            cm_list_FILT = pipeline.request_wbia_query_prefix(
+                qreq0_.ibs, sub_qreq0_, verbose=verbose
+            )
+            qaid2_cm_FILT = {cm.qaid: cm for cm in cm_list_FILT}
+            _iter = list(zip(qreq_list, missed_qaids_list, qaid2_cm_list))
+            for count, (qreq_, missed_qaids_, qaid2_cm) in enumerate(_iter):
+                sub_qaids = [qaid for qaid in qaids if qaid in missed_qaids_]
+                if len(sub_qaids) == 0:
+                    continue
+                sub_qreq_ = qreq_.shallowcopy(qaids=sub_qaids)
+                # The tail modifies chipmatches, so only the last request may
+                # use the shared ones directly
+                sub_cm_list = [qaid2_cm_FILT[qaid] for qaid in sub_qaids]
+                if count < len(_iter) - 1:
+                    sub_cm_list = [cm.copy() for cm in sub_cm_list]
+                sub_cm_list = pipeline.request_wbia_query_tail(
+                    sub_qreq_, sub_cm_list, verbose=verbose
+                )
+                if save_qcache:
+                    _save_chipmatches(qreq_, sub_qaids, sub_cm_list, buffered=True)
+                qaid2_cm.update({cm.qaid: cm for cm in sub_cm_list})
+        if save_qcache:
+            for qreq_ in qreq_list:
+                _flush_chipmatches(qreq_)
+
+    cm_list_list = [
+        [qaid2_cm[qaid] for qaid in qreq_.qaids]
+        for qreq_, qaid2_cm in zip(qreq_list, qaid2_cm_list)
+    ]
+    return cm_list_list
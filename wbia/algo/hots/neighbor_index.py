@@ -7,6 +7,8 @@ multi_index.py as well
 https://github.com/spotify/annoy
 """
 import logging
+import json
+import os
 import six
 import numpy as np
 import utool as ut
@@ -15,7 +17,7 @@ from vtool._pyflann_backend import pyflann as pyflann
 
 # import itertools as it
 # import lockfile
-from os.path import basename
+from os.path import basename, exists, join
 from six.moves import range, zip, map  # NOQA
 from wbia.algo.hots import hstypes
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
@@ -27,6 +29,10 @@ USE_HOTSPOTTER_CACHE = not ut.get_argflag('--nocache-hs')
 NOSAVE_FLANN = ut.get_argflag('--nosave-flann')
 NOCACHE_FLANN = ut.get_argflag('--nocache-flann') and USE_HOTSPOTTER_CACHE
 
+# Stacked support arrays persisted next to the FLANN index
+SUPPORT_KEYS = ('ax2_aid', 'idx2_vec', 'idx2_fgw', 'idx2_ax', 'idx2_fx')
+SUPPORT_VERSION = 1
+
 
 def get_support_data(qreq_, daid_list):
     """
@@ -215,6 +221,8 @@ class NeighborIndex(object):
 
     ext = '.flann'
     prefix1 = 'flann'
+    # True if some of the support is searched exhaustively (see augment_neighbor_index)
+    is_augmented = False
 
     def __init__(nnindexer, flann_params, cfgstr):
         r"""
@@ -226,6 +234,7 @@ class NeighborIndex(object):
         nnindexer.idx2_fgw = None  # (M x 1) Descriptor forground weight
         nnindexer.idx2_ax = None  # (M x 1) Index into the aid_list
         nnindexer.idx2_fx = None  # (M x 1) Index into the annot's features
+        nnindexer._idx2_aid = None  # (M x 1) Lazy dense lookup of annot ids
         nnindexer.cfgstr = cfgstr  # configuration id
         if flann_params is None:
             flann_params = {'algorithm': 'kdtree'}
@@ -266,12 +275,15 @@ class NeighborIndex(object):
         idx2_vec, idx2_fgw, idx2_ax, idx2_fx = tup
 
         ax2_aid = np.array(aid_list)
+        indexer._set_support(ax2_aid, idx2_vec, idx2_fgw, idx2_ax, idx2_fx)
 
+    def _set_support(indexer, ax2_aid, idx2_vec, idx2_fgw, idx2_ax, idx2_fx):
         indexer.flann = pyflann.FLANN()  # Approximate search structure
         indexer.ax2_aid = ax2_aid  # (A x 1) Mapping to original annot ids
         indexer.idx2_vec = idx2_vec  # (M x D) Descriptors to index
         indexer.idx2_fgw = idx2_fgw  # (M x 1) Descriptor forground weight
         indexer.idx2_ax = idx2_ax  # (M x 1) Index into the aid_list
+        indexer._idx2_aid = None
         indexer.idx2_fx = idx2_fx  # (M x 1) Index into the annot's features
         indexer.aid2_ax = ut.make_index_lookup(indexer.ax2_aid)
         indexer.num_indexed = indexer.idx2_vec.shape[0]
@@ -289,7 +301,7 @@ class NeighborIndex(object):
         r"""
         # TODO: ensure that the memcache changes appropriately
         """
-        from wbia.algo.hots.neighbor_index import clear_memcache
+        from wbia.algo.hots.neighbor_index_cache import clear_memcache
 
         clear_memcache()
         if verbose:
@@ -329,7 +341,7 @@ class NeighborIndex(object):
                 '[nnindex] request remove %d annots from single-indexer'
                 % (len(remove_daid_list))
             )
-        from wbia.algo.hots.neighbor_index import clear_memcache
+        from wbia.algo.hots.neighbor_index_cache import clear_memcache
 
         clear_memcache()
         nnindexer.remove_support(remove_daid_list, verbose=verbose)
@@ -386,6 +398,7 @@ class NeighborIndex(object):
         # nnindexer.ax2_aid
         if True:
             nnindexer.ax2_aid[remove_ax_list] = -1
+            nnindexer._idx2_aid = None
             nnindexer.idx2_fx[remove_idx_list] = -1
             nnindexer.idx2_vec[remove_idx_list] = 0
             if nnindexer.idx2_fgw is not None:
@@ -470,6 +483,7 @@ class NeighborIndex(object):
             logger.info('REPLACING')
         nnindexer.ax2_aid = _ax2_aid
         nnindexer.idx2_ax = _idx2_ax
+        nnindexer._idx2_aid = None
         nnindexer.idx2_vec = _idx2_vec
         nnindexer.idx2_fx = _idx2_fx
         nnindexer.aid2_ax = ut.make_index_lookup(nnindexer.ax2_aid)
@@ -602,6 +616,100 @@ class NeighborIndex(object):
                 load_success = True
         return load_success
 
+    def get_support_dpath(nnindexer, cachedir):
+        """ Directory holding the persisted support arrays of this indexer """
+        _args2_fpath = ut.util_cache._args2_fpath
+        return _args2_fpath(cachedir, 'flann_support', nnindexer.cfgstr, '.support')
+
+    def save_support(nnindexer, cachedir, verbose=True):
+        r"""
+        Persists the stacked support arrays (idx2_vec, idx2_fgw, idx2_ax,
+        idx2_fx, and ax2_aid) as .npy files next to the FLANN index. The
+        directory is keyed by the nnindex cfgstr, which is known before any
+        descriptors are read, so load_support can skip the feature tables.
+
+        The arrays are written to a temporary directory which is renamed into
+        place, so concurrent engine processes never see a partial store.
+        """
+        if NOSAVE_FLANN or nnindexer.cfgstr is None:
+            return False
+        support_dpath = nnindexer.get_support_dpath(cachedir)
+        if exists(join(support_dpath, 'meta.json')):
+            return True
+        if ut.VERYVERBOSE or verbose:
+            logger.info(
+                '[nnindex] save support %r' % (ut.path_ndir_split(support_dpath, n=5),)
+            )
+        temp_dpath = '%s.%d.tmp' % (support_dpath, os.getpid())
+        ut.ensuredir(temp_dpath)
+        for key in SUPPORT_KEYS:
+            arr = getattr(nnindexer, key)
+            if arr is not None:
+                np.save(join(temp_dpath, key + '.npy'), arr)
+        flann_fpath = nnindexer.flann_fpath
+        meta = {
+            'version': SUPPORT_VERSION,
+            'num_indexed': int(nnindexer.num_indexed),
+            'flann_fname': None if flann_fpath is None else basename(flann_fpath),
+        }
+        with open(join(temp_dpath, 'meta.json'), 'w') as file_:
+            json.dump(meta, file_)
+        try:
+            os.rename(temp_dpath, support_dpath)
+        except OSError:
+            # Another process persisted the same support data first
+            ut.delete(temp_dpath, verbose=False)
+        return True
+
+    def load_support(nnindexer, cachedir, aid_list=None, mmap_mode='c', verbose=True):
+        r"""
+        Initializes support data from arrays persisted by save_support instead
+        of stacking descriptors in memory.
+
+        The arrays are memory mapped, so the operating system shares their
+        pages between all processes that load the same index. The default
+        copy-on-write mode keeps in-place edits (e.g. remove_support) private
+        to the process.
+
+        Returns:
+            bool: load_success
+        """
+        assert nnindexer.flann is None, 'already initalized'
+        if NOCACHE_FLANN or nnindexer.cfgstr is None:
+            return False
+        support_dpath = nnindexer.get_support_dpath(cachedir)
+        meta_fpath = join(support_dpath, 'meta.json')
+        if not exists(meta_fpath):
+            return False
+        try:
+            with open(meta_fpath, 'r') as file_:
+                meta = json.load(file_)
+            if meta.get('version', None) != SUPPORT_VERSION:
+                return False
+            support = {}
+            for key in SUPPORT_KEYS:
+                fpath = join(support_dpath, key + '.npy')
+                if exists(fpath):
+                    support[key] = np.load(fpath, mmap_mode=mmap_mode)
+                else:
+                    support[key] = None
+        except Exception as ex:
+            ut.printex(ex, '... cannot load nnindex support', iswarning=True)
+            return False
+        if aid_list is not None and not np.array_equal(support['ax2_aid'], aid_list):
+            if verbose:
+                logger.info('[nnindex] persisted support does not match the aids')
+            return False
+        if ut.VERYVERBOSE or verbose:
+            logger.info(
+                '[nnindex] mapped support for %d vectors from %r'
+                % (meta['num_indexed'], ut.path_ndir_split(support_dpath, n=5))
+            )
+        nnindexer._set_support(**support)
+        if meta['flann_fname'] is not None:
+            nnindexer.flann_fpath = join(cachedir, meta['flann_fname'])
+        return True
+
     def get_prefix(nnindexer):
         return nnindexer.prefix1
 
@@ -679,7 +787,7 @@ class NeighborIndex(object):
         return nnindexer.idx2_vec.dtype
 
     @profile
-    def knn(indexer, qfx2_vec, K):
+    def knn(indexer, qfx2_vec, K, cores=None):
         r"""
         Returns the indices and squared distance to the nearest K neighbors.
         The distance is noramlized between zero and one using
@@ -690,6 +798,8 @@ class NeighborIndex(object):
 
             K: number of approximate nearest neighbors to find
 
+            cores: number of FLANN search threads (defaults to indexer.cores)
+
         Returns: tuple of (qfx2_idx, qfx2_dist)
             ndarray : qfx2_idx[n][k] (N x K) is the index of the kth
                         approximate nearest data vector w.r.t qfx2_vec[n]
@@ -755,7 +865,10 @@ class NeighborIndex(object):
             try:
                 # perform nearest neighbors
                 (qfx2_idx, qfx2_raw_dist) = indexer.flann.nn_index(
-                    qfx2_vec, K, checks=indexer.checks, cores=indexer.cores
+                    qfx2_vec,
+                    K,
+                    checks=indexer.checks,
+                    cores=indexer.cores if cores is None else cores,
                 )
                 # TODO: catch case where K < dbsize
             except pyflann.FLANNException as ex:
@@ -859,22 +972,120 @@ class NeighborIndex(object):
                 qfx2_dist = qfx2_raw_dist
         return qfx2_idx, qfx2_dist
 
-    def batch_knn(indexer, vecs, K, chunksize=4096, label='batch knn'):
+    def batch_knn(
+        indexer,
+        vecs,
+        K,
+        chunksize=4096,
+        label='batch knn',
+        num_workers=1,
+        prog_hook=None,
+    ):
         """
         Works like `indexer.knn` but the input is split into batches and
         progress is reported to give an esimated time remaining.
+
+        If num_workers > 1 the chunks are searched by a thread pool (FLANN
+        releases the GIL) and each search is restricted to a single core.
+        Every descriptor is searched independently, so the result does not
+        depend on the chunking or the number of workers.
         """
-        # Preallocate output
-        idxs = np.empty((vecs.shape[0], K), dtype=np.int32)
-        dists = np.empty((vecs.shape[0], K), dtype=np.float32)
+        from concurrent import futures
+
+        if K == 0 or K > indexer.num_indexed or len(vecs) == 0:
+            # Let knn handle the degenerate cases
+            return indexer.knn(vecs, K)
         # Generate chunk slices
-        num_chunks = ut.get_num_chunks(vecs.shape[0], chunksize)
-        iter_ = ut.ichunk_slices(vecs.shape[0], chunksize)
-        prog = ut.ProgIter(iter_, length=num_chunks, label=label)
-        for sl_ in prog:
-            idxs[sl_], dists[sl_] = indexer.knn(vecs[sl_], K=K)
+        slice_list = list(ut.ichunk_slices(vecs.shape[0], chunksize))
+        if num_workers is not None and num_workers > 1 and len(slice_list) > 1:
+
+            def _chunk_knn(sl_):
+                return indexer.knn(vecs[sl_], K=K, cores=1)
+
+            executor = futures.ThreadPoolExecutor(num_workers)
+            try:
+                # map yields results in chunk order
+                result_iter = executor.map(_chunk_knn, slice_list)
+                prog = ut.ProgIter(
+                    result_iter,
+                    length=len(slice_list),
+                    label=label,
+                    prog_hook=prog_hook,
+                )
+                result_list = list(prog)
+            finally:
+                executor.shutdown(wait=True)
+        else:
+            prog = ut.ProgIter(
+                slice_list, length=len(slice_list), label=label, prog_hook=prog_hook
+            )
+            result_list = [indexer.knn(vecs[sl_], K=K) for sl_ in prog]
+        idxs = np.vstack([idxs_ for idxs_, _ in result_list])
+        dists = np.vstack([dists_ for _, dists_ in result_list])
         return idxs, dists
 
+    def multi_knn(
+        indexer,
+        vecs_list,
+        K_list,
+        chunksize=4096,
+        label='multi knn',
+        num_workers=1,
+        prog_hook=None,
+    ):
+        """
+        Finds the neighbors of several queries at once.
+
+        The descriptors of all queries asking for the same number of
+        neighbors are stacked, searched with batch_knn, and split back per
+        query. This removes the per-call overhead for many small queries and
+        gives the same result as calling knn on each query.
+
+        Args:
+            vecs_list (list): (N_i x D) query descriptors of each query
+            K_list (list): number of neighbors of each query
+
+        Returns:
+            list: (qfx2_idx, qfx2_dist) tuples of each query
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+            >>> indexer, qreq_, ibs = testdata_nnindexer()
+            >>> config2_ = qreq_.get_internal_query_config2()
+            >>> vecs_list = ibs.get_annot_vecs([1, 2, 3], config2_=config2_)
+            >>> K_list = [3, 4, 3]
+            >>> idx_dist_list1 = [indexer.knn(vecs, K) for vecs, K in zip(vecs_list, K_list)]
+            >>> idx_dist_list2 = indexer.multi_knn(vecs_list, K_list, chunksize=256,
+            >>>                                    num_workers=4)
+            >>> for (idxs1, dists1), (idxs2, dists2) in zip(idx_dist_list1, idx_dist_list2):
+            >>>     assert np.all(idxs1 == idxs2)
+            >>>     assert np.all(dists1 == dists2)
+        """
+        idx_dist_list = [None] * len(vecs_list)
+        unique_Ks, groupxs = vt.group_indices(np.array(K_list))
+        for K, groupx in zip(unique_Ks, groupxs):
+            group_vecs_list = ut.take(vecs_list, groupx)
+            offsets = np.cumsum([0] + [len(vecs) for vecs in group_vecs_list])
+            stacked_vecs = np.vstack(group_vecs_list)
+            idxs, dists = indexer.batch_knn(
+                stacked_vecs,
+                int(K),
+                chunksize=chunksize,
+                label=label,
+                num_workers=num_workers,
+                prog_hook=prog_hook,
+            )
+            if len(idxs) != len(stacked_vecs):
+                # degenerate K, search each query on its own
+                for x, vecs in zip(groupx, group_vecs_list):
+                    idx_dist_list[x] = indexer.knn(vecs, int(K))
+                continue
+            for count, x in enumerate(groupx):
+                sl_ = slice(offsets[count], offsets[count + 1])
+                idx_dist_list[x] = (idxs[sl_], dists[sl_])
+        return idx_dist_list
+
     def debug_nnindexer(nnindexer):
         r"""
         Makes sure the indexer has valid SIFT descriptors
@@ -898,6 +1109,28 @@ class NeighborIndex(object):
         qfx2_dist = np.empty((0, K), dtype=np.float64)
         return (qfx2_idx, qfx2_dist)
 
+    def get_nbytes(nnindexer):
+        """
+        Approximate memory footprint of the inverted index arrays and the
+        FLANN structure. FLANN references idx2_vec instead of copying it, so
+        only its own tree memory is added.
+        """
+        arr_list = [
+            nnindexer.ax2_aid,
+            nnindexer.idx2_vec,
+            nnindexer.idx2_fgw,
+            nnindexer.idx2_ax,
+            nnindexer.idx2_fx,
+        ]
+        nbytes = sum(arr.nbytes for arr in arr_list if arr is not None)
+        if nnindexer.flann is not None:
+            try:
+                nbytes += nnindexer.flann.used_memory()
+            except Exception:
+                # the index has not been built or loaded yet
+                pass
+        return nbytes
+
     def num_indexed_vecs(nnindexer):
         return nnindexer.idx2_vec.shape[0]
 
@@ -930,6 +1163,16 @@ class NeighborIndex(object):
         r""" gets matching internal annotation indices """
         return nnindexer.idx2_ax.take(qfx2_nnidx)
 
+    def get_idx2_aid(nnindexer):
+        r"""
+        Returns a dense (M x 1) array mapping each indexed vector to its
+        annotation id. It is built on first use and replaces the two level
+        idx -> ax -> aid lookup.
+        """
+        if getattr(nnindexer, '_idx2_aid', None) is None:
+            nnindexer._idx2_aid = nnindexer.ax2_aid.take(nnindexer.idx2_ax)
+        return nnindexer._idx2_aid
+
     def get_nn_aids(nnindexer, qfx2_nnidx):
         r"""
         Args:
@@ -962,8 +1205,7 @@ class NeighborIndex(object):
             >>> ut.assert_inbounds(qfx2_aid.shape[0], 1200, 1300)
         """
         try:
-            qfx2_ax = nnindexer.idx2_ax.take(qfx2_nnidx)
-            qfx2_aid = nnindexer.ax2_aid.take(qfx2_ax)
+            qfx2_aid = nnindexer.get_idx2_aid().take(qfx2_nnidx)
         except Exception as ex:
             ut.printex(
                 ex,
@@ -1016,12 +1258,247 @@ class NeighborIndex(object):
         return qfx2_fgw
 
     def get_nn_nids(indexer, qfx2_nnidx, qreq_):
-        """ iccv hack, todo: make faster by direct lookup from idx """
+        """ iccv hack, uses the dense lookups of the indexer and request """
         qfx2_aid = indexer.get_nn_aids(qfx2_nnidx)
         qfx2_nid = qreq_.get_qreq_annot_nids(qfx2_aid)
         return qfx2_nid
 
 
+class StackedRows(object):
+    """
+    Read-only row concatenation of a base array and an array of new rows.
+    The base array (e.g. the memory mapped descriptors of a persisted index)
+    is shared instead of copied. Supports the operations an indexer uses on
+    idx2_vec, ``np.asarray`` gives a stacked copy.
+
+    Args:
+        base (ndarray): first rows
+        new (ndarray): rows after the base rows
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index StackedRows
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+        >>> base = np.arange(12, dtype=np.uint8).reshape(6, 2)
+        >>> new = np.arange(12, 18, dtype=np.uint8).reshape(3, 2)
+        >>> rows = StackedRows(base, new)
+        >>> full = np.vstack([base, new])
+        >>> idxs = np.array([[8, 0], [5, 6]])
+        >>> assert rows.shape == full.shape and len(rows) == 9
+        >>> assert np.all(rows.take(idxs, axis=0) == full.take(idxs, axis=0))
+        >>> assert np.all(rows[idxs.T] == full[idxs.T])
+        >>> flags = np.arange(9) % 2 == 0
+        >>> assert np.all(rows.compress(flags, axis=0) == full.compress(flags, axis=0))
+        >>> assert np.all(np.asarray(rows) == full)
+        >>> assert rows.nbytes == new.nbytes
+    """
+
+    def __init__(self, base, new):
+        assert base.shape[1:] == new.shape[1:], 'rows do not agree'
+        self.base = base
+        self.new = new
+        self.num_base = len(base)
+        self.shape = (len(base) + len(new),) + base.shape[1:]
+        self.dtype = base.dtype
+        self.ndim = base.ndim
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape))
+
+    @property
+    def nbytes(self):
+        # The base rows belong to (and are counted with) another indexer
+        return self.new.nbytes
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None):
+        arr = np.vstack([self.base, self.new])
+        return arr if dtype is None else arr.astype(dtype)
+
+    def __getitem__(self, index):
+        if isinstance(index, (list, np.ndarray)) or np.isscalar(index):
+            return self.take(index, axis=0)
+        return np.asarray(self)[index]
+
+    def take(self, indices, axis=0):
+        assert axis == 0, 'only rows can be taken'
+        indices = np.asarray(indices)
+        indices = np.where(indices < 0, indices + len(self), indices)
+        out = np.empty(indices.shape + self.shape[1:], dtype=self.dtype)
+        isbase = indices < self.num_base
+        out[isbase] = self.base.take(indices[isbase], axis=0)
+        isnew = ~isbase
+        out[isnew] = self.new.take(indices[isnew] - self.num_base, axis=0)
+        return out
+
+    def compress(self, flags, axis=0):
+        assert axis == 0, 'only rows can be compressed'
+        flags = np.asarray(flags, dtype=bool)
+        base_rows = self.base.compress(flags[0 : self.num_base], axis=0)
+        new_rows = self.new.compress(flags[self.num_base :], axis=0)
+        return np.vstack([base_rows, new_rows])
+
+
+class BruteForceAugmentedFLANN(object):
+    """
+    Stands in for the FLANN index of an indexer whose support was extended
+    after its index was built. The first num_base descriptors are searched
+    with the base FLANN index and the remaining descriptors exhaustively. The
+    neighbors of both searches are merged by distance.
+
+    Args:
+        base_flann (pyflann.FLANN): index of the first num_base descriptors.
+            If None, all descriptors are searched exhaustively.
+        num_base (int): number of descriptors in the base index
+        new_vecs (ndarray): descriptors added after the base was built
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index BruteForceAugmentedFLANN
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> vecs = rng.randint(0, 255, (100, 16)).astype(np.uint8)
+        >>> qvecs = rng.randint(0, 255, (7, 16)).astype(np.uint8)
+        >>> full = BruteForceAugmentedFLANN(None, 0, vecs)
+        >>> base = BruteForceAugmentedFLANN(None, 0, vecs[:60])
+        >>> augmented = BruteForceAugmentedFLANN(base, 60, vecs[60:])
+        >>> idx1, dist1 = full.nn_index(qvecs, 5)
+        >>> idx2, dist2 = augmented.nn_index(qvecs, 5)
+        >>> assert idx2.shape == (7, 5) and np.all(dist1 == dist2)
+        >>> # Distances agree with the neighbors that were found
+        >>> qfx2_dvec = vecs[idx2].astype(np.float64)
+        >>> dist3 = ((qfx2_dvec - qvecs[:, None].astype(np.float64)) ** 2).sum(axis=2)
+        >>> assert np.allclose(dist3, dist2)
+        >>> idx, dist = augmented.nn_index(qvecs, 1)
+        >>> assert idx.shape == (7,) and np.all(dist == dist1[:, 0])
+    """
+
+    # Bound on the number of pairwise distances computed at once
+    CHUNK_NUM_DISTS = 2 ** 22
+
+    def __init__(self, base_flann, num_base, new_vecs):
+        self.base_flann = base_flann
+        self.num_base = num_base
+        self.new_vecs = new_vecs
+        self._new_sqrd_norms = (new_vecs.astype(np.float64) ** 2).sum(axis=1)
+
+    def used_memory(self):
+        if self.base_flann is None:
+            return 0
+        return self.base_flann.used_memory()
+
+    def _exhaustive_nn_index(self, qfx2_vec, K):
+        num_new = len(self.new_vecs)
+        chunksize = max(1, self.CHUNK_NUM_DISTS // max(num_new, 1))
+        qfx2_idx = np.empty((len(qfx2_vec), K), dtype=np.int32)
+        qfx2_dist = np.empty((len(qfx2_vec), K), dtype=np.float64)
+        new_vecs = self.new_vecs.astype(np.float64)
+        for sl_ in ut.ichunk_slices(len(qfx2_vec), chunksize):
+            vecs = qfx2_vec[sl_].astype(np.float64)
+            dists = (
+                (vecs ** 2).sum(axis=1)[:, None]
+                + self._new_sqrd_norms[None, :]
+                - 2 * vecs.dot(new_vecs.T)
+            )
+            np.maximum(dists, 0, out=dists)
+            if K < num_new:
+                idxs = np.argpartition(dists, K - 1, axis=1)[:, 0:K]
+            else:
+                idxs = np.tile(np.arange(num_new), (len(dists), 1))
+            qfx2_idx[sl_] = idxs
+            qfx2_dist[sl_] = np.take_along_axis(dists, idxs, axis=1)
+        return qfx2_idx + self.num_base, qfx2_dist
+
+    def nn_index(self, qfx2_vec, num_neighbors=1, checks=None, cores=None, **kwargs):
+        """ Same interface and conventions as pyflann.FLANN.nn_index """
+        K = num_neighbors
+        idx_list = []
+        dist_list = []
+        K_base = min(K, self.num_base)
+        if K_base > 0:
+            base_idx, base_dist = self.base_flann.nn_index(
+                qfx2_vec, K_base, checks=checks, cores=cores, **kwargs
+            )
+            idx_list.append(np.asarray(base_idx).reshape(len(qfx2_vec), K_base))
+            dist_list.append(np.asarray(base_dist).reshape(len(qfx2_vec), K_base))
+        K_new = min(K, len(self.new_vecs))
+        if K_new > 0:
+            new_idx, new_dist = self._exhaustive_nn_index(qfx2_vec, K_new)
+            idx_list.append(new_idx)
+            dist_list.append(new_dist)
+        qfx2_idx = np.hstack(idx_list).astype(np.int32)
+        qfx2_dist = np.hstack(dist_list).astype(np.float32)
+        sortx = np.argsort(qfx2_dist, axis=1, kind='mergesort')[:, 0:K]
+        qfx2_idx = np.take_along_axis(qfx2_idx, sortx, axis=1)
+        qfx2_dist = np.take_along_axis(qfx2_dist, sortx, axis=1)
+        if K == 1:
+            # pyflann returns flat arrays for a single neighbor
+            qfx2_idx = qfx2_idx.ravel()
+            qfx2_dist = qfx2_dist.ravel()
+        return qfx2_idx, qfx2_dist
+
+
+def augment_neighbor_index(
+    base_nnindexer, aid_list, vecs_list, fgws_list, fxs_list, cfgstr, verbose=True
+):
+    """
+    Returns a new indexer over the support of a built indexer and additional
+    annotations without rebuilding the index. The descriptors of the
+    additional annotations are searched exhaustively, so this is only meant
+    for a small number of annotations, e.g. while a full index is rebuilt in
+    the background. The descriptors of the base indexer are shared, not
+    copied.
+
+    Args:
+        base_nnindexer (NeighborIndex): indexer with a built index
+        aid_list (list): annotations that are not in base_nnindexer
+        cfgstr (str): configuration id of the new indexer
+
+    Returns:
+        NeighborIndex: nnindexer - with is_augmented=True
+    """
+    assert base_nnindexer.flann is not None, 'base index is not built'
+    num_base_annots = len(base_nnindexer.ax2_aid)
+    ax_list = np.arange(len(aid_list)) + num_base_annots
+    base_vecs = base_nnindexer.idx2_vec
+    if sum(map(len, vecs_list)) > 0:
+        new_vec, new_fgw, new_ax, new_fx = invert_index(
+            vecs_list, fgws_list, ax_list, fxs_list, verbose=verbose
+        )
+    else:
+        new_vec = np.empty((0, base_vecs.shape[1]), dtype=base_vecs.dtype)
+        new_fgw = None if fgws_list is None else np.empty(0, dtype=np.float32)
+        new_ax = np.empty(0, dtype=np.int32)
+        new_fx = np.empty(0, dtype=np.int32)
+    if base_nnindexer.idx2_fgw is None or new_fgw is None:
+        idx2_fgw = None
+    else:
+        idx2_fgw = np.hstack([base_nnindexer.idx2_fgw, new_fgw])
+    nnindexer = NeighborIndex(dict(base_nnindexer.flann_params), cfgstr)
+    nnindexer._set_support(
+        np.hstack([base_nnindexer.ax2_aid, np.array(aid_list, dtype=np.int64)]),
+        StackedRows(base_vecs, new_vec),
+        idx2_fgw,
+        np.hstack([base_nnindexer.idx2_ax, new_ax]),
+        np.hstack([base_nnindexer.idx2_fx, new_fx]),
+    )
+    nnindexer.flann = BruteForceAugmentedFLANN(
+        base_nnindexer.flann, base_nnindexer.num_indexed, new_vec
+    )
+    nnindexer.flann_fpath = base_nnindexer.flann_fpath
+    nnindexer.checks = base_nnindexer.checks
+    nnindexer.cores = base_nnindexer.cores
+    nnindexer.is_augmented = True
+    return nnindexer
+
+
 def in1d_shape(arr1, arr2):
     return np.in1d(arr1, arr2).reshape(arr1.shape)
 
@@ -1069,6 +1546,7 @@ class NeighborIndex2(NeighborIndex, ut.NiceRepr):
         del state['idx2_vec']
         del state['idx2_ax']
         del state['idx2_fx']
+        state.pop('_idx2_aid', None)
         # del state['flann_params']
         # del state['checks']
         # nnindexer.num_indexed = None
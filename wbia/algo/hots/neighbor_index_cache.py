@@ -3,12 +3,15 @@
 NEEDS CLEANUP
 """
 import logging
+import collections
+import threading
 from os.path import join
 import six
 import utool as ut
 from six.moves import range, zip, map  # NOQA
 from wbia.algo.hots import _pipeline_helpers as plh  # NOQA
 from wbia.algo.hots.neighbor_index import NeighborIndex, get_support_data
+from wbia.algo.hots.neighbor_index import augment_neighbor_index
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -17,14 +20,225 @@ logger = logging.getLogger('wbia')
 USE_HOTSPOTTER_CACHE = not ut.get_argflag('--nocache-hs')
 NOCACHE_UUIDS = ut.get_argflag('--nocache-uuids') and USE_HOTSPOTTER_CACHE
 
-# LRU cache for nn_indexers. Ensures that only a few are ever in memory
-# MAX_NEIGHBOR_CACHE_SIZE = ut.get_argval('--max-neighbor-cachesize', type_=int, default=2)
-MAX_NEIGHBOR_CACHE_SIZE = ut.get_argval('--max-neighbor-cachesize', type_=int, default=1)
-# Background process for building indexes
-CURRENT_THREAD = None
+# LRU cache for nn_indexers. Bounded by the total bytes of the cached indexers
+# and optionally by the number of cached indexers.
+MAX_NEIGHBOR_CACHE_MB = ut.get_argval('--max-neighbor-cache-mb', type_=int, default=2048)
+MAX_NEIGHBOR_CACHE_SIZE = ut.get_argval(
+    '--max-neighbor-cachesize', type_=int, default=None
+)
+# Serve queries from a cached index augmented with a brute-force search over
+# new annotations while the full index is rebuilt in the background
+BACKGROUND_REINDEX = ut.get_argflag('--background-reindex')
+MAX_BRUTEFORCE_ANNOTS = ut.get_argval('--max-bruteforce-annots', type_=int, default=256)
+NNINDEX_BUILD_WORKERS = ut.get_argval('--nnindex-build-workers', type_=int, default=1)
+NNINDEX_BUILD_CORES = ut.get_argval('--nnindex-build-cores', type_=int, default=2)
 # Global map to keep track of UUID lists with prebuild indexers.
 UUID_MAP = ut.ddict(dict)
-NEIGHBOR_CACHE = ut.get_lru_cache(MAX_NEIGHBOR_CACHE_SIZE)
+
+
+def _nbytes(value):
+    if value is None:
+        return 0
+    if hasattr(value, 'get_nbytes'):
+        return value.get_nbytes()
+    return getattr(value, 'nbytes', 0)
+
+
+class NeighborIndexCache(ut.NiceRepr):
+    """
+    In-memory LRU cache of neighbor indexers bounded by total bytes.
+
+    Each entry is sized with NeighborIndex.get_nbytes when it is written. The
+    least recently used unpinned entries are evicted until the cache fits in
+    max_bytes (and max_size entries if given). An entry can be pinned under a
+    group, such as the species of the active query, so it is never evicted.
+    Pinning another entry under the same group releases the previous pin.
+
+    Args:
+        max_bytes (int): memory budget
+        max_size (int): optional bound on the number of entries
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index_cache NeighborIndexCache
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> import numpy as np
+        >>> cache = NeighborIndexCache(max_bytes=1000)
+        >>> cache['zebra'] = np.zeros(400, dtype=np.uint8)
+        >>> cache.pin('zebra', group=('zebra_plains',))
+        >>> cache['imgset1'] = np.zeros(300, dtype=np.uint8)
+        >>> cache['imgset2'] = np.zeros(300, dtype=np.uint8)
+        >>> assert cache.get('imgset1') is not None
+        >>> # evicts the least recently used unpinned entry
+        >>> cache['imgset3'] = np.zeros(300, dtype=np.uint8)
+        >>> assert sorted(cache.keys()) == ['imgset1', 'imgset3', 'zebra']
+        >>> assert cache.get('imgset2') is None
+        >>> stats = cache.get_stats()
+        >>> print(ut.repr2(ut.dict_subset(stats, ['nbytes', 'hits', 'misses', 'evictions'])))
+        {'nbytes': 1000, 'hits': 1, 'misses': 1, 'evictions': 1}
+        >>> # pinning a new index for the same species releases the old one
+        >>> cache.pin('imgset3', group=('zebra_plains',))
+        >>> cache['imgset4'] = np.zeros(600, dtype=np.uint8)
+        >>> assert sorted(cache.keys()) == ['imgset3', 'imgset4']
+    """
+
+    def __init__(cache, max_bytes, max_size=None):
+        cache.max_bytes = max_bytes
+        cache.max_size = max_size
+        cache._lock = threading.RLock()
+        # key -> (value, nbytes) in least recently used order
+        cache._entries = collections.OrderedDict()
+        # group -> pinned key
+        cache._pins = {}
+        cache.nbytes = 0
+        cache.reset_stats()
+
+    def __nice__(cache):
+        return '%d entries, %s / %s' % (
+            len(cache._entries),
+            ut.byte_str2(cache.nbytes),
+            ut.byte_str2(cache.max_bytes),
+        )
+
+    def reset_stats(cache):
+        cache.hits = 0
+        cache.misses = 0
+        cache.evictions = 0
+
+    def __len__(cache):
+        return len(cache._entries)
+
+    def __contains__(cache, key):
+        return key in cache._entries
+
+    def has_key(cache, key):
+        return key in cache._entries
+
+    def keys(cache):
+        return list(cache._entries.keys())
+
+    def items(cache):
+        with cache._lock:
+            return [(key, value) for key, (value, _) in cache._entries.items()]
+
+    def get(cache, key, default=None):
+        """ Returns the cached indexer and counts the hit or miss """
+        with cache._lock:
+            if key in cache._entries:
+                cache.hits += 1
+                cache._entries.move_to_end(key)
+                return cache._entries[key][0]
+            cache.misses += 1
+            return default
+
+    def __getitem__(cache, key):
+        with cache._lock:
+            cache._entries.move_to_end(key)
+            return cache._entries[key][0]
+
+    def __setitem__(cache, key, value):
+        nbytes = _nbytes(value)
+        with cache._lock:
+            if key in cache._entries:
+                cache._pop(key)
+            cache._entries[key] = (value, nbytes)
+            cache.nbytes += nbytes
+            cache._evict(keep=key)
+            if nbytes > cache.max_bytes:
+                logger.warning(
+                    '[nnindex.MEMCACHE] indexer of %s exceeds the cache budget of %s'
+                    % (ut.byte_str2(nbytes), ut.byte_str2(cache.max_bytes))
+                )
+
+    def __delitem__(cache, key):
+        with cache._lock:
+            if key not in cache._entries:
+                raise KeyError(key)
+            cache._pop(key)
+
+    def pop(cache, key, default=None):
+        with cache._lock:
+            if key not in cache._entries:
+                return default
+            return cache._pop(key)
+
+    def _pop(cache, key):
+        value, nbytes = cache._entries.pop(key)
+        cache.nbytes -= nbytes
+        for group in [group for group, key_ in cache._pins.items() if key_ == key]:
+            del cache._pins[group]
+        return value
+
+    def _is_full(cache):
+        if cache.nbytes > cache.max_bytes:
+            return True
+        return cache.max_size is not None and len(cache._entries) > cache.max_size
+
+    def _evict(cache, keep=None):
+        pinned = set(cache._pins.values())
+        candidates = [
+            key for key in cache._entries.keys() if key != keep and key not in pinned
+        ]
+        for key in candidates:
+            if not cache._is_full():
+                break
+            logger.info('[nnindex.MEMCACHE] evicting cfgstr=%s' % (key,))
+            cache._pop(key)
+            cache.evictions += 1
+
+    def pin(cache, key, group=None):
+        """ Protects a cached entry from eviction until it is unpinned """
+        with cache._lock:
+            if key in cache._entries:
+                cache._pins[group] = key
+                cache._evict()
+
+    def unpin(cache, group=None):
+        with cache._lock:
+            cache._pins.pop(group, None)
+            cache._evict()
+
+    def resize(cache, max_bytes=None, max_size=None):
+        with cache._lock:
+            if max_bytes is not None:
+                cache.max_bytes = max_bytes
+            cache.max_size = max_size
+            cache._evict()
+
+    def clear(cache):
+        with cache._lock:
+            cache._entries.clear()
+            cache._pins.clear()
+            cache.nbytes = 0
+
+    def get_stats(cache):
+        """ Cache size and hit rate metrics """
+        with cache._lock:
+            num_requests = cache.hits + cache.misses
+            stats = {
+                'num_entries': len(cache._entries),
+                'num_pinned': len(cache._pins),
+                'nbytes': cache.nbytes,
+                'max_bytes': cache.max_bytes,
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'evictions': cache.evictions,
+                'hit_rate': cache.hits / num_requests if num_requests else 0.0,
+            }
+        return stats
+
+    def get_stats_str(cache):
+        stats = cache.get_stats()
+        stats['nbytes'] = ut.byte_str2(stats['nbytes'])
+        stats['max_bytes'] = ut.byte_str2(stats['max_bytes'])
+        return ut.repr2(stats, nl=1, precision=3)
+
+
+NEIGHBOR_CACHE = NeighborIndexCache(
+    MAX_NEIGHBOR_CACHE_MB * (2 ** 20), MAX_NEIGHBOR_CACHE_SIZE
+)
 
 
 class UUIDMapHyrbridCache(object):
@@ -221,17 +435,20 @@ def build_nnindex_cfgstr(qreq_, daid_list):
 
         _VUUIDS((6)ylydksaqdigdecdd)_FLANN(8_kdtrees)_FEATWEIGHT(OFF)_FEAT(hesaff+sift_)_CHIP(sz450)
     """
+    data_hashid = get_data_cfgstr(qreq_.ibs, daid_list)
+    nnindex_cfgstr = data_hashid + get_params_cfgstr(qreq_)
+    return nnindex_cfgstr
+
+
+def get_params_cfgstr(qreq_):
+    """ part 1 of the nnindex cfgstr: everything but the indexed data """
     flann_cfgstr = qreq_.qparams.flann_cfgstr
     featweight_cfgstr = qreq_.qparams.featweight_cfgstr
     feat_cfgstr = qreq_.qparams.feat_cfgstr
     chip_cfgstr = qreq_.qparams.chip_cfgstr
     # FIXME; need to include probchip (or better yet just use depcache)
     # probchip_cfgstr = qreq_.qparams.chip_cfgstr
-    data_hashid = get_data_cfgstr(qreq_.ibs, daid_list)
-    nnindex_cfgstr = ''.join(
-        (data_hashid, flann_cfgstr, featweight_cfgstr, feat_cfgstr, chip_cfgstr)
-    )
-    return nnindex_cfgstr
+    return ''.join((flann_cfgstr, featweight_cfgstr, feat_cfgstr, chip_cfgstr))
 
 
 def clear_memcache():
@@ -239,6 +456,19 @@ def clear_memcache():
     NEIGHBOR_CACHE.clear()
 
 
+def get_memcache_stats():
+    """ Size and hit rate metrics of the in-memory indexer cache """
+    return NEIGHBOR_CACHE.get_stats()
+
+
+def _get_species_pin_group(qreq_):
+    # The active species index of a query stays in memory while it is in use
+    unique_species = getattr(qreq_, 'unique_species', None)
+    if unique_species is None:
+        return None
+    return ('species',) + tuple(sorted(unique_species))
+
+
 def clear_uuid_cache(qreq_):
     """
     CommandLine:
@@ -408,6 +638,7 @@ def request_augmented_wbia_nnindexer(
         nnindexer.cfgstr = nnindex_cfgstr
         cachedir = qreq_.ibs.get_flann_cachedir()
         nnindexer.save(cachedir)
+        nnindexer.save_support(cachedir)
         # Write to inverse uuid
         if len(daid_list) > min_reindex_thresh:
             uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
@@ -475,39 +706,40 @@ def request_memcached_wbia_nnindexer(
     global NEIGHBOR_CACHE
     # try:
     if veryverbose:
-        logger.info(
-            '[nnindex.MEMCACHE] len(NEIGHBOR_CACHE) = %r' % (len(NEIGHBOR_CACHE),)
-        )
-        # the lru cache wont be recognized by get_object_size_str, cast to pure python objects
-        logger.info(
-            '[nnindex.MEMCACHE] size(NEIGHBOR_CACHE) = %s'
-            % (ut.get_object_size_str(NEIGHBOR_CACHE.items()),)
-        )
+        logger.info('[nnindex.MEMCACHE] NEIGHBOR_CACHE = %s' % (NEIGHBOR_CACHE,))
     # if memtrack is not None:
     #    memtrack.report('IN REQUEST MEMCACHE')
     nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
     # neighbor memory cache
-    if (
-        not force_rebuild
-        and use_memcache
-        and NEIGHBOR_CACHE.has_key(nnindex_cfgstr)  # NOQA (has_key is for a lru cache)
-    ):
+    if not force_rebuild and use_memcache:
+        nnindexer = NEIGHBOR_CACHE.get(nnindex_cfgstr)
+    else:
+        nnindexer = None
+    if nnindexer is not None:
         if veryverbose or ut.VERYVERBOSE or ut.VERBOSE:
             logger.info('... nnindex memcache hit: cfgstr=%s' % (nnindex_cfgstr,))
-        nnindexer = NEIGHBOR_CACHE[nnindex_cfgstr]
     else:
         if veryverbose or ut.VERYVERBOSE or ut.VERBOSE:
             logger.info('... nnindex memcache miss: cfgstr=%s' % (nnindex_cfgstr,))
-        # Write to inverse uuid
-        nnindexer = request_diskcached_wbia_nnindexer(
-            qreq_,
-            daid_list,
-            nnindex_cfgstr,
-            verbose,
-            force_rebuild=force_rebuild,
-            memtrack=memtrack,
-            prog_hook=prog_hook,
-        )
+        nnindexer = None
+        if BACKGROUND_REINDEX and use_memcache and not force_rebuild:
+            nnindexer = request_nonblocking_nnindexer(
+                qreq_, daid_list, nnindex_cfgstr, verbose=verbose
+            )
+            if nnindexer is not None and nnindexer.is_augmented:
+                # Cached under its own key, the final index takes the real key
+                return nnindexer
+        if nnindexer is None:
+            # Write to inverse uuid
+            nnindexer = request_diskcached_wbia_nnindexer(
+                qreq_,
+                daid_list,
+                nnindex_cfgstr,
+                verbose,
+                force_rebuild=force_rebuild,
+                memtrack=memtrack,
+                prog_hook=prog_hook,
+            )
         NEIGHBOR_CACHE_WRITE = True
         if NEIGHBOR_CACHE_WRITE:
             # Write to memcache
@@ -517,6 +749,11 @@ def request_memcached_wbia_nnindexer(
         else:
             if ut.VERBOSE or ut.VERYVERBOSE:
                 logger.info('[disk] Did not write to memcache=%r' % (nnindex_cfgstr,))
+    pin_group = _get_species_pin_group(qreq_)
+    if use_memcache and pin_group is not None:
+        NEIGHBOR_CACHE.pin(nnindex_cfgstr, group=pin_group)
+    if veryverbose:
+        logger.info('[nnindex.MEMCACHE] stats = %s' % (NEIGHBOR_CACHE.get_stats_str(),))
     return nnindexer
 
 
@@ -570,6 +807,15 @@ def request_diskcached_wbia_nnindexer(
     # if memtrack is not None:
     #    memtrack.report('[PRE SUPPORT]')
     # Get annot descriptors to index
+    if not force_rebuild:
+        # Map the persisted support arrays instead of reading the feature tables
+        nnindexer = load_neighbor_index(
+            daid_list, flann_params, cachedir, cfgstr, verbose=verbose
+        )
+        if nnindexer is not None:
+            if prog_hook is not None:
+                prog_hook.set_progress(3, 3, 'Loaded persisted indexer')
+            return nnindexer
     if prog_hook is not None:
         prog_hook.set_progress(1, 3, 'Loading support data for indexer')
     logger.info('[nnindex] Loading support data for indexer')
@@ -740,6 +986,51 @@ def new_neighbor_index(
     )
     if memtrack is not None:
         memtrack.report('AFTER LOAD OR BUILD')
+    # Persist the stacked support data so the next load can map it from disk
+    nnindexer.save_support(cachedir, verbose=verbose)
+    return nnindexer
+
+
+def load_neighbor_index(daid_list, flann_params, cachedir, cfgstr, verbose=True):
+    r"""
+    Loads an indexer from the support arrays and FLANN index persisted by
+    new_neighbor_index without reading any descriptors from the feature
+    tables.
+
+    Returns:
+        NeighborIndex: nnindexer or None if nothing usable was persisted
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index_cache --test-load_neighbor_index
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> import wbia
+        >>> import numpy as np
+        >>> qreq_ = wbia.testdata_qreq_(defaultdb='testdb1', a='default:species=zebra_plains')
+        >>> daid_list = qreq_.daids
+        >>> cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
+        >>> cachedir = qreq_.ibs.get_flann_cachedir()
+        >>> flann_params = qreq_.qparams.flann_params
+        >>> vecs_list, fgws_list, fxs_list = get_support_data(qreq_, daid_list)
+        >>> nnindexer1 = new_neighbor_index(daid_list, vecs_list, fgws_list, fxs_list,
+        >>>                                 flann_params, cachedir, cfgstr)
+        >>> nnindexer2 = load_neighbor_index(daid_list, flann_params, cachedir, cfgstr)
+        >>> assert isinstance(nnindexer2.idx2_vec, np.memmap)
+        >>> assert np.all(nnindexer1.idx2_vec == nnindexer2.idx2_vec)
+        >>> assert np.all(nnindexer1.idx2_fx == nnindexer2.idx2_fx)
+        >>> qfx2_vec = vecs_list[0]
+        >>> idx1, dist1 = nnindexer1.knn(qfx2_vec, 2)
+        >>> idx2, dist2 = nnindexer2.knn(qfx2_vec, 2)
+        >>> assert np.all(idx1 == idx2)
+        >>> assert load_neighbor_index(daid_list[::-1], flann_params, cachedir, cfgstr) is None
+    """
+    nnindexer = NeighborIndex(flann_params, cfgstr)
+    if not nnindexer.load_support(cachedir, aid_list=daid_list, verbose=verbose):
+        return None
+    if not nnindexer.load(cachedir, fpath=nnindexer.flann_fpath, verbose=verbose):
+        return None
     return nnindexer
 
 
@@ -781,38 +1072,314 @@ def testdata_nnindexer(dbname='testdb1', with_indexer=True, use_memcache=True):
 # NEW
 
 
+# ------------
+# Background index builds
+
+
+def _build_nnindexer_job(qreq_, daid_list, nnindex_cfgstr, build_cores):
+    """ Builds, persists, and caches the neighbor index of a background job """
+    logger.info('[BG] Starting background build of cfgstr=%s' % (nnindex_cfgstr,))
+    cachedir = qreq_.ibs.get_flann_cachedir()
+    flann_params = dict(qreq_.qparams.flann_params, checks=qreq_.qparams.checks)
+    # Only use a few cores in the background, without changing the request
+    build_params = dict(flann_params, cores=build_cores)
+    vecs_list, fgws_list, fxs_list = get_support_data(qreq_, daid_list)
+    nnindexer = new_neighbor_index(
+        daid_list,
+        vecs_list,
+        fgws_list,
+        fxs_list,
+        build_params,
+        cachedir,
+        cfgstr=nnindex_cfgstr,
+        verbose=False,
+    )
+    nprocs = ut.util_parallel.__NUM_PROCS__
+    nnindexer.cores = flann_params.get('cores', 0 if nprocs is None else nprocs)
+    min_reindex_thresh = qreq_.qparams.min_reindex_thresh
+    if len(daid_list) > min_reindex_thresh:
+        uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
+        daids_hashid = get_data_cfgstr(qreq_.ibs, daid_list)
+        visual_uuid_list = qreq_.ibs.get_annot_visual_uuids(daid_list)
+        UUID_MAP_CACHE.write_uuid_map_dict(uuid_map_fpath, visual_uuid_list, daids_hashid)
+    # Swap in the final index before the augmented stand-in is dropped, so a
+    # concurrent request always finds one of them
+    NEIGHBOR_CACHE[nnindex_cfgstr] = nnindexer
+    NEIGHBOR_CACHE.pop(get_augmented_cfgstr(nnindex_cfgstr))
+    logger.info('[BG] Finished background build of cfgstr=%s' % (nnindex_cfgstr,))
+    return nnindexer
+
+
+class NeighborIndexBuildManager(ut.NiceRepr):
+    """
+    Builds neighbor indexes in a pool of background threads.
+
+    Jobs are keyed by the nnindex cfgstr of the index they build, so a build
+    that is already pending or running is never queued twice. Finished jobs
+    write their index to the memcache (see _build_nnindexer_job) and are
+    forgotten.
+
+    Args:
+        num_workers (int): number of indexes built at the same time
+        build_cores (int): number of FLANN threads used by each build
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index_cache NeighborIndexBuildManager
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> manager = NeighborIndexBuildManager(num_workers=1)
+        >>> event = threading.Event()
+        >>> calls = []
+        >>> def build(key):
+        >>>     event.wait()
+        >>>     calls.append(key)
+        >>>     return key
+        >>> future1 = manager.submit('cfgstr1', build, 'cfgstr1')
+        >>> future2 = manager.submit('cfgstr2', build, 'cfgstr2')
+        >>> # Requests for a pending cfgstr are deduplicated
+        >>> assert manager.submit('cfgstr1', build, 'cfgstr1') is future1
+        >>> assert manager.get_pending_cfgstrs() == ['cfgstr1', 'cfgstr2']
+        >>> event.set()
+        >>> assert manager.wait() == 2
+        >>> assert future2.result() == 'cfgstr2' and calls == ['cfgstr1', 'cfgstr2']
+        >>> assert not manager.is_pending('cfgstr1')
+        >>> manager.shutdown()
+    """
+
+    def __init__(manager, num_workers=1, build_cores=2):
+        manager.num_workers = num_workers
+        manager.build_cores = build_cores
+        manager._lock = threading.RLock()
+        # cfgstr -> future in submission order
+        manager._jobs = collections.OrderedDict()
+        manager._executor = None
+        manager.num_finished = 0
+        manager.num_failed = 0
+
+    def __nice__(manager):
+        return '%d pending, %d finished, %d failed' % (
+            len(manager._jobs),
+            manager.num_finished,
+            manager.num_failed,
+        )
+
+    def _get_executor(manager):
+        if manager._executor is None:
+            from concurrent import futures
+
+            manager._executor = futures.ThreadPoolExecutor(
+                max_workers=manager.num_workers, thread_name_prefix='nnindex_build'
+            )
+        return manager._executor
+
+    def submit(manager, cfgstr, func, *args):
+        """ Queues func(*args) unless a job with the same cfgstr is pending """
+        with manager._lock:
+            future = manager._jobs.get(cfgstr, None)
+            if future is None:
+                future = manager._get_executor().submit(func, *args)
+                manager._jobs[cfgstr] = future
+                future.add_done_callback(
+                    lambda future_: manager._on_done(cfgstr, future_)
+                )
+            return future
+
+    def _on_done(manager, cfgstr, future):
+        with manager._lock:
+            if manager._jobs.get(cfgstr, None) is future:
+                del manager._jobs[cfgstr]
+            if future.cancelled() or future.exception() is not None:
+                manager.num_failed += 1
+            else:
+                manager.num_finished += 1
+        if not future.cancelled() and future.exception() is not None:
+            ex = future.exception()
+            logger.error('[BG] index build failed for cfgstr=%s: %r' % (cfgstr, ex))
+
+    def request(manager, qreq_, daid_list, nnindex_cfgstr=None):
+        """
+        Queues a build of the index of daid_list unless it is cached or pending
+
+        Returns:
+            concurrent.futures.Future: future or None if the index is cached
+        """
+        if nnindex_cfgstr is None:
+            nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
+        if nnindex_cfgstr in NEIGHBOR_CACHE:
+            return None
+        return manager.submit(
+            nnindex_cfgstr,
+            _build_nnindexer_job,
+            qreq_,
+            daid_list,
+            nnindex_cfgstr,
+            manager.build_cores,
+        )
+
+    def get_pending_cfgstrs(manager):
+        with manager._lock:
+            return list(manager._jobs.keys())
+
+    def is_pending(manager, cfgstr):
+        with manager._lock:
+            return cfgstr in manager._jobs
+
+    def wait(manager, timeout=None):
+        """ Blocks until the pending jobs are done and returns their number """
+        from concurrent import futures
+
+        with manager._lock:
+            future_list = list(manager._jobs.values())
+        futures.wait(future_list, timeout=timeout)
+        return len(future_list)
+
+    def shutdown(manager, wait=True):
+        with manager._lock:
+            executor = manager._executor
+            manager._executor = None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+INDEX_BUILD_MANAGER = NeighborIndexBuildManager(
+    NNINDEX_BUILD_WORKERS, NNINDEX_BUILD_CORES
+)
+
+
+def get_augmented_cfgstr(nnindex_cfgstr):
+    return 'augmented_' + nnindex_cfgstr
+
+
+def _find_base_nnindexer(qreq_, daid_list):
+    """
+    Returns the cached indexer with the same parameters that covers most of
+    daid_list without indexing anything else
+    """
+    params_cfgstr = get_params_cfgstr(qreq_)
+    daid_set = set(daid_list)
+    best_nnindexer = None
+    best_coverage = 0
+    for cfgstr, nnindexer in NEIGHBOR_CACHE.items():
+        if not cfgstr.endswith(params_cfgstr):
+            continue
+        if getattr(nnindexer, 'is_augmented', True) or nnindexer.ax2_aid is None:
+            continue
+        if len(nnindexer.ax2_aid) <= best_coverage:
+            continue
+        if daid_set.issuperset(nnindexer.ax2_aid):
+            best_nnindexer = nnindexer
+            best_coverage = len(nnindexer.ax2_aid)
+    return best_nnindexer
+
+
+def request_nonblocking_nnindexer(qreq_, daid_list, nnindex_cfgstr=None, verbose=True):
+    r"""
+    Returns an indexer for daid_list without building a FLANN index in the
+    foreground.
+
+    If the index is not persisted, but a cached index covers all but at most
+    MAX_BRUTEFORCE_ANNOTS of the annotations, the full index is queued in
+    INDEX_BUILD_MANAGER and the cached index is augmented with a brute-force
+    search over the remaining annotations (see augment_neighbor_index). The
+    finished index replaces the augmented one in the memcache.
+
+    Args:
+        qreq_ (QueryRequest):  query request object with hyper-parameters
+        daid_list (list):
+
+    Returns:
+        NeighborIndex: nnindexer or None if the index must be built in the
+            foreground
+
+    CommandLine:
+        python -m wbia.algo.hots.neighbor_index_cache --test-request_nonblocking_nnindexer
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from wbia.algo.hots.neighbor_index_cache import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb('testdb1')
+        >>> daid_list = ibs.get_valid_aids(species=wbia.const.TEST_SPECIES.ZEB_PLAIN)
+        >>> qreq_ = ibs.new_query_request(daid_list, daid_list)
+        >>> nnindexer1 = request_memcached_wbia_nnindexer(qreq_, daid_list[:-2])
+        >>> nnindexer2 = request_nonblocking_nnindexer(qreq_, daid_list)
+        >>> assert nnindexer2.is_augmented
+        >>> INDEX_BUILD_MANAGER.wait()
+        >>> nnindexer3 = request_memcached_wbia_nnindexer(qreq_, daid_list)
+        >>> assert not nnindexer3.is_augmented
+    """
+    if nnindex_cfgstr is None:
+        nnindex_cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
+    augmented_cfgstr = get_augmented_cfgstr(nnindex_cfgstr)
+    nnindexer = NEIGHBOR_CACHE.get(augmented_cfgstr)
+    if nnindexer is not None:
+        if INDEX_BUILD_MANAGER.is_pending(nnindex_cfgstr):
+            return nnindexer
+        # The build finished or failed, stop serving the stand-in
+        NEIGHBOR_CACHE.pop(augmented_cfgstr)
+    cachedir = qreq_.ibs.get_flann_cachedir()
+    flann_params = dict(qreq_.qparams.flann_params, checks=qreq_.qparams.checks)
+    nnindexer = load_neighbor_index(
+        daid_list, flann_params, cachedir, nnindex_cfgstr, verbose=verbose
+    )
+    if nnindexer is not None:
+        return nnindexer
+    base_nnindexer = _find_base_nnindexer(qreq_, daid_list)
+    if base_nnindexer is None:
+        return None
+    new_aids = sorted(set(daid_list) - set(base_nnindexer.ax2_aid))
+    if len(new_aids) > MAX_BRUTEFORCE_ANNOTS:
+        return None
+    INDEX_BUILD_MANAGER.request(qreq_, daid_list, nnindex_cfgstr)
+    if verbose:
+        logger.info(
+            '[nnindex] augmenting an index of %d annots with %d new annots'
+            % (len(base_nnindexer.ax2_aid), len(new_aids))
+        )
+    vecs_list, fgws_list, fxs_list = get_support_data(qreq_, new_aids)
+    nnindexer = augment_neighbor_index(
+        base_nnindexer,
+        new_aids,
+        vecs_list,
+        fgws_list,
+        fxs_list,
+        augmented_cfgstr,
+        verbose=verbose,
+    )
+    # The job may have finished while the annotations were loaded
+    if INDEX_BUILD_MANAGER.is_pending(nnindex_cfgstr):
+        NEIGHBOR_CACHE[augmented_cfgstr] = nnindexer
+    return nnindexer
+
+
 def check_background_process():
     r"""
-    checks to see if the process has finished and then
-    writes the uuid map to disk
+    Returns True if no background index build is pending
     """
-    global CURRENT_THREAD
-    if CURRENT_THREAD is None or CURRENT_THREAD.is_alive():
+    if len(INDEX_BUILD_MANAGER.get_pending_cfgstrs()) > 0:
         logger.info('[FG] background thread is not ready yet')
         return False
-    # Get info set in background process
-    finishtup = CURRENT_THREAD.finishtup
-    (uuid_map_fpath, daids_hashid, visual_uuid_list, min_reindex_thresh) = finishtup
-    # Clean up background process
-    CURRENT_THREAD.join()
-    CURRENT_THREAD = None
-    # Write data to current uuidcache
-    if len(visual_uuid_list) > min_reindex_thresh:
-        UUID_MAP_CACHE.write_uuid_map_dict(uuid_map_fpath, visual_uuid_list, daids_hashid)
     return True
 
 
 def can_request_background_nnindexer():
-    return CURRENT_THREAD is None or not CURRENT_THREAD.is_alive()
+    num_pending = len(INDEX_BUILD_MANAGER.get_pending_cfgstrs())
+    return num_pending < INDEX_BUILD_MANAGER.num_workers
 
 
 def request_background_nnindexer(qreq_, daid_list):
-    r"""FIXME: Duplicate code
+    r"""
+    Queues a build of the index of daid_list in INDEX_BUILD_MANAGER
 
     Args:
         qreq_ (QueryRequest):  query request object with hyper-parameters
         daid_list (list):
 
+    Returns:
+        bool: True if the index is (being) built in the background
+
     CommandLine:
         python -m wbia.algo.hots.neighbor_index_cache --test-request_background_nnindexer
 
@@ -826,69 +1393,9 @@ def request_background_nnindexer(qreq_, daid_list):
         >>> qreq_ = ibs.new_query_request(daid_list, daid_list)
         >>> # execute function
         >>> request_background_nnindexer(qreq_, daid_list)
-        >>> # verify results
-        >>> result = str(False)
-        >>> print(result)
+        >>> INDEX_BUILD_MANAGER.wait()
+        >>> assert build_nnindex_cfgstr(qreq_, daid_list) in NEIGHBOR_CACHE
     """
-    global CURRENT_THREAD
     logger.info('Requesting background reindex')
-    if not can_request_background_nnindexer():
-        # Make sure this function doesn't run if it is already running
-        logger.info('REQUEST DENIED')
-        return False
-    logger.info('REQUEST ACCPETED')
-    daids_hashid = qreq_.ibs.get_annot_hashid_visual_uuid(daid_list)
-    cfgstr = build_nnindex_cfgstr(qreq_, daid_list)
-    cachedir = qreq_.ibs.get_flann_cachedir()
-    # Save inverted cache uuid mappings for
-    min_reindex_thresh = qreq_.qparams.min_reindex_thresh
-    # Grab the keypoints names and image ids before query time?
-    flann_params = qreq_.qparams.flann_params
-    # Get annot descriptors to index
-    vecs_list, fgws_list, fxs_list = get_support_data(qreq_, daid_list)
-    # Dont hash rowids when given enough info in nnindex_cfgstr
-    flann_params['cores'] = 2  # Only ues a few cores in the background
-    # Build/Load the flann index
-    uuid_map_fpath = get_nnindexer_uuid_map_fpath(qreq_)
-    visual_uuid_list = qreq_.ibs.get_annot_visual_uuids(daid_list)
-
-    # set temporary attribute for when the thread finishes
-    finishtup = (uuid_map_fpath, daids_hashid, visual_uuid_list, min_reindex_thresh)
-    CURRENT_THREAD = ut.spawn_background_process(
-        background_flann_func,
-        cachedir,
-        daid_list,
-        vecs_list,
-        fgws_list,
-        fxs_list,
-        flann_params,
-        cfgstr,
-    )
-
-    CURRENT_THREAD.finishtup = finishtup
-
-
-def background_flann_func(
-    cachedir,
-    daid_list,
-    vecs_list,
-    fgws_list,
-    fxs_list,
-    flann_params,
-    cfgstr,
-    uuid_map_fpath,
-    daids_hashid,
-    visual_uuid_list,
-    min_reindex_thresh,
-):
-    r""" FIXME: Duplicate code """
-    logger.info('[BG] Starting Background FLANN')
-    # FIXME. dont use flann cache
-    nnindexer = NeighborIndex(flann_params, cfgstr)
-    # Initialize neighbor with unindexed data
-    nnindexer.init_support(daid_list, vecs_list, fgws_list, fxs_list, verbose=True)
-    # Load or build the indexing structure
-    nnindexer.ensure_indexer(cachedir, verbose=True)
-    if len(visual_uuid_list) > min_reindex_thresh:
-        UUID_MAP_CACHE.write_uuid_map_dict(uuid_map_fpath, visual_uuid_list, daids_hashid)
-    logger.info('[BG] Finished Background FLANN')
+    INDEX_BUILD_MANAGER.request(qreq_, daid_list)
+    return True
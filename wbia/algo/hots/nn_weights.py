@@ -26,6 +26,8 @@ TODO: replace testdata_pre_weight_neighbors with
 NN_WEIGHT_FUNC_DICT = {}
 MISC_WEIGHT_FUNC_DICT = {}
 EPS = 1e-8
+# Weight the neighbors of all queries in a request at once
+BATCH_NN_WEIGHTS = not ut.get_argflag('--no-batch-nnweights')
 
 
 def _register_nn_normalized_weight_func(func):
@@ -39,7 +41,10 @@ def _register_nn_normalized_weight_func(func):
     filtkey = ut.get_funcname(func).replace('_fn', '').lower()
     if ut.VERYVERBOSE:
         logger.info('[nn_weights] registering norm func: %r' % (filtkey,))
-    filtfunc = functools.partial(nn_normalized_weight, func)
+    if BATCH_NN_WEIGHTS:
+        filtfunc = functools.partial(nn_normalized_weight_batch, func)
+    else:
+        filtfunc = functools.partial(nn_normalized_weight, func)
     NN_WEIGHT_FUNC_DICT[filtkey] = filtfunc
     return func
 
@@ -196,6 +201,81 @@ def nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_):
     return weight_list, normk_list
 
 
+def nn_normalized_weight_batch(normweight_fn, nns_list, nnvalid0_list, qreq_):
+    r"""
+    Batched version of nn_normalized_weight
+
+    The neighbor matrices of every query in the request are stacked, so the
+    normalizers and weights are computed with one set of array operations
+    instead of once per query. K is dynamic per query, so only queries with
+    the same number of neighbors are stacked together.
+
+    Args:
+        normweight_fn (func): chosen weight function e.g. lnbnn
+        nns_list (list): query descriptor nearest neighbors and distances.
+        nnvalid0_list (list): list of neighbors preflagged as valid
+        qreq_ (QueryRequest): hyper-parameters
+
+    Returns:
+        tuple: (weight_list, normk_list) - the same as nn_normalized_weight
+
+    CommandLine:
+        python -m wbia.algo.hots.nn_weights nn_normalized_weight_batch
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.nn_weights import *  # NOQA
+        >>> qreq_, args = plh.testdata_pre(
+        >>>     'weight_neighbors', defaultdb='testdb1',
+        >>>     a=['default:qindex=0:4,dindex=0:10'],
+        >>>     p=['default:K=4,Knorm=3,normalizer_rule=name'])
+        >>> nns_list, nnvalid0_list = args
+        >>> for normweight_fn in [lnbnn_fn, ratio_fn, bar_l2_fn]:
+        >>>     weights_list1, normk_list1 = nn_normalized_weight(
+        >>>         normweight_fn, nns_list, nnvalid0_list, qreq_)
+        >>>     weights_list2, normk_list2 = nn_normalized_weight_batch(
+        >>>         normweight_fn, nns_list, nnvalid0_list, qreq_)
+        >>>     assert len(weights_list2) == len(nns_list)
+        >>>     for w1, w2 in zip(weights_list1, weights_list2):
+        >>>         assert np.all(w1 == w2)
+        >>>     for k1, k2 in zip(normk_list1, normk_list2):
+        >>>         assert np.all(k1 == k2)
+    """
+    Knorm = qreq_.qparams.Knorm
+    normalizer_rule = qreq_.qparams.normalizer_rule
+    if normalizer_rule not in ['last', 'name'] or len(nns_list) < 2:
+        return nn_normalized_weight(normweight_fn, nns_list, nnvalid0_list, qreq_)
+    qaid_list = qreq_.get_internal_qaids()[0 : len(nns_list)]
+    if normalizer_rule == 'name':
+        qnid_list = np.asarray(qreq_.get_qreq_annot_nids(qaid_list))
+    weight_list = [None] * len(nns_list)
+    normk_list = [None] * len(nns_list)
+    width_list = [neighb_idx.shape[1] for (neighb_idx, neighb_dist) in nns_list]
+    for width, idxs in ut.group_items(range(len(nns_list)), width_list).items():
+        K = width - Knorm
+        assert K > 0, 'K=%r cannot be 0' % (K,)
+        sizes = [len(nns_list[idx][0]) for idx in idxs]
+        neighb_idx = np.vstack([nns_list[idx][0] for idx in idxs])
+        neighb_dist = np.vstack([nns_list[idx][1] for idx in idxs])
+        if normalizer_rule == 'last':
+            neighb_normk = np.full(len(neighb_idx), K + Knorm - 1, hstypes.FK_DTYPE)
+        else:
+            # The query name of each row of the stacked neighbors
+            neighb_qnid = np.repeat(qnid_list.take(idxs), sizes)
+            neighb_normk = _get_name_normk(neighb_qnid, qreq_, Knorm, neighb_idx)
+        neighb_normweight = apply_normweight(
+            normweight_fn, neighb_normk, neighb_idx, neighb_dist, Knorm
+        )
+        splits = np.cumsum(sizes)[:-1]
+        _iter = zip(
+            idxs, np.split(neighb_normweight, splits), np.split(neighb_normk, splits)
+        )
+        for idx, weights, normk in _iter:
+            weight_list[idx] = weights
+            normk_list[idx] = normk
+    return weight_list, normk_list
+
+
 def get_normk(qreq_, qaid, neighb_idx, Knorm, normalizer_rule):
     """
     Get positions of the LNBNN/ratio tests normalizers
@@ -314,6 +394,11 @@ def get_name_normalizers(qaid, qreq_, Knorm, neighb_idx):
     # Get the top names you do not want your normalizer to be from
     # qnid = qreq_.internal_qannots.loc([qaid]).nids[0]
     qnid = qreq_.get_qreq_annot_nids(qaid)
+    return _get_name_normk(qnid, qreq_, Knorm, neighb_idx)
+
+
+def _get_name_normk(qnid, qreq_, Knorm, neighb_idx):
+    """ qnid is the query name id or the query name id of each row """
     K = len(neighb_idx.T) - Knorm
     assert K > 0, 'K cannot be 0'
     # Get the 0th - Kth matching neighbors
@@ -345,7 +430,8 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     Args:
         neighb_topnid (ndarray): marks the names a feature matches
         neighb_normnid (ndarray): marks the names of the feature normalizers
-        qnid (int): query name id
+        qnid (int): query name id (or an array with the query name id of
+            each row)
 
     Returns:
         neighb_selnorm - index of the selected normalizer for each query feature
@@ -380,6 +466,11 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
         >>> result = str(neighb_normk_)
         >>> print(result)
         [2 1 2 0 0 0 2 0]
+        >>> # The query name id can also be given per row
+        >>> qnids = np.full(len(neighb_topnid), qnid)
+        >>> neighb_selnorm2 = mark_name_valid_normalizers(
+        ...     qnids, neighb_topnid, neighb_normnid)
+        >>> assert np.all(neighb_selnorm == neighb_selnorm2)
 
     Ignore:
         logger.info(ut.doctest_repr(neighb_normnid, 'neighb_normnid', verbose=False))
@@ -387,18 +478,18 @@ def mark_name_valid_normalizers(qnid, neighb_topnid, neighb_normnid):
     """
     # TODO?: warn if any([np.any(flags) for flags in neighb_invalid]), (
     #    'Normalizers are potential matches. Increase Knorm')
-    neighb_valid = np.logical_and.reduce(
-        [col1[:, None] != neighb_normnid for col1 in neighb_topnid.T]
-    )
+    neighb_isdup = neighb_topnid[:, :, None] == neighb_normnid[:, None, :]
+    neighb_valid = ~np.any(neighb_isdup, axis=1)
     # Mark self as invalid, if given that information
+    qnid = np.asarray(qnid)
+    if qnid.ndim == 1:
+        qnid = qnid[:, None]
     neighb_valid = np.logical_and(neighb_normnid != qnid, neighb_valid)
     # For each query feature find its best normalizer (using negative indices)
     Knorm = neighb_normnid.shape[1]
-    neighb_validxs = [np.nonzero(normrow)[0] for normrow in neighb_valid]
-    neighb_selnorm = np.array(
-        [validxs[0] - Knorm if len(validxs) != 0 else -1 for validxs in neighb_validxs],
-        hstypes.FK_DTYPE,
-    )
+    neighb_selnorm = np.where(
+        neighb_valid.any(axis=1), neighb_valid.argmax(axis=1) - Knorm, -1
+    ).astype(hstypes.FK_DTYPE)
     return neighb_selnorm
 
 
@@ -162,6 +162,11 @@ def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
         python    -m wbia.algo.hots.pipeline --test-request_wbia_query_L0:0 --db PZ_Master1 -a timectrl:qindex=0:256
         utprof.py -m wbia.algo.hots.pipeline --test-request_wbia_query_L0:0 --db PZ_Master1 -a timectrl:qindex=0:256
 
+        # spatial verification in a pool of 8 threads (or processes)
+        python -m wbia.algo.hots.pipeline --test-request_wbia_query_L0:1
+        python -m wbia.algo.hots.pipeline --test-request_wbia_query_L0:0 --db PZ_MTEST -a timectrl:qindex=0:256 -p default:sver_workers=8
+        python -m wbia.algo.hots.pipeline --test-request_wbia_query_L0:0 --db PZ_MTEST -a timectrl:qindex=0:256 -p default:sver_workers=8,sver_pool=process
+
     Example1:
         >>> # ENABLE_DOCTEST
         >>> from wbia.algo.hots.pipeline import *  # NOQA
@@ -175,6 +180,42 @@ def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
         >>> ut.quit_if_noshow()
         >>> cm.ishow_analysis(qreq_, fnum=0, make_figtitle=True)
         >>> ut.show_if_requested()
+
+    Example2:
+        >>> # ENABLE_DOCTEST
+        >>> # Parallel spatial verification does not change the results
+        >>> from wbia.algo.hots.pipeline import *  # NOQA
+        >>> import wbia
+        >>> a = ['default:qindex=0:4,dindex=0:20']
+        >>> qreq1_ = wbia.init.main_helpers.testdata_qreq_(
+        >>>     defaultdb='PZ_MTEST', a=a, p=['default'])
+        >>> qreq2_ = wbia.init.main_helpers.testdata_qreq_(
+        >>>     defaultdb='PZ_MTEST', a=a, p=['default:sver_workers=4'])
+        >>> assert qreq2_.qparams.sver_workers == 4
+        >>> assert qreq1_.get_pipe_cfgstr() == qreq2_.get_pipe_cfgstr()
+        >>> cm_list1 = request_wbia_query_L0(qreq1_.ibs, qreq1_)
+        >>> cm_list2 = request_wbia_query_L0(qreq2_.ibs, qreq2_)
+        >>> for cm1, cm2 in zip(cm_list1, cm_list2):
+        >>>     assert cm1.qaid == cm2.qaid
+        >>>     assert np.all(cm1.daid_list == cm2.daid_list)
+        >>>     assert np.allclose(cm1.annot_score_list, cm2.annot_score_list)
+    """
+    cm_list_FILT = request_wbia_query_prefix(ibs, qreq_, verbose=verbose)
+    cm_list = request_wbia_query_tail(qreq_, cm_list_FILT, verbose=verbose)
+    return cm_list
+
+
+def request_wbia_query_prefix(ibs, qreq_, verbose=VERB_PIPELINE):
+    """
+    Runs the stages of the pipeline that come before spatial verification
+    (nearest neighbors, filtering, weighting, and building chipmatches).
+
+    The result only depends on ``qreq_.qparams.presver_cfgstr``, so it can be
+    shared by requests that only differ in their spatial verification or
+    scoring parameters. See :func:`request_wbia_query_tail`.
+
+    Returns:
+        list: cm_list_FILT - unverified and unscored chipmatches
     """
     # Load data for nearest neighbors
     if verbose:
@@ -236,7 +277,41 @@ def request_wbia_query_L0(ibs, qreq_, verbose=VERB_PIPELINE):
         )
     else:
         logger.info('invalid pipeline root %r' % (qreq_.qparams.pipeline_root))
+    return cm_list_FILT
+
+
+def request_wbia_query_tail(qreq_, cm_list_FILT, verbose=VERB_PIPELINE):
+    """
+    Runs spatial verification and the final scoring on the output of
+    :func:`request_wbia_query_prefix`. The chipmatches are modified in place.
+
+    Returns:
+        list: cm_list containing ``wbia.ChipMatch`` objects
 
+    CommandLine:
+        python -m wbia.algo.hots.pipeline --test-request_wbia_query_tail
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> # Requests that share a prefix give the same results as full runs
+        >>> from wbia.algo.hots.pipeline import *  # NOQA
+        >>> import wbia
+        >>> a = ['default:qindex=0:2,dindex=0:10']
+        >>> qreq1_ = wbia.init.main_helpers.testdata_qreq_(a=a, p=['default'])
+        >>> qreq2_ = wbia.init.main_helpers.testdata_qreq_(
+        >>>     a=a, p=['default:sv_on=False,score_method=csum'])
+        >>> assert qreq1_.qparams.presver_cfgstr == qreq2_.qparams.presver_cfgstr
+        >>> assert qreq1_.get_pipe_cfgstr() != qreq2_.get_pipe_cfgstr()
+        >>> cm_list_FILT = request_wbia_query_prefix(qreq1_.ibs, qreq1_)
+        >>> for qreq_ in [qreq1_, qreq2_]:
+        >>>     qreq_.lazy_preload()
+        >>>     cm_list_FILT_ = [cm.copy() for cm in cm_list_FILT]
+        >>>     cm_list1 = request_wbia_query_tail(qreq_, cm_list_FILT_)
+        >>>     cm_list2 = request_wbia_query_L0(qreq_.ibs, qreq_)
+        >>>     for cm1, cm2 in zip(cm_list1, cm_list2):
+        >>>         assert np.all(cm1.daid_list == cm2.daid_list)
+        >>>         assert np.allclose(cm1.annot_score_list, cm2.annot_score_list)
+    """
     # Spatial verification (cm_list) (TODO: cython)
     # * prunes chip results and feature matches
     # TODO: allow for reweighting of feature matches to happen.
@@ -306,10 +381,13 @@ def build_impossible_daids_list(qreq_, verbose=VERB_PIPELINE):
             # it will cover this case for us
             _impossible_daid_lists.append([[qaid] for qaid in internal_qaids])
     if not can_match_sameimg:
-        # slow way of getting contact_aids (now incorporates faster way)
-        contact_aids_list = qreq_.ibs.get_annot_contact_aids(
-            internal_qaids, daid_list=internal_daids
-        )
+        # The database annots in the image of each query (including itself)
+        internal_data_gids = qreq_.get_qreq_annot_gids(internal_daids)
+        internal_query_gids = qreq_.get_qreq_annot_gids(internal_qaids)
+        contact_aids_list = [
+            internal_daids.compress(internal_data_gids == gid)
+            for gid in internal_query_gids
+        ]
         _impossible_daid_lists.append(contact_aids_list)
         EXTEND_TO_OTHER_CONTACT_GT = False
         # TODO: flag overlapping keypoints with another annot as likely to
@@ -350,7 +428,7 @@ def build_impossible_daids_list(qreq_, verbose=VERB_PIPELINE):
         Kpad_list = list(map(len, impossible_daids_list))
     else:
         # always at least pad K for self queries
-        Kpad_list = [1 if qaid in internal_daids else 0 for qaid in internal_qaids]
+        Kpad_list = np.in1d(internal_qaids, internal_daids).astype(int).tolist()
     return impossible_daids_list, Kpad_list
 
 
@@ -561,6 +639,20 @@ def cachemiss_nn_compute_fn(
                 qvec_iter, num_neighbors_list, Kpad_list, impossible_daids_list
             )
         ]
+    elif qreq_.qparams.batch_knn and len(qvecs_list) > 1:
+        # Stack the descriptors of every query and search them in chunks with
+        # a thread pool. Queries are grouped by number of neighbors, so the
+        # result is the same as the per-query loop below.
+        num_workers = qreq_.qparams.nn_workers
+        if num_workers is None:
+            num_workers = ut.num_cpus()
+        idx_dist_list = qreq_.indexer.multi_knn(
+            qvecs_list,
+            num_neighbors_list,
+            label=NN_LBL,
+            num_workers=num_workers,
+            prog_hook=prog_hook,
+        )
     else:
         qvec_iter = ut.ProgressIter(qvecs_list, lbl=NN_LBL, prog_hook=prog_hook, **PROGKW)
         idx_dist_list = [
@@ -1334,6 +1426,13 @@ def _spatial_verification(qreq_, cm_list, verbose=VERB_PIPELINE):
         qreq_, cm_list, nNameShortList, nAnnotPerName, score_method
     )
     prog_hook = None if qreq_.prog_hook is None else qreq_.prog_hook.next_subhook()
+    sver_workers = qreq_.qparams.sver_workers
+    if sver_workers is not None and sver_workers > 1:
+        cm_list_SVER = _parallel_sver_chipmatches(
+            qreq_, cm_shortlist, sver_workers, qreq_.qparams.sver_pool, prog_hook
+        )
+        return cm_list_SVER
+
     cm_progiter = ut.ProgressIter(
         cm_shortlist,
         length=len(cm_shortlist),
@@ -1347,6 +1446,73 @@ def _spatial_verification(qreq_, cm_list, verbose=VERB_PIPELINE):
     return cm_list_SVER
 
 
+def _parallel_sver_chipmatches(qreq_, cm_shortlist, sver_workers, sver_pool, prog_hook):
+    """
+    Spatially verifies every shortlisted pair of every query in a worker pool.
+
+    Keypoints and weights are gathered in the calling thread (the controller
+    is not thread safe), the pairs of all queries are verified in the pool,
+    and the results are mapped back in submission order, so the output is
+    identical to the serial path.
+
+    CommandLine:
+        python -m wbia.algo.hots.pipeline --test-_parallel_sver_chipmatches
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.hots.pipeline import *  # NOQA
+        >>> ibs, qreq_, cm_list = plh.testdata_pre_sver('PZ_MTEST', qaid_list=[18, 19])
+        >>> scoring.score_chipmatch_list(qreq_, cm_list, qreq_.qparams.prescore_method)
+        >>> cm_list1 = [sver_single_chipmatch(qreq_, cm) for cm in cm_list]
+        >>> cm_list2 = _parallel_sver_chipmatches(qreq_, cm_list, 3, 'thread', None)
+        >>> cm_list3 = _parallel_sver_chipmatches(qreq_, cm_list, 2, 'process', None)
+        >>> for cm1, cm2, cm3 in zip(cm_list1, cm_list2, cm_list3):
+        >>>     assert np.all(cm1.daid_list == cm2.daid_list)
+        >>>     assert np.all(cm1.daid_list == cm3.daid_list)
+        >>>     for fm1, fm2, fm3 in zip(cm1.fm_list, cm2.fm_list, cm3.fm_list):
+        >>>         assert np.all(fm1 == fm2) and np.all(fm1 == fm3)
+    """
+    from concurrent import futures
+
+    # Gather inputs serially
+    prep_list = [_sver_prepare_chipmatch(qreq_, cm) for cm in cm_shortlist]
+    # Flatten the shortlisted pairs of all queries into a single job list
+    job_list = ut.flatten([args_list for args_list, _ in prep_list])
+    offsets = np.cumsum([0] + [len(args_list) for args_list, _ in prep_list])
+
+    if sver_pool == 'process':
+        executor = futures.ProcessPoolExecutor(sver_workers)
+        # Amortize pickling overhead over several pairs
+        chunksize = max(1, len(job_list) // (sver_workers * 4))
+    elif sver_pool == 'thread':
+        executor = futures.ThreadPoolExecutor(sver_workers)
+        chunksize = 1
+    else:
+        raise ValueError('Unknown sver_pool=%r' % (sver_pool,))
+    try:
+        # map yields results in submission order regardless of completion order
+        result_iter = executor.map(_sver_pair_worker, job_list, chunksize=chunksize)
+        svtup_flat = list(
+            ut.ProgressIter(
+                result_iter,
+                length=len(job_list),
+                prog_hook=prog_hook,
+                lbl=SVER_LVL,
+                **PROGKW,
+            )
+        )
+    finally:
+        executor.shutdown(wait=True)
+
+    cm_list_SVER = [
+        _sver_finalize_chipmatch(
+            qreq_, cm, svtup_flat[offsets[count] : offsets[count + 1]], dlen_sqrd2
+        )
+        for count, (cm, (_, dlen_sqrd2)) in enumerate(zip(cm_shortlist, prep_list))
+    ]
+    return cm_list_SVER
+
+
 # @profile
 def sver_single_chipmatch(qreq_, cm, verbose=False):
     r"""
@@ -1452,6 +1618,28 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
         >>>                    refine_method=refine_method)
         >>> ut.show_if_requested()
     """
+    sver_args_list, dlen_sqrd2 = _sver_prepare_chipmatch(qreq_, cm)
+    if verbose:
+        sver_args_list = ut.ProgIter(
+            sver_args_list, length=len(cm.daid_list), lbl='sver shortlist', freq=1
+        )
+    svtup_list = [_sver_pair_worker(sver_args) for sver_args in sver_args_list]
+
+    # <SENTINAL>
+
+    cmSV = _sver_finalize_chipmatch(qreq_, cm, svtup_list, dlen_sqrd2)
+    return cmSV
+
+
+def _sver_prepare_chipmatch(qreq_, cm):
+    """
+    Gathers the arguments of vt.spatially_verify_kpts for each shortlisted
+    database annotation of a chipmatch. Pairs without feature matches get
+    None.
+
+    Returns:
+        tuple: (sver_args_list, dlen_sqrd2)
+    """
     qaid = cm.qaid
     use_chip_extent = qreq_.qparams.use_chip_extent
     xy_thresh = qreq_.qparams.xy_thresh
@@ -1460,7 +1648,6 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
     min_nInliers = qreq_.qparams.min_nInliers
     full_homog_checks = qreq_.qparams.full_homog_checks
     refine_method = qreq_.qparams.refine_method
-    sver_output_weighting = qreq_.qparams.sver_output_weighting
     # Precompute sver cmtup_old
     kpts1 = qreq_.get_qreq_qannot_kpts(qaid).astype(np.float64)
     kpts2_list = qreq_.get_qreq_dannot_kpts(cm.daid_list)
@@ -1486,77 +1673,95 @@ def sver_single_chipmatch(qreq_, cm, verbose=False):
         match_weight_list = [np.ones(len(fm), dtype=np.float64) for fm in cm.fm_list]
 
     # Make an svtup for every daid in the shortlist
-    _iter1 = zip(
-        cm.daid_list,
-        cm.fm_list,
-        cm.fsv_list,
-        kpts2_list,
-        top_dlen_sqrd_list,
-        match_weight_list,
-    )
-    if verbose:
-        _iter1 = ut.ProgIter(
-            _iter1, length=len(cm.daid_list), lbl='sver shortlist', freq=1
-        )
-    svtup_list = []
-    for daid, fm, fsv, kpts2, dlen_sqrd2, match_weights in _iter1:
+    _iter1 = zip(cm.fm_list, kpts2_list, top_dlen_sqrd_list, match_weight_list)
+    sver_args_list = []
+    for fm, kpts2, dlen_sqrd2, match_weights in _iter1:
         if len(fm) == 0:
             # skip results without any matches
-            sv_tup = None
+            sver_args = None
         else:
+            sver_args = (
+                kpts1,
+                kpts2,
+                fm,
+                xy_thresh,
+                scale_thresh,
+                ori_thresh,
+                dlen_sqrd2,
+                min_nInliers,
+                match_weights,
+                full_homog_checks,
+                refine_method,
+            )
+        sver_args_list.append(sver_args)
+    # HACK: output weighting has always used the extent of the last pair
+    dlen_sqrd2 = top_dlen_sqrd_list[-1] if len(top_dlen_sqrd_list) > 0 else None
+    return sver_args_list, dlen_sqrd2
 
-            # sver_testdata = dict(
-            #     kpts1=kpts1,
-            #     kpts2=kpts2,
-            #     fm=fm,
-            #     xy_thresh=xy_thresh,
-            #     scale_thresh=scale_thresh,
-            #     ori_thresh=ori_thresh,
-            #     dlen_sqrd2=dlen_sqrd2,
-            #     min_nInliers=min_nInliers,
-            #     match_weights=match_weights,
-            #     full_homog_checks=full_homog_checks,
-            #     refine_method=refine_method
-            # )
-
-            # locals().update(ut.load_data('sver_testdata.pkl'))
-
-            try:
-                # Compute homography from chip2 to chip1 returned homography
-                # maps image1 space into image2 space image1 is a query chip
-                # and image2 is a database chip
-                sv_tup = vt.spatially_verify_kpts(
-                    kpts1,
-                    kpts2,
-                    fm,
-                    xy_thresh,
-                    scale_thresh,
-                    ori_thresh,
-                    dlen_sqrd2,
-                    min_nInliers,
-                    match_weights=match_weights,
-                    full_homog_checks=full_homog_checks,
-                    refine_method=refine_method,
-                    returnAff=True,
-                )
-            except Exception as ex:
-                ut.printex(
-                    ex,
-                    'Unknown error in spatial verification.',
-                    keys=[
-                        'kpts1',
-                        'kpts2',
-                        'fm',
-                        'xy_thresh',
-                        'scale_thresh',
-                        'dlen_sqrd2',
-                        'min_nInliers',
-                    ],
-                )
-                sv_tup = None
-        svtup_list.append(sv_tup)
 
-    # <SENTINAL>
+def _sver_pair_worker(sver_args):
+    """
+    Spatially verifies a single pair. Module level so process pools can
+    pickle it.
+    """
+    if sver_args is None:
+        return None
+    (
+        kpts1,
+        kpts2,
+        fm,
+        xy_thresh,
+        scale_thresh,
+        ori_thresh,
+        dlen_sqrd2,
+        min_nInliers,
+        match_weights,
+        full_homog_checks,
+        refine_method,
+    ) = sver_args
+    try:
+        # Compute homography from chip2 to chip1 returned homography
+        # maps image1 space into image2 space image1 is a query chip
+        # and image2 is a database chip
+        sv_tup = vt.spatially_verify_kpts(
+            kpts1,
+            kpts2,
+            fm,
+            xy_thresh,
+            scale_thresh,
+            ori_thresh,
+            dlen_sqrd2,
+            min_nInliers,
+            match_weights=match_weights,
+            full_homog_checks=full_homog_checks,
+            refine_method=refine_method,
+            returnAff=True,
+        )
+    except Exception as ex:
+        ut.printex(
+            ex,
+            'Unknown error in spatial verification.',
+            keys=[
+                'kpts1',
+                'kpts2',
+                'fm',
+                'xy_thresh',
+                'scale_thresh',
+                'dlen_sqrd2',
+                'min_nInliers',
+            ],
+        )
+        sv_tup = None
+    return sv_tup
+
+
+def _sver_finalize_chipmatch(qreq_, cm, svtup_list, dlen_sqrd2):
+    """
+    Keeps only the inliers of each verified pair and appends the homography
+    error weights if requested.
+    """
+    xy_thresh = qreq_.qparams.xy_thresh
+    sver_output_weighting = qreq_.qparams.sver_output_weighting
 
     # New way
     inliers_list = []
@@ -85,6 +85,8 @@ class QueryParams(collections.Mapping):
         qparams.sv_cfgstr = query_cfg.sv_cfg.get_cfgstr()
         qparams.flann_cfgstr = query_cfg.flann_cfg.get_cfgstr()
         qparams.query_cfgstr = query_cfg.get_cfgstr()
+        # Identifies the output of the stages before spatial verification
+        qparams.presver_cfgstr = query_cfg.get_cfgstr(use_sv=False, use_agg=False)
 
     def hack_lnbnn_config_trail(qparams):
         query_cfg = Config.QueryConfig()
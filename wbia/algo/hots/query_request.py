@@ -356,7 +356,9 @@ class QueryRequest(ut.NiceRepr):
         # Keeps internal name state
         qreq_.unique_aids = None
         qreq_.unique_nids = None
+        qreq_.unique_gids = None
         qreq_.aid_to_idx = None
+        qreq_.aid_to_uidx = None  # dense version of aid_to_idx
         qreq_.nid_to_groupuuid = None
 
     @classmethod
@@ -414,6 +416,8 @@ class QueryRequest(ut.NiceRepr):
         else:
             qreq_.unique_nids = ut.dict_take(custom_nid_lookup, qreq_.unique_aids)
         qreq_.unique_nids = np.array(qreq_.unique_nids)
+        qreq_.unique_gids = np.array(ibs.get_annot_gids(qreq_.unique_aids))
+        qreq_.aid_to_uidx = qreq_._make_dense_aid_lookup(qreq_.unique_aids)
 
         # qreq_.nid_to_groupuuid = qreq_._make_namegroup_uuids()
         # qreq_.dnid_to_groupuuid = qreq_._make_namegroup_data_uuids()
@@ -616,6 +620,8 @@ class QueryRequest(ut.NiceRepr):
         # del state['dbdir']
         # state['ibs'] = wbia.opendb(dbdir=dbdir, web=False)
         qreq_.__dict__.update(state)
+        if qreq_.__dict__.get('aid_to_uidx', None) is None:
+            qreq_.aid_to_uidx = qreq_._make_dense_aid_lookup(qreq_.unique_aids)
 
         # Internal caching objects and views
         _annots = qreq_.ibs.annots(qreq_.unique_aids)
@@ -933,13 +939,81 @@ class QueryRequest(ut.NiceRepr):
         """ These are the users qaids in vsone mode """
         return qreq_.get_internal_qaids()
 
-    @ut.accepts_numpy
+    @staticmethod
+    def _make_dense_aid_lookup(unique_aids):
+        """
+        Returns an array mapping each aid to its index in unique_aids (or -1)
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.query_request import *  # NOQA
+            >>> aid_to_uidx = QueryRequest._make_dense_aid_lookup(np.array([2, 5, 6]))
+            >>> print(aid_to_uidx.tolist())
+            [-1, -1, 0, -1, -1, 1, 2]
+        """
+        unique_aids = np.asarray(unique_aids, dtype=np.int64)
+        num = int(unique_aids.max()) + 1 if len(unique_aids) else 0
+        aid_to_uidx = np.full(num, -1, dtype=np.int32)
+        aid_to_uidx[unique_aids] = np.arange(len(unique_aids), dtype=np.int32)
+        return aid_to_uidx
+
+    def _take_unique_annot_values(qreq_, unique_values, aids):
+        """
+        Vectorized lookup of per-annotation request state aligned with
+        unique_aids. Accepts a scalar, list, or ndarray of any shape. Lists
+        return lists, everything else returns arrays or scalars.
+        """
+        aid_arr = np.asarray(aids)
+        if aid_arr.size == 0:
+            uidxs = np.zeros(aid_arr.shape, dtype=np.int32)
+        else:
+            if aid_arr.min() < 0 or aid_arr.max() >= len(qreq_.aid_to_uidx):
+                raise KeyError('Some aids are not part of this query request')
+            uidxs = qreq_.aid_to_uidx.take(aid_arr)
+            if np.any(uidxs < 0):
+                raise KeyError('Some aids are not part of this query request')
+        values = unique_values.take(uidxs)
+        if isinstance(aids, list):
+            values = values.tolist()
+        return values
+
     def get_qreq_annot_nids(qreq_, aids):
-        # Hack uses own internal state to grab name rowids
-        # instead of using wbia.
-        idxs = ut.take(qreq_.aid_to_idx, aids)
-        nids = ut.take(qreq_.unique_nids, idxs)
-        return nids
+        """
+        Hack uses own internal state to grab name rowids instead of using
+        wbia.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.query_request import *  # NOQA
+            >>> import wbia
+            >>> qreq_ = wbia.testdata_qreq_(defaultdb='testdb1')
+            >>> aids = qreq_.daids
+            >>> nids = qreq_.get_qreq_annot_nids(aids)
+            >>> assert nids.tolist() == qreq_.ibs.get_annot_nids(aids)
+            >>> assert qreq_.get_qreq_annot_nids(list(aids[0:2])) == list(nids[0:2])
+            >>> assert qreq_.get_qreq_annot_nids(aids[0]) == nids[0]
+            >>> grid = np.array([aids[0:2], aids[2:4]])
+            >>> assert qreq_.get_qreq_annot_nids(grid).shape == (2, 2)
+        """
+        return qreq_._take_unique_annot_values(qreq_.unique_nids, aids)
+
+    def get_qreq_annot_gids(qreq_, aids):
+        """
+        image rowids loaded once per request
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.algo.hots.query_request import *  # NOQA
+            >>> import wbia
+            >>> qreq_ = wbia.testdata_qreq_(defaultdb='testdb1')
+            >>> aids = qreq_.daids
+            >>> gids = qreq_.get_qreq_annot_gids(aids)
+            >>> assert gids.tolist() == qreq_.ibs.get_annot_gids(aids)
+        """
+        if qreq_.__dict__.get('unique_gids', None) is None:
+            # Requests pickled before the gids were loaded
+            qreq_.unique_gids = np.array(qreq_.ibs.get_annot_gids(qreq_.unique_aids))
+        return qreq_._take_unique_annot_values(qreq_.unique_gids, aids)
 
     def get_qreq_qannot_kpts(qreq_, qaids):
         return qreq_.ibs.get_annot_kpts(qaids, config2_=qreq_.extern_query_config2)
@@ -1277,6 +1351,18 @@ class QueryRequest(ut.NiceRepr):
             fpath = join(dpath, fname)
             yield fpath
 
+    def get_chipmatch_store(qreq_, super_qres_cache=False):
+        r"""
+        Returns the store of the chipmatches of this configuration, which is
+        indexed by the same query uuids as the chipmatch paths
+        """
+        dpath = qreq_.get_qresdir()
+        if super_qres_cache:
+            cfgstr = 'supercache'
+        else:
+            cfgstr = qreq_.get_cfgstr(with_input=False, with_data=True, with_pipe=True)
+        return chip_match.get_chipmatch_store(dpath, cfgstr)
+
     def execute(
         qreq_, qaids=None, prog_hook=None, use_cache=None, invalidate_supercache=None
     ):
@@ -35,3 +35,46 @@ def benchmark_knn():
     nns_list1 = nearest_neighbors(  # NOQA
         qreq_, Kpad_list, impossible_daids_list, verbose=verbose
     )
+
+
+def benchmark_batch_knn():
+    r"""
+    Compares the per-query knn loop against the stacked, threaded search
+    used by the nearest_neighbors stage.
+
+    CommandLine:
+        python ~/code/wbia/wbia/algo/hots/tests/bench.py benchmark_batch_knn
+
+    Example:
+        >>> # DISABLE_DOCTEST
+        >>> from bench import *  # NOQA
+        >>> result = benchmark_batch_knn()
+        >>> print(result)
+    """
+    import numpy as np
+    import wbia
+
+    qreq_ = wbia.testdata_qreq_(
+        defaultdb='PZ_MTEST', t='default:K=4', a='default:qsize=100', verbose=1
+    )
+    qreq_.load_indexer()
+    indexer = qreq_.indexer
+    qvecs_list = qreq_.internal_qannots.vecs
+    num_neighbors = qreq_.qparams.K + qreq_.qparams.Knorm + 1
+    K_list = [num_neighbors] * len(qvecs_list)
+
+    with ut.Timer('per-query knn') as t1:
+        idx_dist_list1 = [indexer.knn(qvecs, K) for qvecs, K in zip(qvecs_list, K_list)]
+    timings = {'loop': t1.ellapsed}
+    for num_workers in [1, 2, 4, ut.num_cpus()]:
+        with ut.Timer('multi knn workers=%d' % (num_workers,)) as t2:
+            idx_dist_list2 = indexer.multi_knn(
+                qvecs_list, K_list, num_workers=num_workers
+            )
+        timings['batch_workers=%d' % (num_workers,)] = t2.ellapsed
+        for (idxs1, dists1), (idxs2, dists2) in zip(idx_dist_list1, idx_dist_list2):
+            assert np.all(idxs1 == idxs2)
+            assert np.all(dists1 == dists2)
+    result = ut.repr4(timings, precision=4)
+    return result
+
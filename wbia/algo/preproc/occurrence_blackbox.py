@@ -37,6 +37,15 @@ logger = logging.getLogger('wbia')
 
 KM_PER_SEC = 0.002
 
+# Inputs larger than this are clustered with the neighbor-search engine
+# instead of the dense pairwise distance matrix when engine='auto'
+TREE_ENGINE_MIN_SIZE = 1000
+
+# Maximum number of candidate pairs materialized at once by the tree engine
+TREE_ENGINE_MAX_PAIRS = 2 ** 22
+
+EARTH_RADIUS_KM = 6367
+
 
 def haversine(latlon1, latlon2):
     r"""
@@ -283,13 +292,16 @@ def prepare_data(posixtimes, latlons, km_per_sec=KM_PER_SEC, thresh_units='secon
     return X_data, dist_func, columns
 
 
-def cluster_timespace_km(posixtimes, latlons, thresh_km, km_per_sec=KM_PER_SEC):
+def cluster_timespace_km(
+    posixtimes, latlons, thresh_km, km_per_sec=KM_PER_SEC, engine='auto'
+):
     """
     Agglometerative clustering of time/space data
 
     Args:
         X_data (ndarray) : Nx3 array where columns are (seconds, lat, lon)
         thresh_km (float) : threshold in kilometers
+        engine (str): one of 'pdist', 'tree', or 'auto'. See `_cluster_chunk`.
 
     References:
         http://docs.scipy.org/doc/scipy-0.14.0/reference/generated/
@@ -333,6 +345,10 @@ def cluster_timespace_km(posixtimes, latlons, thresh_km, km_per_sec=KM_PER_SEC):
     if X_data is None:
         return None
 
+    if _use_tree_engine(X_data, engine) and not np.any(np.isnan(X_data)):
+        X_labels = _cluster_chunk_tree(X_data, columns, thresh_km, km_per_sec, 'km')
+        return X_labels
+
     # Compute pairwise distances between all inputs
     dist_func = functools.partial(dist_func, km_per_sec=km_per_sec)
     condenced_dist_mat = distance.pdist(X_data, dist_func)
@@ -345,11 +361,14 @@ def cluster_timespace_km(posixtimes, latlons, thresh_km, km_per_sec=KM_PER_SEC):
     return X_labels
 
 
-def cluster_timespace_sec(posixtimes, latlons, thresh_sec=5, km_per_sec=KM_PER_SEC):
+def cluster_timespace_sec(
+    posixtimes, latlons, thresh_sec=5, km_per_sec=KM_PER_SEC, engine='auto'
+):
     """
     Args:
         X_data (ndarray) : Nx3 array where columns are (seconds, lat, lon)
         thresh_sec (float) : threshold in seconds
+        engine (str): one of 'pdist', 'tree', or 'auto'. See `_cluster_chunk`.
 
     Doctest:
         >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
@@ -410,7 +429,9 @@ def cluster_timespace_sec(posixtimes, latlons, thresh_sec=5, km_per_sec=KM_PER_S
     grouped_labels = []
     for xs in groupxs:
         X_part = X_data.take(xs, axis=0)
-        labels = _cluster_part(X_part, dist_func, columns, thresh_sec, km_per_sec)
+        labels = _cluster_part(
+            X_part, dist_func, columns, thresh_sec, km_per_sec, engine=engine
+        )
         grouped_labels.append((labels, xs))
     # Undo grouping and rectify overlaps
     X_labels = _recombine_labels(grouped_labels)
@@ -445,7 +466,7 @@ def _recombine_labels(chunk_labels):
     return X_labels
 
 
-def _cluster_part(X_part, dist_func, columns, thresh_sec, km_per_sec):
+def _cluster_part(X_part, dist_func, columns, thresh_sec, km_per_sec, engine='auto'):
     if len(X_part) > 500 and 'time' in columns and ~np.isnan(X_part[0, 0]):
         # Try and break problem up into smaller chunks by finding feasible
         # one-dimensional breakpoints (is this a cutting plane?)
@@ -454,22 +475,58 @@ def _cluster_part(X_part, dist_func, columns, thresh_sec, km_per_sec):
         for idxs in chunk_idxs:
             # logger.info('Doing occurrence chunk {}'.format(len(idxs)))
             X_chunk = X_part.take(idxs, axis=0)
-            labels = _cluster_chunk(X_chunk, dist_func, thresh_sec)
+            labels = _cluster_chunk(
+                X_chunk, dist_func, thresh_sec, columns, km_per_sec, engine
+            )
             chunk_labels.append((labels, idxs))
         X_labels = _recombine_labels(chunk_labels)
     else:
         # Compute the whole problem
-        X_labels = _cluster_chunk(X_part, dist_func, thresh_sec)
+        X_labels = _cluster_chunk(
+            X_part, dist_func, thresh_sec, columns, km_per_sec, engine
+        )
     return X_labels
 
 
-def _cluster_chunk(X_data, dist_func, thresh_sec):
+def _use_tree_engine(X_data, engine):
+    if engine == 'auto':
+        return len(X_data) >= TREE_ENGINE_MIN_SIZE
+    elif engine == 'tree':
+        return True
+    elif engine == 'pdist':
+        return False
+    else:
+        raise ValueError('Unknown occurrence clustering engine=%r' % (engine,))
+
+
+def _cluster_chunk(
+    X_data, dist_func, thresh_sec, columns=None, km_per_sec=KM_PER_SEC, engine='auto'
+):
+    """
+    Single linkage clustering of a chunk without missing columns.
+
+    The 'pdist' engine builds the full condensed distance matrix with a python
+    level distance function and is quadratic in time and memory. The 'tree'
+    engine produces the same partition using a neighbor search and union-find
+    (see `_cluster_chunk_tree`). Labels agree up to a renumbering. The 'auto'
+    engine uses the tree engine for chunks with at least
+    TREE_ENGINE_MIN_SIZE points. Chunks with missing times or positions always
+    use the 'pdist' engine, which ignores the missing parts of each distance.
+    """
     if len(X_data) == 0:
         X_labels = np.empty(len(X_data), dtype=np.int)
     elif len(X_data) == 1:
         X_labels = np.ones(len(X_data), dtype=np.int)
     elif np.all(np.isnan(X_data)):
         X_labels = np.arange(1, len(X_data) + 1, dtype=np.int)
+    elif (
+        columns is not None
+        and _use_tree_engine(X_data, engine)
+        and not np.any(np.isnan(X_data))
+    ):
+        X_labels = _cluster_chunk_tree(
+            X_data, columns, thresh_sec, km_per_sec, 'seconds'
+        )
     else:
         # Compute pairwise distances between all inputs
         condenced_dist_mat = distance.pdist(X_data, dist_func)
@@ -482,6 +539,159 @@ def _cluster_chunk(X_data, dist_func, thresh_sec):
     return X_labels
 
 
+def _timespace_weights(km_per_sec, thresh_units):
+    """
+    Returns the factors that convert seconds and kilometers into threshold
+    units, matching the distance functions chosen by `prepare_data`.
+    """
+    if thresh_units == 'seconds':
+        sec_weight, km_weight = 1.0, 1.0 / km_per_sec
+    elif thresh_units == 'km':
+        sec_weight, km_weight = km_per_sec, 1.0
+    else:
+        raise ValueError('Unknown thresh_units=%r' % (thresh_units,))
+    return sec_weight, km_weight
+
+
+def _timespace_embedding(X_data, columns, sec_weight, km_weight):
+    """
+    Embeds (time, lat, lon) rows into euclidean space such that the euclidean
+    distance between two embedded points is never larger than their
+    timespace distance. Times are mapped onto a line and gps coordinates onto
+    the surface of the earth (chord distance <= great circle distance).
+    """
+    parts = []
+    if 'time' in columns:
+        X_time = X_data.T[columns.index('time')]
+        parts.append(((X_time - X_time.min()) * sec_weight)[:, None])
+    if 'lat' in columns:
+        lat = np.radians(X_data.T[columns.index('lat')])
+        lon = np.radians(X_data.T[columns.index('lon')])
+        xyz = np.vstack(
+            [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+        ).T
+        parts.append(xyz * (EARTH_RADIUS_KM * km_weight))
+    X_embed = np.hstack(parts)
+    return X_embed
+
+
+def _timespace_pair_dists(X_data, columns, idx1, idx2, sec_weight, km_weight):
+    """
+    Vectorized version of the distance functions chosen by `prepare_data`
+    evaluated on the pairs of rows (idx1[i], idx2[i]).
+    """
+    dists = np.zeros(len(idx1), dtype=np.float64)
+    if 'time' in columns:
+        X_time = X_data.T[columns.index('time')]
+        dists += np.abs(X_time[idx1] - X_time[idx2]) * sec_weight
+    if 'lat' in columns:
+        lat = np.radians(X_data.T[columns.index('lat')])
+        lon = np.radians(X_data.T[columns.index('lon')])
+        km_dist = haversine_rad(lat[idx1], lon[idx1], lat[idx2], lon[idx2])
+        dists += km_dist * km_weight
+    return dists
+
+
+def _union_labels(labels, idx1, idx2):
+    """
+    Vectorized union-find step. Merges the components containing idx1[i] and
+    idx2[i] and returns the compressed component label of every point.
+    """
+    import scipy.sparse
+    import scipy.sparse.csgraph
+
+    lbl1 = labels[idx1]
+    lbl2 = labels[idx2]
+    flags = lbl1 != lbl2
+    if not np.any(flags):
+        return labels
+    n = len(labels)
+    lbl1 = lbl1[flags]
+    lbl2 = lbl2[flags]
+    data = np.ones(len(lbl1), dtype=np.int8)
+    graph = scipy.sparse.coo_matrix((data, (lbl1, lbl2)), shape=(n, n))
+    _, comp = scipy.sparse.csgraph.connected_components(graph, directed=False)
+    return comp[labels]
+
+
+def _cluster_chunk_tree(X_data, columns, thresh, km_per_sec, thresh_units):
+    """
+    Sub-quadratic single linkage clustering.
+
+    Two points belong to the same flat single linkage cluster iff they are
+    connected by a path whose edges have a distance of at most thresh (this
+    is what fcluster with criterion='distance' computes). Candidate edges are
+    found with a KD-tree over a euclidean embedding that lower-bounds the
+    timespace distance, the exact distances of the candidates are computed in
+    a vectorized pass, and surviving edges are merged with union-find.
+    Candidate pairs are generated in blocks of query points so at most
+    TREE_ENGINE_MAX_PAIRS pairs are held in memory at a time.
+
+    Returns:
+        ndarray: 1-based labels numbered in order of first appearance
+
+    Doctest:
+        >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
+        >>> from wbia.algo.preproc.occurrence_blackbox import _cluster_chunk_tree
+        >>> X_data = np.array([
+        >>>     (0, 42.727985, -73.683994),  # MRC
+        >>>     (0, 42.657414, -73.774448),  # Park1
+        >>>     (0, 42.658333, -73.770993),  # Park2
+        >>>     (0, 42.654384, -73.768919),  # Park3
+        >>>     (0, 42.655039, -73.769048),  # Park4
+        >>>     (0, 42.657872, -73.764148),  # Park5
+        >>>     (0, 42.876974, -73.819311),  # CP1
+        >>>     (0, 42.862946, -73.804977),  # CP2
+        >>>     (0, 42.849809, -73.758486),  # CP3
+        >>> ])
+        >>> columns = ('time', 'lat', 'lon')
+        >>> X_labels = _cluster_chunk_tree(X_data, columns, 5.0, KM_PER_SEC, 'km')
+        >>> result = 'X_labels = {}'.format(ut.repr2(X_labels))
+        >>> print(result)
+        X_labels = np.array([1, 2, 2, 2, 2, 2, 3, 3, 3])
+    """
+    from scipy.spatial import cKDTree
+
+    num = len(X_data)
+    sec_weight, km_weight = _timespace_weights(km_per_sec, thresh_units)
+    X_embed = _timespace_embedding(X_data, columns, sec_weight, km_weight)
+    tree = cKDTree(X_embed)
+
+    # Pad the radius slightly so borderline pairs are never lost to rounding
+    # in the embedding. The exact distance check below decides the edge.
+    radius = thresh * (1 + 1e-9) + 1e-9
+    num_neighbs = tree.query_ball_point(X_embed, radius, return_length=True)
+    # Split query points into blocks with a bounded number of candidate pairs
+    cumsum = np.cumsum(num_neighbs)
+    block_ids = cumsum // TREE_ENGINE_MAX_PAIRS
+    breaks = np.where(np.diff(block_ids))[0] + 1
+    bounds = np.hstack([[0], breaks, [num]]).astype(np.int64)
+
+    labels = np.arange(num)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if start == stop:
+            continue
+        block_tree = cKDTree(X_embed[start:stop])
+        pairs = block_tree.sparse_distance_matrix(tree, radius, output_type='ndarray')
+        idx1 = pairs['i'].astype(np.int64) + start
+        idx2 = pairs['j'].astype(np.int64)
+        # Each undirected edge only needs to be checked once
+        flags = idx1 < idx2
+        idx1, idx2 = idx1[flags], idx2[flags]
+        dists = _timespace_pair_dists(
+            X_data, columns, idx1, idx2, sec_weight, km_weight
+        )
+        flags = dists <= thresh
+        labels = _union_labels(labels, idx1[flags], idx2[flags])
+
+    # Number components by order of first appearance
+    _, first_idxs, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    rank = np.empty(len(first_idxs), dtype=np.int64)
+    rank[first_idxs.argsort()] = np.arange(1, len(first_idxs) + 1)
+    X_labels = rank[inverse]
+    return X_labels
+
+
 def _chunk_time(X_part, thresh_sec):
     X_time = X_part.T[0]
     time_sortx = X_time.argsort()
@@ -565,6 +775,64 @@ def _chunk_time(X_part, thresh_sec):
 #         yield idxs
 
 
+def testdata_timespace(num=1000, num_sites=20, seed=0):
+    """
+    Synthetic survey data: images taken in bursts around a few sites over the
+    course of a single day.
+
+    Returns:
+        tuple: (posixtimes, latlons)
+    """
+    rng = np.random.RandomState(seed)
+    site_latlons = np.array([42.65, -73.77]) + rng.randn(num_sites, 2) * 0.2
+    site_times = 1.5e9 + rng.rand(num_sites) * 12 * 60 * 60
+    site_idxs = rng.randint(0, num_sites, size=num)
+    latlons = site_latlons[site_idxs] + rng.randn(num, 2) * 0.005
+    posixtimes = site_times[site_idxs] + rng.rand(num) * 2 * 60 * 60
+    return posixtimes, latlons
+
+
+def benchmark_cluster_engines(sizes=[250, 500, 1000], thresh_sec=600):
+    """
+    Compares the pdist and tree clustering engines on synthetic data and
+    checks that both produce the same partition.
+
+    CommandLine:
+        python -m wbia.algo.preproc.occurrence_blackbox benchmark_cluster_engines
+
+    Doctest:
+        >>> from wbia.algo.preproc.occurrence_blackbox import *  # NOQA
+        >>> results = benchmark_cluster_engines(sizes=[50, 300])
+        >>> assert all(r['same_partition'] for r in results)
+    """
+    results = []
+    for num in sizes:
+        posixtimes, latlons = testdata_timespace(num)
+        labels = {}
+        times = {}
+        for engine in ['pdist', 'tree']:
+            with ut.Timer(verbose=False) as timer:
+                labels[engine] = cluster_timespace_sec(
+                    posixtimes, latlons, thresh_sec, engine=engine
+                )
+            times[engine] = timer.ellapsed
+        # Partitions are the same iff the label pairs are in bijection
+        pairs = set(zip(labels['pdist'], labels['tree']))
+        num_pdist = len(set(labels['pdist']))
+        num_tree = len(set(labels['tree']))
+        same_partition = len(pairs) == num_pdist == num_tree
+        result = {
+            'num': num,
+            'pdist_sec': times['pdist'],
+            'tree_sec': times['tree'],
+            'num_clusters': num_tree,
+            'same_partition': same_partition,
+        }
+        logger.info('benchmark_cluster_engines: %s' % (ut.repr2(result, precision=4),))
+        results.append(result)
+    return results
+
+
 def main():
     """
     CommandLine:
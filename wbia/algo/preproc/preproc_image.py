@@ -1,15 +1,27 @@
 # -*- coding: utf-8 -*-
+import collections
+import hashlib
+import io
 import logging
 import os
-from os.path import splitext, basename, isabs
+import threading
+import uuid
+from os.path import splitext, basename
 import warnings
 import vtool.exif as vtexif
 import utool as ut
-import six
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
 
+URL_PROTOS = ['https://', 'http://']
+S3_PROTOS = ['s3://']
+# Remote image ingestion
+INGEST_WORKERS = ut.get_argval('--ingest-workers', type_=int, default=16)
+INGEST_MAX_INFLIGHT_MB = ut.get_argval('--ingest-max-inflight-mb', type_=int, default=256)
+INGEST_MAX_RETRIES = ut.get_argval('--ingest-max-retries', type_=int, default=3)
+INGEST_TIMEOUT = ut.get_argval('--ingest-timeout', type_=float, default=60.0)
+
 
 def parse_exif(pil_img):
     """ Image EXIF helper """
@@ -28,12 +40,156 @@ def get_standard_ext(gpath):
     return '.jpg' if ext == '.jpeg' else ext
 
 
+def isproto(gpath, valid_protos):
+    return any(gpath.startswith(proto) for proto in valid_protos)
+
+
+def is_remote_gpath(gpath):
+    return isproto(gpath.strip(), S3_PROTOS + URL_PROTOS)
+
+
+def get_bytes_uuid(data):
+    """ Same as ut.get_file_uuid for a file with the given contents """
+    hashbytes_20 = hashlib.sha1(data).digest()
+    return uuid.UUID(bytes=hashbytes_20[0:16])
+
+
+class _ByteBudget(object):
+    """
+    Bounds the number of bytes held by concurrent downloads. A download waits
+    until enough bytes are released, unless nothing else is held so a single
+    image larger than the budget can still proceed.
+    """
+
+    def __init__(budget, max_bytes=None):
+        budget.max_bytes = max_bytes
+        budget.used = 0
+        budget._cond = threading.Condition()
+
+    def acquire(budget, nbytes, block=True):
+        with budget._cond:
+            if block and budget.max_bytes is not None:
+                while budget.used > 0 and budget.used + nbytes > budget.max_bytes:
+                    budget._cond.wait()
+            budget.used += nbytes
+
+    def release(budget, nbytes):
+        with budget._cond:
+            budget.used -= nbytes
+            budget._cond.notify_all()
+
+
+def new_http_session(pool_size=None, max_retries=None):
+    """
+    Returns a requests session that keeps up to pool_size connections per
+    host alive and retries failed connections and transient server errors
+    with an exponential backoff.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    if pool_size is None:
+        pool_size = INGEST_WORKERS
+    if max_retries is None:
+        max_retries = INGEST_MAX_RETRIES
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def _read_response(response, budget=None):
+    """ Reads the body of a streamed response, holding its size in budget """
+    declared = int(response.headers.get('Content-Length', 0) or 0)
+    if budget is not None:
+        budget.acquire(declared)
+    try:
+        data = b''.join(response.iter_content(2 ** 16))
+    except Exception:
+        if budget is not None:
+            budget.release(declared)
+        raise
+    if budget is not None and len(data) != declared:
+        # Account for what was actually read without waiting while holding it
+        budget.acquire(len(data) - declared, block=False)
+    return data
+
+
+def download_remote_image(gpath, session=None, timeout=None, budget=None):
+    """
+    Returns the contents of an http(s):// or s3:// image. The caller must
+    release len(data) bytes of budget.
+
+    Args:
+        gpath (str): image uri
+        session (requests.Session): reused for all http downloads if given
+        timeout (float): seconds to wait for the server
+        budget (_ByteBudget): bounds the bytes held by concurrent downloads
+    """
+    import tempfile
+    import requests
+    import urllib
+
+    urlsplit = urllib.parse.urlsplit
+    urlquote = urllib.parse.quote
+    urlunquote = urllib.parse.unquote
+
+    if isproto(gpath, S3_PROTOS):
+        temp_file, temp_filepath = tempfile.mkstemp(suffix=get_standard_ext(gpath))
+        try:
+            s3_dict = ut.s3_str_decode_to_dict(gpath)
+            ut.grab_s3_contents(temp_filepath, **s3_dict)
+            if budget is not None:
+                budget.acquire(os.path.getsize(temp_filepath))
+            with open(temp_filepath, 'rb') as file_:
+                return file_.read()
+        finally:
+            os.close(temp_file)
+            os.unlink(temp_filepath)
+
+    if session is None:
+        session = requests
+    # Ensure that the Unicode string is properly encoded for web requests
+    uri_ = urlunquote(gpath)
+    uri_ = urlsplit(uri_, allow_fragments=False)
+    uri_path = urlquote(uri_.path.encode('utf8'))
+    uri_ = uri_._replace(path=uri_path)
+    uri_ = uri_.geturl()
+    try:
+        response = session.get(uri_, stream=True, allow_redirects=True, timeout=timeout)
+        assert response.status_code == 200, '200 code not received on download'
+    except Exception:
+        scheme = urlsplit(uri_, allow_fragments=False).scheme
+        uri_ = uri_.strip('%s://' % (scheme,))
+        uri_path = urlquote(uri_.encode('utf8'))
+        uri_ = '%s://%s' % (scheme, uri_path)
+        response = session.get(uri_, stream=True, allow_redirects=True, timeout=timeout)
+        assert response.status_code == 200, '200 code not received on download'
+    with response:
+        return _read_response(response, budget)
+
+
 @profile
-def parse_imageinfo(gpath):
+def parse_imageinfo(gpath, session=None, timeout=None, budget=None):
     """Worker function: gpath must be in UNIX-PATH format!
 
+    Remote images are hashed and parsed from memory.
+
     Args:
         gpath (str): image path
+        session (requests.Session): reused for remote images if given
+        timeout (float): seconds to wait for the server of a remote image
+        budget (_ByteBudget): bounds the bytes held by concurrent downloads
 
     Returns:
         tuple: param_tup -
@@ -54,115 +210,46 @@ def parse_imageinfo(gpath):
     """
     # Try to open the image
     from PIL import Image
-    import tempfile
     import requests
-
-    if six.PY2:
-        import urllib
-        import urlparse
-
-        urlsplit = urlparse.urlsplit
-        urlquote = urllib.quote
-    else:
-        import urllib
-
-        urlsplit = urllib.parse.urlsplit
-        urlquote = urllib.parse.quote
-        urlunquote = urllib.parse.unquote
+    import urllib
 
     gpath = gpath.strip()
-
-    url_protos = ['https://', 'http://']
-    s3_proto = ['s3://']
-    valid_protos = s3_proto + url_protos
-
-    def isproto(gpath, valid_protos):
-        return any(gpath.startswith(proto) for proto in valid_protos)
-
-    def islocal(gpath):
-        return not (isabs(gpath) and isproto(gpath, valid_protos))
-
-    with warnings.catch_warnings(record=True) as w:
-        try:
-            if isproto(gpath, valid_protos):
-                # suffix = '.%s' % (basename(gpath), )
-                filename = basename(gpath)
-                _, ext = splitext(filename)
-                # base = filename
-                base = ut.random_nonce(16)
-                suffix = '.%s%s' % (base, ext)
-                temp_file, temp_filepath = tempfile.mkstemp(suffix=suffix)
-                args = (
-                    gpath,
-                    temp_filepath,
-                )
-                logger.info(
-                    '[preproc] Caching remote %s file to temporary file %r' % args
-                )
-
-                if isproto(gpath, s3_proto):
-                    s3_dict = ut.s3_str_decode_to_dict(gpath)
-                    ut.grab_s3_contents(temp_filepath, **s3_dict)
-                if isproto(gpath, url_protos):
-                    # Ensure that the Unicode string is properly encoded for web requests
-                    uri_ = urlunquote(gpath)
-                    uri_ = urlsplit(uri_, allow_fragments=False)
-                    uri_path = urlquote(uri_.path.encode('utf8'))
-                    uri_ = uri_._replace(path=uri_path)
-                    uri_ = uri_.geturl()
-                    try:
-                        # six.moves.urllib.request.urlretrieve(uri_, filename=temp_filepath)
-                        response = requests.get(uri_, stream=True, allow_redirects=True)
-                        assert (
-                            response.status_code == 200
-                        ), '200 code not received on download'
-                    except Exception:
-                        scheme = urlsplit(uri_, allow_fragments=False).scheme
-                        uri_ = uri_.strip('%s://' % (scheme,))
-                        uri_path = urlquote(uri_.encode('utf8'))
-                        uri_ = '%s://%s' % (scheme, uri_path)
-                        # six.moves.urllib.request.urlretrieve(uri_, filename=temp_filepath)
-                        response = requests.get(uri_, stream=True, allow_redirects=True)
-                        assert (
-                            response.status_code == 200
-                        ), '200 code not received on download'
-
-                    # Save
-                    with open(temp_filepath, 'wb') as temp_file_:
-                        for chunk in response.iter_content(1024):
-                            temp_file_.write(chunk)
-                gpath_ = temp_filepath
-            else:
-                temp_file, temp_filepath = None, None
-                gpath_ = gpath
-
-            # Open image with Exif support
-            pil_img = Image.open(gpath_, 'r')
-            # We cannot use pixel data as libjpeg is not determenistic (even for reads!)
-            image_uuid = ut.get_file_uuid(gpath_)  # Read file ]-hash-> guid = gid
-        except (
-            AssertionError,
-            IOError,
-            requests.HTTPError,
-            urllib.error.HTTPError,
-            Image.DecompressionBombError,
-        ) as ex:
-            # ut.embed()
-            logger.info('[preproc] IOError: %s' % (str(ex),))
-            return None
-
-        if len(w) > 0:
-            # for warn in w:
-            #     warnings.showwarning(warn.message, warn.category,
-            #                          warn.filename, warn.lineno, warn.file,
-            #                          warn.line)
-            #     warnstr = warnings.formatwarning
-            #     logger.info(warnstr)
-            logger.info('%d warnings issued by %r' % (len(w), gpath))
-    # Parse out the data
-    width, height = pil_img.size  # Read width, height
-    time, lat, lon, orient = parse_exif(pil_img)  # Read exif tags
-    pil_img.close()
+    nbytes = 0
+    try:
+        with warnings.catch_warnings(record=True) as w:
+            try:
+                if isproto(gpath, S3_PROTOS + URL_PROTOS):
+                    logger.info('[preproc] Reading remote file %r' % (gpath,))
+                    data = download_remote_image(gpath, session, timeout, budget)
+                    nbytes = len(data)
+                    image_uuid = get_bytes_uuid(data)
+                    # Open image with Exif support
+                    pil_img = Image.open(io.BytesIO(data), 'r')
+                else:
+                    # Open image with Exif support
+                    pil_img = Image.open(gpath, 'r')
+                    # We cannot use pixel data as libjpeg is not determenistic
+                    # (even for reads!)
+                    image_uuid = ut.get_file_uuid(gpath)  # Read file ]-hash-> guid = gid
+            except (
+                AssertionError,
+                IOError,
+                requests.HTTPError,
+                urllib.error.HTTPError,
+                Image.DecompressionBombError,
+            ) as ex:
+                logger.info('[preproc] IOError: %s' % (str(ex),))
+                return None
+
+            if len(w) > 0:
+                logger.info('%d warnings issued by %r' % (len(w), gpath))
+        # Parse out the data
+        width, height = pil_img.size  # Read width, height
+        time, lat, lon, orient = parse_exif(pil_img)  # Read exif tags
+        pil_img.close()
+    finally:
+        if budget is not None and nbytes > 0:
+            budget.release(nbytes)
     if orient in [6, 8]:
         width, height = height, width
     # orig_gpath = gpath
@@ -185,14 +272,84 @@ def parse_imageinfo(gpath):
         orient,
         notes,
     )
-
-    if temp_filepath is not None:
-        os.close(temp_file)
-        os.unlink(temp_filepath)
     # logger.info('[ginfo] %r %r' % (image_uuid, orig_gname))
     return param_tup
 
 
+def generate_imageinfo(
+    gpath_list,
+    num_workers=None,
+    max_inflight_mb=None,
+    session=None,
+    timeout=None,
+    force_serial=False,
+):
+    """
+    Generates the parse_imageinfo param_tup of each image in order.
+
+    Images are read by a pool of threads that share a pooled HTTP session, so
+    remote images reuse connections to the same host. At most a few tasks per
+    worker are queued ahead of the consumer, and the bytes of the remote
+    images held at the same time are bounded by max_inflight_mb.
+
+    Args:
+        gpath_list (list): image paths or uris
+        num_workers (int): number of concurrent reads (default --ingest-workers)
+        max_inflight_mb (int): budget for downloaded bytes
+        session (requests.Session): defaults to a new_http_session
+        timeout (float): seconds to wait for the server of a remote image
+        force_serial (bool): read the images in the calling thread
+
+    Yields:
+        tuple: param_tup or None if the image could not be read
+
+    CommandLine:
+        python -m wbia.algo.preproc.preproc_image --exec-generate_imageinfo
+
+    Doctest:
+        >>> from wbia.algo.preproc.preproc_image import *  # NOQA
+        >>> gpath_list = [ut.grab_test_imgpath('patsy.jpg'), 'doesnotexist.jpg']
+        >>> params_list = list(generate_imageinfo(gpath_list, num_workers=2))
+        >>> assert str(params_list[0][0]) == '16008058-788c-2d48-cd50-f6029f726cbf'
+        >>> assert params_list[1] is None
+    """
+    from concurrent import futures
+
+    if num_workers is None:
+        num_workers = INGEST_WORKERS
+    if max_inflight_mb is None:
+        max_inflight_mb = INGEST_MAX_INFLIGHT_MB
+    if timeout is None:
+        timeout = INGEST_TIMEOUT
+    own_session = session is None and any(map(is_remote_gpath, gpath_list))
+    if own_session:
+        session = new_http_session(pool_size=num_workers)
+    budget = _ByteBudget(max_inflight_mb * (2 ** 20))
+    try:
+        if force_serial or num_workers <= 1:
+            for gpath in gpath_list:
+                yield parse_imageinfo(gpath, session, timeout, budget)
+            return
+        executor = futures.ThreadPoolExecutor(num_workers)
+        pending = collections.deque()
+        try:
+            for gpath in gpath_list:
+                pending.append(
+                    executor.submit(parse_imageinfo, gpath, session, timeout, budget)
+                )
+                if len(pending) >= num_workers * 4:
+                    yield pending.popleft().result()
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+    finally:
+        if own_session:
+            session.close()
+
+
 # def add_images_params_gen(gpath_list):
 #     """
 #     generates values for add_images sqlcommands asychronously
@@ -297,6 +297,7 @@ class InvertedAnnots(InvertedAnnotsExtras):
         inva.int_rvec = None
         inva.config = None
         inva.vocab_rowid = None
+        inva.word_index = None
 
     @property
     def wx_list(inva):
@@ -389,6 +390,12 @@ class InvertedAnnots(InvertedAnnotsExtras):
             wx_to_aids = smk_funcs.invert_lists(inva.aids, inva.wx_lists)
             return wx_to_aids
 
+    def compute_word_index(inva):
+        """ Builds the word-major layout used by batched SMK scoring """
+        with ut.Timer('Building inverted word index'):
+            word_index = InvertedWordIndex.from_inva(inva)
+            return word_index
+
     @profile
     def compute_word_weights(inva, method='idf'):
         """
@@ -570,6 +577,92 @@ class SingleAnnot(ut.NiceRepr):
         return nbytes
 
 
+@ut.reloadable_class
+class InvertedWordIndex(ut.NiceRepr):
+    """
+    Word-major (CSR) layout of the aggregated residuals of an InvertedAnnots.
+
+    The postings of word wx are the rows indptr[wx]:indptr[wx + 1]. Each
+    posting stores the index of its annotation in inva.aids, the row of the
+    word in that annotation's wx_list, and the aggregated residual vector and
+    error flag. Postings of a word are ordered like inva.aids.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.smk.inverted_index import *  # NOQA
+        >>> inva = InvertedAnnots()
+        >>> inva.aids = [5, 3, 9]
+        >>> inva.wx_lists = [np.array([0, 2]), np.array([2]), np.array([1, 2, 4])]
+        >>> inva.agg_rvecs = [np.full((len(wxs), 2), aid, dtype=np.int8)
+        >>>                   for aid, wxs in zip(inva.aids, inva.wx_lists)]
+        >>> inva.agg_flags = [np.zeros((len(wxs), 1), dtype=bool)
+        >>>                   for wxs in inva.wx_lists]
+        >>> inva.gamma_list = [1.0, 2.0, 3.0]
+        >>> inva.int_rvec = True
+        >>> word_index = InvertedWordIndex.from_inva(inva)
+        >>> sl_ = word_index.postings(2)
+        >>> assert word_index.didxs[sl_].tolist() == [0, 1, 2]
+        >>> assert word_index.rowxs[sl_].tolist() == [1, 0, 1]
+        >>> assert word_index.agg_rvecs[sl_, 0].tolist() == [5, 3, 9]
+        >>> assert word_index.postings(3) == slice(5, 5)
+        >>> assert word_index.postings(100) == slice(0, 0)
+    """
+
+    def __init__(word_index):
+        word_index.indptr = None
+        word_index.didxs = None
+        word_index.rowxs = None
+        word_index.agg_rvecs = None
+        word_index.agg_flags = None
+        word_index.gammas = None
+        word_index.int_rvec = None
+
+    def __nice__(word_index):
+        return 'nWords=%d, nPostings=%d' % (
+            len(word_index.indptr) - 1,
+            len(word_index.didxs),
+        )
+
+    @classmethod
+    def from_inva(cls, inva):
+        word_index = cls()
+        nrows_list = [len(wxs) for wxs in inva.wx_lists]
+        flat_wxs = np.hstack([np.zeros(0, dtype=np.int32)] + list(inva.wx_lists))
+        flat_didxs = np.repeat(np.arange(len(nrows_list), dtype=np.int32), nrows_list)
+        flat_rowxs = np.hstack(
+            [np.zeros(0, dtype=np.int32)]
+            + [np.arange(nrows, dtype=np.int32) for nrows in nrows_list]
+        )
+        # A stable sort keeps the postings of each word in annotation order
+        sortx = np.argsort(flat_wxs, kind='stable')
+        num_words = int(flat_wxs.max()) + 1 if len(flat_wxs) else 0
+        word_index.indptr = np.zeros(num_words + 1, dtype=np.int64)
+        np.cumsum(np.bincount(flat_wxs, minlength=num_words), out=word_index.indptr[1:])
+        word_index.didxs = flat_didxs.take(sortx)
+        word_index.rowxs = flat_rowxs.take(sortx)
+        if len(sortx):
+            word_index.agg_rvecs = np.vstack(inva.agg_rvecs).take(sortx, axis=0)
+            word_index.agg_flags = np.vstack(inva.agg_flags).ravel().take(sortx)
+        if inva.gamma_list is not None:
+            word_index.gammas = np.array(inva.gamma_list)
+        word_index.int_rvec = inva.int_rvec
+        return word_index
+
+    def postings(word_index, wx):
+        """ slice of the postings of a word """
+        if wx + 1 >= len(word_index.indptr):
+            return slice(0, 0)
+        return slice(word_index.indptr[wx], word_index.indptr[wx + 1])
+
+    def Phis_flags(word_index, sl_):
+        """ aggregated residual vectors of a range of postings """
+        Phis = word_index.agg_rvecs[sl_]
+        flags = word_index.agg_flags[sl_]
+        if word_index.int_rvec:
+            Phis = smk_funcs.uncast_residual_integer(Phis)
+        return Phis, flags
+
+
 @derived_attribute(
     tablename='inverted_agg_assign',
     parents=['feat', 'vocab'],
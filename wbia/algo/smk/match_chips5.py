@@ -110,6 +110,14 @@ class EstimatorRequest(ut.NiceRepr):
         fpath_list = [join(dpath, fname) for fname in fname_list]
         return fpath_list
 
+    def get_chipmatch_store(qreq_):
+        """
+        Returns the store of the chipmatches of this configuration, indexed
+        by the semantic uuids of the queries
+        """
+        cfgstr = qreq_.get_cfgstr(with_input=False, with_data=True, with_pipe=True)
+        return chip_match.get_chipmatch_store(qreq_.cachedir, 'mc5_' + cfgstr)
+
     def get_nice_parts(qreq_):
         parts = []
         parts.append(qreq_.ibs.get_dbname())
@@ -185,6 +193,12 @@ def execute_bulk(qreq_):
 
 
 def _load_singles(qreq_):
+    if chip_match.USE_CHIPMATCH_STORE:
+        store = qreq_.get_chipmatch_store()
+        quuids = qreq_.ibs.get_annot_semantic_uuids(qreq_.qaids)
+        cm_list = store.load(quuids, qaids=qreq_.qaids)
+        qaid_to_hit = {cm.qaid: cm for cm in cm_list if cm is not None}
+        return qaid_to_hit
     # Find existing cached chip matches
     # Try loading as many as possible
     fpath_list = qreq_.get_chipmatch_fpaths(qreq_.qaids)
@@ -284,6 +298,13 @@ def execute_and_save(qreq_miss):
         assert len(cm_batch) == len(qaids), 'bad alignment'
         assert all([qaid == cm.qaid for qaid, cm in zip(qaids, cm_batch)])
 
+        if chip_match.USE_CHIPMATCH_STORE:
+            store = sub_qreq.get_chipmatch_store()
+            quuids = sub_qreq.ibs.get_annot_semantic_uuids(qaids)
+            store.append(quuids, cm_batch, buffered=True)
+            qaid_to_cm.update({cm.qaid: cm for cm in cm_batch})
+            continue
+
         # TODO: we already computed the fpaths
         # should be able to pass them in
         fpath_list = sub_qreq.get_chipmatch_fpaths(qaids)
@@ -298,4 +319,7 @@ def execute_and_save(qreq_miss):
             cm.save_to_fpath(fpath, verbose=False)
         qaid_to_cm.update({cm.qaid: cm for cm in cm_batch})
 
+    if chip_match.USE_CHIPMATCH_STORE:
+        # Chipmatches of small chunks are written as one segment
+        qreq_miss.get_chipmatch_store().flush()
     return qaid_to_cm
@@ -53,6 +53,8 @@ class SMKRequestConfig(dtool.Config):
             'word_weight_method', 'idf', shortprefix='wwm'
         ),  # hack for query only multiple assignment
         ut.ParamInfo('smk_version', 3),
+        # Score all database annotations at once with the word-major index
+        ut.ParamInfo('smk_batch', True, hideif=True),
     ]
     _sub_config_list = [
         core_annots.ChipConfig,
@@ -301,6 +303,9 @@ class SMKRequest(mc5.EstimatorRequest):
             lambda: qinva.compute_gammas(alpha, thresh)
         )
 
+        if qreq_.qparams['smk_batch'] and qreq_.qparams['agg']:
+            dinva.word_index = dinva.compute_word_index()
+
         qreq_.qinva = qinva
         qreq_.dinva = dinva
 
@@ -410,42 +415,49 @@ class SMK(ut.NiceRepr):
 
         X = qreq_.qinva.get_annot(qaid)
 
-        # Determine which database annotations need to be checked
-        # with ut.Timer('searching qaid=%r' % (qaid,), verbose=verbose):
-        hit_inva_wxs = ut.take(qreq_.dinva.wx_to_aids, X.wx_list)
-        hit_daids = np.array(list(set(ut.iflatten(hit_inva_wxs))))
-
-        # Mark impossible daids
-        # with ut.Timer('checking impossible daids=%r' % (qaid,), verbose=verbose):
-        valid_flags = check_can_match(qaid, hit_daids, qreq_)
-        valid_daids = hit_daids.compress(valid_flags)
-
-        shortlist = ut.Shortlist(shortsize)
-        # gammaX = smk.gamma(X, wx_to_weight, agg, alpha, thresh)
-        _prog = ut.ProgPartial(
-            lbl='smk scoring qaid=%r' % (qaid,), enabled=verbose, bs=True, adjust=True
-        )
-
         wx_to_weight = qreq_.dinva.wx_to_weight
+        word_index = getattr(qreq_.dinva, 'word_index', None)
 
-        debug = False
-        if debug:
-            qnid = qreq_.get_qreq_annot_nids([qaid])[0]
-            daids = np.array(qreq_.daids)
-            dnids = qreq_.get_qreq_annot_nids(daids)
-            correct_aids = daids[np.where(dnids == qnid)[0]]
-            daid = correct_aids[0]
-
-        if agg:
-            for daid in _prog(valid_daids):
-                Y = qreq_.dinva.get_annot(daid)
-                item = match_kernel_agg(X, Y, wx_to_weight, alpha, thresh)
-                shortlist.insert(item)
+        if agg and word_index is not None:
+            # Score all hit database annotations in vectorized passes
+            shortlist = batch_shortlist_agg(
+                qaid, X, qreq_, word_index, wx_to_weight, alpha, thresh, shortsize
+            )
         else:
-            for daid in _prog(valid_daids):
-                Y = qreq_.dinva.get_annot(daid)
-                item = match_kernel_sep(X, Y, wx_to_weight, alpha, thresh)
-                shortlist.insert(item)
+            # Determine which database annotations need to be checked
+            # with ut.Timer('searching qaid=%r' % (qaid,), verbose=verbose):
+            hit_inva_wxs = ut.take(qreq_.dinva.wx_to_aids, X.wx_list)
+            hit_daids = np.array(list(set(ut.iflatten(hit_inva_wxs))))
+
+            # Mark impossible daids
+            # with ut.Timer('checking impossible daids=%r' % (qaid,), verbose=verbose):
+            valid_flags = check_can_match(qaid, hit_daids, qreq_)
+            valid_daids = hit_daids.compress(valid_flags)
+
+            shortlist = ut.Shortlist(shortsize)
+            # gammaX = smk.gamma(X, wx_to_weight, agg, alpha, thresh)
+            _prog = ut.ProgPartial(
+                lbl='smk scoring qaid=%r' % (qaid,), enabled=verbose, bs=True, adjust=True
+            )
+
+            debug = False
+            if debug:
+                qnid = qreq_.get_qreq_annot_nids([qaid])[0]
+                daids = np.array(qreq_.daids)
+                dnids = qreq_.get_qreq_annot_nids(daids)
+                correct_aids = daids[np.where(dnids == qnid)[0]]
+                daid = correct_aids[0]
+
+            if agg:
+                for daid in _prog(valid_daids):
+                    Y = qreq_.dinva.get_annot(daid)
+                    item = match_kernel_agg(X, Y, wx_to_weight, alpha, thresh)
+                    shortlist.insert(item)
+            else:
+                for daid in _prog(valid_daids):
+                    Y = qreq_.dinva.get_annot(daid)
+                    item = match_kernel_sep(X, Y, wx_to_weight, alpha, thresh)
+                    shortlist.insert(item)
 
         # Build chipmatches for the shortlist results
 
@@ -540,6 +552,147 @@ def match_kernel_sep(X, Y, wx_to_weight, alpha, thresh):
     return item
 
 
+@profile
+def match_kernel_agg_batch(X, word_index, wx_to_weight, alpha, thresh):
+    """
+    Computes match_kernel_agg between X and every database annotation that
+    shares a word with it.
+
+    The postings of each query word are scored together, then the scores are
+    grouped by database annotation. The per-word scores and the totals are
+    the same as calling match_kernel_agg on each annotation.
+
+    Returns:
+        tuple: (hit_didxs, hit_scores, offsets, flat_scores, flat_X_idx,
+            flat_Y_idx). The word matches of hit_didxs[i] are the rows
+            offsets[i]:offsets[i + 1] of the flat arrays, ordered by word.
+    """
+    scores_list = []
+    didxs_list = []
+    X_idx_list = []
+    Y_idx_list = []
+    # Matches of each database annotation must be summed in word order
+    for X_idx in np.argsort(X.wx_list, kind='stable'):
+        wx = X.wx_list[X_idx]
+        sl_ = word_index.postings(wx)
+        if sl_.start == sl_.stop:
+            continue
+        PhisX, flagsX = X.Phis_flags([X_idx])
+        PhisY, flagsY = word_index.Phis_flags(sl_)
+        didxs = word_index.didxs[sl_]
+        u = (PhisX * PhisY).sum(axis=1)
+        flags = np.logical_or(flagsX[0, 0], flagsY)
+        u[flags] = 1
+        scores = smk_funcs.selectivity(u, alpha, thresh, out=u)
+        weights = np.array([wx_to_weight[wx]])
+        gammaXY = X.gamma * word_index.gammas.take(didxs)
+        # match_kernel_agg multiplies the weights by a scalar gammaXY
+        gammaXY = gammaXY.astype(np.result_type(weights, X.gamma), copy=False)
+        norm_weights = weights * gammaXY
+        scores *= norm_weights
+        scores_list.append(scores)
+        didxs_list.append(didxs)
+        X_idx_list.append(np.full(len(didxs), X_idx, dtype=np.int32))
+        Y_idx_list.append(word_index.rowxs[sl_])
+
+    if len(scores_list) == 0:
+        empty = np.zeros(0, dtype=np.int32)
+        offsets = np.zeros(1, dtype=np.int64)
+        return empty, np.zeros(0), offsets, np.zeros(0), empty, empty
+
+    flat_didxs = np.hstack(didxs_list)
+    # Stable sort keeps the word order within each database annotation
+    sortx = np.argsort(flat_didxs, kind='stable')
+    flat_didxs = flat_didxs.take(sortx)
+    flat_scores = np.hstack(scores_list).take(sortx)
+    flat_X_idx = np.hstack(X_idx_list).take(sortx)
+    flat_Y_idx = np.hstack(Y_idx_list).take(sortx)
+
+    is_start = np.ones(len(flat_didxs), dtype=bool)
+    is_start[1:] = flat_didxs[1:] != flat_didxs[:-1]
+    starts = np.flatnonzero(is_start)
+    offsets = np.append(starts, len(flat_didxs))
+    hit_didxs = flat_didxs.take(starts)
+    hit_scores = segment_sums(flat_scores, offsets)
+    return hit_didxs, hit_scores, offsets, flat_scores, flat_X_idx, flat_Y_idx
+
+
+def segment_sums(values, offsets):
+    """
+    Sums values[offsets[i]:offsets[i + 1]] for each i.
+
+    Segments of equal length are summed as rows of one matrix. Unlike
+    np.add.reduceat this uses the same pairwise summation as calling sum on
+    each segment, so the results are bitwise identical.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.algo.smk.smk_pipeline import *  # NOQA
+        >>> rng = np.random.RandomState(0)
+        >>> values = rng.rand(1000).astype(np.float32)
+        >>> offsets = np.array([0, 3, 4, 300, 303, 1000])
+        >>> sums = segment_sums(values, offsets)
+        >>> expected = [values[a:b].sum() for a, b in zip(offsets[:-1], offsets[1:])]
+        >>> assert sums.tolist() == expected
+    """
+    offsets = np.asarray(offsets)
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    sums = np.zeros(len(starts), dtype=values.dtype)
+    for length in np.unique(lengths):
+        if length == 0:
+            continue
+        segxs = np.flatnonzero(lengths == length)
+        rowxs = starts.take(segxs)[:, None] + np.arange(length)
+        sums[segxs] = values.take(rowxs).sum(axis=1)
+    return sums
+
+
+@profile
+def batch_shortlist_agg(
+    qaid, X, qreq_, word_index, wx_to_weight, alpha, thresh, shortsize
+):
+    """
+    Builds the same shortlist items as inserting match_kernel_agg items for
+    every valid database annotation into a ut.Shortlist. The best items are
+    found with a partial sort. Items with exactly equal scores are ordered
+    by their position in dinva.aids.
+
+    Returns:
+        list: (score, score_list, Y, X_idx, Y_idx) items in ascending score
+    """
+    dinva = qreq_.dinva
+    tup = match_kernel_agg_batch(X, word_index, wx_to_weight, alpha, thresh)
+    hit_didxs, hit_scores, offsets, flat_scores, flat_X_idx, flat_Y_idx = tup
+
+    # Mark impossible daids
+    hit_daids = np.array(dinva.aids).take(hit_didxs)
+    valid_flags = check_can_match(qaid, hit_daids, qreq_)
+    candxs = np.flatnonzero(valid_flags)
+
+    if shortsize is not None and len(candxs) > shortsize:
+        if shortsize <= 0:
+            return []
+        partx = np.argpartition(hit_scores.take(candxs), -shortsize)[-shortsize:]
+        candxs = np.sort(candxs.take(partx))
+    # Ascending score, ties by annotation index
+    candxs = candxs.take(np.argsort(hit_scores.take(candxs), kind='stable'))
+
+    shortlist = []
+    for candx in candxs:
+        sl_ = slice(offsets[candx], offsets[candx + 1])
+        Y = dinva.get_annot(hit_daids[candx])
+        item = (
+            hit_scores[candx],
+            flat_scores[sl_],
+            Y,
+            flat_X_idx[sl_].tolist(),
+            flat_Y_idx[sl_].tolist(),
+        )
+        shortlist.append(item)
+    return shortlist
+
+
 def check_can_match(qaid, hit_daids, qreq_):
     can_match_samename = qreq_.qparams.can_match_samename
     can_match_sameimg = qreq_.qparams.can_match_sameimg
@@ -170,6 +170,9 @@ class PairwiseFeatureExtractor(object):
         Performs one-vs-one matching between pairs of annotations.
         This establishes the feature correspondences.
 
+        Setting vsone_workers in the match_config matches the pairs of each
+        depcache chunk in a thread pool. It does not change the cfgstr.
+
         CommandLine:
             python -m wbia.algo.verif.pairfeat _exec_pairwise_match --show
 
@@ -213,6 +216,8 @@ class PairwiseFeatureExtractor(object):
         configured_lazy_annots = core_annots.make_configured_annots(
             ibs, qaids, daids, qannot_cfg, dannot_cfg, preload=preload
         )
+        # Reuse the kd-trees and keypoints cached while matching
+        core_annots.ensure_vsone_metadata(ibs, configured_lazy_annots)
         for qaid, daid, match in zip(qaids, daids, match_list):
             match.annot1 = configured_lazy_annots[config][qaid]
             match.annot2 = configured_lazy_annots[config][daid]
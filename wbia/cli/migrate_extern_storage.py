@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+import logging
+import sys
+from pathlib import Path
+
+import click
+
+from wbia.constants import REL_PATHS
+from wbia.dtool.extern_storage import migrate_extern_dpath
+
+
+logger = logging.getLogger('wbia')
+
+
+@click.command()
+@click.option(
+    '--db-dir', required=True, type=click.Path(exists=True), help='database location'
+)
+@click.option(
+    '--table',
+    'tablenames',
+    required=True,
+    multiple=True,
+    help='depcache table registered with extern_storage=pack (e.g. chips)',
+)
+@click.option(
+    '--keep-files',
+    is_flag=True,
+    default=False,
+    help='Keep the migrated files in the extern directories',
+)
+@click.option(
+    '--compact',
+    is_flag=True,
+    default=False,
+    help='Compact the packs after the migration',
+)
+@click.option(
+    '-v',
+    '--verbose',
+    is_flag=True,
+    default=False,
+    help='Show debug messages',
+)
+def main(db_dir, tablenames, keep_files, compact, verbose):
+    """
+    Moves the external files of depcache tables from one file per row into
+    pack files. Only migrate tables that are registered with
+    extern_storage='pack', the other tables do not read the packs.
+    """
+    if verbose:
+        logger.setLevel(logging.DEBUG)
+    else:
+        logger.setLevel(logging.INFO)
+    logger.addHandler(logging.StreamHandler())
+
+    cache_dpath = Path(db_dir) / REL_PATHS.cache
+    for tablename in tablenames:
+        extern_dpath = cache_dpath / f'extern_{tablename}'
+        if not extern_dpath.is_dir():
+            logger.info(f'No extern directory for {tablename}: {extern_dpath}')
+            continue
+        logger.info(f'Migrating {extern_dpath} ...')
+        migrate_extern_dpath(
+            str(extern_dpath), remove=not keep_files, compact=compact, verbose=verbose
+        )
+
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
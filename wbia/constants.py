@@ -5,6 +5,7 @@ string correctly every time you use it. (Also it makes it much easier if a
 string name changes)
 """
 import logging
+import os
 import six
 import numpy as np
 import math
@@ -26,6 +27,12 @@ CONTAINER_NAME = ut.get_argval(
 )
 ENGINE_SLOT = ut.get_argval('--engine-slot', type_=str, default='default')
 
+# Import plugin modules (detection, training, web APIs, SMK, ...) on first use
+# instead of when the controller is imported. See wbia.control.plugin_manifest
+LAZY_PLUGINS = ut.get_argflag('--lazy-plugins') or (
+    os.environ.get('WBIA_LAZY_PLUGINS', 'OFF') == 'ON'
+)
+
 
 PI = math.pi
 TAU = 2.0 * PI
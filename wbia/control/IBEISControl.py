@@ -35,6 +35,7 @@ Note:
 """
 import logging
 import six
+import sys
 from wbia import dtool
 import atexit
 import weakref
@@ -167,6 +168,44 @@ python -c "import wbia" --no-cnn
 UTOOL_NO_CNN=True python -c "import wbia"
 """
 
+# Lazy plugins that have not been imported yet (modname -> injected method names)
+LAZY_PLUGIN_METHODS = {}
+
+# Depcache roots of the global preproc registries in controller_inject
+LAZY_PLUGIN_ROOTS = {
+    'image': const.IMAGE_TABLE,
+    'annot': const.ANNOTATION_TABLE,
+    'part': const.PART_TABLE,
+}
+
+
+def register_lazy_plugin(modname, entry):
+    """
+    Registers the methods and depcache tables of a plugin module from its
+    manifest entry (see wbia.control.plugin_manifest) without importing it.
+    """
+    LAZY_PLUGIN_METHODS[modname] = entry['methods']
+    for root, tablenames in entry['preprocs'].items():
+        dtool.depcache_control.register_lazy_preprocs(
+            LAZY_PLUGIN_ROOTS[root], tablenames, modname
+        )
+
+
+def import_lazy_plugin(modname):
+    """ Imports a lazily registered plugin module """
+    module = ub.import_module_from_name(modname)
+    LAZY_PLUGIN_METHODS.pop(modname, None)
+    return module
+
+
+if const.LAZY_PLUGINS:
+    from wbia.control import plugin_manifest
+
+    PLUGIN_MANIFEST = plugin_manifest.load_plugin_manifest()
+else:
+    PLUGIN_MANIFEST = {}
+
+
 for modname in ut.ProgIter(
     AUTOLOAD_PLUGIN_MODNAMES,
     'loading plugins',
@@ -178,6 +217,9 @@ for modname in ut.ProgIter(
         flag, modname = modname
         if ut.get_argflag(flag):
             continue
+    if modname in PLUGIN_MANIFEST and modname not in sys.modules:
+        register_lazy_plugin(modname, PLUGIN_MANIFEST[modname])
+        continue
     try:
         # ut.import_modname(modname)
         ub.import_module_from_name(modname)
@@ -189,6 +231,14 @@ for modname in ut.ProgIter(
         else:
             raise
 
+for modname in sorted(PLUGIN_MANIFEST):
+    if modname in sys.modules:
+        # Already imported by another module, so its methods are registered
+        LAZY_PLUGIN_METHODS.pop(modname, None)
+    elif modname not in LAZY_PLUGIN_METHODS:
+        # Plugins that package inits import when not lazy (e.g. assigner)
+        register_lazy_plugin(modname, PLUGIN_MANIFEST[modname])
+
 
 # NOTE: new plugin code needs to be hacked in here currently
 # this is not a long term solution.  THE Long term solution is to get these
@@ -306,6 +356,25 @@ def __cleanup():
         pass
 
 
+def _make_lazy_method(ibs, modname, method_name):
+    ibs_ref = weakref.ref(ibs)
+
+    def lazy_method(*args, **kwargs):
+        ibs = ibs_ref()
+        ibs.load_lazy_plugin(modname)
+        method = getattr(ibs, method_name)
+        if getattr(method, '_lazy_modname', None) is not None:
+            raise AttributeError(
+                '%s does not define %s. Regenerate the plugin manifest'
+                % (modname, method_name)
+            )
+        return method(*args, **kwargs)
+
+    lazy_method.__name__ = method_name
+    lazy_method._lazy_modname = modname
+    return lazy_method
+
+
 # -----------------
 # IBEIS CONTROLLER
 # -----------------
@@ -449,17 +518,15 @@ class IBEISController(BASE_CLASS):
         return f'sqlite:///{self.get_cachedir()}/{name}.sqlite'
 
     def reset_table_cache(self):
-        self.table_cache = accessor_decors.init_tablecache()
+        if self.table_cache is None:
+            self.table_cache = accessor_decors.init_tablecache()
+        else:
+            # Keep the tables that were switched on at runtime
+            self.table_cache.clear()
 
     def clear_table_cache(self, tablename=None):
         logger.info('[ibs] clearing table_cache[%r]' % (tablename,))
-        if tablename is None:
-            self.reset_table_cache()
-        else:
-            try:
-                del self.table_cache[tablename]
-            except KeyError:
-                pass
+        self.table_cache.clear(tablename)
 
     def show_depc_graph(self, depc, reduced=False):
         depc.show_graph(reduced=reduced)
@@ -520,15 +587,7 @@ class IBEISController(BASE_CLASS):
         """
         Returns info about the underlying SQL cache memory
         """
-        total_size_str = ut.get_object_size_str(
-            self.table_cache, lbl='size(table_cache): '
-        )
-        total_size_str = '\nlen(table_cache) = %r' % (len(self.table_cache))
-        table_size_str_list = [
-            ut.get_object_size_str(val, lbl='size(table_cache[%s]): ' % (key,))
-            for key, val in six.iteritems(self.table_cache)
-        ]
-        cachestats_str = total_size_str + ut.indentjoin(table_size_str_list, '\n  * ')
+        cachestats_str = self.table_cache.get_stats_str()
         return cachestats_str
 
     def print_cachestats_str(self):
@@ -551,10 +610,22 @@ class IBEISController(BASE_CLASS):
             controller_inject.CONTROLLER_CLASSNAME,
             allow_override=self.allow_override,
         )
+        self._inject_lazy_plugin_methods()
         assert hasattr(self, 'get_database_species'), 'issue with ibsfuncs'
         assert hasattr(self, 'get_annot_pair_timedelta'), 'issue with annotmatch_funcs'
         self.register_controller()
 
+    def _inject_lazy_plugin_methods(self):
+        """
+        Injects stubs for the methods of plugins that have not been imported.
+        The first call of a stub imports the plugin and injects its methods.
+        """
+        for modname, method_names in list(LAZY_PLUGIN_METHODS.items()):
+            for method_name in method_names:
+                if not hasattr(self, method_name):
+                    lazy_method = _make_lazy_method(self, modname, method_name)
+                    setattr(self, method_name, lazy_method)
+
     def _on_reload(self):
         """
         For utools auto reload (rrr).
@@ -577,6 +648,23 @@ class IBEISController(BASE_CLASS):
             verbose=False,
         )
 
+    def load_lazy_plugin(self, modname):
+        """ Imports a lazily registered plugin and injects its methods """
+        import_lazy_plugin(modname)
+        # Override the stubs
+        ut.inject_instance(
+            self,
+            classkey=(controller_inject.CONTROLLER_CLASSNAME, modname),
+            allow_override=True,
+            strict=False,
+            verbose=False,
+        )
+
+    def load_lazy_plugins(self):
+        """ Imports every lazily registered plugin (e.g. before serving the web API) """
+        for modname in sorted(PLUGIN_MANIFEST):
+            self.load_lazy_plugin(modname)
+
     # We should probably not implement __del__
     # see: https://docs.python.org/2/reference/datamodel.html#object.__del__
     # def __del__(self):
@@ -13,7 +13,11 @@ from wbia.control import IBEISControl
 from wbia.control import _sql_helpers
 from wbia.control import accessor_decors
 from wbia.control import controller_inject
-from wbia.control import docker_control
+from wbia import constants as const
+
+if not const.LAZY_PLUGINS:
+    # Imported on first use with lazy plugins (see wbia.control.plugin_manifest)
+    from wbia.control import docker_control
 import utool
 
 print, rrr, profile = utool.inject2(__name__)
@@ -28,7 +32,8 @@ def reload_subs(verbose=True):
     getattr(_sql_helpers, 'rrr', lambda verbose: None)(verbose=verbose)
     getattr(accessor_decors, 'rrr', lambda verbose: None)(verbose=verbose)
     getattr(controller_inject, 'rrr', lambda verbose: None)(verbose=verbose)
-    getattr(docker_control, 'rrr', lambda verbose: None)(verbose=verbose)
+    if 'docker_control' in globals():
+        getattr(docker_control, 'rrr', lambda verbose: None)(verbose=verbose)
     rrr(verbose=verbose)
 
 
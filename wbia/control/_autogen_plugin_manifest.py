@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Autogenerated plugin manifest. Do not edit by hand.
+
+Regen Command:
+    python -m wbia.control.plugin_manifest dev_autogen_plugin_manifest
+"""
+
+PLUGIN_MANIFEST = {
+    'wbia.algo.detect.assigner': {
+        'methods': [
+            '_are_part_annots',
+            'assign_parts',
+            'assign_parts_one_image',
+            'assigner_testdb_ibs',
+        ],
+        'preprocs': {},
+    },
+    'wbia.algo.smk.smk_pipeline': {
+        'methods': [],
+        'preprocs': {},
+    },
+    'wbia.algo.smk.vocab_indexer': {
+        'methods': [],
+        'preprocs': {
+            'annot': [
+                'vocab',
+            ],
+        },
+    },
+    'wbia.control.docker_control': {
+        'methods': [
+            'docker_check_container',
+            'docker_container_IP_port_options',
+            'docker_container_clone_name',
+            'docker_container_status',
+            'docker_container_status_dict',
+            'docker_container_urls',
+            'docker_container_urls_from_name',
+            'docker_ensure',
+            'docker_ensure_image',
+            'docker_get_config',
+            'docker_get_container',
+            'docker_get_image',
+            'docker_image_list',
+            'docker_image_run',
+            'docker_login',
+            'docker_pull_image',
+            'docker_register_config',
+            'docker_run',
+        ],
+        'preprocs': {},
+    },
+    'wbia.core_images': {
+        'methods': [],
+        'preprocs': {
+            'image': [
+                'cameratrap_exif',
+                'classifier',
+                'classifier_two',
+                'detections',
+                'features',
+                'localizations',
+                'localizations_aoi_two',
+                'localizations_chips',
+                'localizations_classifier',
+                'localizations_features',
+                'localizations_labeler',
+                'localizations_original',
+                'thumbnails',
+                'web_src',
+            ],
+        },
+    },
+    'wbia.core_parts': {
+        'methods': [],
+        'preprocs': {
+            'part': [
+                'pchips',
+            ],
+        },
+    },
+    'wbia.other.detectcore': {
+        'methods': [
+            'classifier_visualize_training_localizations',
+            'export_to_coco',
+            'export_to_pascal',
+            'export_to_xml',
+            'imageset_train_test_split',
+            'localizer_distributions',
+            'redownload_detection_models',
+            'view_model_dir',
+            'visualize_ground_truth',
+            'visualize_pascal_voc_dataset',
+            'visualize_predictions',
+        ],
+        'preprocs': {},
+    },
+    'wbia.other.detectfuncs': {
+        'methods': [
+            'aoi2_precision_recall_algo_display',
+            'background_accuracy_display',
+            'canonical_localization_iou_visualize',
+            'canonical_localization_precision_recall_algo_display',
+            'canonical_precision_recall_algo_display',
+            'classifier2_precision_recall_algo_display',
+            'classifier_cameratrap_precision_recall_algo_display',
+            'labeler_precision_recall_algo_display',
+            'localizer_precision_recall',
+            'localizer_precision_recall_algo_display',
+            'localizer_precision_recall_algo_display_animate',
+        ],
+        'preprocs': {},
+    },
+    'wbia.other.detectgrave': {
+        'methods': [
+            'bootstrap',
+            'bootstrap2',
+            'bootstrap_pca_test',
+            'bootstrap_pca_train',
+            'classifier2_train_image_rf',
+            'classifier2_train_image_rf_sweep',
+            'classifier_train_image_svm',
+            'classifier_train_image_svm_sweep',
+            'set_reviewed_from_target_species_count',
+        ],
+        'preprocs': {},
+    },
+    'wbia.other.detecttrain': {
+        'methods': [
+            'aoi2_train',
+            'aoi_train',
+            'background_train',
+            'canonical_classifier_train',
+            'canonical_localizer_train',
+            'classifier2_train',
+            'classifier_binary_train',
+            'classifier_cameratrap_densenet_train',
+            'classifier_cameratrap_train',
+            'classifier_multiclass_densenet_train',
+            'classifier_train',
+            'detector_train',
+            'labeler_train',
+            'labeler_train_wbia_cnn',
+            'localizer_lightnet_train',
+            'localizer_yolo_train',
+        ],
+        'preprocs': {},
+    },
+    'wbia.research.metrics': {
+        'methods': [
+            'research_print_metrics',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.apis': {
+        'methods': [
+            'api_test_datasets_id',
+            'heartbeat',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.apis_detect': {
+        'methods': [
+            'aoi_cnn',
+            'commit_detection_results',
+            'commit_detection_results_filtered',
+            'commit_localization_results',
+            'detect_cnn_json',
+            'detect_cnn_json_wrapper',
+            'detect_cnn_lightnet',
+            'detect_cnn_lightnet_json',
+            'detect_cnn_lightnet_json_wrapper',
+            'detect_cnn_yolo',
+            'detect_cnn_yolo_exists',
+            'detect_cnn_yolo_json',
+            'detect_cnn_yolo_json_wrapper',
+            'detect_random_forest',
+            'detect_ws_injury',
+            'detection_lightnet_test',
+            'detection_yolo_test',
+            'get_species_with_detectors',
+            'get_working_species',
+            'has_species_detector',
+            'labeler_cnn',
+            'log_detections',
+            'models_cnn',
+            'models_cnn_lightnet',
+            'models_cnn_yolo',
+            'wic_cnn',
+            'wic_cnn_json',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.apis_engine': {
+        'methods': [
+            'start_detect_image_lightnet',
+            'start_detect_image_test_lightnet',
+            'start_detect_image_test_yolo',
+            'start_detect_image_yolo',
+            'start_identify_annots',
+            'start_identify_annots_query',
+            'start_identify_annots_query_complete',
+            'start_labeler_cnn',
+            'start_predict_ws_injury_interim_svm',
+            'start_review_query_chips_best',
+            'start_web_query_all',
+            'start_wic_image',
+            'start_wildbook_sync',
+            'web_check_uuids',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.apis_query': {
+        'methods': [
+            'add_annots_query_chips_graph_v2',
+            'delete_query_chips_graph_v2',
+            'get_graph_client_query_chips_graph_v2',
+            'get_recognition_query_aids',
+            'log_render_status',
+            'process_graph_match_html',
+            'process_graph_match_html_v2',
+            'query_chips',
+            'query_chips_dict',
+            'query_chips_graph',
+            'query_chips_graph_complete',
+            'query_chips_graph_v2',
+            'query_chips_simple_dict',
+            'query_chips_test',
+            'remove_annots_query_chips_graph_v2',
+            'review_graph_match_config_v2',
+            'review_query_chips_best',
+            'sync_query_chips_graph_v2',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.apis_sync': {
+        'methods': [
+            '_construct_route_url_ibs',
+            '_detect_remote_push_annot_metadata',
+            '_detect_remote_push_annots',
+            '_detect_remote_push_images',
+            '_detect_remote_push_imageset',
+            '_detect_remote_push_metadata',
+            '_detect_remote_push_part_metadata',
+            '_detect_remote_push_parts',
+            '_get_ibs',
+            '_sync_filter_only_multiple_sightings',
+            '_sync_get_aids_for_uuids',
+            '_sync_get_annot_endpoint',
+            '_sync_get_auuid_endpoint',
+            '_sync_get_image',
+            '_sync_get_names',
+            '_sync_get_remote_info',
+            '_sync_get_remote_name_uuids',
+            '_sync_get_species_aids',
+            '_sync_get_training_aids',
+            '_verify_response_ibs',
+            'detect_remote_sync_images',
+            'sync_get_training_data',
+            'sync_get_training_data_uuid_list',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.routes': {
+        'methods': [
+            '_princeton_kaia_annot_filtering',
+            '_princeton_kaia_filtering',
+            '_princeton_kaia_imageset_filtering',
+            'load_identification_query_object_worker',
+            'precompute_web_detection_thumbnails',
+            'precompute_web_viewpoint_thumbnails',
+        ],
+        'preprocs': {},
+    },
+    'wbia.web.routes_experiments': {
+        'methods': [],
+        'preprocs': {},
+    },
+}
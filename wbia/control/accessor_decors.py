@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
+import sys
+import threading
 import six
 import utool as ut
 from six.moves import builtins
@@ -20,42 +23,257 @@ VERB_CONTROL = ut.get_argflag(('--verb-control'))
 # DEBUG_API_CACHE = ut.get_argflag('--debug-api-cache')
 DEV_CACHE = False
 DEBUG_API_CACHE = False
-RELEASE_MODE = True
-
-if RELEASE_MODE:
-    # API Cache is only for when you can gaurentee one instance of the
-    # Controller will be running. This is not safe to use in production.  Use
-    # only for local testing.
-    # API_CACHE = ut.get_argflag('--api-cache')
-    # ASSERT_API_CACHE = not ut.get_argflag(('--noassert-api-cache', '--naac'))
-    API_CACHE = False
-    ASSERT_API_CACHE = False
-else:
-    # API_CACHE = not ut.get_argflag('--no-api-cache')
-    # ASSERT_API_CACHE = ut.get_argflag(('--assert-api-cache', '--naac'))
-    API_CACHE = False
-    ASSERT_API_CACHE = False
+
+# The API cache memoizes getter results per table column. It is invalidated by
+# the writers (adders, setters, deleters) decorated with ``cache_invalidator``
+# in this process, so only turn it on for tables that other processes do not
+# write to. It is off by default, and can be turned on for all tables
+# (--api-cache), for some tables (--api-cache-tables=annotations,species), or
+# at runtime with ``ibs.table_cache.enable(tblname)``.
+API_CACHE = ut.get_argflag('--api-cache')
+API_CACHE_TABLES = ut.get_argval('--api-cache-tables', type_=list, default=[])
+# Approximate memory bound of the cache of each controller
+API_CACHE_MAX_BYTES = ut.get_argval('--api-cache-mb', type_=int, default=256) * 2 ** 20
+ASSERT_API_CACHE = False
 
 
 if ut.VERBOSE:
     if ut.in_main_process():
         if API_CACHE:
             logger.info('[accessor_decors] API_CACHE IS ENABLED')
+        elif API_CACHE_TABLES:
+            logger.info(
+                '[accessor_decors] API_CACHE IS ENABLED FOR %r' % (API_CACHE_TABLES,)
+            )
         else:
             logger.info('[accessor_decors] API_CACHE IS DISABLED')
+
+
 #
 # -----------------
 # IBEIS DECORATORS
 # -----------------
 
 
-# DECORATORS::ADDER
+# DECORATORS::CACHE
+
+
+def _approx_nbytes(value):
+    """ Rough memory footprint of a cached getter value """
+    if hasattr(value, 'nbytes'):
+        return sys.getsizeof(value) + value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_approx_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class TableCache(ut.NiceRepr):
+    r"""
+    Bounded LRU cache of controller getter values.
+
+    Values are keyed by table, column, getter configuration (kwargs_hash), and
+    rowid. The cache holds at most ``max_bytes`` (approximately) and evicts the
+    least recently used values first. None values are never cached.
+
+    Each table has a generation that writers bump when they invalidate it.
+    Values fetched before an invalidation are not stored afterwards, so a
+    getter racing with a writer cannot put stale values back into the cache.
+
+    Args:
+        max_bytes (int): approximate memory bound
+        tables (list): tables to cache, ``'*'`` for all tables
+            (default: API_CACHE_TABLES, or all tables if API_CACHE)
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.accessor_decors import *  # NOQA
+        >>> cache = TableCache(max_bytes=1000, tables=['annotations'])
+        >>> assert cache.is_enabled('annotations') and not cache.is_enabled('images')
+        >>> cache.set_many('annotations', 'gid', None, [1, 2, 3], [10, None, 30])
+        >>> print(cache.get_many('annotations', 'gid', None, [3, 2, 1]))
+        [30, None, 10]
+        >>> cache.invalidate('annotations', ['gid'], [1])
+        >>> print(cache.get_many('annotations', 'gid', None, [1, 3]))
+        [None, 30]
+        >>> print(ut.repr2(cache.get_stats()['annotations.gid']))
+        {'evictions': 0, 'hits': 3, 'misses': 2}
+        >>> # Values are evicted in least recently used order
+        >>> cache.set_many('annotations', 'gid', None, range(100), range(100))
+        >>> assert cache.nbytes <= 1000
+        >>> assert cache.get_many('annotations', 'gid', None, [0])[0] is None
+        >>> assert cache.get_many('annotations', 'gid', None, [99])[0] == 99
+    """
+
+    ALL_TABLES = '*'
+
+    def __init__(self, max_bytes=None, tables=None):
+        if max_bytes is None:
+            max_bytes = API_CACHE_MAX_BYTES
+        if tables is None:
+            tables = [self.ALL_TABLES] if API_CACHE else API_CACHE_TABLES
+        self.max_bytes = max_bytes
+        self.enabled_tables = set(tables)
+        self._lock = threading.RLock()
+        self._generations = collections.Counter()
+        self.reset_stats()
+        self.clear()
+
+    def __nice__(self):
+        return 'n=%d, nbytes=%s' % (len(self), ut.byte_str2(self.nbytes))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_enabled(self, tblname):
+        return tblname in self.enabled_tables or self.ALL_TABLES in self.enabled_tables
+
+    def enable(self, tblname=ALL_TABLES):
+        with self._lock:
+            self.enabled_tables.add(tblname)
+
+    def disable(self, tblname=ALL_TABLES):
+        with self._lock:
+            if tblname == self.ALL_TABLES:
+                self.enabled_tables.clear()
+                self.clear()
+            else:
+                self.enabled_tables.discard(tblname)
+                self.clear(tblname)
+
+    def generation(self, tblname):
+        return self._generations[tblname]
+
+    def reset_stats(self):
+        self._stats = collections.defaultdict(
+            lambda: {'hits': 0, 'misses': 0, 'evictions': 0}
+        )
+
+    def get_stats(self):
+        """ Returns the hit, miss, and eviction counts of each table column """
+        with self._lock:
+            return {
+                '%s.%s' % key: dict(stats) for key, stats in sorted(self._stats.items())
+            }
+
+    def get_stats_str(self):
+        lines = [
+            'table_cache: %d values, %s / %s'
+            % (
+                len(self),
+                ut.byte_str2(self.nbytes),
+                ut.byte_str2(self.max_bytes),
+            ),
+            'enabled tables: %s' % (', '.join(sorted(self.enabled_tables)),),
+        ]
+        for key, stats in self.get_stats().items():
+            total = stats['hits'] + stats['misses']
+            hit_rate = stats['hits'] / total if total else 0.0
+            lines.append(
+                '  * %s: hits=%d, misses=%d, evictions=%d, hit_rate=%.2f'
+                % (key, stats['hits'], stats['misses'], stats['evictions'], hit_rate)
+            )
+        return '\n'.join(lines)
+
+    def get_many(self, tblname, colname, kwargs_hash, rowid_list):
+        """ Returns the cached value of each rowid, None for misses """
+        with self._lock:
+            entries = self._entries
+            vals_list = []
+            for rowid in rowid_list:
+                key = (tblname, colname, kwargs_hash, rowid)
+                entry = entries.get(key, None)
+                if entry is None:
+                    vals_list.append(None)
+                else:
+                    entries.move_to_end(key)
+                    vals_list.append(entry[0])
+            num_miss = vals_list.count(None)
+            stats = self._stats[(tblname, colname)]
+            stats['misses'] += num_miss
+            stats['hits'] += len(vals_list) - num_miss
+        return vals_list
+
+    def set_many(
+        self, tblname, colname, kwargs_hash, rowid_list, val_list, generation=None
+    ):
+        """
+        Caches the values of rowids. If generation is given, the values are
+        dropped when the table was invalidated since that generation.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations[tblname]:
+                return
+            entries = self._entries
+            rowid_set = self._rowids[(tblname, colname)][kwargs_hash]
+            for rowid, val in zip(rowid_list, val_list):
+                if val is None:
+                    continue
+                key = (tblname, colname, kwargs_hash, rowid)
+                nbytes = _approx_nbytes(val)
+                old = entries.pop(key, None)
+                if old is not None:
+                    self.nbytes -= old[1]
+                entries[key] = (val, nbytes)
+                rowid_set.add(rowid)
+                self.nbytes += nbytes
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries
+        while self.nbytes > self.max_bytes and entries:
+            key, (val, nbytes) = entries.popitem(last=False)
+            self.nbytes -= nbytes
+            tblname, colname, kwargs_hash, rowid = key
+            self._rowids[(tblname, colname)][kwargs_hash].discard(rowid)
+            self._stats[(tblname, colname)]['evictions'] += 1
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1]
+
+    def invalidate(self, tblname, colnames=None, rowid_list=None):
+        """
+        Removes the cached values of the given columns (all columns if None)
+        for the given rowids (all rowids if None) and bumps the generation of
+        the table.
+        """
+        with self._lock:
+            self._generations[tblname] += 1
+            if colnames is None:
+                colnames = [
+                    colname for (tblname_, colname) in self._rowids if tblname_ == tblname
+                ]
+            for colname in colnames:
+                kwargs_rowids = self._rowids.get((tblname, colname), {})
+                for kwargs_hash, rowid_set in kwargs_rowids.items():
+                    if rowid_list is None:
+                        invalid_rowids = list(rowid_set)
+                        rowid_set.clear()
+                    else:
+                        invalid_rowids = [
+                            rowid for rowid in rowid_list if rowid in rowid_set
+                        ]
+                        rowid_set.difference_update(invalid_rowids)
+                    for rowid in invalid_rowids:
+                        self._pop((tblname, colname, kwargs_hash, rowid))
+
+    def clear(self, tblname=None):
+        with self._lock:
+            if tblname is None:
+                for tblname_ in list(self._generations.keys()):
+                    self._generations[tblname_] += 1
+                self._entries = collections.OrderedDict()
+                self._rowids = collections.defaultdict(lambda: collections.defaultdict(set))
+                self.nbytes = 0
+            else:
+                self.invalidate(tblname)
 
 
 def init_tablecache():
     r"""
     Returns:
-       defaultdict: tablecache
+       TableCache: tablecache
 
     CommandLine:
         python -m wbia.control.accessor_decors --test-init_tablecache
@@ -64,11 +282,10 @@ def init_tablecache():
         >>> # ENABLE_DOCTEST
         >>> from wbia.control.accessor_decors import *  # NOQA
         >>> result = init_tablecache()
-        >>> print(result)
+        >>> print(len(result))
+        0
     """
-    # 4 levels of dictionaries
-    # tablename, colname, kwargs, and then rowids
-    tablecache = ut.ddict(lambda: ut.ddict(lambda: ut.ddict(dict)))
+    tablecache = TableCache()
     return tablecache
 
 
@@ -121,7 +338,9 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
         >>> setter_func = ibs.set_name_texts
         >>> wrp_cache_invalidator = cache_invalidator(tblname, force=True)(lambda *a: None)
         >>> wrp_cache_invalidator(ibs, rowid_list1)
-        >>> print(ut.repr2(ibs.table_cache))
+        >>> print(ibs.table_cache.get_stats_str())
+        >>> cached = ibs.table_cache.get_many(tblname, colname, None, rowid_list1)
+        >>> assert cached == [None] * len(rowid_list1)
 
     Example1:
         >>> # ENABLE_DOCTEST
@@ -151,10 +370,6 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
     assert colname is not None, 'must specify a single colname'
 
     def closure_getter_cacher(getter_func):
-        if not API_CACHE and not force:
-            # Turn of API Cache
-            return getter_func
-
         def debug_cache_hits(ismiss_list, rowid_list):
             num_miss = sum(ismiss_list)
             num_total = len(rowid_list)
@@ -164,11 +379,9 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 % (tblname, colname, num_hit, num_total)
             )
 
-        def assert_cache_hits(ibs, ismiss_list, rowid_list, kwargs_hash, **kwargs):
+        def assert_cache_hits(ibs, ismiss_list, rowid_list, vals_list, **kwargs):
             cached_rowid_list = ut.filterfalse_items(rowid_list, ismiss_list)
-            cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-            # Load cached values for each rowid
-            cache_vals_list = ut.dict_take_list(cache_, cached_rowid_list, None)
+            cache_vals_list = ut.filterfalse_items(vals_list, ismiss_list)
             db_vals_list = getter_func(ibs, cached_rowid_list, **kwargs)
             # Assert everything is valid
             msg_fmt = ut.codeblock(
@@ -180,81 +393,32 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 """
             )
             msg = msg_fmt % (tblname, colname, cfgkeys, cache_vals_list, db_vals_list)
-            try:
-                list1 = cache_vals_list
-                list2 = db_vals_list
-                assert ut.lists_eq(list1, list2), msg
-                # if isinstance(db_vals_list, list):
-                #    assert cache_vals_list == db_vals_list, msg
-                # else:
-                #    assert np.all(cache_vals_list == db_vals_list), msg
-            except AssertionError as ex:
-                raise ex
-            except Exception as ex2:
-                logger.info(type(cache_vals_list))
-                logger.info(type(db_vals_list))
-                ut.printex(ex2)
-                ut.embed()
-                raise
-
-        if False:
-            # @profile cannot profile this because it is alrady being profiled by
-            def wrp_getter_cacher(ibs, rowid_list, **kwargs):
-                """
-                Wrapper function that caches rowid values in a dictionary
-                """
-                # HACK TAKE OUT GETTING DEBUG OUT OF KWARGS
-                debug_ = kwargs.pop('debug', False)
-                if cfgkeys is not None:
-                    # kwargs_hash = ut.get_dict_hashid(ut.dict_take_list(kwargs, cfgkeys, None))
-                    kwargs_hash = ut.get_dict_hashid(
-                        [kwargs.get(key, None) for key in cfgkeys]
-                    )
-                    # ut.dict_take_list(kwargs, cfgkeys, None))
-                else:
-                    kwargs_hash = None
-                # +----------------------------
-                # There are 3 levels of caches
-                # +----------------------------
-                # All caches for this table
-                # colscache_ = ibs.table_cache[tblname]
-                # # All caches for the this column
-                # kwargs_cache_ = colscache_[colname]
-                # # All caches for this kwargs configuration
-                # cache_ = kwargs_cache_[kwargs_hash]
-                cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-                # L____________________________
-
-                # Load cached values for each rowid
-                # vals_list = ut.dict_take_list(cache_, rowid_list, None)
-                vals_list = [cache_.get(rowid, None) for rowid in rowid_list]
-                # Mark rowids with cache misses
-                ismiss_list = [val is None for val in vals_list]
-                if debug or debug_:
-                    debug_cache_hits(ismiss_list, rowid_list)
-                    # logger.info('[cache_getter] "debug_cache_hits" turned off')
-                # HACK !!! DEBUG THESE GETTERS BY ASSERTING INFORMATION IN CACHE IS CORRECT
-                if ASSERT_API_CACHE:
-                    assert_cache_hits(ibs, ismiss_list, rowid_list, kwargs_hash, **kwargs)
-                # END HACK
-                if any(ismiss_list):
-                    miss_indices = ut.list_where(ismiss_list)
-                    miss_rowids = ut.compress(rowid_list, ismiss_list)
-                    # call wrapped function
-                    miss_vals = getter_func(ibs, miss_rowids, **kwargs)
-                    # overwrite missed output
-                    for index, val in zip(miss_indices, miss_vals):
-                        vals_list[index] = val  # Output write
-                    # cache save
-                    for rowid, val in zip(miss_rowids, miss_vals):
-                        cache_[rowid] = val  # Cache write
-                return vals_list
-
-        else:
-
-            def handle_cache_misses(
-                ibs, getter_func, rowid_list, ismiss_list, vals_list, cache_, kwargs
-            ):
+            assert ut.lists_eq(cache_vals_list, db_vals_list), msg
+
+        def wrp_getter_cacher(ibs, rowid_list, **kwargs):
+            """
+            Wrapper function that caches rowid values in the table cache
+            """
+            table_cache = ibs.table_cache
+            if not force and not table_cache.is_enabled(tblname):
+                return getter_func(ibs, rowid_list, **kwargs)
+            debug_ = kwargs.pop('debug', False)
+            kwargs_hash = (
+                None
+                if cfgkeys is None
+                else ut.get_dict_hashid([kwargs.get(key, None) for key in cfgkeys])
+            )
+            # Values fetched before a concurrent invalidation are not cached
+            generation = table_cache.generation(tblname)
+            # Load cached values for each rowid
+            vals_list = table_cache.get_many(tblname, colname, kwargs_hash, rowid_list)
+            # Mark rowids with cache misses
+            ismiss_list = [val is None for val in vals_list]
+            if debug or debug_:
+                debug_cache_hits(ismiss_list, rowid_list)
+            if ASSERT_API_CACHE:
+                assert_cache_hits(ibs, ismiss_list, rowid_list, vals_list, **kwargs)
+            if any(ismiss_list):
                 miss_indices = ut.list_where(ismiss_list)
                 miss_rowids = ut.compress(rowid_list, ismiss_list)
                 # call wrapped function
@@ -262,39 +426,15 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
                 # overwrite missed output
                 for index, val in zip(miss_indices, miss_vals):
                     vals_list[index] = val  # Output write
-                # cache save
-                for rowid, val in zip(miss_rowids, miss_vals):
-                    cache_[rowid] = val  # Cache write
-
-            def wrp_getter_cacher(ibs, rowid_list, **kwargs):
-                """
-                Wrapper function that caches rowid values in a dictionary
-                """
-                kwargs.pop('debug', False)
-                kwargs_hash = (
-                    None
-                    if cfgkeys is None
-                    else ut.get_dict_hashid([kwargs.get(key, None) for key in cfgkeys])
+                table_cache.set_many(
+                    tblname,
+                    colname,
+                    kwargs_hash,
+                    miss_rowids,
+                    miss_vals,
+                    generation=generation,
                 )
-                # There are 3 levels of caches
-                # All caches for this table, caches for the this column, and caches for this kwargs configuration
-                cache_ = ibs.table_cache[tblname][colname][kwargs_hash]
-                # Load cached values for each rowid
-                vals_list = [cache_.get(rowid, None) for rowid in rowid_list]
-                # Mark rowids with cache misses
-                ismiss_list = [val is None for val in vals_list]
-                # END HACK
-                if any(ismiss_list):
-                    handle_cache_misses(
-                        ibs,
-                        getter_func,
-                        rowid_list,
-                        ismiss_list,
-                        vals_list,
-                        cache_,
-                        kwargs,
-                    )
-                return vals_list
+            return vals_list
 
         wrp_getter_cacher = ut.preserve_sig(wrp_getter_cacher, getter_func)
         return wrp_getter_cacher
@@ -305,6 +445,9 @@ def cache_getter(tblname, colname=None, cfgkeys=None, force=False, debug=False):
 def cache_invalidator(tblname, colnames=None, rowidx=None, force=False):
     """cacher decorator
 
+    The cached values are invalidated both before and after the writer runs,
+    so getters running concurrently with the writer cannot cache stale values.
+
     Args:
         tablename (str): the table that the owns the underlying cache
         colnames (list): the list of cached column that this function will invalidate
@@ -320,53 +463,37 @@ def cache_invalidator(tblname, colnames=None, rowidx=None, force=False):
         writer_func is either a setter, deleter, or an adder, something that writes to
         the database.
         """
-        if not API_CACHE and not force:
-            return writer_func
 
         def wrp_cache_invalidator(self, *args, **kwargs):
             # the class must have a table_cache property
-            colscache_ = self.table_cache[tblname]
-            colnames_ = list(six.iterkeys(colscache_)) if colnames is None else colnames
+            table_cache = self.table_cache
+            if not force and not table_cache.is_enabled(tblname):
+                return writer_func(self, *args, **kwargs)
+            # Clear the cache of any specified colname when the invalidator is
+            # called. If we dont know the rowids clear everything
+            if rowidx is None:
+                rowid_list = None
+            else:
+                rowid_list = args[rowidx]
+                if not hasattr(rowid_list, '__len__'):
+                    if ut.isiterable(rowid_list):
+                        # Don't exhaust generators before the writer sees them
+                        rowid_list = list(rowid_list)
+                        args = args[:rowidx] + (rowid_list,) + args[rowidx + 1 :]
+                    else:
+                        rowid_list = [rowid_list]
             if DEBUG_API_CACHE:
-                indenter = ut.Indenter('[%s]' % (tblname,))
-                indenter.start()
-                logger.info('+------')
                 logger.info(
                     'INVALIDATING tblname=%r, colnames=%r, rowidx=%r, force=%r'
                     % (tblname, colnames, rowidx, force)
                 )
-                logger.info('self = %r' % (self,))
-                logger.info('args = %r' % (args,))
-                logger.info('kwargs = %r' % (kwargs,))
-                logger.info('colscache_ = ' + ut.repr2(colscache_, truncate=1))
-
-            # Clear the cache of any specified colname
-            # when the invalidator is called
-            if rowidx is None:
-                for colname in colnames_:
-                    kwargs_cache_ = colscache_[colname]
-                    # We dont know the rowsids so clear everything
-                    for cache_ in six.itervalues(kwargs_cache_):
-                        cache_.clear()
-            else:
-                rowid_list = args[rowidx]
-                for colname in colnames_:
-                    kwargs_cache_ = colscache_[colname]
-                    # We know the rowids to delete
-                    # iterate over all getter kwargs values
-                    for cache_ in six.itervalues(kwargs_cache_):
-                        ut.delete_dict_keys(cache_, rowid_list)
-
-            # Preform set/delete action
-            if DEBUG_API_CACHE:
-                logger.info('After:')
-                logger.info('colscache_ = ' + ut.repr2(colscache_, truncate=1))
-                logger.info('L__________')
-
-            writer_result = writer_func(self, *args, **kwargs)
-
-            if DEBUG_API_CACHE:
-                indenter.stop()
+                logger.info(table_cache.get_stats_str())
+            table_cache.invalidate(tblname, colnames, rowid_list)
+            try:
+                # Preform set/delete action
+                writer_result = writer_func(self, *args, **kwargs)
+            finally:
+                table_cache.invalidate(tblname, colnames, rowid_list)
             return writer_result
 
         wrp_cache_invalidator = ut.preserve_sig(wrp_cache_invalidator, writer_func)
@@ -264,15 +264,13 @@ def _compute_image_uuids(ibs, gpath_list, sanitize=True, ensure=True, **kwargs):
 
     # Create param_iter
     # params_list = list(preproc_image.add_images_params_gen(gpath_list))
-    force_serial = ibs.force_serial or ibs.production
+    # Images are read by threads that share a pooled session for remote images
+    params_gen = preproc_image.generate_imageinfo(
+        gpath_list, force_serial=ibs.force_serial
+    )
     params_list = list(
-        ut.generate2(
-            preproc_image.parse_imageinfo,
-            list(zip(gpath_list)),
-            nTasks=len(gpath_list),
-            ordered=True,
-            force_serial=force_serial,
-            futures_threaded=True,
+        ut.ProgIter(
+            params_gen, length=len(gpath_list), label='parsing images', adjust=True
         )
     )
 
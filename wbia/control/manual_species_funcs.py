@@ -294,7 +294,7 @@ def add_species(
 
 @register_ibs_method
 @accessor_decors.deleter
-# @cache_invalidator(const.SPECIES_TABLE)
+@accessor_decors.cache_invalidator(const.SPECIES_TABLE, rowidx=0)
 @register_api('/api/species/', methods=['DELETE'], __api_plural_check__=False)
 def delete_species(ibs, species_rowid_list):
     r"""
@@ -592,6 +592,7 @@ def get_species_enabled(ibs, species_rowid_list):
 
 @register_ibs_method
 @accessor_decors.setter
+@accessor_decors.cache_invalidator(const.SPECIES_TABLE, [SPECIES_TEXT], rowidx=0)
 def _set_species_texts(ibs, species_rowid_list, species_text_list):
     r"""
     Sets the species nice names
@@ -603,6 +604,7 @@ def _set_species_texts(ibs, species_rowid_list, species_text_list):
 
 @register_ibs_method
 @accessor_decors.setter
+@accessor_decors.cache_invalidator(const.SPECIES_TABLE, [SPECIES_NICE], rowidx=0)
 def _set_species_nice(ibs, species_rowid_list, species_nice_list):
     r"""
     Sets the species nice names
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Manifest of the controller methods and depcache tables registered by plugin
+modules that can be imported lazily.
+
+When the controller is imported with lazy plugins (--lazy-plugins or
+WBIA_LAZY_PLUGINS=ON), the modules in LAZY_PLUGIN_MODNAMES are not imported.
+Instead, the methods listed in the manifest are injected as stubs that import
+the module on first call, and the listed tables are registered with the
+dependency caches, which import the module the first time a table is needed.
+
+The manifest is built by statically parsing the plugin sources, so it can be
+generated (and checked) without importing any of them.
+
+CommandLine:
+    python -m wbia.control.plugin_manifest dev_autogen_plugin_manifest
+"""
+import ast
+import logging
+from os.path import dirname, exists, join
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+# Modules that are only imported on first use with lazy plugins
+LAZY_PLUGIN_MODNAMES = [
+    'wbia.other.detectfuncs',
+    'wbia.other.detectcore',
+    'wbia.other.detectgrave',
+    'wbia.other.detecttrain',
+    'wbia.algo.detect.assigner',
+    'wbia.research.metrics',
+    'wbia.control.docker_control',
+    'wbia.web.apis_detect',
+    'wbia.web.apis_engine',
+    'wbia.web.apis_query',
+    'wbia.web.apis_sync',
+    'wbia.web.apis',
+    'wbia.web.routes',
+    'wbia.web.routes_experiments',
+    'wbia.core_images',
+    'wbia.core_parts',
+    'wbia.algo.smk.vocab_indexer',
+    'wbia.algo.smk.smk_pipeline',
+]
+
+# Names of the global depcache decorator registries in controller_inject
+REGISTRY_NAMES = {'register_preprocs': 'preprocs', 'register_subprops': 'subprops'}
+
+MANIFEST_FNAME = '_autogen_plugin_manifest.py'
+
+
+def get_module_fpath(modname):
+    """ Finds the source file of a wbia module without importing it """
+    parts = modname.split('.')
+    assert parts[0] == 'wbia', 'not a wbia module: %r' % (modname,)
+    package_dpath = dirname(dirname(__file__))
+    base_fpath = join(package_dpath, *parts[1:])
+    if exists(base_fpath + '.py'):
+        return base_fpath + '.py'
+    return join(base_fpath, '__init__.py')
+
+
+def _node_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return None
+
+
+def _const_value(node):
+    if isinstance(node, getattr(ast, 'Constant', ())):
+        return node.value
+    # python < 3.8 parses strings as ast.Str
+    if isinstance(node, getattr(ast, 'Str', ())):
+        return node.s
+    return None
+
+
+def _registry_key(node):
+    """
+    Returns ('preprocs', root) for an expression like register_preprocs['annot']
+    """
+    if not isinstance(node, ast.Subscript):
+        return None
+    kind = REGISTRY_NAMES.get(_node_name(node.value), None)
+    slice_ = node.slice
+    if isinstance(slice_, getattr(ast, 'Index', ())):
+        slice_ = slice_.value
+    root = _const_value(slice_)
+    if kind is None or not isinstance(root, str):
+        return None
+    return (kind, root)
+
+
+def _tablename(call):
+    if len(call.args) > 0:
+        return _const_value(call.args[0])
+    for keyword in call.keywords:
+        if keyword.arg == 'tablename':
+            return _const_value(keyword.value)
+    return None
+
+
+def parse_plugin_module(modname):
+    """
+    Statically finds the controller methods and the depcache tables that a
+    module registers when it is imported.
+
+    Args:
+        modname (str): name of a wbia module
+
+    Returns:
+        dict: entry with the sorted names of the injected methods and a dict
+            mapping depcache roots to the names of the registered tables
+
+    CommandLine:
+        python -m wbia.control.plugin_manifest parse_plugin_module
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.control.plugin_manifest import *  # NOQA
+        >>> entry = parse_plugin_module('wbia.core_parts')
+        >>> assert entry['methods'] == []
+        >>> print(ut.repr2(entry['preprocs']))
+        {'part': ['pchips']}
+        >>> entry = parse_plugin_module('wbia.research.metrics')
+        >>> assert 'preprocs' in entry and len(entry['methods']) == 1
+    """
+    fpath = get_module_fpath(modname)
+    tree = ast.parse(ut.readfrom(fpath, verbose=False), filename=fpath)
+
+    # Find the names bound to the registration decorators
+    method_decors = set()
+    decorator_tuples = set()
+    table_decors = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Assign):
+            continue
+        value = node.value
+        is_tuple = isinstance(value, ast.Call) and (
+            _node_name(value.func) == 'make_ibs_register_decorator'
+        )
+        is_tuple = is_tuple or _node_name(value) in decorator_tuples
+        registry_key = _registry_key(value)
+        for target in node.targets:
+            if is_tuple and isinstance(target, ast.Tuple) and len(target.elts) == 2:
+                method_decors.add(_node_name(target.elts[1]))
+            elif is_tuple and isinstance(target, ast.Name):
+                decorator_tuples.add(target.id)
+            elif registry_key is not None and isinstance(target, ast.Name):
+                table_decors[target.id] = registry_key
+
+    method_names = set()
+    preprocs = {}
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        for decor in node.decorator_list:
+            if _node_name(decor) in method_decors:
+                method_names.add(node.name)
+            if not isinstance(decor, ast.Call):
+                continue
+            registry_key = table_decors.get(_node_name(decor.func), None)
+            if registry_key is None:
+                registry_key = _registry_key(decor.func)
+            if registry_key is not None and registry_key[0] == 'preprocs':
+                tablename = _tablename(decor)
+                if tablename is not None:
+                    preprocs.setdefault(registry_key[1], []).append(tablename)
+    entry = {
+        'methods': sorted(method_names),
+        'preprocs': {root: sorted(set(names)) for root, names in preprocs.items()},
+    }
+    return entry
+
+
+def build_plugin_manifest(modnames=None):
+    """
+    Returns:
+        dict: maps each module name to its entry (see parse_plugin_module)
+    """
+    if modnames is None:
+        modnames = LAZY_PLUGIN_MODNAMES
+    manifest = {modname: parse_plugin_module(modname) for modname in modnames}
+    return manifest
+
+
+def make_plugin_manifest_source(manifest):
+    """ Formats a manifest as the source of the autogenerated module """
+    lines = [
+        '# -*- coding: utf-8 -*-',
+        '"""',
+        'Autogenerated plugin manifest. Do not edit by hand.',
+        '',
+        'Regen Command:',
+        '    python -m wbia.control.plugin_manifest dev_autogen_plugin_manifest',
+        '"""',
+        '',
+        'PLUGIN_MANIFEST = {',
+    ]
+    for modname in sorted(manifest.keys()):
+        entry = manifest[modname]
+        lines.append('    %r: {' % (modname,))
+        if len(entry['methods']) == 0:
+            lines.append("        'methods': [],")
+        else:
+            lines.append("        'methods': [")
+            lines.extend(['            %r,' % (name,) for name in entry['methods']])
+            lines.append('        ],')
+        if len(entry['preprocs']) == 0:
+            lines.append("        'preprocs': {},")
+        else:
+            lines.append("        'preprocs': {")
+            for root in sorted(entry['preprocs'].keys()):
+                lines.append('            %r: [' % (root,))
+                lines.extend(
+                    ['                %r,' % (name,) for name in entry['preprocs'][root]]
+                )
+                lines.append('            ],')
+            lines.append('        },')
+        lines.append('    },')
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_plugin_manifest_fpath():
+    return join(dirname(__file__), MANIFEST_FNAME)
+
+
+def load_plugin_manifest():
+    """ Returns the checked in manifest without importing any plugin """
+    from wbia.control import _autogen_plugin_manifest
+
+    return _autogen_plugin_manifest.PLUGIN_MANIFEST
+
+
+def dev_autogen_plugin_manifest():
+    r"""
+    Regenerates the checked in manifest of the lazy plugin modules
+
+    CommandLine:
+        python -m wbia.control.plugin_manifest dev_autogen_plugin_manifest
+
+    Example:
+        >>> # SCRIPT
+        >>> from wbia.control.plugin_manifest import *  # NOQA
+        >>> dev_autogen_plugin_manifest()
+    """
+    manifest = build_plugin_manifest()
+    source = make_plugin_manifest_source(manifest)
+    ut.writeto(get_plugin_manifest_fpath(), source, verbose=2)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m wbia.control.plugin_manifest
+        python -m wbia.control.plugin_manifest --allexamples
+    """
+    import multiprocessing
+
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+
+    ut.doctest_funcs()
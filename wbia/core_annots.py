@@ -1415,6 +1415,8 @@ class VsOneConfig(dtool.Config):
     _param_info_list = vt.matching.VSONE_DEFAULT_CONFIG + [
         ut.ParamInfo('version', 8),
         ut.ParamInfo('query_rotation_heuristic', False),
+        # Threads matching the pairs of a chunk. Never part of the cfgstr.
+        ut.ParamInfo('vsone_workers', 0, hideif=lambda cfg: True),
     ]
     #     #ut.ParamInfo('sver_xy_thresh', .01),
     #     ut.ParamInfo('sver_xy_thresh', .001),
@@ -1431,6 +1433,167 @@ class VsOneConfig(dtool.Config):
     ]
 
 
+#: Maximum number of annotations with cached vsone matching metadata
+VSONE_METADATA_CACHE_SIZE = ut.get_argval(
+    '--vsone-metadata-cache-size', type_=int, default=256
+)
+
+#: Lazily computed annotation metadata that only depends on the annotation
+VSONE_METADATA_KEYS = ('flann', 'norm_xys')
+
+VSONE_FLANN_PARAMS = {'algorithm': 'kdtree', 'trees': 4}
+
+
+class VsoneMetadataCache(ut.NiceRepr):
+    """
+    Bounded LRU cache of per-annotation vsone matching metadata (the FLANN
+    index of the annotation descriptors and the normalized keypoint
+    locations). It persists across depcache chunks and calls, so candidate
+    edges that share annotations do not rebuild the same kd-trees.
+
+    Keys are built by get_vsone_metadata_keys from the chip and feature
+    config, the annotation id, and its visual uuid.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.core_annots import *  # NOQA
+        >>> cache = VsoneMetadataCache(maxsize=2)
+        >>> annot1 = ut.LazyDict({'aid': 1})
+        >>> annot1['norm_xys'] = lambda: np.zeros((2, 3))
+        >>> assert not cache.load(annot1, 'key1')
+        >>> cache.store(annot1, 'key1')
+        >>> assert len(cache) == 0, 'unevaluated metadata is not stored'
+        >>> norm_xys = annot1['norm_xys']
+        >>> cache.store(annot1, 'key1')
+        >>> annot2 = ut.LazyDict({'aid': 1})
+        >>> assert cache.load(annot2, 'key1')
+        >>> assert annot2['norm_xys'] is norm_xys
+        >>> cache.store(ut.LazyDict({'flann': None}), 'key2')
+        >>> cache.store(ut.LazyDict({'flann': None}), 'key3')
+        >>> assert not cache.load(ut.LazyDict(), 'key1'), 'should be evicted'
+        >>> print(cache)
+        <VsoneMetadataCache(2/2, hits=1, misses=2)>
+    """
+
+    def __init__(cache, maxsize=VSONE_METADATA_CACHE_SIZE):
+        import collections
+        import threading
+
+        cache.maxsize = maxsize
+        cache._lock = threading.RLock()
+        cache._entries = collections.OrderedDict()
+        cache.hits = 0
+        cache.misses = 0
+
+    def __nice__(cache):
+        return '%d/%r, hits=%d, misses=%d' % (
+            len(cache),
+            cache.maxsize,
+            cache.hits,
+            cache.misses,
+        )
+
+    def __len__(cache):
+        return len(cache._entries)
+
+    def load(cache, annot, key):
+        """
+        Puts cached metadata into a lazy annot dict
+
+        Returns:
+            bool: True if the annotation was in the cache
+        """
+        with cache._lock:
+            entry = cache._entries.get(key, None)
+            if entry is None:
+                cache.misses += 1
+                return False
+            cache._entries.move_to_end(key)
+            cache.hits += 1
+        for metakey, value in entry.items():
+            if metakey not in annot:
+                annot[metakey] = value
+        return True
+
+    def store(cache, annot, key):
+        """ Remembers the metadata that has been computed for an annot dict """
+        stored_keys = annot.stored_keys()
+        entry = {
+            metakey: annot[metakey]
+            for metakey in VSONE_METADATA_KEYS
+            if metakey in stored_keys
+        }
+        if len(entry) == 0:
+            return
+        with cache._lock:
+            if key in cache._entries:
+                cache._entries[key].update(entry)
+                cache._entries.move_to_end(key)
+            else:
+                cache._entries[key] = entry
+            while cache.maxsize is not None and len(cache._entries) > cache.maxsize:
+                cache._entries.popitem(last=False)
+
+    def clear(cache):
+        with cache._lock:
+            cache._entries.clear()
+
+
+VSONE_METADATA_CACHE = VsoneMetadataCache()
+
+
+def _vsone_metadata_cfgstr(config):
+    """ The cached metadata only depends on the chip and feature config """
+    if hasattr(config, 'parse_items'):
+        items = dict(config.parse_items())
+    else:
+        items = dict(config)
+    cfgstr_list = []
+    for configclass in [ChipConfig, FeatConfig]:
+        subconfig = configclass()
+        subconfig.update(**items)
+        cfgstr_list.append(subconfig.get_cfgstr())
+    return '_'.join(cfgstr_list)
+
+
+def ensure_vsone_metadata(ibs, configured_lazy_annots, flann_params=None):
+    """
+    Sets up lazy vsone metadata for configured annots (see
+    make_configured_annots). Metadata in VSONE_METADATA_CACHE is reused
+    instead of recomputed.
+
+    Returns:
+        list: (annot, key) pairs to pass to store_vsone_metadata
+    """
+    if flann_params is None:
+        flann_params = VSONE_FLANN_PARAMS
+    annot_keys = []
+    for config, annot_dict in configured_lazy_annots.items():
+        aids = sorted(annot_dict.keys())
+        cfgstr = _vsone_metadata_cfgstr(config) + ut.repr2(flann_params)
+        visual_uuids = ibs.get_annot_visual_uuids(aids)
+        for aid, visual_uuid in zip(aids, visual_uuids):
+            annot = annot_dict[aid]
+            key = (cfgstr, aid, visual_uuid)
+            VSONE_METADATA_CACHE.load(annot, key)
+            vt.matching.ensure_metadata_flann(annot, flann_params)
+            vt.matching.ensure_metadata_normxy(annot)
+            annot_keys.append((annot, key))
+    return annot_keys
+
+
+def store_vsone_metadata(annot_keys):
+    for annot, key in annot_keys:
+        VSONE_METADATA_CACHE.store(annot, key)
+
+
+def _vsone_match_worker(args):
+    annot1, annot2, config = args
+    match = vt.PairwiseMatch(annot1, annot2)
+    match.apply_all(config)
+    return match
+
+
 @derived_attribute(
     tablename='pairwise_match',
     parents=['annotations', 'annotations'],
@@ -1467,25 +1630,39 @@ def compute_pairwise_vsone(depc, qaids, daids, config):
         ibs, qaids, daids, qannot_cfg, dannot_cfg, preload=True
     )
 
-    unique_lazy_annots = ut.flatten([x.values() for x in configured_lazy_annots.values()])
-
-    flann_params = {'algorithm': 'kdtree', 'trees': 4}
-    for annot in unique_lazy_annots:
-        vt.matching.ensure_metadata_flann(annot, flann_params)
-
-    for annot in unique_lazy_annots:
-        vt.matching.ensure_metadata_normxy(annot)
-        # annot['norm_xys'] = (vt.get_xys(annot['kpts']) /
-        #                      np.array(annot['chip_size'])[:, None])
-
-    for qaid, daid in ut.ProgIter(
-        zip(qaids, daids), length=len(qaids), lbl='compute vsone', bs=True, freq=1
-    ):
-        annot1 = configured_lazy_annots[qannot_cfg][qaid]
-        annot2 = configured_lazy_annots[dannot_cfg][daid]
-        match = vt.PairwiseMatch(annot1, annot2)
-        match.apply_all(config)
-        yield (match,)
+    # Reuse kd-trees and normalized keypoints of annots seen in earlier chunks
+    annot_keys = ensure_vsone_metadata(ibs, configured_lazy_annots)
+
+    args_iter = (
+        (
+            configured_lazy_annots[qannot_cfg][qaid],
+            configured_lazy_annots[dannot_cfg][daid],
+            config,
+        )
+        for qaid, daid in zip(qaids, daids)
+    )
+    num_workers = config.get('vsone_workers', 0)
+    if num_workers is not None and num_workers > 1 and len(qaids) > 1:
+        from concurrent import futures
+
+        # Evaluate shared lazy metadata before the threads use it
+        for annot, key in annot_keys:
+            for metakey in VSONE_METADATA_KEYS:
+                annot[metakey]
+        executor = futures.ThreadPoolExecutor(num_workers)
+        match_iter = executor.map(_vsone_match_worker, args_iter)
+    else:
+        executor = None
+        match_iter = map(_vsone_match_worker, args_iter)
+    try:
+        for match in ut.ProgIter(
+            match_iter, length=len(qaids), lbl='compute vsone', bs=True, freq=1
+        ):
+            yield (match,)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        store_vsone_metadata(annot_keys)
 
 
 def make_configured_annots(
@@ -2,6 +2,7 @@
 """
 implicit version of dependency cache from wbia/templates/template_generator
 """
+import importlib
 import logging
 
 import utool as ut
@@ -21,6 +22,9 @@ logger = logging.getLogger('wbia')
 PREPROC_REGISTER = defaultdict(list)
 SUBPROP_REGISTER = defaultdict(list)
 
+# tables defined by modules that are imported on first use (tablename -> modname)
+LAZY_PREPROC_REGISTER = defaultdict(dict)
+
 
 REG_PREPROC_DOC = """
 Args:
@@ -34,6 +38,15 @@ Args:
     docstr (str): (default = None)
     fname (str):  file name(default = None)
     asobject (bool): hacky dont use (default = False)
+    extern_storage (str): storage of external columns. 'file' writes a file
+        per row, 'pack' appends rows to large segment files, see
+        dtool.extern_storage (default = 'file')
+    pipelined_writes (bool): writes each computed chunk in a background thread
+        while the next chunk is computed (default = False)
+    preproc_procs (int): calls a row-wise (vectorized=False) preproc function
+        in this many forked worker processes. Rows that fail are None, with or
+        without workers. If None the --preproc-procs command line flag is used
+        (default = None)
 
 SeeAlso:
     depcache_table.DependencyCacheTable
@@ -83,6 +96,78 @@ def make_depcache_decors(root_tablename):
     return _depcdecors
 
 
+def register_lazy_preprocs(root_tablename, tablenames, modname):
+    """
+    Registers tables whose preproc functions are defined in a module that has
+    not been imported yet. Dependency caches import the module (which then
+    registers the tables as usual) the first time one of the tables is needed.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.depcache_control import *  # NOQA
+        >>> register_lazy_preprocs('dummy_root', ['lazy_table'], 'some.module')
+        >>> assert LAZY_PREPROC_REGISTER['dummy_root']['lazy_table'] == 'some.module'
+        >>> LAZY_PREPROC_REGISTER.pop('dummy_root')
+        {'lazy_table': 'some.module'}
+    """
+    for tablename in tablenames:
+        LAZY_PREPROC_REGISTER[root_tablename][tablename] = modname
+
+
+class LazyTableDict(dict):
+    """
+    Maps tablenames to tables. Once a loader is set, looking up a lazily
+    registered table or iterating over all tables calls the loader, which
+    imports the modules defining the missing tables.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LazyTableDict, self).__init__(*args, **kwargs)
+        self.loader = None
+
+    def _load(self, tablename=None):
+        if self.loader is not None:
+            self.loader(tablename)
+
+    def __missing__(self, tablename):
+        self._load(tablename)
+        if dict.__contains__(self, tablename):
+            return dict.__getitem__(self, tablename)
+        raise KeyError(tablename)
+
+    def __contains__(self, tablename):
+        if not dict.__contains__(self, tablename):
+            self._load(tablename)
+        return dict.__contains__(self, tablename)
+
+    def get(self, tablename, default=None):
+        return self[tablename] if tablename in self else default
+
+    def __iter__(self):
+        self._load()
+        return super(LazyTableDict, self).__iter__()
+
+    def __len__(self):
+        self._load()
+        return super(LazyTableDict, self).__len__()
+
+    def keys(self):
+        self._load()
+        return super(LazyTableDict, self).keys()
+
+    def values(self):
+        self._load()
+        return super(LazyTableDict, self).values()
+
+    def items(self):
+        self._load()
+        return super(LazyTableDict, self).items()
+
+
+class InjectedDepc(object):
+    pass
+
+
 class DependencyCache:
     def __init__(
         self,
@@ -110,7 +195,12 @@ class DependencyCache:
         # Parent (ibs) controller
         self.controller = controller
         # Internal dictionary of dependant tables
-        self.cachetable_dict = {}
+        self.cachetable_dict = LazyTableDict()
+        # Lazily registered tables that are not loaded yet (tablename -> modname)
+        self._lazy_tables = {}
+        # Number of global preprocs and subprops registered so far
+        self._num_global_preprocs = 0
+        self._num_global_subprops = 0
         self.configclass_dict = {}
         self.requestclass_dict = {}
         self.resultclass_dict = {}
@@ -240,8 +330,15 @@ class DependencyCache:
         #       to database controller objects.
         return self._db_by_name[name]
 
+    def close_preproc_pools(self):
+        """Shut down the preproc worker processes of all tables"""
+        # Only the loaded tables can have a pool
+        for table in dict.values(self.cachetable_dict):
+            table.close_preproc_pool()
+
     def close(self):
         """Close all managed SQL databases"""
+        self.close_preproc_pools()
         for db_inst in self._db_by_name.values():
             db_inst.close()
 
@@ -251,18 +348,49 @@ class DependencyCache:
         Creates all registered tables
         """
         if self._use_globals:
-            reg_preproc = PREPROC_REGISTER[self.root]
-            reg_subprop = SUBPROP_REGISTER[self.root]
-            logger.info(
-                '[depc.init] Registering %d global preproc funcs' % len(reg_preproc)
-            )
-            for args_, _kwargs in reg_preproc:
-                self._register_prop(*args_, **_kwargs)
-            logger.info('[depc.init] Registering %d global subprops ' % len(reg_subprop))
-            for args_, _kwargs in reg_subprop:
-                self._register_subprop(*args_, **_kwargs)
+            self._register_global_props()
+            # Tables of modules that are not imported yet are loaded on demand
+            self._lazy_tables = {
+                tablename: modname
+                for tablename, modname in LAZY_PREPROC_REGISTER[self.root].items()
+                if tablename not in self.cachetable_dict
+            }
+        table_list = list(self.cachetable_dict.values())
+
+        self._connect_dbs()
+
+        for table in table_list:
+            table.initialize()
+
+        # ??? What's the significance of 'd' and 'w'? Do the mean anything?
+        self.d = InjectedDepc()
+        self.w = InjectedDepc()
+        self._inject_table_funcs(table_list)
+        self.cachetable_dict.loader = self._load_lazy_tables
 
-        for name in self._db_by_name.keys():
+    def _register_global_props(self):
+        """
+        Registers the global preprocs and subprops that were added since the
+        last call. Returns the new tables.
+        """
+        reg_preproc = PREPROC_REGISTER[self.root][self._num_global_preprocs :]
+        reg_subprop = SUBPROP_REGISTER[self.root][self._num_global_subprops :]
+        self._num_global_preprocs += len(reg_preproc)
+        self._num_global_subprops += len(reg_subprop)
+        logger.info('[depc.init] Registering %d global preproc funcs' % len(reg_preproc))
+        table_list = []
+        for args_, _kwargs in reg_preproc:
+            table_list.append(self._register_prop(*args_, **_kwargs))
+        logger.info('[depc.init] Registering %d global subprops ' % len(reg_subprop))
+        for args_, _kwargs in reg_subprop:
+            self._register_subprop(*args_, **_kwargs)
+        return table_list
+
+    def _connect_dbs(self):
+        """ Opens the databases that registered tables need """
+        for name, db in list(self._db_by_name.items()):
+            if db is not None:
+                continue
             # FIXME (20-Oct-12020) 'smk/smk_agg_rvecs' is known to have issues.
             #       Either fix the name or find a better normalizer/slugifier.
             normalized_name = name.replace('/', '__')
@@ -272,22 +400,41 @@ class DependencyCache:
             depcache_table.ensure_config_table(db)
             self._db_by_name[name] = db
 
-        for table in self.cachetable_dict.values():
+    def _load_lazy_tables(self, tablename=None):
+        """
+        Imports the modules that define lazily registered tables and registers
+        their tables. Loads every pending module if tablename is None.
+        """
+        if tablename is None:
+            modnames = set(self._lazy_tables.values())
+        elif tablename in self._lazy_tables:
+            modnames = {self._lazy_tables[tablename]}
+        else:
+            return
+        if len(modnames) == 0:
+            return
+        self._lazy_tables = {
+            tablename_: modname
+            for tablename_, modname in self._lazy_tables.items()
+            if modname not in modnames
+        }
+        for modname in sorted(modnames):
+            logger.info('[depc] Importing %r for lazily registered tables' % (modname,))
+            importlib.import_module(modname)
+        table_list = self._register_global_props()
+        self._connect_dbs()
+        for table in table_list:
             table.initialize()
+        self._inject_table_funcs(table_list)
 
+    def _inject_table_funcs(self, table_list):
         # HACKS:
         # Define injected functions for autocomplete convinience
-        class InjectedDepc(object):
-            pass
-
-        # ??? What's the significance of 'd' and 'w'? Do the mean anything?
-        self.d = InjectedDepc()
-        self.w = InjectedDepc()
         inject_patterns = [
             ('get_{tablename}_rowids', self.get_rowids),
             ('get_{tablename}_config_history', self.get_config_history),
         ]
-        for table in self.cachetable_dict.values():
+        for table in table_list:
             wobj = InjectedDepc()
             # Set nested version
             setattr(self.w, table.tablename, wobj)
@@ -375,6 +522,7 @@ class DependencyCache:
             tablekey (str): name of the table to grab config from
             config (dict): may be overspecified or underspecfied
         """
+        self._load_lazy_tables(tablekey)
         configclass = self.configclass_dict.get(tablekey, None)
         # requestclass = self.requestclass_dict.get(tablekey, None)
         if configclass is None:
@@ -833,8 +981,6 @@ class DependencyCache:
 
         if hack_paths and not ensure and not read_extern:
             # HACK: should be able to not compute rows to get certain properties
-            from os.path import join
-
             # recompute_ = recompute or recompute_all
             parent_rowids = self.get_parent_rowids(
                 tablename,
@@ -848,12 +994,13 @@ class DependencyCache:
             config_ = self._ensure_config(tablename, config)
             logger.debug(' * (ensured) config_ = %r' % (config_,))
             table = self[tablename]
-            extern_dpath = table.extern_dpath
-            ut.ensuredir(extern_dpath)
+            ut.ensuredir(table.extern_dpath)
             fname_list = table.get_extern_fnames(
                 parent_rowids, config=config_, extern_col_index=0
             )
-            fpath_list = [join(extern_dpath, fname) for fname in fname_list]
+            # Packed data is materialized, other rows map to the extern dpath
+            extern_store = table.extern_store
+            fpath_list = [extern_store.get_fpath(fname) for fname in fname_list]
             return fpath_list
 
         if nInput is None and ut.is_listlike(root_rowids):
@@ -1554,6 +1701,28 @@ class DependencyCache:
         for table in self.cachetable_dict.values():
             table.clear_table()
 
+    def migrate_extern_storage(self, tablenames=None, remove=True, compact=False):
+        """
+        Moves the external files of tables registered with
+        ``extern_storage='pack'`` into their packs.
+
+        Returns:
+            dict: number of migrated files of each table
+        """
+        if tablenames is None:
+            tablenames = [
+                tablename
+                for tablename, table in self.cachetable_dict.items()
+                if table.extern_storage == 'pack'
+            ]
+        tablename2_num = {
+            tablename: self[tablename].migrate_extern_storage(
+                remove=remove, compact=compact
+            )
+            for tablename in tablenames
+        }
+        return tablename2_num
+
     def make_root_info_uuid(self, root_rowids, info_props):
         """
         Creates a uuid that depends on certain properties of the root object.
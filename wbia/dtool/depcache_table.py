@@ -20,10 +20,17 @@ FIXME:
 
 
 """
+import collections
 import logging
+import multiprocessing
+import os
+import queue
 import re
+import threading
+import traceback
 import itertools as it
-from os.path import join, exists
+from concurrent import futures
+from os.path import join
 
 import networkx as nx
 import six
@@ -32,6 +39,7 @@ import ubelt as ub
 from six.moves import zip, range
 
 from wbia.dtool import sqlite3 as lite
+from wbia.dtool.extern_storage import new_extern_storage
 from wbia.dtool.sql_control import SQLDatabaseController, compare_coldef_lists
 from wbia.dtool.types import TYPE_TO_SQLTYPE
 
@@ -58,6 +66,22 @@ CONFIG_DICT = 'config_dict'
 # else:
 GRACE_PERIOD = ut.get_argval('--grace', type_=int, default=0)
 
+# Threads that read and decode external columns (1 reads them serially)
+EXTERN_READ_WORKERS = ut.get_argval('--extern-read-workers', type_=int, default=8)
+
+# Reads submitted ahead of the row being consumed (per read worker)
+EXTERN_READAHEAD = 4
+
+# Computed chunks that may wait for the writer of a table with pipelined_writes
+PIPELINE_QUEUE_CHUNKS = 2
+
+# Worker processes of row-wise (vectorized=False) preproc functions of tables
+# registered without preproc_procs (0 calls them in this process)
+PREPROC_PROCS = ut.get_argval('--preproc-procs', type_=int, default=0)
+
+# Rows sent to a preproc worker at once
+PREPROC_BATCH_SIZE = 16
+
 
 class TableOutOfSyncError(Exception):
     """Raised when the code's table definition doesn't match the defition in the database"""
@@ -153,6 +177,194 @@ def make_extern_io_funcs(table, cls):
     return _read_func, _write_func
 
 
+_EXTERN_READ_EXECUTOR = None
+_EXTERN_READ_LOCK = threading.Lock()
+_EXTERN_READ_LOCAL = threading.local()
+
+
+def _init_extern_reader():
+    _EXTERN_READ_LOCAL.is_reader = True
+
+
+def _get_extern_read_executor():
+    """ The thread pool of the current process that reads external columns """
+    global _EXTERN_READ_EXECUTOR
+    pid = os.getpid()
+    with _EXTERN_READ_LOCK:
+        if _EXTERN_READ_EXECUTOR is None or _EXTERN_READ_EXECUTOR[0] != pid:
+            executor = futures.ThreadPoolExecutor(
+                EXTERN_READ_WORKERS,
+                thread_name_prefix='extern_read',
+                initializer=_init_extern_reader,
+            )
+            _EXTERN_READ_EXECUTOR = (pid, executor)
+        return _EXTERN_READ_EXECUTOR[1]
+
+
+def imap_extern_reads(func, args_iter, serial=False):
+    """
+    Calls func on each argument tuple in the extern read pool and yields the
+    results in input order. At most EXTERN_READ_WORKERS * EXTERN_READAHEAD
+    calls are in flight, so the results of a lazy args_iter are decoded just
+    ahead of the consumer. Reads are serial if requested, if there is only
+    one read worker, or if the caller is itself a read worker (e.g. a
+    read_func that reads another table).
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.depcache_table import *  # NOQA
+        >>> import time
+        >>> def slow_square(x):
+        >>>     time.sleep(.01 * (x % 3))
+        >>>     return x ** 2
+        >>> result_iter = imap_extern_reads(slow_square, ((x,) for x in range(100)))
+        >>> assert list(result_iter) == [x ** 2 for x in range(100)]
+        >>> result_iter = imap_extern_reads(slow_square, [(2,), (3,)], serial=True)
+        >>> assert list(result_iter) == [4, 9]
+    """
+    serial = (
+        serial
+        or EXTERN_READ_WORKERS <= 1
+        or getattr(_EXTERN_READ_LOCAL, 'is_reader', False)
+    )
+    if serial:
+        for args in args_iter:
+            yield func(*args)
+        return
+    executor = _get_extern_read_executor()
+    max_inflight = EXTERN_READ_WORKERS * EXTERN_READAHEAD
+    pending = collections.deque()
+    try:
+        for args in args_iter:
+            pending.append(executor.submit(func, *args))
+            if len(pending) >= max_inflight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # The consumer stopped early
+        for future in pending:
+            future.cancel()
+
+
+def _try_read_extern(extern_store, uri, read_func, read_extern, ensure):
+    """
+    Returns (True, data) or (False, exception) so failures of single reads
+    can be handled in order by the caller.
+    """
+    try:
+        if read_extern:
+            data = extern_store.read(uri, read_func)
+        else:
+            data = extern_store.get_fpath(uri)
+            if ensure:
+                ut.assertpath(data)
+    except Exception as ex:
+        return False, ex
+    return True, data
+
+
+_PREPROC_WORKER = None
+
+
+def _init_preproc_worker(table, config_):
+    """ Runs in each forked worker of a preproc pool """
+    global _PREPROC_WORKER
+    _PREPROC_WORKER = (table, config_)
+    # Pooled connections of the parent must not be used (or closed) by the
+    # workers. dispose(close=False) needs sqlalchemy 1.4.33.
+    for db in table.depc._db_by_name.values():
+        if db is not None:
+            db._engine.dispose(close=False)
+
+
+def _call_preproc_row(table, argrow, config_):
+    """ Calls a row-wise preproc function, returns None if the row fails """
+    try:
+        return table.preproc_func(table.depc, *argrow, config=config_)
+    except Exception:
+        logger.error(
+            '[deptbl.preproc] %s failed on row %r\n%s'
+            % (table.tablename, argrow, traceback.format_exc())
+        )
+        return None
+
+
+def _call_preproc_worker(argrow_list):
+    """ Calls the preproc function on each row, with None for failed rows """
+    table, config_ = _PREPROC_WORKER
+    return [_call_preproc_row(table, argrow, config_) for argrow in argrow_list]
+
+
+class _ChunkWriter(object):
+    """
+    Writes the computed chunks of a table (to external storage and SQL) in a
+    background thread while the caller computes the next chunks. The queue
+    holds at most ``maxsize`` chunks, so the caller blocks when the writes
+    fall behind. A write error is raised in the caller on its next put or
+    on close.
+    """
+
+    def __init__(self, table, colnames, config_rowid, config, maxsize):
+        self.table = table
+        self.colnames = colnames
+        self.config_rowid = config_rowid
+        # HACK extract config if given a request
+        self.config_ = config.config if hasattr(config, 'config') else config
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, name='write_' + table.tablename, daemon=True
+        )
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is None:
+                break
+            if self.error is not None:
+                # Keep draining so the caller never blocks on a full queue
+                continue
+            try:
+                self._write(*chunk)
+            except BaseException as ex:
+                self.error = ex
+
+    def _write(self, dirty_parent_ids, dirty_preproc_args, proptup_list):
+        table = self.table
+        dirty_params_iter = table.prepare_storage(
+            dirty_parent_ids,
+            proptup_list,
+            dirty_preproc_args,
+            self.config_rowid,
+            self.config_,
+        )
+        # None data means that there was an error for a specific row
+        dirty_params_iter = ut.filter_Nones(dirty_params_iter)
+        table.db._add(
+            table.tablename,
+            self.colnames,
+            dirty_params_iter,
+            nInput=len(dirty_params_iter),
+        )
+
+    def _check(self):
+        if self.error is not None:
+            raise self.error
+
+    def put(self, dirty_parent_ids, dirty_preproc_args, proptup_list):
+        self._check()
+        self.queue.put((dirty_parent_ids, dirty_preproc_args, proptup_list))
+
+    def close(self, check=True):
+        """ Waits for the queued chunks to be written """
+        self.queue.put(None)
+        self.thread.join()
+        if check:
+            self._check()
+
+
 @profile
 def ensure_config_table(db):
     """ SQL definition of configuration table. """
@@ -1024,6 +1236,31 @@ class _TableGeneralHelper(ub.NiceRepr):
         extern_dpath = join(cache_dpath, extern_dname)
         return extern_dpath
 
+    @property
+    def extern_store(self):
+        """
+        The backend that stores the data of external columns. See
+        wbia.dtool.extern_storage
+        """
+        extern_dpath = self.extern_dpath
+        if self._extern_store is None or self._extern_store[0] != extern_dpath:
+            store = new_extern_storage(self.extern_storage, extern_dpath)
+            self._extern_store = (extern_dpath, store)
+        return self._extern_store[1]
+
+    def migrate_extern_storage(self, remove=True, compact=False):
+        """
+        Moves the files of the original extern layout into the packs of a
+        table with ``extern_storage='pack'``.
+
+        Returns:
+            int: number of migrated files
+        """
+        from wbia.dtool.extern_storage import migrate_extern_dpath
+
+        assert self.extern_storage == 'pack', 'only pack storage can be migrated to'
+        return migrate_extern_dpath(self.extern_dpath, remove=remove, compact=compact)
+
     @property
     def dpath(self):
         # assert table.ismulti, 'only valid for models'
@@ -1558,6 +1795,7 @@ class _TableComputeHelper(object):
         # get extern cache directory and fpaths
         extern_dpath = self.extern_dpath
         ut.ensuredir(extern_dpath)
+        extern_store = self.extern_store
         # extern_fpaths_list = [
         #     [join(extern_dpath, fname) for fname in fnames]
         #     for fnames in extern_fnames_list
@@ -1577,10 +1815,7 @@ class _TableComputeHelper(object):
             try:
                 _iter = zip(extern_data, extern_fpaths, extern_writers)
                 for obj, fpath, write_func in _iter:
-                    abs_fpath = join(extern_dpath, fpath)
-                    # logger.info('WRITE fpath = %r, abs_fpath = %r' % (fpath, abs_fpath, ))
-                    write_func(abs_fpath, obj)
-                    ut.assert_exists(abs_fpath, verbose=False)
+                    extern_store.write(fpath, obj, write_func)
             except Exception as ex:
                 ut.printex(ex, 'external write', keys=['config_rowid', 'data'])
                 raise
@@ -1667,13 +1902,10 @@ class _TableComputeHelper(object):
         ]
         return fname_list
 
-    def _compute_dirty_rows(
-        self, dirty_parent_ids, dirty_preproc_args, config_rowid, config, verbose=True
-    ):
+    def _compute_dirty_proptups(self, dirty_parent_ids, dirty_preproc_args, config):
         """
-        dirty_preproc_args = preproc_args
-        dirty_parent_ids = parent_rowids
-        config_ = config
+        Calls the preproc function and returns the list of its outputs (one
+        tuple per row, or None if the row failed)
         """
         nInput = len(dirty_parent_ids)
         # if verbose:
@@ -1693,52 +1925,165 @@ class _TableComputeHelper(object):
             proptup_gen = self.preproc_func(self.depc, *argsT, config=config_)
         else:
             # Function is written in a way that only accepts a single row of
-            # input at a time
-            proptup_gen = (
-                self.preproc_func(self.depc, *argrow, config=config_)
-                for argrow in zip(*argsT)
-            )
+            # input at a time. A row that fails is None in both modes.
+            num_procs = self._get_preproc_procs()
+            if num_procs > 0:
+                argrow_list = list(zip(*argsT))
+                proptup_gen = self._imap_preproc_procs(argrow_list, config_, num_procs)
+            else:
+                proptup_gen = (
+                    _call_preproc_row(self, argrow, config_) for argrow in zip(*argsT)
+                )
 
-        DEBUG_LIST_MODE = True
-        if DEBUG_LIST_MODE:
-            proptup_gen = list(proptup_gen)
-            num_output = len(proptup_gen)
-            assert (
-                num_output == nInput
-            ), 'Input and output sizes do not agree. ' 'num_output=%r, num_input=%r' % (
-                num_output,
-                nInput,
-            )
+        proptup_list = list(proptup_gen)
+        num_output = len(proptup_list)
+        assert (
+            num_output == nInput
+        ), 'Input and output sizes do not agree. ' 'num_output=%r, num_input=%r' % (
+            num_output,
+            nInput,
+        )
+        return proptup_list
+
+    def _compute_dirty_rows(
+        self, dirty_parent_ids, dirty_preproc_args, config_rowid, config, verbose=True
+    ):
+        """
+        dirty_preproc_args = preproc_args
+        dirty_parent_ids = parent_rowids
+        config_ = config
+        """
+        nInput = len(dirty_parent_ids)
+        proptup_gen = self._compute_dirty_proptups(
+            dirty_parent_ids, dirty_preproc_args, config
+        )
+        # HACK extract config if given a request
+        config_ = config.config if hasattr(config, 'config') else config
         # Append rowids and rectify nested and external columns
         dirty_params_iter = self.prepare_storage(
             dirty_parent_ids, proptup_gen, dirty_preproc_args, config_rowid, config_
         )
+        DEBUG_LIST_MODE = True
         if DEBUG_LIST_MODE:
             dirty_params_iter = list(dirty_params_iter)
             assert len(dirty_params_iter) == nInput
         # None data means that there was an error for a specific row
         return dirty_params_iter
 
-    def _chunk_compute_dirty_rows(
-        self, dirty_parent_ids, dirty_preproc_args, config_rowid, config, verbose=True
-    ):
-        """
-        Executes registered functions, does external storage and yeilds results
-        to be stored internally in SQL.
+    def _get_preproc_procs(self):
+        """ Number of worker processes for the row-wise preproc function """
+        num_procs = PREPROC_PROCS if self.preproc_procs is None else self.preproc_procs
+        if num_procs > 0:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                return 0
+            if self._db_is_in_memory():
+                # The workers would only see a snapshot of the database
+                return 0
+        return num_procs
+
+    def _get_preproc_pool(self, config_, num_procs):
+        """
+        Returns the persistent worker pool of the preproc function. The
+        workers are forked with the table and config, so neither has to be
+        pickled, and the pool is replaced when the config changes.
+        """
+        if hasattr(config_, 'get_cfgstr'):
+            cfgstr = config_.get_cfgstr()
+        else:
+            cfgstr = ut.repr2(config_)
+        key = (cfgstr, num_procs)
+        if self._preproc_pool is None or self._preproc_pool[0] != key:
+            self.close_preproc_pool()
+            executor = futures.ProcessPoolExecutor(
+                num_procs,
+                mp_context=multiprocessing.get_context('fork'),
+                initializer=_init_preproc_worker,
+                initargs=(self, config_),
+            )
+            self._preproc_pool = (key, executor)
+        return self._preproc_pool[1]
 
-        CommandLine:
-            python -m dtool.depcache_table _chunk_compute_dirty_rows
+    def close_preproc_pool(self):
+        if self._preproc_pool is not None:
+            self._preproc_pool[1].shutdown(wait=True)
+            self._preproc_pool = None
 
-        Example:
-            >>> # ENABLE_DOCTEST
-            >>> from wbia.dtool.depcache_table import *  # NOQA
-            >>> from wbia.dtool.example_depcache2 import *  # NOQA
-            >>> depc = testdata_depc3(in_memory=False)
-            >>> depc.clear_all()
-            >>> data = depc.get('labeler', [1, 2, 3], 'data')
-            >>> data = depc.get('indexer', [[1, 2, 3]], 'data')
-            >>> depc.print_all_tables()
+    def _discard_preproc_pool(self):
+        """ Drops a pool whose worker crashed, the next call forks a new one """
+        if self._preproc_pool is not None:
+            self._preproc_pool[1].shutdown(wait=False)
+            self._preproc_pool = None
+
+    def _call_preproc_isolated(self, batch, config_, num_procs):
         """
+        Calls the preproc function on a batch that is the only task of the
+        pool. If a worker crashes, the rows are retried one by one and only
+        the rows that crash are None.
+        """
+        executor = self._get_preproc_pool(config_, num_procs)
+        try:
+            return executor.submit(_call_preproc_worker, batch).result()
+        except futures.BrokenExecutor:
+            self._discard_preproc_pool()
+            if len(batch) == 1:
+                logger.error(
+                    '[deptbl.preproc] %s worker crashed on row %r'
+                    % (self.tablename, batch[0])
+                )
+                return [None]
+        return [
+            self._call_preproc_isolated([argrow], config_, num_procs)[0]
+            for argrow in batch
+        ]
+
+    def _imap_preproc_procs(self, argrow_list, config_, num_procs):
+        """
+        Calls the row-wise preproc function in worker processes and yields
+        the results in input order. Failed rows and rows that crash a worker
+        are None.
+
+        Only ``2 * num_procs`` batches are in flight. When a worker crashes,
+        the in flight batches that did not finish are rerun one at a time in
+        a new pool to find the crashing rows, then the remaining batches run
+        in parallel again.
+        """
+        batch_size = max(1, min(PREPROC_BATCH_SIZE, len(argrow_list) // (num_procs * 4)))
+        batch_iter = ut.ichunks(argrow_list, batch_size)
+        inflight = collections.deque()
+        while True:
+            for batch in it.islice(batch_iter, 2 * num_procs - len(inflight)):
+                executor = self._get_preproc_pool(config_, num_procs)
+                inflight.append((batch, executor.submit(_call_preproc_worker, batch)))
+            if len(inflight) == 0:
+                break
+            batch, future = inflight.popleft()
+            try:
+                proptup_list = future.result()
+            except futures.BrokenExecutor:
+                logger.error('[deptbl.preproc] %s worker crashed' % (self.tablename,))
+                self._discard_preproc_pool()
+                inflight.appendleft((batch, future))
+                while inflight:
+                    batch, future = inflight.popleft()
+                    if future.exception() is None:
+                        proptup_list = future.result()
+                    else:
+                        proptup_list = self._call_preproc_isolated(
+                            batch, config_, num_procs
+                        )
+                    for proptup in proptup_list:
+                        yield proptup
+                continue
+            for proptup in proptup_list:
+                yield proptup
+
+    def _db_is_in_memory(self):
+        # Each thread has its own in-memory SQLite database
+        database = self.db._engine.url.database
+        return self.db.is_using_sqlite and database in {None, '', ':memory:'}
+
+    def _dirty_chunk_iter(self, dirty_parent_ids, dirty_preproc_args):
+        """ Chunks the dirty rows and reports the progress of each chunk """
         nInput = len(dirty_parent_ids)
         chunksize = nInput if self.chunksize is None else self.chunksize
 
@@ -1756,6 +2101,29 @@ class _TableComputeHelper(object):
             nInput,
             lbl='[deptbl.compute] add %s chunk' % (self.tablename),
         )
+        return prog_iter
+
+    def _chunk_compute_dirty_rows(
+        self, dirty_parent_ids, dirty_preproc_args, config_rowid, config, verbose=True
+    ):
+        """
+        Executes registered functions, does external storage and yeilds results
+        to be stored internally in SQL.
+
+        CommandLine:
+            python -m dtool.depcache_table _chunk_compute_dirty_rows
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.depcache_table import *  # NOQA
+            >>> from wbia.dtool.example_depcache2 import *  # NOQA
+            >>> depc = testdata_depc3(in_memory=False)
+            >>> depc.clear_all()
+            >>> data = depc.get('labeler', [1, 2, 3], 'data')
+            >>> data = depc.get('indexer', [[1, 2, 3]], 'data')
+            >>> depc.print_all_tables()
+        """
+        prog_iter = self._dirty_chunk_iter(dirty_parent_ids, dirty_preproc_args)
         # These are the colnames that we expect to be computed
         colnames = self.computable_colnames()
         # CALL EXTERNAL PREPROCESSING / GENERATION FUNCTION
@@ -1800,6 +2168,41 @@ class _TableComputeHelper(object):
             )
             raise
 
+    def _pipelined_compute_dirty_rows(
+        self, dirty_parent_ids, dirty_preproc_args, config_rowid, config
+    ):
+        """
+        Computes and stores the dirty rows like _chunk_compute_dirty_rows,
+        but chunk N is written to external storage and SQL in a background
+        thread while chunk N + 1 is computed. At most PIPELINE_QUEUE_CHUNKS
+        computed chunks wait for the writer. The preproc function always runs
+        in the calling thread. Chunks computed before an error are written.
+        """
+        prog_iter = self._dirty_chunk_iter(dirty_parent_ids, dirty_preproc_args)
+        colnames = self.computable_colnames()
+        writer = _ChunkWriter(
+            self, colnames, config_rowid, config, maxsize=PIPELINE_QUEUE_CHUNKS
+        )
+        try:
+            for dirty_chunk in prog_iter:
+                if len(dirty_chunk) == 0:
+                    break
+                dirty_parent_ids_chunk, dirty_preproc_args_chunk = zip(*dirty_chunk)
+                proptup_list = self._compute_dirty_proptups(
+                    dirty_parent_ids_chunk, dirty_preproc_args_chunk, config
+                )
+                writer.put(dirty_parent_ids_chunk, dirty_preproc_args_chunk, proptup_list)
+        except BaseException as ex:
+            writer.close(check=False)
+            ut.printex(
+                ex,
+                'error in pipelined add_rowids',
+                keys=['config', 'config_rowid', 'self.preproc_func'],
+                tb=True,
+            )
+            raise
+        writer.close()
+
 
 @ut.reloadable_class
 class DependencyCacheTable(
@@ -1866,6 +2269,9 @@ class DependencyCacheTable(
         rm_extern_on_delete=False,
         vectorized=True,
         taggable=False,
+        extern_storage='file',
+        pipelined_writes=False,
+        preproc_procs=None,
     ):
         """
         recieves kwargs from depc._register_prop
@@ -1904,6 +2310,11 @@ class DependencyCacheTable(
         # SQL Internals
         self.sqldb_fpath = None
         self.rm_extern_on_delete = rm_extern_on_delete
+        self.extern_storage = extern_storage
+        self._extern_store = None
+        self.pipelined_writes = pipelined_writes
+        self.preproc_procs = preproc_procs
+        self._preproc_pool = None
         # Update internals
         self.parent_col_attrs = self._infer_parentcol()
         self.data_col_attrs = self._infer_datacol()
@@ -1933,6 +2344,9 @@ class DependencyCacheTable(
         rm_extern_on_delete=False,
         vectorized=True,
         taggable=False,
+        extern_storage='file',
+        pipelined_writes=False,
+        preproc_procs=None,
     ):
         """Build the instance based on a database and table name."""
         self = cls.__new__(cls)
@@ -1968,6 +2382,14 @@ class DependencyCacheTable(
         self.taggable = taggable
         #: Flag to enable the deletion of external files on associated SQL row deletion.
         self.rm_extern_on_delete = rm_extern_on_delete
+        #: Storage backend of external columns ('file' or 'pack')
+        self.extern_storage = extern_storage
+        self._extern_store = None
+        #: Flag to write computed chunks while the next chunk is computed
+        self.pipelined_writes = pipelined_writes
+        #: Worker processes of a row-wise preproc_func (None uses PREPROC_PROCS)
+        self.preproc_procs = preproc_procs
+        self._preproc_pool = None
 
         # XXX (20-Oct-12020) It's not clear if these attributes are absolutely necessary.
         # Update internals
@@ -2167,19 +2589,24 @@ class DependencyCacheTable(
 
                 # Gives the function a hacky cache to use between chunks
                 self._hack_chunk_cache = {}
-                gen = self._chunk_compute_dirty_rows(
-                    dirty_parent_ids, dirty_preproc_args, config_rowid, config
-                )
-                """
-                colnames, dirty_params_iter, nChunkInput = next(gen)
-                """
-                for colnames, dirty_params_iter, nChunkInput in gen:
-                    self.db._add(
-                        self.tablename,
-                        colnames,
-                        dirty_params_iter,
-                        nInput=nChunkInput,
+                if self.pipelined_writes and not self._db_is_in_memory():
+                    self._pipelined_compute_dirty_rows(
+                        dirty_parent_ids, dirty_preproc_args, config_rowid, config
+                    )
+                else:
+                    gen = self._chunk_compute_dirty_rows(
+                        dirty_parent_ids, dirty_preproc_args, config_rowid, config
                     )
+                    """
+                    colnames, dirty_params_iter, nChunkInput = next(gen)
+                    """
+                    for colnames, dirty_params_iter, nChunkInput in gen:
+                        self.db._add(
+                            self.tablename,
+                            colnames,
+                            dirty_params_iter,
+                            nInput=nChunkInput,
+                        )
 
                 # Remove cache when main add is done
                 self._hack_chunk_cache = None
@@ -2523,21 +2950,25 @@ class DependencyCacheTable(
                 eager=True,
                 keepwrap=False,
             )
-            absuris = []
+            flat_uris = []
             for uri in it.chain.from_iterable(uris):
                 if not isinstance(uri, tuple):
                     uri = [uri]
-                for uri_ in uri:
-                    absuris.append(join(self.extern_dpath, uri_))
-            fpaths = [fpath for fpath in absuris if exists(fpath)]
+                flat_uris.extend(uri)
+            extern_store = self.extern_store
+            existing_uris = [uri_ for uri_ in flat_uris if extern_store.exists(uri_)]
             if delete_extern:
-                if ut.VERBOSE or len(fpaths) > 0:
-                    logger.info('deleting {} existing internal files'.format(len(fpaths)))
+                if ut.VERBOSE or len(existing_uris) > 0:
+                    logger.info(
+                        'deleting {} existing internal files'.format(len(existing_uris))
+                    )
                 if not dry:
-                    ut.remove_fpaths(fpaths, verbose=verbose)
+                    extern_store.delete(existing_uris, verbose=verbose)
             else:
-                if ut.VERBOSE or len(fpaths) > 0:
-                    logger.info('Leaving {} dangling filepaths'.format(len(fpaths)))
+                if ut.VERBOSE or len(existing_uris) > 0:
+                    logger.info(
+                        'Leaving {} dangling filepaths'.format(len(existing_uris))
+                    )
 
         # DELETE EXPLICITLY DEFINED CHILDREN
         # (TODO: handle implicit definitions)
@@ -2645,6 +3076,10 @@ class DependencyCacheTable(
         FIXME: unpacking is confusing with sql controller
         TODO: Clean up and allow for eager=False
 
+        External columns are read and decoded in a thread pool (see
+        imap_extern_reads). If eager=False a generator yields the rows as they
+        are decoded.
+
         colnames = ('mask', 'size')
 
         CommandLine:
@@ -2767,30 +3202,44 @@ class DependencyCacheTable(
         if nInput > 0 and len(nonNone_tbl_rowids) > 0:
             if generator_version:
 
+                extern_store = self.extern_store
+
+                def _resolve_row(rowid, rawprop):
+                    if rawprop is None:
+                        raise Exception(
+                            'raw prop was None, but it should always be a tuple. '
+                            'This may indicate that the cache needs to be cleared'
+                        )
+                    exprop = list(rawprop)
+                    # Modify prop with external data
+                    for extern_colx, read_func in extern_resolve_tups:
+                        uri = exprop[extern_colx]
+                        flag, data = _try_read_extern(
+                            extern_store, uri, read_func, read_extern, ensure
+                        )
+                        if not flag:
+                            return rowid, rawprop, False, data
+                        exprop[extern_colx] = data
+                    # nestprop = ut.unflat_take(exprop, nesting_xs)
+                    nestprop = tup_unflat_take(exprop, nesting_xs)
+                    return rowid, rawprop, True, nestprop
+
                 def _generator_resolve_all():
-                    extern_dpath = self.extern_dpath
-                    for rawprop in raw_prop_list:
-                        if rawprop is None:
-                            raise Exception(
-                                'raw prop was None, but it should always be a tuple. '
-                                'This may indicate that the cache needs to be cleared'
+                    # Rows are read and decoded ahead of the consumer
+                    row_iter = zip(nonNone_tbl_rowids, raw_prop_list)
+                    for rowid, rawprop, flag, result in imap_extern_reads(
+                        _resolve_row, row_iter
+                    ):
+                        if not flag and num_retries > 0 and delete_on_fail:
+                            logger.info(
+                                'Failed to read row %r of %s. Recomputing'
+                                % (rowid, self.tablename)
                             )
-
-                        exprop = list(rawprop)
-                        # Modify prop with external data
-                        for extern_colx, read_func in extern_resolve_tups:
-                            uri = exprop[extern_colx]
-                            uri_full = join(extern_dpath, uri)
-                            if read_extern:
-                                data = read_func(uri_full)
-                            else:
-                                data = uri_full
-                                if ensure:
-                                    ut.assertpath(uri_full)
-                            exprop[extern_colx] = data
-                        # nestprop = ut.unflat_take(exprop, nesting_xs)
-                        nestprop = tup_unflat_take(exprop, nesting_xs)
-                        yield nestprop
+                            self._recompute_external_storage([rowid])
+                            rowid, rawprop, flag, result = _resolve_row(rowid, rawprop)
+                        if not flag:
+                            raise result
+                        yield result
 
                 prop_gen = _generator_resolve_all()
                 if unpack_columns:
@@ -2853,7 +3302,7 @@ class DependencyCacheTable(
     ):
         ####
         # Read data specified by any external columns
-        extern_dpath = self.extern_dpath
+        extern_store = self.extern_store
         try:
             prop_listT = list(zip(*raw_prop_list))
         except TypeError as ex:
@@ -2864,16 +3313,16 @@ class DependencyCacheTable(
             logger.debug('[deptbl.get_row_data] read_func = %r' % (read_func,))
             data_list = []
             failed_list = []
-            for uri in prop_listT[extern_colx]:
-                uri_full = join(extern_dpath, uri)
-                try:
-                    if read_extern:
-                        data = read_func(uri_full)
-                    else:
-                        if ensure:
-                            ut.assertpath(uri_full)
-                        data = uri_full
-                except Exception as ex:
+            uri_list = prop_listT[extern_colx]
+            # Paths of the original layout do not need to be read
+            serial = not read_extern and extern_store.storage_type == 'file'
+            args_iter = (
+                (extern_store, uri, read_func, read_extern, ensure) for uri in uri_list
+            )
+            result_iter = imap_extern_reads(_try_read_extern, args_iter, serial=serial)
+            for uri, (flag, data) in zip(uri_list, result_iter):
+                if not flag:
+                    ex = data
                     ut.printex(
                         ex,
                         'failed to load external data',
@@ -2881,13 +3330,13 @@ class DependencyCacheTable(
                         keys=[
                             'tries_left',
                             'uri',
-                            'uri_full',
-                            (exists, 'uri_full'),
+                            'extern_store',
+                            (extern_store.exists, 'uri'),
                             'read_func',
                         ],
                     )
                     if tries_left == 0:
-                        raise
+                        raise ex
                     failed_list.append(True)
                     data = None
                 else:
@@ -2938,7 +3387,7 @@ class DependencyCacheTable(
                 parent_ids, parent_args, config_rowid=cfgid, config=config
             )
             # Evaulate just to ensure storage
-            ut.evaluate_generator(dirty_params_iter)
+            collections.deque(dirty_params_iter, maxlen=0)
 
     def _recompute_and_store(self, tbl_rowids, config=None):
         """
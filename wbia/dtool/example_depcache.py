@@ -225,6 +225,28 @@ class DummyVsOneMatch(dtool.AlgoResult, ut.NiceRepr):
         return '(%d-vs-%d) %.2f' % (self.qaid, self.daid, self.score)
 
 
+def testdata_rowid_depc(cache_dpath, root):
+    """
+    Returns an empty dependency cache in cache_dpath whose root rowids are
+    integers with uuid.UUID(int=rowid) as their uuids. Register the tables and
+    then call initialize.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.example_depcache import *  # NOQA
+        >>> import tempfile
+        >>> with tempfile.TemporaryDirectory() as dpath:
+        >>>     depc = testdata_rowid_depc(dpath, 'rowid_root')
+        >>>     depc.initialize()
+        >>>     assert depc.get_root_uuid([1]) == [uuid.UUID(int=1)]
+    """
+
+    def get_root_uuid(rowid_list):
+        return [uuid.UUID(int=rowid) for rowid in rowid_list]
+
+    return dtool.DependencyCache(DummyController(cache_dpath), root, get_root_uuid)
+
+
 def testdata_depc(fname=None):
     """
     Example of local registration
@@ -767,3 +789,55 @@ def dummy_example_depcacahe():
     )
 
     return depc
+
+
+def benchmark_preproc_procs(num_rows=64, num_procs=4, num_iters=200000):
+    """
+    Compares a row-wise (vectorized=False) preproc function that is called in
+    process with the same function called by a pool of worker processes.
+
+    CommandLine:
+        python -c "from wbia.dtool.example_depcache import *; benchmark_preproc_procs()"
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.example_depcache import *  # NOQA
+        >>> timings = benchmark_preproc_procs(num_rows=8, num_procs=2, num_iters=100)
+        >>> assert set(timings.keys()) == {'in_process', 'procs=2'}
+    """
+    import tempfile
+
+    def compute_checksum(depc, rowid, config=None):
+        # Pure python work that holds the GIL
+        checksum = rowid
+        for count in range(config['num_iters']):
+            checksum = (checksum * 31 + count) % 1000003
+        return (checksum,)
+
+    rowid_list = list(range(1, num_rows + 1))
+    timings = {}
+    results = {}
+    with tempfile.TemporaryDirectory() as dpath:
+        modes = [('in_process', 0), ('procs=%d' % num_procs, num_procs)]
+        for key, preproc_procs in modes:
+            depc = testdata_rowid_depc(join(dpath, key), 'bench_root')
+            depc.register_preproc(
+                'checksum',
+                ['bench_root'],
+                ['checksum'],
+                [int],
+                configclass={'num_iters': num_iters},
+                vectorized=False,
+                preproc_procs=preproc_procs,
+            )(compute_checksum)
+            depc.initialize()
+            with ut.Timer(verbose=False) as timer:
+                results[key] = depc.get('checksum', rowid_list)
+            timings[key] = timer.ellapsed
+            depc['checksum'].close_preproc_pool()
+    assert ut.allsame(list(results.values())), 'results disagree'
+    print(
+        'depc.get of %d rows (num_iters=%d): %s'
+        % (num_rows, num_iters, ut.repr2(timings, precision=4))
+    )
+    return timings
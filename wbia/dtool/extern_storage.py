@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""
+Storage backends for the external columns of depcache tables.
+
+A table writes the data of an external column with the ``write_func`` of the
+column, stores the file name (the uri) in SQL, and later reads it back with
+the ``read_func`` of the column. Both functions work on file paths.
+
+``FileExternStorage`` is the original layout: one file per uri in the extern
+directory of the table.
+
+``PackExternStorage`` appends the bytes written by ``write_func`` to large
+segment files and keeps the (segment, offset, length) of each uri in an
+SQLite index in WAL mode. Readers never block writers, and writers (threads
+or processes) serialize on the index write lock. Each blob is staged in a
+scratch file (in ``/dev/shm`` when available) so the read and write functions
+keep their path based contract. Callers that need a path to a blob get a copy
+in a size bounded cache of materialized blobs. Deleted blobs are reclaimed by
+``compact``, and uris that are not in the index are read from the extern
+directory of the original layout, which :func:`migrate_extern_dpath` moves into
+the packs.
+
+CommandLine:
+    python -m wbia.dtool.extern_storage --allexamples
+    wbia-migrate-extern-storage --db-dir <dbdir> --table chips
+"""
+import atexit
+import contextlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import uuid
+from os.path import join, exists, isdir, basename
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+EXTERN_STORAGE_TYPES = ('file', 'pack')
+
+# Suffix of the pack directory of an extern directory
+PACK_DPATH_SUFFIX = '_pack'
+
+PACK_INDEX_FILENAME = 'index.sqlite3'
+
+# A new segment is started once the current one would exceed this size
+PACK_SEGMENT_BYTES = 2 ** 30
+
+# Seconds a writer waits on the index write lock before giving up
+PACK_TIMEOUT = 600
+
+# Segments with at least this fraction of deleted bytes are rewritten by compact
+PACK_COMPACT_RATIO = 0.5
+
+# The least recently used materialized blobs are removed once they take more
+# than this many bytes
+PACK_MATERIALIZED_BYTES = 2 ** 30
+
+PACK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    uri TEXT PRIMARY KEY NOT NULL,
+    segment INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    length INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    segment INTEGER PRIMARY KEY NOT NULL,
+    nbytes INTEGER NOT NULL DEFAULT 0,
+    dead_bytes INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+_SCRATCH_DPATH = None
+_SCRATCH_LOCK = threading.Lock()
+
+
+def get_scratch_dpath():
+    """
+    Returns a process specific directory for staging blobs. It lives in
+    ``/dev/shm`` when that is available so staging does not touch the disk.
+    """
+    global _SCRATCH_DPATH
+    with _SCRATCH_LOCK:
+        if _SCRATCH_DPATH is None or not exists(_SCRATCH_DPATH):
+            shm_dpath = '/dev/shm'
+            if not (isdir(shm_dpath) and os.access(shm_dpath, os.W_OK)):
+                shm_dpath = None
+            _SCRATCH_DPATH = tempfile.mkdtemp(prefix='wbia_extern_', dir=shm_dpath)
+            atexit.register(shutil.rmtree, _SCRATCH_DPATH, True)
+        return _SCRATCH_DPATH
+
+
+@contextlib.contextmanager
+def _scratch_fpath(uri):
+    """ A unique scratch path with the same name (and extension) as the uri """
+    fpath = join(get_scratch_dpath(), uuid.uuid4().hex[0:8] + '_' + basename(uri))
+    try:
+        yield fpath
+    finally:
+        if exists(fpath):
+            os.remove(fpath)
+
+
+def _read_bytes(fpath):
+    with open(fpath, 'rb') as file_:
+        return file_.read()
+
+
+def _write_bytes_atomic(fpath, data):
+    tmp_fpath = fpath + '.tmp.' + uuid.uuid4().hex[0:8]
+    with open(tmp_fpath, 'wb') as file_:
+        file_.write(data)
+    os.replace(tmp_fpath, fpath)
+
+
+def get_pack_dpath(extern_dpath):
+    return extern_dpath + PACK_DPATH_SUFFIX
+
+
+def new_extern_storage(storage_type, extern_dpath):
+    """
+    Args:
+        storage_type (str): one of EXTERN_STORAGE_TYPES
+        extern_dpath (str): extern directory of the table
+
+    Returns:
+        FileExternStorage or PackExternStorage
+    """
+    if storage_type == 'file':
+        return FileExternStorage(extern_dpath)
+    elif storage_type == 'pack':
+        pack_dpath = get_pack_dpath(extern_dpath)
+        return PackExternStorage(pack_dpath, fallback_dpath=extern_dpath)
+    else:
+        raise ValueError(
+            'extern_storage=%r must be one of %r' % (storage_type, EXTERN_STORAGE_TYPES)
+        )
+
+
+class FileExternStorage(ut.NiceRepr):
+    """
+    Stores each uri as a file in a flat directory.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.extern_storage import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'extern_file')
+        >>> ut.delete(dpath, verbose=False)
+        >>> ut.ensuredir(dpath)
+        >>> store = FileExternStorage(dpath)
+        >>> store.write('a.txt', 'spam', ut.writeto)
+        >>> assert store.exists('a.txt') and not store.exists('b.txt')
+        >>> assert store.read('a.txt', ut.readfrom) == 'spam'
+        >>> assert store.get_fpath('a.txt') == join(dpath, 'a.txt')
+        >>> assert store.delete(['a.txt', 'b.txt']) == 1
+        >>> assert not store.exists('a.txt')
+    """
+
+    storage_type = 'file'
+
+    def __init__(store, dpath):
+        store.dpath = dpath
+
+    def __nice__(store):
+        return store.dpath
+
+    def write(store, uri, obj, write_func):
+        fpath = join(store.dpath, uri)
+        write_func(fpath, obj)
+        ut.assert_exists(fpath, verbose=False)
+
+    def read(store, uri, read_func):
+        return read_func(join(store.dpath, uri))
+
+    def get_fpath(store, uri):
+        return join(store.dpath, uri)
+
+    def exists(store, uri):
+        return exists(join(store.dpath, uri))
+
+    def delete(store, uris, verbose=False):
+        """ Returns the number of uris that existed """
+        fpaths = [join(store.dpath, uri) for uri in uris]
+        fpaths = [fpath for fpath in fpaths if exists(fpath)]
+        ut.remove_fpaths(fpaths, verbose=verbose)
+        return len(fpaths)
+
+
+class PackExternStorage(ut.NiceRepr):
+    """
+    Stores uris as blobs appended to large segment files.
+
+    Each thread (and each forked process) lazily opens its own connection to
+    the index. Appends hold the index write lock from the moment the offset is
+    chosen until the index is committed, so the segment files are only ever
+    appended to by one writer and readers only see fully written blobs. A
+    blob that is written again leaves its old bytes behind as dead bytes.
+
+    Args:
+        dpath (str): directory of the segments and the index
+        fallback_dpath (str): directory of the original layout, which is used
+            for uris that are not in the index (default = None)
+        segment_bytes (int): size at which a new segment is started
+        materialized_bytes (int): size of the cache of materialized blobs
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.extern_storage import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'extern_pack')
+        >>> ut.delete(dpath, verbose=False)
+        >>> store = PackExternStorage(dpath, segment_bytes=10)
+        >>> store.write('a.txt', 'spam', ut.writeto)
+        >>> store.write('b.txt', 'eggs', ut.writeto)
+        >>> store.write('c.txt', 'ham', ut.writeto)
+        >>> assert store.read('b.txt', ut.readfrom) == 'eggs'
+        >>> assert ut.readfrom(store.get_fpath('c.txt')) == 'ham'
+        >>> assert store.exists('a.txt') and not store.exists('d.txt')
+        >>> assert store.delete(['a.txt', 'd.txt']) == 1
+        >>> stats = store.get_stats()
+        >>> assert stats == {'num_blobs': 2, 'num_segments': 2, 'nbytes': 11,
+        >>>                  'dead_bytes': 4, 'num_materialized': 1,
+        >>>                  'materialized_bytes': 3}
+        >>> assert store.compact() == 1
+        >>> stats = store.get_stats()
+        >>> assert stats == {'num_blobs': 2, 'num_segments': 1, 'nbytes': 7,
+        >>>                  'dead_bytes': 0, 'num_materialized': 0,
+        >>>                  'materialized_bytes': 0}
+        >>> assert store.read('b.txt', ut.readfrom) == 'eggs'
+        >>> assert store.read('c.txt', ut.readfrom) == 'ham'
+    """
+
+    storage_type = 'pack'
+
+    def __init__(
+        store,
+        dpath,
+        fallback_dpath=None,
+        segment_bytes=PACK_SEGMENT_BYTES,
+        timeout=PACK_TIMEOUT,
+        materialized_bytes=PACK_MATERIALIZED_BYTES,
+    ):
+        store.dpath = dpath
+        store.fallback_dpath = fallback_dpath
+        store.segment_bytes = segment_bytes
+        store.timeout = timeout
+        store.index_fpath = join(dpath, PACK_INDEX_FILENAME)
+        store.materialized_dpath = join(dpath, 'materialized')
+        store.materialized_bytes = materialized_bytes
+        # Estimate of the size of the materialized blobs, None until scanned
+        store._materialized_nbytes = None
+        store._materialized_lock = threading.Lock()
+        store._local = threading.local()
+        store._init_lock = threading.Lock()
+        store._initialized = False
+
+    def __nice__(store):
+        return store.dpath
+
+    @property
+    def connection(store):
+        """ The index connection for the current thread and process """
+        pid = os.getpid()
+        local = store._local
+        if getattr(local, 'pid', None) != pid:
+            local.connection = store._connect()
+            local.pid = pid
+        return local.connection
+
+    def _connect(store):
+        ut.ensuredir(store.dpath)
+        # isolation_level=None gives explicit control over transactions
+        connection = sqlite3.connect(
+            store.index_fpath, timeout=store.timeout, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=%d' % (int(store.timeout * 1000),))
+        with store._init_lock:
+            if not store._initialized:
+                connection.executescript(PACK_SCHEMA)
+                store._initialized = True
+        return connection
+
+    @contextlib.contextmanager
+    def _write_transaction(store):
+        """
+        Takes the index write lock up front, so concurrent writers queue on
+        SQLite's busy handler.
+        """
+        connection = store.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        else:
+            connection.execute('COMMIT')
+
+    def get_segment_fpath(store, segment):
+        return join(store.dpath, 'segment_%06d.pack' % (segment,))
+
+    def lookup(store, uri):
+        """ Returns the (segment, offset, length) of a uri or None """
+        return store.connection.execute(
+            'SELECT segment, offset, length FROM blobs WHERE uri=?', (uri,)
+        ).fetchone()
+
+    def _append(store, connection, uri, data):
+        """ Appends a blob within a write transaction """
+        row = connection.execute(
+            'SELECT segment, nbytes FROM segments ORDER BY segment DESC LIMIT 1'
+        ).fetchone()
+        if row is None:
+            segment, offset = 0, 0
+        else:
+            segment, offset = row
+            if offset > 0 and offset + len(data) > store.segment_bytes:
+                segment, offset = segment + 1, 0
+        if offset == 0:
+            connection.execute(
+                'INSERT OR IGNORE INTO segments (segment) VALUES (?)', (segment,)
+            )
+        # The offset comes from the index, so the bytes of an append that
+        # failed before its commit are simply overwritten.
+        fd = os.open(store.get_segment_fpath(segment), os.O_WRONLY | os.O_CREAT, 0o644)
+        try:
+            num_written = 0
+            while num_written < len(data):
+                num_written += os.pwrite(fd, data[num_written:], offset + num_written)
+        finally:
+            os.close(fd)
+        old = connection.execute(
+            'SELECT segment, length FROM blobs WHERE uri=?', (uri,)
+        ).fetchone()
+        if old is not None:
+            connection.execute(
+                'UPDATE segments SET dead_bytes = dead_bytes + ? WHERE segment=?',
+                (old[1], old[0]),
+            )
+        connection.execute(
+            'INSERT OR REPLACE INTO blobs (uri, segment, offset, length) '
+            'VALUES (?, ?, ?, ?)',
+            (uri, segment, offset, len(data)),
+        )
+        connection.execute(
+            'UPDATE segments SET nbytes=? WHERE segment=?',
+            (offset + len(data), segment),
+        )
+
+    def write_bytes(store, uri, data):
+        with store._write_transaction() as connection:
+            store._append(connection, uri, data)
+        store._remove_materialized([uri])
+
+    def read_bytes(store, uri):
+        """ Returns the bytes of a uri or None if it is not in the index """
+        # A concurrent compaction may remove a segment between the lookup and
+        # the read, in which case the blob has already been moved.
+        for retry in [False, True]:
+            loc = store.lookup(uri)
+            if loc is None:
+                return None
+            segment, offset, length = loc
+            try:
+                fd = os.open(store.get_segment_fpath(segment), os.O_RDONLY)
+            except FileNotFoundError:
+                if retry:
+                    raise
+                continue
+            try:
+                data = os.pread(fd, length, offset)
+            finally:
+                os.close(fd)
+            if len(data) != length:
+                raise IOError('blob %r is truncated' % (uri,))
+            return data
+
+    def _get_fallback_fpath(store, uri):
+        if store.fallback_dpath is None:
+            raise IOError('blob %r does not exist in %r' % (uri, store.dpath))
+        return join(store.fallback_dpath, uri)
+
+    def write(store, uri, obj, write_func):
+        with _scratch_fpath(uri) as fpath:
+            write_func(fpath, obj)
+            ut.assert_exists(fpath, verbose=False)
+            data = _read_bytes(fpath)
+        store.write_bytes(uri, data)
+
+    def read(store, uri, read_func):
+        data = store.read_bytes(uri)
+        if data is None:
+            return read_func(store._get_fallback_fpath(uri))
+        with _scratch_fpath(uri) as fpath:
+            with open(fpath, 'wb') as file_:
+                file_.write(data)
+            return read_func(fpath)
+
+    def get_fpath(store, uri):
+        """
+        Returns a path to the data of a uri for callers that need one. Blobs
+        are materialized into the pack directory. The path stays valid until
+        the materialized blobs exceed ``materialized_bytes`` and this blob is
+        among the least recently used ones, or until ``compact``.
+        """
+        fpath = join(store.materialized_dpath, uri)
+        try:
+            # Marks the blob as recently used
+            os.utime(fpath)
+            return fpath
+        except FileNotFoundError:
+            pass
+        data = store.read_bytes(uri)
+        if data is None:
+            return store._get_fallback_fpath(uri)
+        ut.ensuredir(store.materialized_dpath)
+        _write_bytes_atomic(fpath, data)
+        store._add_materialized(len(data))
+        return fpath
+
+    def _scan_materialized(store):
+        """ Returns the (mtime, nbytes, fpath) of the materialized blobs """
+        if not exists(store.materialized_dpath):
+            return []
+        entry_list = []
+        for entry in os.scandir(store.materialized_dpath):
+            if '.tmp.' in entry.name:
+                # Still being written by _write_bytes_atomic
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entry_list.append((stat.st_mtime, stat.st_size, entry.path))
+        return entry_list
+
+    def _add_materialized(store, nbytes):
+        """ Removes the least recently used blobs once the cache is too large """
+        with store._materialized_lock:
+            if store._materialized_nbytes is None:
+                entry_list = store._scan_materialized()
+                store._materialized_nbytes = sum(entry[1] for entry in entry_list)
+            else:
+                store._materialized_nbytes += nbytes
+            if store._materialized_nbytes <= store.materialized_bytes:
+                return
+            # Other processes share the directory, so the estimate is redone.
+            # The cache is shrunk to 3/4 of its size so this does not happen
+            # on every call, and the newest blob is always kept.
+            entry_list = sorted(store._scan_materialized())
+            total = sum(entry[1] for entry in entry_list)
+            for mtime, size, fpath in entry_list[:-1]:
+                if total <= store.materialized_bytes * 3 // 4:
+                    break
+                ut.delete(fpath, verbose=False)
+                total -= size
+            store._materialized_nbytes = total
+
+    def clear_materialized(store):
+        """ Removes all materialized blobs """
+        with store._materialized_lock:
+            ut.delete(store.materialized_dpath, verbose=False)
+            store._materialized_nbytes = 0
+
+    def exists(store, uri):
+        if store.lookup(uri) is not None:
+            return True
+        if store.fallback_dpath is None:
+            return False
+        return exists(join(store.fallback_dpath, uri))
+
+    def _remove_materialized(store, uris):
+        if exists(store.materialized_dpath):
+            fpaths = [join(store.materialized_dpath, uri) for uri in uris]
+            ut.remove_fpaths([fpath for fpath in fpaths if exists(fpath)], verbose=False)
+
+    def delete(store, uris, verbose=False):
+        """ Returns the number of uris that existed """
+        num_deleted = 0
+        with store._write_transaction() as connection:
+            for uri in uris:
+                row = connection.execute(
+                    'SELECT segment, length FROM blobs WHERE uri=?', (uri,)
+                ).fetchone()
+                if row is None:
+                    continue
+                connection.execute('DELETE FROM blobs WHERE uri=?', (uri,))
+                connection.execute(
+                    'UPDATE segments SET dead_bytes = dead_bytes + ? WHERE segment=?',
+                    (row[1], row[0]),
+                )
+                num_deleted += 1
+        store._remove_materialized(uris)
+        if store.fallback_dpath is not None:
+            fpaths = [join(store.fallback_dpath, uri) for uri in uris]
+            fpaths = [fpath for fpath in fpaths if exists(fpath)]
+            ut.remove_fpaths(fpaths, verbose=verbose)
+            num_deleted += len(fpaths)
+        return num_deleted
+
+    def get_stats(store):
+        connection = store.connection
+        num_blobs = connection.execute('SELECT COUNT(*) FROM blobs').fetchone()[0]
+        num_segments, nbytes, dead_bytes = connection.execute(
+            'SELECT COUNT(*), TOTAL(nbytes), TOTAL(dead_bytes) FROM segments'
+        ).fetchone()
+        entry_list = store._scan_materialized()
+        stats = {
+            'num_blobs': num_blobs,
+            'num_segments': num_segments,
+            'nbytes': int(nbytes),
+            'dead_bytes': int(dead_bytes),
+            'num_materialized': len(entry_list),
+            'materialized_bytes': sum(entry[1] for entry in entry_list),
+        }
+        return stats
+
+    def compact(store, min_ratio=PACK_COMPACT_RATIO):
+        """
+        Moves the live blobs of segments where at least ``min_ratio`` of the
+        bytes are deleted to the end of the packs and removes those segments.
+        Readers that looked up a moved blob retry the lookup. The materialized
+        blobs are removed as well.
+
+        Returns:
+            int: number of removed segments
+        """
+        store.clear_materialized()
+        with store._write_transaction() as connection:
+            segments = [
+                segment
+                for segment, nbytes, dead_bytes in connection.execute(
+                    'SELECT segment, nbytes, dead_bytes FROM segments'
+                ).fetchall()
+                if dead_bytes > 0 and dead_bytes >= min_ratio * nbytes
+            ]
+            if len(segments) == 0:
+                return 0
+            last_segment = connection.execute(
+                'SELECT MAX(segment) FROM segments'
+            ).fetchone()[0]
+            if last_segment in segments:
+                # Never append live blobs to a segment that is being removed
+                connection.execute(
+                    'INSERT INTO segments (segment) VALUES (?)', (last_segment + 1,)
+                )
+            for segment in segments:
+                blob_list = connection.execute(
+                    'SELECT uri, offset, length FROM blobs WHERE segment=? '
+                    'ORDER BY offset',
+                    (segment,),
+                ).fetchall()
+                fd = os.open(store.get_segment_fpath(segment), os.O_RDONLY)
+                try:
+                    for uri, offset, length in blob_list:
+                        data = os.pread(fd, length, offset)
+                        store._append(connection, uri, data)
+                finally:
+                    os.close(fd)
+                connection.execute('DELETE FROM segments WHERE segment=?', (segment,))
+        for segment in segments:
+            os.remove(store.get_segment_fpath(segment))
+        logger.info('[pack] compacted %d segments of %s' % (len(segments), store.dpath))
+        return len(segments)
+
+    def migrate(store, remove=True, verbose=True):
+        """
+        Moves the files of the fallback directory that are not in the index
+        into the packs.
+
+        Returns:
+            int: number of migrated files
+        """
+        if store.fallback_dpath is None or not exists(store.fallback_dpath):
+            return 0
+        fnames = sorted(os.listdir(store.fallback_dpath))
+        num_migrated = 0
+        _iter = ut.ProgIter(fnames, label='migrating extern files', enabled=verbose)
+        for fname in _iter:
+            fpath = join(store.fallback_dpath, fname)
+            if not os.path.isfile(fpath):
+                continue
+            if store.lookup(fname) is None:
+                store.write_bytes(fname, _read_bytes(fpath))
+                num_migrated += 1
+            if remove:
+                os.remove(fpath)
+        return num_migrated
+
+
+def migrate_extern_dpath(extern_dpath, remove=True, compact=False, verbose=True):
+    """
+    Moves the files of the extern directory of a table into the packs of
+    the table. Tables read the packs when they are registered with
+    ``extern_storage='pack'``. Files are only removed once their blob is
+    committed to the index, so an interrupted migration can be rerun.
+
+    Args:
+        extern_dpath (str): the extern directory of a table
+        remove (bool): removes the migrated files
+        compact (bool): compacts the packs afterwards
+
+    Returns:
+        int: number of migrated files
+
+    CommandLine:
+        python -m wbia.dtool.extern_storage migrate_extern_dpath
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.extern_storage import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'extern_migrate')
+        >>> ut.delete(dpath, verbose=False)
+        >>> extern_dpath = ut.ensuredir(join(dpath, 'extern_spam'))
+        >>> for count in range(3):
+        >>>     ut.writeto(join(extern_dpath, 'spam_%d.txt' % (count,)), str(count))
+        >>> assert migrate_extern_dpath(extern_dpath, verbose=False) == 3
+        >>> assert os.listdir(extern_dpath) == []
+        >>> store = new_extern_storage('pack', extern_dpath)
+        >>> assert store.read('spam_2.txt', ut.readfrom) == '2'
+    """
+    store = new_extern_storage('pack', extern_dpath)
+    num_migrated = store.migrate(remove=remove, verbose=verbose)
+    if compact:
+        store.compact()
+    if verbose:
+        logger.info(
+            '[pack] migrated %d files of %s into %s'
+            % (num_migrated, extern_dpath, store.dpath)
+        )
+    return num_migrated
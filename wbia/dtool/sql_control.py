@@ -16,6 +16,7 @@ from collections.abc import Mapping, MutableMapping
 from contextlib import contextmanager
 from os.path import join, exists
 
+import numpy as np
 import six
 import sqlalchemy
 import utool as ut
@@ -128,6 +129,75 @@ def compare_coldef_lists(coldef_list1, coldef_list2):
     return
 
 
+# Compiled select of ``SQLDatabaseController._get_unique``
+_KeyGetterPlan = collections.namedtuple(
+    '_KeyGetterPlan',
+    (
+        'select_sql',
+        'param_sql',
+        'key_columns',
+        'key_processors',
+        'result_processors',
+        'value_index',
+    ),
+)
+
+
+def _column_result_processor(column, dialect):
+    """Returns a function that converts a list of values of a column, or None"""
+    coltype = str(column.type)
+    bulk_result_processor = getattr(column.type, 'bulk_result_processor', None)
+    if bulk_result_processor is not None:
+        # e.g. ndarrays are decoded into a single buffer
+        return bulk_result_processor(dialect, coltype)
+    processor = column.type.result_processor(dialect, coltype)
+    if processor is None:
+        return None
+    return lambda values: list(map(processor, values))
+
+
+def _is_integer_array(values):
+    arr = np.asarray(values)
+    return arr.ndim == 1 and arr.dtype.kind in 'iu'
+
+
+def _lookup_positions(keys, query_keys):
+    """
+    Finds the position of each query key in a list of unique keys
+
+    Integer keys are matched with a sort and a binary search, other keys (e.g.
+    uuids or tuples) through a dictionary.
+
+    Returns:
+        ndarray: position of each query key in ``keys`` or -1 if not found
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.sql_control import *  # NOQA
+        >>> keys = [7, 3, 5, 1]
+        >>> query_keys = [1, 2, 7, 7, 5, 9]
+        >>> print(_lookup_positions(keys, query_keys).tolist())
+        [3, -1, 0, 0, 2, -1]
+        >>> print(_lookup_positions(['a', 'b'], ['b', 'c', None]).tolist())
+        [1, -1, -1]
+    """
+    if len(query_keys) == 0:
+        return np.empty(0, dtype=np.int64)
+    if len(keys) == 0:
+        return np.full(len(query_keys), -1, dtype=np.int64)
+    if _is_integer_array(keys) and _is_integer_array(query_keys):
+        keys = np.asarray(keys)
+        query_keys = np.asarray(query_keys)
+        sortx = keys.argsort(kind='stable')
+        sorted_keys = keys[sortx]
+        pos = np.searchsorted(sorted_keys, query_keys)
+        pos[pos == len(sorted_keys)] = 0
+        found = sorted_keys[pos] == query_keys
+        return np.where(found, sortx[pos], -1)
+    lookup = {key: pos for pos, key in enumerate(keys)}
+    return np.array([lookup.get(key, -1) for key in query_keys], dtype=np.int64)
+
+
 def _unpacker(results):
     """ HELPER: Unpacks results if unpack_scalars is True. """
     if not results:  # Check for None or empty list
@@ -520,6 +590,11 @@ class SQLDatabaseController(object):
         self._sa_metadata.reflect(bind=self._engine)
 
         self._tablenames = None
+        # Caches of reflected tables, unique keys and bulk getter statements.
+        # These are cleared whenever the schema changes.
+        self._table_cache = {}
+        self._unique_key_cache = {}
+        self._stmt_cache = {}
 
         if not self.readonly:
             # Ensure the metadata table is initialized.
@@ -745,13 +820,251 @@ class SQLDatabaseController(object):
     def _reflect_table(self, table_name):
         """Produces a SQLAlchemy Table object from the given ``table_name``"""
         # Note, this on introspects once. Repeated calls will pull the Table object
-        # from the MetaData object.
+        # from the controller's cache, which is reset by ``invalidate_tables_cache``.
+        try:
+            return self._table_cache[table_name]
+        except KeyError:
+            pass
         kw = {}
         if self.is_using_postgres:
             kw = {'schema': self.schema_name}
-        return Table(
+        table = Table(
             table_name, self._sa_metadata, autoload=True, autoload_with=self._engine, **kw
         )
+        self._table_cache[table_name] = table
+        return table
+
+    def _forget_table(self, table_name):
+        """Drops the cached reflection of a table after its schema changed"""
+        table = self._table_cache.pop(table_name, None)
+        if table is not None and table in self._sa_metadata.tables.values():
+            self._sa_metadata.remove(table)
+        self._unique_key_cache = {}
+        self._stmt_cache = {}
+
+    def _is_unique_key(self, tblname, colnames):
+        """True if each value of ``colnames`` identifies at most one row
+
+        The columns are a unique key if they contain the rowid, the primary
+        key, or all the columns of a unique constraint or unique index.
+
+        Example:
+            >>> # ENABLE_DOCTEST
+            >>> from wbia.dtool.sql_control import *  # NOQA
+            >>> db = SQLDatabaseController('sqlite:///:memory:', 'testing')
+            >>> db.add_table('thing', [('thing_rowid', 'INTEGER PRIMARY KEY'),
+            >>>                        ('thing_uuid', 'UUID'), ('name', 'TEXT')],
+            >>>              superkeys=[('thing_uuid',)])
+            >>> assert db._is_unique_key('thing', ('rowid',))
+            >>> assert db._is_unique_key('thing', ('thing_rowid',))
+            >>> assert db._is_unique_key('thing', ('thing_uuid',))
+            >>> assert db._is_unique_key('thing', ('thing_uuid', 'name'))
+            >>> assert not db._is_unique_key('thing', ('name',))
+        """
+        key = (tblname, tuple(colnames))
+        try:
+            return self._unique_key_cache[key]
+        except KeyError:
+            pass
+        colset = set(colnames)
+        if 'rowid' in colset:
+            is_unique = True
+        else:
+            table = self._reflect_table(tblname)
+            candidates = [table.primary_key.columns]
+            candidates += [
+                constraint.columns
+                for constraint in table.constraints
+                if isinstance(constraint, sqlalchemy.UniqueConstraint)
+            ]
+            candidates += [index.columns for index in table.indexes if index.unique]
+            is_unique = any(
+                len(columns) > 0 and {c.name for c in columns}.issubset(colset)
+                for columns in candidates
+            )
+        self._unique_key_cache[key] = is_unique
+        return is_unique
+
+    def _column(self, table, colname):
+        if colname == 'rowid' and colname not in table.c:
+            # rowid isn't an actual column in sqlite
+            return sqlalchemy.sql.column('rowid', Integer)
+        return table.c[colname]
+
+    def _get_by_keys_plan(self, tblname, colnames, key_colnames):
+        """Compiles (once) the select used by the unique key bulk getter
+
+        The SQL is rendered directly for the DBAPI, and the column type
+        processors are looked up here, so each batch only formats the
+        placeholders of its ``IN`` list and executes.
+        """
+        cachekey = (tblname, tuple(colnames), tuple(key_colnames))
+        try:
+            return self._stmt_cache[cachekey]
+        except KeyError:
+            pass
+        table = self._reflect_table(tblname)
+        dialect = self._engine.dialect
+        quote = dialect.identifier_preparer.quote
+        # Select each column once, the key columns first
+        select_names = ut.unique_ordered(list(key_colnames) + list(colnames))
+        select_columns = [self._column(table, c) for c in select_names]
+        key_columns = select_columns[: len(key_colnames)]
+        placeholder = '?' if dialect.paramstyle == 'qmark' else '%s'
+        if len(key_columns) == 1:
+            key_sql = quote(key_columns[0].name)
+            param_sql = placeholder
+            values_prefix = ''
+        else:
+            key_sql = '(%s)' % (', '.join([quote(c.name) for c in key_columns]),)
+            param_sql = '(%s)' % (', '.join([placeholder] * len(key_columns)),)
+            values_prefix = 'VALUES '
+        select_sql = 'SELECT %s FROM %s WHERE %s IN (%s' % (
+            ', '.join([quote(c.name) for c in select_columns]),
+            quote(table.name),
+            key_sql,
+            values_prefix,
+        )
+        plan = _KeyGetterPlan(
+            select_sql=select_sql,
+            param_sql=param_sql,
+            key_columns=key_columns,
+            key_processors=[c.type.bind_processor(dialect) for c in key_columns],
+            result_processors=[
+                _column_result_processor(c, dialect) for c in select_columns
+            ],
+            value_index=tuple(select_names.index(c) for c in colnames),
+        )
+        self._stmt_cache[cachekey] = plan
+        return plan
+
+    def _normalize_keys(self, columns, keys):
+        """
+        Round trips search keys through the column types when their python
+        type doesn't match, so they compare equal to the values in result rows
+        (e.g. a uuid given as a string)
+        """
+        dialect = self._engine.dialect
+
+        def make_process(column):
+            coltype = str(column.type)
+            bind_processor = column.type.bind_processor(dialect)
+            result_processor = column.type.result_processor(dialect, coltype)
+
+            def process(a):
+                if not isinstance(a, bool) and TYPE_TO_SQLTYPE.get(type(a)) == coltype:
+                    return a
+                if bind_processor:
+                    a = bind_processor(a)
+                if result_processor:
+                    a = result_processor(a)
+                return a
+
+            return process
+
+        if len(columns) == 1:
+            (column,) = columns
+            if str(column.type) == 'INTEGER' and _is_integer_array(keys):
+                # integers (e.g. numpy ints) already compare equal
+                return keys
+            process = make_process(column)
+            return [process(key) for key in keys]
+        processes = [make_process(column) for column in columns]
+        return [tuple(p(a) for p, a in zip(processes, key)) for key in keys]
+
+    def _get_unique(
+        self,
+        tblname,
+        colnames,
+        key_list,
+        key_colnames,
+        batch_size=BATCH_SIZE,
+        unpack_scalars=True,
+        keepwrap=False,
+        **kwargs,
+    ):
+        """Bulk getter for keys that match at most one row
+
+        Rows are fetched with one ``IN`` query per batch, their columns are
+        converted with the column types in bulk, and they are put back into
+        the order of ``key_list`` with a single vectorized lookup instead of
+        grouping and sorting the values of each key in python.
+
+        Args:
+            key_list (list): search keys, tuples when there are several
+                ``key_colnames``. Missing keys give None (or [] when
+                ``unpack_scalars`` is False).
+        """
+        plan = self._get_by_keys_plan(tblname, colnames, key_colnames)
+        num_keys = len(plan.key_columns)
+        key_list = list(key_list)
+        if num_keys == 1:
+            (processor,) = plan.key_processors
+            if _is_integer_array(key_list):
+                params = np.asarray(key_list).tolist()
+            elif processor is not None:
+                params = [processor(key) for key in key_list]
+            else:
+                params = list(key_list)
+        else:
+            batch_size = max(1, int(batch_size / num_keys))
+            params = [
+                tuple(
+                    a if processor is None else processor(a)
+                    for a, processor in zip(key, plan.key_processors)
+                )
+                for key in key_list
+            ]
+
+        rows = []
+        sql_cache = {}
+        batch_list = list(range(0, len(params), batch_size))
+        with self.connect() as conn:
+            cursor = conn.connection.cursor()
+            try:
+                for start in tqdm.tqdm(
+                    batch_list,
+                    disable=len(batch_list) <= 1,
+                    desc='[db.get(%s)]' % (tblname,),
+                ):
+                    batch = params[start : start + batch_size]
+                    num = len(batch)
+                    if num not in sql_cache:
+                        sql_cache[num] = (
+                            plan.select_sql + ', '.join([plan.param_sql] * num) + ')'
+                        )
+                    if num_keys > 1:
+                        batch = [a for key in batch for a in key]
+                    cursor.execute(sql_cache[num], batch)
+                    rows.extend(cursor.fetchall())
+            finally:
+                cursor.close()
+
+        # Convert column by column
+        if rows:
+            columns = list(zip(*rows))
+        else:
+            columns = [()] * len(plan.result_processors)
+        for index, processor in enumerate(plan.result_processors):
+            if processor is not None:
+                columns[index] = processor(columns[index])
+        if num_keys == 1:
+            row_keys = columns[0]
+        else:
+            row_keys = list(zip(*columns[:num_keys]))
+        if len(plan.value_index) == 1 and not keepwrap:
+            row_values = list(columns[plan.value_index[0]])
+        else:
+            row_values = list(zip(*[columns[index] for index in plan.value_index]))
+
+        key_list = self._normalize_keys(plan.key_columns, key_list)
+        positions = _lookup_positions(row_keys, key_list)
+        if unpack_scalars:
+            # Position -1 (not found) takes the trailing None
+            row_values.append(None)
+        else:
+            row_values = [[value] for value in row_values] + [[]]
+        return ut.take(row_values, positions.tolist())
 
     # ==============
     # API INTERFACE
@@ -1034,6 +1347,17 @@ class SQLDatabaseController(object):
                 **kwargs,
             )
 
+        if self._is_unique_key(tblname, where_colnames):
+            return self._get_unique(
+                tblname,
+                colnames,
+                params_iter,
+                where_colnames,
+                unpack_scalars=unpack_scalars,
+                batch_size=batch_size,
+                **kwargs,
+            )
+
         params_per_batch = int(batch_size / len(params_iter[0]))
         result_map = {}
         stmt = sqlalchemy.select(
@@ -1290,7 +1614,10 @@ class SQLDatabaseController(object):
             id_iter (iterable): iterable of search keys
             id_colname (str): column to be used as the search key (default: rowid)
             eager (bool): use eager evaluation
-            assume_unique (bool): default False. Experimental feature that could result in a 10x speedup
+            assume_unique (bool): default False. Treat the ids as a unique key
+                even if the schema doesn't say so. Unique keys (the rowid, the
+                primary key, or a unique constraint) are detected automatically
+                and use a faster path that returns one result per id.
             unpack_scalars (bool): default True
 
         Example:
@@ -1307,111 +1634,78 @@ class SQLDatabaseController(object):
             >>> got_data = db.get('notch', colnames, id_iter=rowids)
             >>> assert got_data == [1, 2, 3]
         """
-        logger.debug(
-            '[sql]'
-            + ut.get_caller_name(list(range(1, 4)))
-            + ' db.get(%r, %r, ...)' % (tblname, colnames)
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                '[sql]'
+                + ut.get_caller_name(list(range(1, 4)))
+                + ' db.get(%r, %r, ...)' % (tblname, colnames)
+            )
         if not isinstance(colnames, (tuple, list)):
             raise TypeError('colnames must be a sequence type of strings')
 
-        # ??? Getting a single column of unique values that is matched on rowid?
-        #     And sorts the results after the query?
-        # ??? This seems oddly specific for a generic method.
-        #     Perhaps the logic should be in its own method?
-        if (
-            assume_unique
-            and id_iter is not None
-            and id_colname == 'rowid'
-            and len(colnames) == 1
-        ):
-            id_iter = list(id_iter)
-            columns = ', '.join(colnames)
-            ids_listing = ', '.join(map(str, id_iter))
-            operation = f'SELECT {columns} FROM {tblname} WHERE rowid in ({ids_listing}) ORDER BY rowid ASC'
-            with self.connect() as conn:
-                results = conn.execute(operation).fetchall()
-            import numpy as np
-
-            # ??? Why order the results if they are going to be sorted here?
-            sortx = np.argsort(np.argsort(id_iter))
-            results = ut.take(results, sortx)
-            if kwargs.get('unpack_scalars', True):
-                results = ut.take_column(results, 0)
-            return results
-        else:
-            if id_iter is None:
-                where_clause = None
-                params_iter = []
+        if id_iter is None:
+            where_clause = None
+            params_iter = []
 
-                return self.get_where(
-                    tblname, colnames, params_iter, where_clause, eager=eager, **kwargs
-                )
-
-            id_iter = list(id_iter)  # id_iter could be a set
-            table = self._reflect_table(tblname)
-            result_map = {}
-            if id_colname == 'rowid':  # rowid isn't an actual column in sqlite
-                id_column = sqlalchemy.sql.column('rowid', Integer)
-            else:
-                id_column = table.c[id_colname]
-            stmt = sqlalchemy.select([id_column] + [table.c[c] for c in colnames])
-            stmt = stmt.where(id_column.in_(bindparam('value', expanding=True)))
-
-            batch_list = list(range(int(len(id_iter) / batch_size) + 1))
-            for batch in tqdm.tqdm(
-                batch_list, disable=len(batch_list) <= 1, desc='[db.get(%s)]' % (tblname,)
-            ):
-                val_list = self.executeone(
-                    stmt,
-                    {'value': id_iter[batch * batch_size : (batch + 1) * batch_size]},
-                )
+            return self.get_where(
+                tblname, colnames, params_iter, where_clause, eager=eager, **kwargs
+            )
 
-                for val in val_list:
-                    if not kwargs.get('keepwrap', False) and len(val[1:]) == 1:
-                        values = val[1]
-                    else:
-                        values = val[1:]
-                    existing = result_map.setdefault(val[0], set())
-                    if isinstance(existing, set):
-                        try:
-                            existing.add(values)
-                        except TypeError:
-                            # unhashable type
-                            result_map[val[0]] = list(result_map[val[0]])
-                            if values not in result_map[val[0]]:
-                                result_map[val[0]].append(values)
-                    elif values not in existing:
-                        existing.append(values)
+        id_iter = list(id_iter)  # id_iter could be a set
+        if assume_unique or self._is_unique_key(tblname, (id_colname,)):
+            return self._get_unique(
+                tblname, colnames, id_iter, (id_colname,), batch_size=batch_size, **kwargs
+            )
+        return self._get_grouped(
+            tblname, colnames, id_iter, id_colname, batch_size=batch_size, **kwargs
+        )
 
-            results = []
+    def _get_grouped(
+        self, tblname, colnames, id_iter, id_colname='rowid', batch_size=BATCH_SIZE, **kwargs
+    ):
+        """Getter for keys that can match several rows, see ``get``"""
+        table = self._reflect_table(tblname)
+        result_map = {}
+        id_column = self._column(table, id_colname)
+        stmt = sqlalchemy.select([id_column] + [table.c[c] for c in colnames])
+        stmt = stmt.where(id_column.in_(bindparam('value', expanding=True)))
 
-            def process(a):
-                processor = id_column.type.bind_processor(self._engine.dialect)
-                if processor:
-                    a = processor(a)
-                result_processor = id_column.type.result_processor(
-                    self._engine.dialect, str(id_column.type)
-                )
-                if result_processor:
-                    return result_processor(a)
-                return a
+        batch_list = list(range(int(len(id_iter) / batch_size) + 1))
+        for batch in tqdm.tqdm(
+            batch_list, disable=len(batch_list) <= 1, desc='[db.get(%s)]' % (tblname,)
+        ):
+            val_list = self.executeone(
+                stmt,
+                {'value': id_iter[batch * batch_size : (batch + 1) * batch_size]},
+            )
 
-            if id_iter:
-                first_id = id_iter[0]
-                if isinstance(first_id, bool) or TYPE_TO_SQLTYPE.get(
-                    type(first_id)
-                ) != str(id_column.type):
-                    id_iter = (process(id_) for id_ in id_iter)
-
-            for id_ in id_iter:
-                result = sorted(list(result_map.get(id_, set())))
-                if kwargs.get('unpack_scalars', True) and isinstance(result, list):
-                    results.append(_unpacker(result))
+            for val in val_list:
+                if not kwargs.get('keepwrap', False) and len(val[1:]) == 1:
+                    values = val[1]
                 else:
-                    results.append(result)
+                    values = val[1:]
+                existing = result_map.setdefault(val[0], set())
+                if isinstance(existing, set):
+                    try:
+                        existing.add(values)
+                    except TypeError:
+                        # unhashable type
+                        result_map[val[0]] = list(result_map[val[0]])
+                        if values not in result_map[val[0]]:
+                            result_map[val[0]].append(values)
+                elif values not in existing:
+                    existing.append(values)
 
-            return results
+        results = []
+        id_iter = self._normalize_keys([id_column], id_iter)
+        for id_ in id_iter:
+            result = sorted(list(result_map.get(id_, set())))
+            if kwargs.get('unpack_scalars', True) and isinstance(result, list):
+                results.append(_unpacker(result))
+            else:
+                results.append(result)
+
+        return results
 
     def set(
         self,
@@ -1840,6 +2134,7 @@ class SQLDatabaseController(object):
         op_fmtstr = 'ALTER TABLE {tablename} ADD COLUMN {colname} {coltype}'
         operation = op_fmtstr.format(**fmtkw)
         self.executeone(operation, [], verbose=False)
+        self._forget_table(tablename)
 
     def __make_unique_constraint(self, table_name, column_or_columns):
         """Creates a SQL ``CONSTRAINT`` clause for ``UNIQUE`` column data"""
@@ -2471,6 +2766,9 @@ class SQLDatabaseController(object):
         """
         self._tablenames = None
         self._sa_metadata = sqlalchemy.MetaData()
+        self._table_cache = {}
+        self._unique_key_cache = {}
+        self._stmt_cache = {}
         self.get_table_names()
 
     def get_table_names(self, lazy=False):
@@ -3458,3 +3756,61 @@ class SQLTable(ut.NiceRepr):
 
     def __nice__(table):
         return table.name + ', n=' + str(table.number_of_rows())
+
+
+def benchmark_bulk_get(num_rows=100000, num_ids=None, uri='sqlite:///:memory:'):
+    """
+    Compares the unique key bulk getter with the grouping getter it replaced
+
+    CommandLine:
+        python -c "from wbia.dtool.sql_control import *; benchmark_bulk_get(500000)"
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.dtool.sql_control import *  # NOQA
+        >>> timings = benchmark_bulk_get(num_rows=2000)
+        >>> assert set(timings.keys()) == {'grouped', 'unique'}
+    """
+    import random
+
+    if num_ids is None:
+        num_ids = num_rows
+    db = SQLDatabaseController(uri, 'benchmark')
+    tblname = 'bench_annots'
+    coldef_list = [
+        ('annot_rowid', 'INTEGER PRIMARY KEY'),
+        ('annot_uuid', 'UUID NOT NULL'),
+        ('annot_xtl', 'INTEGER'),
+        ('annot_ytl', 'INTEGER'),
+        ('annot_width', 'INTEGER'),
+        ('annot_height', 'INTEGER'),
+    ]
+    db.add_table(tblname, coldef_list, superkeys=[('annot_uuid',)])
+    rng = random.Random(0)
+    colnames = ('annot_uuid', 'annot_xtl', 'annot_ytl', 'annot_width', 'annot_height')
+    params_list = [
+        (uuid.UUID(int=rng.getrandbits(128)),) + tuple(rng.randint(0, 1000) for _ in range(4))
+        for _ in range(num_rows)
+    ]
+    table = db._reflect_table(tblname)
+    with db.connect() as conn:
+        conn.execute(
+            table.insert(), [dict(zip(colnames, params)) for params in params_list]
+        )
+    # Query in a random order, with some duplicate and some missing ids
+    rowid_list = [rng.randint(1, int(num_rows * 1.1)) for _ in range(num_ids)]
+    bbox_colnames = colnames[1:]
+
+    timings = {}
+    with ut.Timer(verbose=False) as timer:
+        grouped = db._get_grouped(tblname, bbox_colnames, rowid_list)
+    timings['grouped'] = timer.ellapsed
+    with ut.Timer(verbose=False) as timer:
+        unique = db.get(tblname, bbox_colnames, rowid_list)
+    timings['unique'] = timer.ellapsed
+    assert grouped == unique, 'getters disagree'
+    logger.info(
+        'db.get of %d ids from %d rows: %s'
+        % (num_ids, num_rows, ut.repr2(timings, precision=4))
+    )
+    return timings
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """Mapping of Python types to SQL types"""
 import io
+import struct
 import uuid
 
 import numpy as np
@@ -19,6 +20,9 @@ __all__ = (
     'Number',
     'SQL_TYPE_TO_SA_TYPE',
     'UUID',
+    'decode_ndarray',
+    'decode_ndarray_list',
+    'encode_ndarray',
 )
 
 # DDD (26-Sept-12020) Deprecated in favor of SQL_TYPE_TO_SA_TYPE
@@ -69,6 +73,148 @@ class JSONCodeableType(UserDefinedType):
         return process
 
 
+NP_NUMBER_TYPES = (
+    np.int8,
+    np.int16,
+    np.int32,
+    np.int64,
+    np.uint8,
+    np.uint16,
+    np.uint32,
+    np.uint64,
+    np.float32,
+    np.float64,
+)
+
+
+# Raw ndarray codec: a fixed header with the magic, codec version, number of
+# dimensions, and dtype string (padded to 8 bytes), then one int64 per
+# dimension, then the raw C-ordered data. The data starts at a multiple of 8.
+NDARRAY_MAGIC = b'\x93NDRAW'
+NDARRAY_CODEC_VERSION = 1
+_NDARRAY_HEADER = struct.Struct('<6sBB8s')
+# Blobs written by np.save
+_NPY_MAGIC = b'\x93NUMPY'
+
+
+def _is_raw_encodable(value):
+    if type(value) not in (np.ndarray,) + NP_NUMBER_TYPES:
+        # e.g. masked arrays
+        return False
+    dtype = value.dtype
+    return dtype.kind in 'biufcmMSU' and len(dtype.str) <= 8 and value.ndim <= 255
+
+
+def encode_ndarray(value):
+    """Encodes an ndarray or numpy scalar as a raw ndarray blob
+
+    Values that cannot be raw encoded (e.g. object or structured arrays) are
+    written with ``np.save``, which :func:`decode_ndarray` also reads.
+    """
+    if not _is_raw_encodable(value):
+        out = io.BytesIO()
+        np.save(out, value)
+        return out.getvalue()
+    arr = np.asarray(value)
+    header = _NDARRAY_HEADER.pack(
+        NDARRAY_MAGIC, NDARRAY_CODEC_VERSION, arr.ndim, arr.dtype.str.encode('ascii')
+    )
+    shape = struct.pack('<%dq' % (arr.ndim,), *arr.shape)
+    return b''.join([header, shape, arr.tobytes()])
+
+
+def _parse_ndarray_header(blob):
+    """Returns (dtype, shape, offset) of a raw ndarray blob or None"""
+    if bytes(blob[0:6]) != NDARRAY_MAGIC:
+        return None
+    magic, version, ndim, dtype_str = _NDARRAY_HEADER.unpack_from(blob, 0)
+    if version != NDARRAY_CODEC_VERSION:
+        raise ValueError('Unknown ndarray codec version %r' % (version,))
+    offset = _NDARRAY_HEADER.size
+    shape = struct.unpack_from('<%dq' % (ndim,), blob, offset)
+    dtype = np.dtype(dtype_str.rstrip(b'\x00').decode('ascii'))
+    return dtype, shape, offset + 8 * ndim
+
+
+def _load_npy(blob):
+    out = io.BytesIO(blob)
+    arr = np.load(out, allow_pickle=True)
+    out.close()
+    return arr
+
+
+def decode_ndarray(blob):
+    """Decodes a blob written by :func:`encode_ndarray` or ``np.save``
+
+    Raw encoded arrays are read-only views of the blob, nothing is copied.
+
+    Example:
+        >>> from wbia.dtool.types import *  # NOQA
+        >>> arr = np.arange(12, dtype=np.float32).reshape(3, 4)
+        >>> blob = encode_ndarray(arr)
+        >>> assert len(blob) == 16 + 2 * 8 + arr.nbytes
+        >>> arr2 = decode_ndarray(blob)
+        >>> assert arr2.dtype == arr.dtype and np.all(arr2 == arr)
+        >>> assert not arr2.flags.writeable
+        >>> # blobs of the old np.save format still decode
+        >>> out = io.BytesIO()
+        >>> np.save(out, arr)
+        >>> assert np.all(decode_ndarray(out.getvalue()) == arr)
+        >>> assert decode_ndarray(encode_ndarray(np.uint8(7))).shape == ()
+    """
+    header = _parse_ndarray_header(blob)
+    if header is None:
+        return _load_npy(blob)
+    dtype, shape, offset = header
+    count = int(np.prod(shape))
+    arr = np.frombuffer(blob, dtype=dtype, count=count, offset=offset)
+    return arr.reshape(shape)
+
+
+def decode_ndarray_list(blob_list):
+    """Decodes many blobs, None items decode to None
+
+    The data of all raw encoded blobs is copied once into a single writable
+    buffer and each array is a view into it.
+
+    Example:
+        >>> from wbia.dtool.types import *  # NOQA
+        >>> arrs = [np.ones((2, 3), np.uint8), np.zeros((0, 3), np.uint8),
+        >>>         np.arange(3.0), np.float32(1.5)]
+        >>> out = io.BytesIO()
+        >>> np.save(out, np.arange(3))
+        >>> blob_list = [encode_ndarray(arr) for arr in arrs] + [None, out.getvalue()]
+        >>> arr_list = decode_ndarray_list(blob_list)
+        >>> assert all(np.all(a1 == a2) for a1, a2 in zip(arr_list, arrs))
+        >>> assert arr_list[2].dtype == np.float64 and arr_list[3].shape == ()
+        >>> assert arr_list[4] is None and np.all(arr_list[5] == np.arange(3))
+        >>> assert arr_list[0].base is arr_list[2].base
+    """
+    arr_list = [None] * len(blob_list)
+    raw_items = []
+    total = 0
+    for index, blob in enumerate(blob_list):
+        if blob is None:
+            continue
+        header = _parse_ndarray_header(blob)
+        if header is None:
+            arr_list[index] = _load_npy(blob)
+            continue
+        dtype, shape, offset = header
+        nbytes = dtype.itemsize * int(np.prod(shape))
+        # Keep each array aligned to 8 bytes in the buffer
+        start = -(-total // 8) * 8
+        raw_items.append((index, blob, dtype, shape, offset, start, nbytes))
+        total = start + nbytes
+    buf = np.empty(total, dtype=np.uint8)
+    view = memoryview(buf)
+    for index, blob, dtype, shape, offset, start, nbytes in raw_items:
+        view[start : start + nbytes] = memoryview(blob)[offset : offset + nbytes]
+        arr = buf[start : start + nbytes].view(dtype)
+        arr_list[index] = arr.reshape(shape)
+    return arr_list
+
+
 class NumPyPicklableType(UserDefinedType):
 
     # Abstract properties
@@ -85,10 +231,7 @@ class NumPyPicklableType(UserDefinedType):
                 return value
             else:
                 if isinstance(value, self.base_py_types):
-                    out = io.BytesIO()
-                    np.save(out, value)
-                    out.seek(0)
-                    return out.read()
+                    return encode_ndarray(value)
                 else:
                     return value
 
@@ -100,24 +243,41 @@ class NumPyPicklableType(UserDefinedType):
                 return value
             else:
                 if not isinstance(value, self.base_py_types):
-                    out = io.BytesIO(value)
-                    out.seek(0)
-                    arr = np.load(out, allow_pickle=True)
-                    out.close()
-                    return arr
+                    return decode_ndarray(value)
                 else:
                     return value
 
         return process
 
+    def bulk_result_processor(self, dialect, coltype):
+        """Like result_processor, but converts a list of column values"""
+
+        def process(value_list):
+            blob_list = [
+                None if value is None or isinstance(value, self.base_py_types) else value
+                for value in value_list
+            ]
+            arr_list = decode_ndarray_list(blob_list)
+            return [
+                value if arr is None else arr for value, arr in zip(value_list, arr_list)
+            ]
+
+        return process
+
+
+# The types below are stateless, so ``cache_ok`` lets SQLAlchemy reuse the
+# compiled form of the statements that use them.
+
 
 class Dict(JSONCodeableType):
+    cache_ok = True
     base_py_type = dict
     col_spec = 'DICT'
 
 
 class Integer(TypeDecorator):
     impl = SAInteger
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         if value is not None:
@@ -125,35 +285,26 @@ class Integer(TypeDecorator):
 
 
 class List(JSONCodeableType):
+    cache_ok = True
     base_py_type = list
     col_spec = 'LIST'
 
 
 class NDArray(NumPyPicklableType):
+    cache_ok = True
     base_py_types = (np.ndarray,)
     col_spec = 'NDARRAY'
 
 
-NP_NUMBER_TYPES = (
-    np.int8,
-    np.int16,
-    np.int32,
-    np.int64,
-    np.uint8,
-    np.uint16,
-    np.uint32,
-    np.uint64,
-    np.float32,
-    np.float64,
-)
-
-
 class Number(NumPyPicklableType):
+    cache_ok = True
     base_py_types = NP_NUMBER_TYPES
     col_spec = 'NUMPY'
 
 
 class UUID(UserDefinedType):
+    cache_ok = True
+
     def get_col_spec(self, **kw):
         return 'UUID'
 
@@ -27,6 +27,11 @@ TEST_INFO = True
 # dont actually query. Just print labels and stuff
 DRY_RUN = ut.get_argflag(('--dryrun', '--dry'))
 
+# Run the pipeline stages that are shared between configs only once
+SHARE_STAGES = ut.get_argflag('--share-stages')
+# Number of processes that run independent branches of the stage DAG
+STAGE_WORKERS = ut.get_argval('--stage-workers', type_=int, default=0)
+
 
 def run_expt(
     ibs,
@@ -165,10 +170,21 @@ def make_single_testres(
     testnameid,
     use_cache=None,
     subindexer_partial=ut.ProgIter,
+    share_stages=None,
+    stage_workers=None,
 ):
     """
+    Args:
+        share_stages (bool): if True, configs that only differ in spatial
+            verification and scoring share the earlier pipeline stages
+            (defaults to --share-stages)
+        stage_workers (int): number of processes that run independent
+            branches of the stage DAG when sharing stages
+            (defaults to --stage-workers)
+
     CommandLine:
         python -m wbia run_expt
+        python -m wbia run_expt --share-stages --stage-workers=4
     """
     cfgslice = None
     if cfgslice is not None:
@@ -186,6 +202,10 @@ def make_single_testres(
 
     if use_cache is None:
         use_cache = USE_BIG_TEST_CACHE
+    if share_stages is None:
+        share_stages = SHARE_STAGES
+    if stage_workers is None:
+        stage_workers = STAGE_WORKERS
 
     if use_cache:
         try:
@@ -209,6 +229,24 @@ def make_single_testres(
         # HACK
         prev_feat_cfgstr = None
 
+    cfgx2_shared_cm_list = {}
+    if share_stages and not DRY_RUN:
+        compute_cfgxs = list(range(len(cfgx2_qreq_)))
+        if use_cache:
+            st_cachedir = ut.unixjoin(bt_cachedir, 'small_tests')
+            compute_cfgxs = [
+                cfgx
+                for cfgx in compute_cfgxs
+                if not ut.Cacher(
+                    'smalltest',
+                    cfgx2_qreq_[cfgx].get_cfgstr(with_input=True),
+                    cache_dir=st_cachedir,
+                ).exists()
+            ]
+        cfgx2_shared_cm_list = execute_pipeline_stage_dag(
+            ibs, qaids, daids, pipecfg_list, cfgx2_qreq_, compute_cfgxs, stage_workers
+        )
+
     cfgx2_cmsinfo = []
     cfgiter = subindexer_partial(
         range(len(cfgx2_qreq_)), lbl='pipe config', freq=1, adjust=False
@@ -260,7 +298,10 @@ def make_single_testres(
                         # Clear features to preserve memory
                         ibs.clear_table_cache()
                         # qreq_.ibs.print_cachestats_str()
-                cm_list = qreq_.execute()
+                if cfgx in cfgx2_shared_cm_list:
+                    cm_list = cfgx2_shared_cm_list.pop(cfgx)
+                else:
+                    cm_list = qreq_.execute()
                 cmsinfo = test_result.build_cmsinfo(cm_list, qreq_)
                 # record previous feature configuration
                 if ibs.table_cache:
@@ -294,3 +335,145 @@ def make_single_testres(
             if ut.SUPER_STRICT:
                 raise
     return testres
+
+
+def get_pipeline_stage_keys(qreq_):
+    """
+    Returns the cfgstrs of the shareable stages of a query request: the
+    stages before spatial verification and the full pipeline. Requests that
+    do not run the vsmany pipeline (e.g. depcache requests) cannot share
+    their stages, so their first key is the full pipeline key.
+
+    Returns:
+        tuple: (prefix_key, full_key)
+    """
+    from wbia.algo.hots import query_request
+
+    full_key = qreq_.get_cfgstr(with_input=True)
+    if (
+        isinstance(qreq_, query_request.QueryRequest)
+        and qreq_.qparams.pipeline_root == 'vsmany'
+    ):
+        input_cfgstr = qreq_.get_cfgstr(with_input=True, with_pipe=False)
+        prefix_key = input_cfgstr + qreq_.qparams.presver_cfgstr
+    else:
+        prefix_key = full_key
+    return (prefix_key, full_key)
+
+
+def build_pipeline_stage_dag(stage_keys_list):
+    """
+    Groups pipeline configs into a DAG of shared stages. Each branch is the
+    set of configs with the same prefix key, each tail within a branch is the
+    set of configs with the same full key (and therefore the same results).
+
+    Args:
+        stage_keys_list (list): (prefix_key, full_key) of each config
+
+    Returns:
+        list: branch_list - a list of tails for each distinct prefix key,
+            where a tail is the list of the indices of its configs. Branches
+            and tails are in order of first appearance.
+
+    CommandLine:
+        python -m wbia.expt.harness build_pipeline_stage_dag
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.expt.harness import *  # NOQA
+        >>> stage_keys_list = [
+        >>>     ('nn1', 'nn1_sv1'), ('nn2', 'nn2_sv1'), ('nn1', 'nn1_sv2'),
+        >>>     ('nn1', 'nn1_sv1'), ('smk', 'smk'),
+        >>> ]
+        >>> branch_list = build_pipeline_stage_dag(stage_keys_list)
+        >>> print(branch_list)
+        [[[0, 3], [2]], [[1]], [[4]]]
+    """
+    prefix_to_tails = ut.odict()
+    for cfgx, (prefix_key, full_key) in enumerate(stage_keys_list):
+        full_to_cfgxs = prefix_to_tails.setdefault(prefix_key, ut.odict())
+        full_to_cfgxs.setdefault(full_key, []).append(cfgx)
+    branch_list = [list(tails.values()) for tails in prefix_to_tails.values()]
+    return branch_list
+
+
+def _execute_stage_branch(qreq_list):
+    """ Runs the tails of a branch, sharing the prefix if there is more than one """
+    if len(qreq_list) == 1:
+        return [qreq_list[0].execute()]
+    from wbia.algo.hots import match_chips4 as mc4
+
+    return mc4.submit_query_request_group(qreq_list)
+
+
+def _stage_branch_worker(args):
+    """ Runs a branch of the stage DAG in a worker process """
+    import wbia
+
+    dbdir, qaids, daids, pipecfg_list = args
+    # Do not reuse the controller (and connections) of the parent process
+    ibs = wbia.opendb(dbdir=dbdir, use_cache=False)
+    qreq_list = [
+        ibs.new_query_request(qaids, daids, verbose=False, query_cfg=pipe_cfg)
+        for pipe_cfg in pipecfg_list
+    ]
+    return _execute_stage_branch(qreq_list)
+
+
+def execute_pipeline_stage_dag(
+    ibs, qaids, daids, pipecfg_list, cfgx2_qreq_, cfgx_list, stage_workers=0
+):
+    """
+    Executes the query requests of several pipeline configs, running each
+    distinct stage only once (see build_pipeline_stage_dag).
+
+    The stages before spatial verification run once per branch, spatial
+    verification and scoring run once per tail, and configs with the same
+    full pipeline cfgstr share their results. If stage_workers > 1, the
+    independent branches run in a pool of processes that open their own
+    controller.
+
+    Args:
+        cfgx_list (list): indices of the configs to execute
+
+    Returns:
+        dict: cfgx2_cm_list
+    """
+    stage_keys_list = [get_pipeline_stage_keys(cfgx2_qreq_[cfgx]) for cfgx in cfgx_list]
+    branch_list = [
+        [ut.take(cfgx_list, tail) for tail in tails]
+        for tails in build_pipeline_stage_dag(stage_keys_list)
+    ]
+    num_tails = sum(map(len, branch_list))
+    logger.info(
+        '[harn] running %d pipeline configs as %d distinct pipelines in %d branches'
+        % (len(cfgx_list), num_tails, len(branch_list))
+    )
+    if stage_workers > 1 and len(branch_list) > 1:
+        from concurrent import futures
+
+        args_list = [
+            (ibs.get_dbdir(), qaids, daids, [pipecfg_list[tail[0]] for tail in tails])
+            for tails in branch_list
+        ]
+        executor = futures.ProcessPoolExecutor(min(stage_workers, len(args_list)))
+        try:
+            # map yields results in submission order regardless of completion order
+            result_iter = executor.map(_stage_branch_worker, args_list)
+            cm_lists_list = list(
+                ut.ProgIter(result_iter, length=len(args_list), lbl='stage branch')
+            )
+        finally:
+            executor.shutdown(wait=True)
+    else:
+        cm_lists_list = [
+            _execute_stage_branch([cfgx2_qreq_[tail[0]] for tail in tails])
+            for tails in ut.ProgIter(branch_list, lbl='stage branch')
+        ]
+
+    cfgx2_cm_list = {}
+    for tails, cm_lists in zip(branch_list, cm_lists_list):
+        for tail, cm_list in zip(tails, cm_lists):
+            for cfgx in tail:
+                cfgx2_cm_list[cfgx] = cm_list
+    return cfgx2_cm_list
@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar snapshot of the annotation, image, and name attributes used by the
+annotation filters in :mod:`wbia.init.filter_annots`.
+
+The snapshot is built once per database version with one bulk getter call per
+attribute and is cached to disk, so expanding annotation configs only does
+array operations instead of issuing controller getters for every filter.
+
+CommandLine:
+    python -m wbia.init.annot_snapshot AnnotSnapshot
+"""
+import contextlib
+import functools
+import logging
+import os
+import threading
+import uuid
+from os.path import basename, exists, join
+import utool as ut
+import numpy as np
+from wbia import constants as const
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+USE_ANNOT_SNAPSHOT = not ut.get_argflag(('--no-annot-snapshot', '--nocache-snapshot'))
+
+# Updates of a postgres database are not detected, so by default a snapshot
+# of a postgres database is only reused within a snapshot_scope
+REUSE_POSTGRES_SNAPSHOT = ut.get_argflag('--reuse-postgres-snapshot')
+
+# Increment when the columns change so old snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+
+# Tables whose contents the snapshot depends on
+SNAPSHOT_TABLES = [const.ANNOTATION_TABLE, const.IMAGE_TABLE, const.NAME_TABLE]
+
+# In memory snapshots keyed by database directory
+_SNAPSHOT_CACHE = {}
+
+# Snapshots of the active snapshot scopes of each thread
+_SCOPE_LOCAL = threading.local()
+
+
+def _nones_to(values, default, dtype):
+    return np.array([default if val is None else val for val in values], dtype=dtype)
+
+
+class AnnotSnapshot(ut.NiceRepr):
+    """
+    Columnar in-memory snapshot of annotation attributes.
+
+    Each column is an array aligned with the sorted annotation rowids in
+    ``snap.aids``. Filters look up the rows of their aids with
+    :func:`AnnotSnapshot.take_idxs` and are then expressed as vectorized mask
+    operations over the columns.
+
+    Args:
+        columns (dict): maps column names to arrays, must contain 'aid'
+        version (str): database version the snapshot was built from
+
+    CommandLine:
+        python -m wbia.init.annot_snapshot AnnotSnapshot
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.init.annot_snapshot import *  # NOQA
+        >>> snap = testdata_snapshot()
+        >>> aids = [5, 1, 2, 4]
+        >>> print(snap.take('quality', aids))
+        [ 4. nan  2. -1.]
+        >>> print(snap.quality_flags(aids, 'ok', unknown_ok=True))
+        [ True  True False  True]
+        >>> print(snap.viewpoint_flags(aids, ['left'], unknown_ok=False))
+        [ True False  True False]
+        >>> grouped_aids, unique_nids = snap.group_annots_by_name([1, 2, 3, 4, 5, 6])
+        >>> print([aids.tolist() for aids in grouped_aids], unique_nids.tolist())
+        [[4], [1, 3], [2, 5], [6]] [-4, 1, 2, 3]
+        >>> print(snap.take('num_gt_global', [1, 4, 5]))
+        [2 1 1]
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'annot_snapshot')
+        >>> fpath = snap.save(join(dpath, 'snapshot.npz'))
+        >>> snap2 = AnnotSnapshot.load(fpath)
+        >>> assert snap2.version == snap.version
+        >>> assert sorted(snap2.columns.keys()) == sorted(snap.columns.keys())
+        >>> assert np.all(snap2.take('viewpoint', aids) == snap.take('viewpoint', aids))
+        >>> ut.delete(dpath, verbose=False)
+    """
+
+    def __init__(snap, columns, version=None):
+        sortx = np.argsort(columns['aid'], kind='mergesort')
+        snap.columns = {key: np.asarray(col)[sortx] for key, col in columns.items()}
+        snap.aids = snap.columns['aid']
+        snap.version = version
+        if 'num_gt_global' not in snap.columns and 'nid' in snap.columns:
+            # Same as ibs.get_annot_num_groundtruth(aids, noself=False), which
+            # only counts unstaged annotations. Unknown names are
+            # distinguished, so they only count themselves.
+            nids = snap.columns['nid']
+            if 'staged' in snap.columns:
+                unstaged = ~snap.columns['staged'].astype(bool)
+            else:
+                unstaged = np.ones(len(nids), dtype=bool)
+            unique_nids, inverse = np.unique(nids, return_inverse=True)
+            counts = np.bincount(inverse, weights=unstaged, minlength=len(unique_nids))
+            snap.columns['num_gt_global'] = counts.astype(np.int64)[inverse]
+
+    def __nice__(snap):
+        return 'nAids=%d' % (len(snap),)
+
+    def __len__(snap):
+        return len(snap.aids)
+
+    def take_idxs(snap, aids):
+        """ Returns the rows of the given annotation rowids """
+        aids = np.asarray(aids, dtype=snap.aids.dtype)
+        idxs = np.searchsorted(snap.aids, aids)
+        idxs[idxs >= len(snap.aids)] = 0
+        if len(aids) and np.any(snap.aids.take(idxs) != aids):
+            missing = aids[snap.aids.take(idxs) != aids]
+            raise KeyError('annotations not in snapshot: %r' % (missing[0:10].tolist(),))
+        return idxs
+
+    def take(snap, colname, aids):
+        return snap.columns[colname].take(snap.take_idxs(aids), axis=0)
+
+    def quality_flags(snap, aids, minqual, unknown_ok=True):
+        """ Vectorized version of ibs.filter_aids_to_quality """
+        minqual_int = const.QUALITY_TEXT_TO_INT[minqual]
+        quals = snap.take('quality', aids)
+        with np.errstate(invalid='ignore'):
+            isgood = quals >= minqual_int
+        if unknown_ok:
+            return np.isnan(quals) | (quals == -1) | isgood
+        else:
+            return ~np.isnan(quals) & isgood
+
+    def viewpoint_flags(snap, aids, valid_yaws, unknown_ok=True):
+        """ Vectorized version of ibs.get_viewpoint_filterflags """
+        views = snap.take('viewpoint', aids)
+        isunknown = views == ''
+        if valid_yaws is None:
+            isvalid = np.ones(len(views), dtype=bool)
+        else:
+            isvalid = np.isin(views, list(valid_yaws))
+        if unknown_ok:
+            return isunknown | isvalid
+        else:
+            return ~isunknown & isvalid
+
+    def contributor_flags(snap, aids, contributor_contains):
+        tags = snap.take('contributor_tag', aids)
+        return np.char.find(tags, contributor_contains) >= 0
+
+    def group_annots_by_name(snap, aids):
+        """
+        Same as ibs.group_annots_by_name(aids, distinguish_unknowns=True)
+
+        Returns:
+            tuple: grouped_aids, unique_nids
+        """
+        aids = np.asarray(aids, dtype=snap.aids.dtype)
+        nids = snap.take('nid', aids)
+        sortx = np.argsort(nids, kind='mergesort')
+        unique_nids, startxs = np.unique(nids.take(sortx), return_index=True)
+        grouped_aids = np.split(aids.take(sortx), startxs[1:])
+        if len(aids) == 0:
+            grouped_aids = []
+        return grouped_aids, unique_nids
+
+    def save(snap, fpath):
+        """ Writes the snapshot to a temporary file and renames it into place """
+        tmp_fpath = fpath + '.%s.tmp' % (uuid.uuid4().hex[0:8],)
+        with open(tmp_fpath, 'wb') as file_:
+            np.savez(file_, __version__=np.array(snap.version), **snap.columns)
+        os.replace(tmp_fpath, fpath)
+        return fpath
+
+    @classmethod
+    def load(cls, fpath):
+        with np.load(fpath, allow_pickle=False) as data:
+            columns = {key: data[key] for key in data.files if key != '__version__'}
+            version = str(data['__version__'])
+        return cls(columns, version)
+
+    @classmethod
+    @profile
+    def build(cls, ibs, version=None):
+        """ Reads every column with a single bulk getter call """
+        aids = sorted(ibs._get_all_aids())
+        gids = ibs.get_annot_gids(aids)
+        unixtimes = ibs.get_annot_image_unixtimes(aids)
+        viewpoints = ibs.get_annot_viewpoints(aids, assume_unique=True)
+        contributor_tags = ibs.get_image_contributor_tag(gids)
+        columns = {
+            'aid': np.array(aids, dtype=np.int64),
+            'gid': _nones_to(gids, -1, np.int64),
+            'nid': np.array(
+                ibs.get_annot_name_rowids(aids, distinguish_unknowns=True),
+                dtype=np.int64,
+            ),
+            'staged': _nones_to(ibs.get_annot_staged_flags(aids), False, bool),
+            'exemplar': _nones_to(ibs.get_annot_exemplar_flags(aids), -1, np.int8),
+            'reviewed': _nones_to(ibs.get_annot_reviewed(aids), -1, np.int8),
+            'multiple': _nones_to(ibs.get_annot_multiple(aids), -1, np.int8),
+            'has_timestamp': np.array([time != -1 for time in unixtimes], dtype=bool),
+            'unixtime': np.array(
+                ibs.get_annot_image_unixtimes_asfloat(aids), dtype=np.float64
+            ),
+            'gps': np.array(ibs.get_annot_image_gps2(aids), dtype=np.float64).reshape(
+                -1, 2
+            ),
+            'species_rowid': _nones_to(ibs.get_annot_species_rowids(aids), -1, np.int64),
+            'quality': _nones_to(ibs.get_annot_qualities(aids), np.nan, np.float64),
+            'viewpoint': _nones_to(viewpoints, '', str),
+            'been_adjusted': np.array(ibs.get_annot_been_adjusted(aids), dtype=bool),
+            'contributor_tag': _nones_to(contributor_tags, '', str),
+        }
+        return cls(columns, version)
+
+
+def get_annot_snapshot_version(ibs):
+    """
+    Returns a string that changes whenever the tables the snapshot is built
+    from may have changed.
+
+    The row counts and maximum rowids of the tables detect additions and
+    deletions. For sqlite databases the modification times of the database
+    files also detect updates. Updates to a postgres database are not
+    detected, so those snapshots are only reused within a snapshot_scope
+    unless --reuse-postgres-snapshot is given.
+    """
+    stamp = [SNAPSHOT_VERSION, ibs.get_dbname(), str(ibs.get_db_init_uuid())]
+    with ibs.db.connect() as conn:
+        for tablename in SNAPSHOT_TABLES:
+            operation = 'SELECT COUNT(rowid), MAX(rowid) FROM %s' % (tablename,)
+            stamp.append(tuple(conn.execute(operation).fetchone()))
+    if not ibs.is_using_postgres_db:
+        db_fpath = join(ibs.get_ibsdir(), ibs.sqldb_fname)
+        for fpath in [db_fpath, db_fpath + '-wal']:
+            if exists(fpath):
+                stat = os.stat(fpath)
+                stamp.append((basename(fpath), stat.st_mtime_ns, stat.st_size))
+    return ibs.get_dbname() + '_' + ut.hashstr27(ut.repr2(stamp))
+
+
+def get_annot_snapshot_fpath(ibs, version, cache_dpath=None):
+    if cache_dpath is None:
+        from wbia.init import filter_annots
+
+        cache_dpath = filter_annots.get_acfg_cachedir(ibs)
+    return join(cache_dpath, 'ANNOT_SNAPSHOT_%s.npz' % (version,))
+
+
+def _get_scope_snapshots():
+    if not hasattr(_SCOPE_LOCAL, 'snapshots'):
+        _SCOPE_LOCAL.snapshots = {}
+    return _SCOPE_LOCAL.snapshots
+
+
+def in_snapshot_scope(ibs):
+    return ibs.get_dbdir() in _get_scope_snapshots()
+
+
+@contextlib.contextmanager
+def snapshot_scope(ibs):
+    """
+    Within the scope the snapshot of the database is built or validated only
+    once, so a chain of filters does not query the database version for every
+    filter. Scopes of the same database can be nested.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.init.annot_snapshot import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb(defaultdb='testdb1')
+        >>> with snapshot_scope(ibs):
+        >>>     snap = get_annot_snapshot(ibs, use_cache=False)
+        >>>     assert get_annot_snapshot(ibs) is snap
+        >>>     with snapshot_scope(ibs):
+        >>>         assert get_annot_snapshot(ibs) is snap
+        >>>     assert in_snapshot_scope(ibs)
+        >>> assert not in_snapshot_scope(ibs)
+    """
+    snapshots = _get_scope_snapshots()
+    key = ibs.get_dbdir()
+    if key in snapshots:
+        yield
+        return
+    snapshots[key] = None
+    try:
+        yield
+    finally:
+        del snapshots[key]
+
+
+def snapshot_scoped(func):
+    """ Decorator that runs func(ibs, ...) in a snapshot_scope """
+
+    @functools.wraps(func)
+    def _wrapper(ibs, *args, **kwargs):
+        with snapshot_scope(ibs):
+            return func(ibs, *args, **kwargs)
+
+    return _wrapper
+
+
+@profile
+def get_annot_snapshot(ibs, use_cache=None, cache_dpath=None, verbose=None):
+    """
+    Returns the snapshot of the current database version. The snapshot is
+    kept in memory and on disk, snapshots of older versions are removed.
+    Within a snapshot_scope the version is only checked once.
+
+    Args:
+        ibs (IBEISController):  wbia controller object
+        use_cache (bool): if False the snapshot is rebuilt. Defaults to
+            False for postgres databases (see REUSE_POSTGRES_SNAPSHOT).
+        cache_dpath (str): defaults to the annot config cache directory
+
+    Returns:
+        AnnotSnapshot: snap
+
+    CommandLine:
+        python -m wbia.init.annot_snapshot get_annot_snapshot
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.init.annot_snapshot import *  # NOQA
+        >>> import wbia
+        >>> ibs = wbia.opendb(defaultdb='testdb1')
+        >>> snap = get_annot_snapshot(ibs, use_cache=False)
+        >>> aids = ibs.get_valid_aids()
+        >>> assert snap.take('nid', aids).tolist() == ibs.get_annot_nids(aids)
+        >>> assert get_annot_snapshot(ibs) is snap
+        >>> _SNAPSHOT_CACHE.clear()
+        >>> snap2 = get_annot_snapshot(ibs)
+        >>> assert snap2 is not snap and snap2.version == snap.version
+    """
+    key = ibs.get_dbdir()
+    scope_snapshots = _get_scope_snapshots()
+    if use_cache is not False and scope_snapshots.get(key, None) is not None:
+        return scope_snapshots[key]
+    if use_cache is None:
+        use_cache = USE_ANNOT_SNAPSHOT
+        if ibs.is_using_postgres_db and not REUSE_POSTGRES_SNAPSHOT:
+            use_cache = False
+    if verbose is None:
+        verbose = ut.VERBOSE
+    version = get_annot_snapshot_version(ibs)
+    snap = _SNAPSHOT_CACHE.get(key, None)
+    if use_cache and snap is not None and snap.version == version:
+        return snap
+    fpath = get_annot_snapshot_fpath(ibs, version, cache_dpath)
+    snap = None
+    if use_cache and exists(fpath):
+        try:
+            snap = AnnotSnapshot.load(fpath)
+        except Exception as ex:
+            ut.printex(ex, 'Cannot load annot snapshot', iswarning=True)
+    if snap is None:
+        with ut.Timer('building annot snapshot', verbose=verbose):
+            snap = AnnotSnapshot.build(ibs, version)
+        dpath = ut.ensuredir(os.path.dirname(fpath))
+        prefix = 'ANNOT_SNAPSHOT_%s_' % (ibs.get_dbname(),)
+        for fname in os.listdir(dpath):
+            if fname.startswith(prefix) and fname != basename(fpath):
+                ut.delete(join(dpath, fname), verbose=False)
+        try:
+            snap.save(fpath)
+        except IOError as ex:
+            ut.printex(ex, 'Cannot save annot snapshot', iswarning=True)
+    _SNAPSHOT_CACHE[key] = snap
+    if key in scope_snapshots:
+        scope_snapshots[key] = snap
+    return snap
+
+
+def testdata_snapshot():
+    """
+    A small snapshot that does not need a database
+    """
+    columns = {
+        'aid': np.array([6, 2, 3, 1, 4, 5]),
+        'nid': np.array([3, 2, 1, 1, -4, 2]),
+        'quality': np.array([3, 2, np.nan, np.nan, -1, 4]),
+        'staged': np.array([False, False, False, False, False, True]),
+        'viewpoint': np.array(['', 'left', 'right', 'right', '', 'left']),
+        'contributor_tag': np.array(['a', 'b', 'ab', '', 'b', 'c']),
+    }
+    return AnnotSnapshot(columns, 'testdata')
@@ -11,6 +11,7 @@ import utool as ut
 import numpy as np
 import six
 from wbia.control import controller_inject
+from wbia.init import annot_snapshot
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -50,6 +51,7 @@ def time_filter_annots():
 
 
 @register_ibs_method
+@annot_snapshot.snapshot_scoped
 def filter_annots_general(ibs, aid_list=None, filter_kw={}, verbose=False, **kwargs):
     r"""
     Args:
@@ -267,10 +269,7 @@ def filterannots_by_tags(ibs, aid_list, filter_kw):
     return aid_list_
 
 
-def get_acfg_cacheinfo(ibs, aidcfg):
-    """
-    Returns location and name of the ~~annot~~ data cache
-    """
+def get_acfg_cachedir(ibs):
     from os.path import dirname, join
 
     # Make loading aids a big faster for experiments
@@ -283,21 +282,68 @@ def get_acfg_cacheinfo(ibs, aidcfg):
         # acfg_cachedir = './localdata/ACFG_CACHE'
         acfg_cachedir = join(ibs.get_cachedir(), 'ACFG_CACHE')
         ut.ensuredir(acfg_cachedir)
+    return acfg_cachedir
+
+
+def get_acfg_cacheinfo(ibs, aidcfg):
+    """
+    Returns location and name of the ~~annot~~ data cache
+
+    The cachestr includes the version of the annotation snapshot, so cached
+    expansions are reused across runs until the database changes.
+    """
+    acfg_cachedir = get_acfg_cachedir(ibs)
     acfg_cachename = 'ACFG_CACHE'
+    if annot_snapshot.USE_ANNOT_SNAPSHOT:
+        db_cachestr = annot_snapshot.get_annot_snapshot(ibs).version
+    else:
+        db_cachestr = annot_snapshot.get_annot_snapshot_version(ibs)
 
     RESPECT_INTERNAL_CFGS = False
     if RESPECT_INTERNAL_CFGS:
-        aid_cachestr = ibs.get_dbname() + '_' + ut.hashstr27(ut.to_json(aidcfg))
+        aid_cachestr = db_cachestr + '_' + ut.hashstr27(ut.to_json(aidcfg))
     else:
         relevant_aidcfg = copy.deepcopy(aidcfg)
         ut.delete_dict_keys(relevant_aidcfg['qcfg'], ut.INTERNAL_CFGKEYS)
         ut.delete_dict_keys(relevant_aidcfg['dcfg'], ut.INTERNAL_CFGKEYS)
-        aid_cachestr = ibs.get_dbname() + '_' + ut.hashstr27(ut.to_json(relevant_aidcfg))
+        aid_cachestr = db_cachestr + '_' + ut.hashstr27(ut.to_json(relevant_aidcfg))
     acfg_cacheinfo = (acfg_cachedir, acfg_cachename, aid_cachestr)
     return acfg_cacheinfo
 
 
+def _get_snapshot(ibs):
+    """ Returns the annot snapshot or None if it is disabled """
+    if not annot_snapshot.USE_ANNOT_SNAPSHOT:
+        return None
+    if ibs.is_using_postgres_db and not annot_snapshot.REUSE_POSTGRES_SNAPSHOT:
+        # The snapshot is rebuilt for every scope, which only pays off for a
+        # chain of filters
+        if not annot_snapshot.in_snapshot_scope(ibs):
+            return None
+    return annot_snapshot.get_annot_snapshot(ibs)
+
+
+def _get_all_unstaged_aids(ibs, snap, initial_aids=None):
+    if snap is None:
+        if initial_aids is None:
+            initial_aids = ibs._get_all_aids()
+        return ibs.filter_annotation_set(initial_aids, is_staged=False)
+    if initial_aids is None:
+        return snap.aids.compress(~snap.columns['staged']).tolist()
+    if not initial_aids:
+        return initial_aids
+    flags = ~snap.take('staged', initial_aids)
+    return ut.compress(initial_aids, flags)
+
+
+def _group_annots_by_name(ibs, snap, aid_list):
+    if snap is None:
+        return ibs.group_annots_by_name(aid_list, assume_unique=True)
+    return snap.group_annots_by_name(aid_list)
+
+
 @profile
+@annot_snapshot.snapshot_scoped
 def expand_single_acfg(ibs, aidcfg, verbose=None):
     """
     for main_helpers"""
@@ -312,8 +358,7 @@ def expand_single_acfg(ibs, aidcfg, verbose=None):
             % (ut.repr2(annotation_configs.compress_aidcfg(aidcfg), align=True),)
         )
         logger.info('+---------------------')
-    avail_aids = ibs._get_all_aids()
-    avail_aids = ibs.filter_annotation_set(avail_aids, is_staged=False)
+    avail_aids = _get_all_unstaged_aids(ibs, _get_snapshot(ibs))
     avail_aids = filter_annots_independent(ibs, avail_aids, aidcfg, verbose=verbose)
     avail_aids = filter_annots_intragroup(ibs, avail_aids, aidcfg, verbose=verbose)
     avail_aids = sample_annots(ibs, avail_aids, aidcfg, verbose=verbose)
@@ -396,6 +441,7 @@ def hack_extra(ibs, expanded_aids):
     return expanded_aids
 
 
+@annot_snapshot.snapshot_scoped
 def expand_acfgs_consistently(
     ibs, acfg_combo, initial_aids=None, use_cache=None, verbose=None, base=0
 ):
@@ -1010,6 +1056,7 @@ def annot_crossval(
 
 
 @profile
+@annot_snapshot.snapshot_scoped
 def expand_acfgs(
     ibs,
     aidcfg,
@@ -1162,10 +1209,7 @@ def expand_acfgs(
     # if aidcfg['qcfg']['hack_imageset'] is True:
     #    return ibs.get_imageset_expanded_aids()
     # Hack: Make hierarchical filters to supersede this
-    if initial_aids is None:
-        initial_aids = ibs._get_all_aids()
-
-    initial_aids = ibs.filter_annotation_set(initial_aids, is_staged=False)
+    initial_aids = _get_all_unstaged_aids(ibs, _get_snapshot(ibs), initial_aids)
 
     verbflags = dict(verbose=verbose)
     qfiltflags = dict(prefix='q', **verbflags)
@@ -1328,45 +1372,60 @@ def filter_annots_independent(
     VerbosityContext = verb_context('FILTER_INDEPENDENT', aidcfg, verbose)
     VerbosityContext.startfilter(withpre=withpre)
 
+    # Filters are vectorized masks over the columns of the snapshot
+    snap = _get_snapshot(ibs)
+
     if aidcfg.get('is_known') is True:
         with VerbosityContext('is_known'):
-            avail_aids = ibs.filter_aids_without_name(
-                avail_aids, invert=not aidcfg['is_known']
-            )
-        # avail_aids = sorted(avail_aids)
-
-    if aidcfg.get('is_exemplar') is not None:
-        flags = ibs.get_annot_exemplar_flags(avail_aids)
-        is_valid = [flag == aidcfg['is_exemplar'] for flag in flags]
-        with VerbosityContext('is_exemplar'):
-            avail_aids = ut.compress(avail_aids, is_valid)
-        # avail_aids = sorted(avail_aids)
-
-    if aidcfg.get('reviewed') is not None:
-        flags = ibs.get_annot_reviewed(avail_aids)
-        is_valid = [flag == aidcfg['reviewed'] for flag in flags]
-        with VerbosityContext('reviewed'):
-            avail_aids = ut.compress(avail_aids, is_valid)
+            if snap is None:
+                avail_aids = ibs.filter_aids_without_name(
+                    avail_aids, invert=not aidcfg['is_known']
+                )
+            else:
+                flags = snap.take('nid', avail_aids) > 0
+                avail_aids = ut.compress(avail_aids, flags)
         # avail_aids = sorted(avail_aids)
 
-    if aidcfg.get('multiple') is not None:
-        flags = ibs.get_annot_multiple(avail_aids)
-        is_valid = [flag == aidcfg['multiple'] for flag in flags]
-        with VerbosityContext('multiple'):
-            avail_aids = ut.compress(avail_aids, is_valid)
+    for key in ['is_exemplar', 'reviewed', 'multiple']:
+        if aidcfg.get(key) is not None and avail_aids:
+            if snap is None:
+                getter = {
+                    'is_exemplar': ibs.get_annot_exemplar_flags,
+                    'reviewed': ibs.get_annot_reviewed,
+                    'multiple': ibs.get_annot_multiple,
+                }[key]
+                is_valid = [flag == aidcfg[key] for flag in getter(avail_aids)]
+            else:
+                colname = 'exemplar' if key == 'is_exemplar' else key
+                is_valid = snap.take(colname, avail_aids) == int(aidcfg[key])
+            with VerbosityContext(key):
+                avail_aids = ut.compress(avail_aids, is_valid)
         # avail_aids = sorted(avail_aids)
 
     if aidcfg.get('require_timestamp') is True:
         with VerbosityContext('require_timestamp'):
-            avail_aids = ibs.filter_aids_without_timestamps(avail_aids)
+            if snap is None:
+                avail_aids = ibs.filter_aids_without_timestamps(avail_aids)
+            elif avail_aids:
+                flags = snap.take('has_timestamp', avail_aids)
+                avail_aids = ut.compress(avail_aids, flags)
 
     if aidcfg.get('require_gps') is True:
         with VerbosityContext('require_gps'):
-            annots = ibs.annots(avail_aids)
-            annots = annots.compress(~np.isnan(np.array(annots.gps)).any(axis=1))
-            avail_aids = annots.aids
+            if snap is None:
+                annots = ibs.annots(avail_aids)
+                annots = annots.compress(~np.isnan(np.array(annots.gps)).any(axis=1))
+                avail_aids = annots.aids
+            elif avail_aids:
+                flags = ~np.isnan(snap.take('gps', avail_aids)).any(axis=1)
+                avail_aids = ut.compress(avail_aids, flags)
         # avail_aids = sorted(avail_aids)
 
+    def get_unixtimes(aids):
+        if snap is None:
+            return np.array(ibs.get_annot_image_unixtimes_asfloat(aids))
+        return snap.take('unixtime', aids)
+
     if aidcfg.get('max_timestamp') is not None:
         with VerbosityContext('max_timestamp'):
             max_dt = aidcfg.get('max_timestamp')
@@ -1382,7 +1441,7 @@ def filter_annots_independent(
                     y, m, d = max_dt.split('-')
                     max_dt = ut.date_to_datetime(datetime.date(y, m, d))
             max_unixtime = ut.datetime_to_posixtime(max_dt)
-            unixtimes = np.array(ibs.annots(avail_aids).image_unixtimes_asfloat)
+            unixtimes = get_unixtimes(avail_aids)
             flag_list = np.logical_or(np.isnan(unixtimes), unixtimes <= max_unixtime)
             ut.compress(avail_aids, flag_list)
         # avail_aids = sorted(avail_aids)
@@ -1396,36 +1455,53 @@ def filter_annots_independent(
     if cfg_species is not None:
         species = metadata['species']
         with VerbosityContext('species', species=species):
-            avail_aids = ibs.filter_aids_to_species(avail_aids, species)
+            if snap is None:
+                avail_aids = ibs.filter_aids_to_species(avail_aids, species)
+            elif avail_aids:
+                species_rowid = ibs.get_species_rowids_from_text(species)
+                species_rowid = -1 if species_rowid is None else species_rowid
+                flags = snap.take('species_rowid', avail_aids) == species_rowid
+                avail_aids = ut.compress(avail_aids, flags)
             # avail_aids = sorted(avail_aids)
 
     if aidcfg.get('been_adjusted', None):
         # HACK to see if the annotation has been adjusted from the default
         # value set by dbio.ingest_database
-        flag_list = ibs.get_annot_been_adjusted(avail_aids)
+        if snap is None:
+            flag_list = ibs.get_annot_been_adjusted(avail_aids)
+        else:
+            flag_list = snap.take('been_adjusted', avail_aids)
         with VerbosityContext('been_adjusted'):
             avail_aids = ut.compress(avail_aids, flag_list)
 
     if aidcfg.get('contributor_contains', None):
         contributor_contains = aidcfg['contributor_contains']
-        gid_list = ibs.get_annot_gids(avail_aids)
-        tag_list = ibs.get_image_contributor_tag(gid_list)
-        flag_list = [contributor_contains in tag for tag in tag_list]
+        if snap is None:
+            gid_list = ibs.get_annot_gids(avail_aids)
+            tag_list = ibs.get_image_contributor_tag(gid_list)
+            flag_list = [contributor_contains in tag for tag in tag_list]
+        else:
+            flag_list = snap.contributor_flags(avail_aids, contributor_contains)
         with VerbosityContext('contributor_contains'):
             avail_aids = ut.compress(avail_aids, flag_list)
 
     if aidcfg.get('minqual') is not None or aidcfg.get('require_quality'):
         minqual = 'junk' if aidcfg['minqual'] is None else aidcfg['minqual']
+        unknown_ok = not aidcfg['require_quality']
         with VerbosityContext('minqual', 'require_quality'):
             # Filter quality
-            avail_aids = ibs.filter_aids_to_quality(
-                avail_aids, minqual, unknown_ok=not aidcfg['require_quality']
-            )
+            if snap is None:
+                avail_aids = ibs.filter_aids_to_quality(
+                    avail_aids, minqual, unknown_ok=unknown_ok
+                )
+            elif avail_aids:
+                flags = snap.quality_flags(avail_aids, minqual, unknown_ok=unknown_ok)
+                avail_aids = ut.compress(avail_aids, flags)
         # avail_aids = sorted(avail_aids)
 
     if aidcfg.get('max_unixtime', None) is not None:
         max_unixtime = aidcfg.get('max_unixtime', None)
-        unixtimes = np.array(ibs.get_annot_image_unixtimes_asfloat(avail_aids))
+        unixtimes = get_unixtimes(avail_aids)
         flags = unixtimes <= max_unixtime
         with VerbosityContext('max_unixtime'):
             avail_aids = ut.compress(avail_aids, flags)
@@ -1433,7 +1509,7 @@ def filter_annots_independent(
 
     if aidcfg.get('min_unixtime', None) is not None:
         min_unixtime = aidcfg.get('min_unixtime', None)
-        unixtimes = np.array(ibs.get_annot_image_unixtimes_asfloat(avail_aids))
+        unixtimes = get_unixtimes(avail_aids)
         flags = unixtimes >= min_unixtime
         with VerbosityContext('min_unixtime'):
             avail_aids = ut.compress(avail_aids, flags)
@@ -1521,10 +1597,15 @@ def filter_annots_independent(
                     rectify_view(vstr) for vstr in ut.smart_cast(view, list)
                 ]
             unknown_ok = not aidcfg['require_viewpoint']
-            yaw_flags = ibs.get_viewpoint_filterflags(
-                avail_aids, valid_yaw_txts, unknown_ok=unknown_ok, assume_unique=True
-            )
-            yaw_flags = list(yaw_flags)
+            if snap is None:
+                yaw_flags = ibs.get_viewpoint_filterflags(
+                    avail_aids, valid_yaw_txts, unknown_ok=unknown_ok, assume_unique=True
+                )
+                yaw_flags = list(yaw_flags)
+            else:
+                yaw_flags = snap.viewpoint_flags(
+                    avail_aids, valid_yaw_txts, unknown_ok=unknown_ok
+                )
             with VerbosityContext(
                 'view',
                 'require_viewpoint',
@@ -1547,7 +1628,10 @@ def filter_annots_independent(
     if aidcfg.get('min_pername_global') is not None:
         # Keep annots with at least this many groundtruths in the database
         min_pername_global = aidcfg.get('min_pername_global')
-        num_gt_global_list = ibs.get_annot_num_groundtruth(avail_aids, noself=False)
+        if snap is None:
+            num_gt_global_list = ibs.get_annot_num_groundtruth(avail_aids, noself=False)
+        else:
+            num_gt_global_list = snap.take('num_gt_global', avail_aids)
         flag_list = np.array(num_gt_global_list) >= min_pername_global
         with VerbosityContext('exclude_view'):
             avail_aids = ut.compress(avail_aids, flag_list)
@@ -1555,7 +1639,10 @@ def filter_annots_independent(
 
     if aidcfg.get('max_pername_global') is not None:
         max_pername_global = aidcfg.get('max_pername_global')
-        num_gt_global_list = ibs.get_annot_num_groundtruth(avail_aids, noself=False)
+        if snap is None:
+            num_gt_global_list = ibs.get_annot_num_groundtruth(avail_aids, noself=False)
+        else:
+            num_gt_global_list = snap.take('num_gt_global', avail_aids)
         flag_list = np.array(num_gt_global_list) <= max_pername_global
         with VerbosityContext('exclude_view'):
             avail_aids = ut.compress(avail_aids, flag_list)
@@ -1608,6 +1695,8 @@ def filter_annots_intragroup(
     VerbosityContext = verb_context('FILTER_INTRAGROUP', aidcfg, verbose)
     VerbosityContext.startfilter(withpre=withpre)
 
+    snap = _get_snapshot(ibs)
+
     metadata = ut.LazyDict(
         species=lambda: expand_species(ibs, aidcfg['species'], avail_aids)
     )
@@ -1681,9 +1770,7 @@ def filter_annots_intragroup(
     # Each aid must have at least this number of other groundtruth aids
     min_pername = aidcfg['min_pername']
     if min_pername is not None:
-        grouped_aids_ = ibs.group_annots_by_name(
-            avail_aids, distinguish_unknowns=True, assume_unique=True
-        )[0]
+        grouped_aids_ = _group_annots_by_name(ibs, snap, avail_aids)[0]
         with VerbosityContext('min_pername'):
             flags = np.array(ut.lmap(len, grouped_aids_)) >= min_pername
             avail_aids = ut.flatten(ut.compress(grouped_aids_, flags))
@@ -1693,9 +1780,7 @@ def filter_annots_intragroup(
 
     max_pername = aidcfg['max_pername']
     if max_pername is not None:
-        grouped_aids_ = ibs.group_annots_by_name(
-            avail_aids, distinguish_unknowns=True, assume_unique=True
-        )[0]
+        grouped_aids_ = _group_annots_by_name(ibs, snap, avail_aids)[0]
         with VerbosityContext('max_pername'):
             avail_aids = ut.flatten(
                 [aids for aids in grouped_aids_ if len(aids) <= max_pername]
@@ -2065,9 +2150,15 @@ def sample_annots(ibs, avail_aids, aidcfg, prefix='', verbose=VERB_TESTDATA):
     num_names = get_cfg('num_names')
     sample_occur = get_cfg('sample_occur')
 
-    unflat_get_annot_unixtimes = functools.partial(
-        ibs.unflat_map, ibs.get_annot_image_unixtimes_asfloat
-    )
+    snap = _get_snapshot(ibs)
+    if snap is None:
+        unflat_get_annot_unixtimes = functools.partial(
+            ibs.unflat_map, ibs.get_annot_image_unixtimes_asfloat
+        )
+    else:
+
+        def unflat_get_annot_unixtimes(grouped_aids):
+            return [snap.take('unixtime', aids) for aids in grouped_aids]
 
     if offset is None:
         offset = 0
@@ -2077,7 +2168,7 @@ def sample_annots(ibs, avail_aids, aidcfg, prefix='', verbose=VERB_TESTDATA):
         name_offset = 0
 
     if num_names is not None:
-        grouped_aids = ibs.group_annots_by_name(avail_aids, assume_unique=True)[0]
+        grouped_aids = _group_annots_by_name(ibs, snap, avail_aids)[0]
         with VerbosityContext('num_names'):
             name_slice = slice(name_offset, name_offset + num_names)
             avail_aids = ut.flatten(grouped_aids[name_slice])
@@ -2103,7 +2194,7 @@ def sample_annots(ibs, avail_aids, aidcfg, prefix='', verbose=VERB_TESTDATA):
     if sample_per_name is not None:
         # For the query we just choose a single annot per name
         # For the database we have to do something different
-        grouped_aids = ibs.group_annots_by_name(avail_aids, assume_unique=True)[0]
+        grouped_aids = _group_annots_by_name(ibs, snap, avail_aids)[0]
         # Order based on some preference (like random)
         sample_seed = get_cfg('sample_seed')
         rng = np.random.RandomState(sample_seed)
@@ -2150,7 +2241,7 @@ def sample_annots(ibs, avail_aids, aidcfg, prefix='', verbose=VERB_TESTDATA):
         rng = np.random.RandomState(SEED2)
         # Randomly sample names rather than annotations this makes sampling a
         # knapsack problem. Use a random greedy solution
-        grouped_aids = ibs.group_annots_by_name(avail_aids, assume_unique=True)[0]
+        grouped_aids = _group_annots_by_name(ibs, snap, avail_aids)[0]
         # knapsack items values and weights are are num annots per name
         knapsack_items = [
             (len(aids), len(aids), count) for count, aids in enumerate(grouped_aids)
@@ -2,13 +2,17 @@
 # Autogenerated on 18:39:13 2016/02/22
 # flake8: noqa
 import logging
+from wbia import constants as const
 from wbia.other import dbinfo
 from wbia.other import duct_tape
-from wbia.other import detectgrave
-from wbia.other import detectcore
-from wbia.other import detectexport
-from wbia.other import detectfuncs
-from wbia.other import detecttrain
+
+if not const.LAZY_PLUGINS:
+    # Imported on first use with lazy plugins (see wbia.control.plugin_manifest)
+    from wbia.other import detectgrave
+    from wbia.other import detectcore
+    from wbia.other import detectexport
+    from wbia.other import detectfuncs
+    from wbia.other import detecttrain
 from wbia.other import ibsfuncs
 import utool
 
@@ -33,7 +37,9 @@ def reassign_submodule_attributes(verbose=True):
         if len(tup) > 2 and tup[2]:
             continue  # dont import package names
         submodname, fromimports = tup[0:2]
-        submod = getattr(wbia.other, submodname)
+        submod = getattr(wbia.other, submodname, None)
+        if submod is None:
+            continue  # not imported yet with lazy plugins
         for attr in dir(submod):
             if attr.startswith('_'):
                 continue
@@ -74,11 +80,17 @@ def reload_subs(verbose=True):
 
     get_rrr(dbinfo)(verbose=verbose)
     get_rrr(duct_tape)(verbose=verbose)
-    get_rrr(detectfuncs)(verbose=verbose)
-    get_rrr(detectexport)(verbose=verbose)
-    get_rrr(detectcore)(verbose=verbose)
-    get_rrr(detectgrave)(verbose=verbose)
-    get_rrr(detecttrain)(verbose=verbose)
+    detect_modnames = [
+        'detectfuncs',
+        'detectexport',
+        'detectcore',
+        'detectgrave',
+        'detecttrain',
+    ]
+    for modname in detect_modnames:
+        # Detection modules may not be imported yet with lazy plugins
+        if modname in globals():
+            get_rrr(globals()[modname])(verbose=verbose)
     get_rrr(ibsfuncs)(verbose=verbose)
     rrr(verbose=verbose)
     try:
@@ -1398,6 +1398,7 @@ def check_cache_purge(ibs, ttl_days=90, dryrun=True, squeeze=True):
             uris_list = list(it.chain.from_iterable(uris))
 
             extern_rowid_list = []
+            extern_uri_list = []
             extern_path_list = []
 
             zipped = list(zip(rowid_list, uris_list))
@@ -1407,12 +1408,19 @@ def check_cache_purge(ibs, ttl_days=90, dryrun=True, squeeze=True):
                 for uri_ in uri:
                     extern_path = os.path.join(table.extern_dpath, uri_)
                     extern_rowid_list.append(rowid)
+                    extern_uri_list.append(uri_)
                     extern_path_list.append(extern_path)
 
-            arguments_list = list(zip(extern_path_list))
-            extern_exists_list = check_cache_purge_parallel_wrapper(
-                check_cache_purge_exists_worker, arguments_list
-            )
+            if table.extern_storage == 'file':
+                arguments_list = list(zip(extern_path_list))
+                extern_exists_list = check_cache_purge_parallel_wrapper(
+                    check_cache_purge_exists_worker, arguments_list
+                )
+            else:
+                extern_store = table.extern_store
+                extern_exists_list = [
+                    extern_store.exists(extern_uri) for extern_uri in extern_uri_list
+                ]
 
             flag_list = [not extern_exists for extern_exists in extern_exists_list]
             corrupted_rowid_list = ut.compress(extern_rowid_list, flag_list)
@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
-from wbia.research import metrics  # NOQA
+from wbia import constants as const
+
+if not const.LAZY_PLUGINS:
+    # Imported on first use with lazy plugins (see wbia.control.plugin_manifest)
+    from wbia.research import metrics  # NOQA
 
 import utool as ut
 
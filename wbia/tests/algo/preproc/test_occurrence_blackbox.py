@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+
+from wbia.algo.preproc import occurrence_blackbox
+
+
+def make_survey(num, seed=0):
+    rng = np.random.RandomState(seed)
+    posixtimes = np.sort(rng.uniform(0, 60 * 60 * 8, size=num))
+    latlons = np.array([42.7, -73.7]) + rng.normal(scale=0.05, size=(num, 2))
+    return posixtimes, latlons
+
+
+def assert_same_partition(labels1, labels2):
+    # Labels agree up to a renumbering
+    pairs = set(zip(labels1.tolist(), labels2.tolist()))
+    assert len(pairs) == len(set(labels1.tolist())) == len(set(labels2.tolist()))
+
+
+def test_cluster_partially_nan(monkeypatch):
+    # Every chunk is large enough for the tree engine
+    monkeypatch.setattr(occurrence_blackbox, 'TREE_ENGINE_MIN_SIZE', 10)
+    posixtimes, latlons = make_survey(120)
+    posixtimes[::2] = np.nan
+    latlons[::3] = np.nan
+
+    expected = occurrence_blackbox.cluster_timespace_sec(
+        posixtimes, latlons, 300, engine='pdist'
+    )
+    for engine in ['auto', 'tree']:
+        X_labels = occurrence_blackbox.cluster_timespace_sec(
+            posixtimes, latlons, 300, engine=engine
+        )
+        assert_same_partition(X_labels, expected)
+
+
+def test_cluster_engines_agree(monkeypatch):
+    monkeypatch.setattr(occurrence_blackbox, 'TREE_ENGINE_MIN_SIZE', 10)
+    posixtimes, latlons = make_survey(120)
+    expected = occurrence_blackbox.cluster_timespace_sec(
+        posixtimes, latlons, 300, engine='pdist'
+    )
+    X_labels = occurrence_blackbox.cluster_timespace_sec(
+        posixtimes, latlons, 300, engine='auto'
+    )
+    assert_same_partition(X_labels, expected)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+import http.server
+import io
+import threading
+
+import pytest
+from PIL import Image
+
+from wbia.algo.preproc import preproc_image
+
+
+def make_jpeg(color, size=(32, 24)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+class ImageServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, images):
+        super().__init__(('127.0.0.1', 0), ImageRequestHandler)
+        self.images = images
+        self.failures = {}
+        self.num_connections = 0
+        self.lock = threading.Lock()
+
+    def url(self, name):
+        return 'http://127.0.0.1:%d/%s' % (self.server_address[1], name)
+
+
+class ImageRequestHandler(http.server.BaseHTTPRequestHandler):
+    # Keep connections alive so clients can reuse them
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.num_connections += 1
+
+    def do_GET(self):
+        name = self.path.lstrip('/')
+        with self.server.lock:
+            fail = self.server.failures.get(name, 0)
+            if fail > 0:
+                self.server.failures[name] = fail - 1
+        data = self.server.images.get(name, None)
+        if fail > 0 or data is None:
+            self.send_response(503 if fail > 0 else 404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    colors = ['red', 'green', 'blue', 'white', 'black', 'yellow', 'cyan', 'gray']
+    images = {
+        'img%d.jpg' % (count,): make_jpeg(color) for count, color in enumerate(colors)
+    }
+    server = ImageServer(images)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_images_match_local_files(server, tmp_path):
+    names = sorted(server.images.keys())
+    local_gpaths = []
+    for name in names:
+        fpath = tmp_path / name
+        fpath.write_bytes(server.images[name])
+        local_gpaths.append(str(fpath))
+    urls = [server.url(name) for name in names]
+
+    remote_params = list(preproc_image.generate_imageinfo(urls, num_workers=4))
+    local_params = [preproc_image.parse_imageinfo(gpath) for gpath in local_gpaths]
+    for remote, local, url in zip(remote_params, local_params, urls):
+        # uuid, size, and exif agree; the paths are the uris
+        assert remote[0] == local[0]
+        assert remote[1] == url
+        assert remote[3:] == local[3:]
+
+
+def test_connections_are_pooled(server):
+    urls = [server.url(name) for name in sorted(server.images.keys())] * 4
+    params_list = list(preproc_image.generate_imageinfo(urls, num_workers=2))
+    assert all(params is not None for params in params_list)
+    assert server.num_connections <= 2
+
+
+def test_failed_downloads(server):
+    server.failures['img0.jpg'] = 2
+    urls = [server.url('img0.jpg'), server.url('missing.jpg'), server.url('img1.jpg')]
+    session = preproc_image.new_http_session(pool_size=2, max_retries=3)
+    session.get_adapter('http://').max_retries.backoff_factor = 0
+    params_list = list(
+        preproc_image.generate_imageinfo(urls, num_workers=2, session=session)
+    )
+    # Transient server errors are retried, missing images are reported as None
+    assert params_list[0] is not None
+    assert params_list[1] is None
+    assert params_list[2] is not None
+    assert server.failures['img0.jpg'] == 0
+
+
+def test_byte_budget():
+    budget = preproc_image._ByteBudget(max_bytes=10)
+    # A single download larger than the budget does not wait
+    budget.acquire(25)
+    acquired = threading.Event()
+
+    def acquire():
+        budget.acquire(5)
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(0.1)
+    budget.release(25)
+    assert acquired.wait(5)
+    thread.join()
+    assert budget.used == 5
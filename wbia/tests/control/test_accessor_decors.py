@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from wbia.control import accessor_decors
+from wbia.control.accessor_decors import TableCache
+
+
+class FakeController:
+    """Stands in for the controller, storing one column in a dict"""
+
+    def __init__(self, tables=('things',), max_bytes=2 ** 20):
+        self.table_cache = TableCache(max_bytes=max_bytes, tables=tables)
+        self.values = {rowid: rowid * 10 for rowid in range(1, 101)}
+        self.fetched = []
+
+    @accessor_decors.cache_getter('things', 'value', cfgkeys=['scale'])
+    def get_values(self, rowid_list, scale=1):
+        self.fetched.extend(rowid_list)
+        return [
+            None if rowid not in self.values else self.values[rowid] * scale
+            for rowid in rowid_list
+        ]
+
+    @accessor_decors.cache_invalidator('things', ['value'], rowidx=0)
+    def set_values(self, rowid_list, value_list):
+        for rowid, value in zip(rowid_list, value_list):
+            self.values[rowid] = value
+
+    @accessor_decors.cache_invalidator('things', rowidx=0)
+    def delete_things(self, rowid_list):
+        for rowid in rowid_list:
+            self.values.pop(rowid, None)
+
+
+@pytest.fixture
+def ibs():
+    return FakeController()
+
+
+def test_getter_caches_values(ibs):
+    assert ibs.get_values([1, 2, 3]) == [10, 20, 30]
+    assert ibs.get_values([3, 2, 4]) == [30, 20, 40]
+    assert ibs.fetched == [1, 2, 3, 4]
+    # Missing rows are not cached
+    assert ibs.get_values([1000, 1000]) == [None, None]
+    assert ibs.get_values([1000]) == [None]
+    assert ibs.fetched == [1, 2, 3, 4, 1000, 1000, 1000]
+    # Getter configurations are cached separately
+    assert ibs.get_values([1, 2], scale=2) == [20, 40]
+    assert ibs.fetched[-2:] == [1, 2]
+    stats = ibs.table_cache.get_stats()['things.value']
+    assert stats['hits'] == 2
+    assert stats['misses'] == 9
+
+
+def test_writers_invalidate(ibs):
+    ibs.get_values([1, 2, 3])
+    ibs.get_values([1, 2, 3], scale=2)
+    ibs.set_values([2], [7])
+    assert ibs.get_values([1, 2, 3]) == [10, 7, 30]
+    assert ibs.get_values([1, 2, 3], scale=2) == [20, 14, 60]
+    ibs.delete_things((rowid for rowid in [1, 3]))
+    assert 1 not in ibs.values and 3 not in ibs.values
+    assert ibs.get_values([1, 2, 3]) == [None, 7, None]
+
+
+def test_disabled_tables_are_not_cached(ibs):
+    ibs.table_cache.disable('things')
+    ibs.get_values([1, 2])
+    ibs.get_values([1, 2])
+    assert ibs.fetched == [1, 2, 1, 2]
+    assert len(ibs.table_cache) == 0
+    ibs.table_cache.enable('things')
+    ibs.get_values([1, 2])
+    ibs.get_values([1, 2])
+    assert ibs.fetched == [1, 2, 1, 2, 1, 2]
+    assert len(ibs.table_cache) == 2
+
+
+def test_memory_bound():
+    ibs = FakeController(max_bytes=2000)
+    for start in range(1, 100, 10):
+        ibs.get_values(list(range(start, start + 10)))
+        assert ibs.table_cache.nbytes <= 2000
+    assert ibs.table_cache.get_stats()['things.value']['evictions'] > 0
+    # The most recent values are still cached
+    num_fetched = len(ibs.fetched)
+    ibs.get_values([100])
+    assert len(ibs.fetched) == num_fetched
+
+
+def test_values_read_during_a_write_are_not_cached(ibs):
+    original_get_values = FakeController.get_values
+
+    class RacingController(FakeController):
+        @accessor_decors.cache_getter('things', 'value')
+        def get_values(self, rowid_list):
+            values = [self.values[rowid] for rowid in rowid_list]
+            # A writer commits between the read and the cache write
+            self.set_values(rowid_list, [-1] * len(rowid_list))
+            return values
+
+    racing = RacingController()
+    assert racing.get_values([5]) == [50]
+    assert len(racing.table_cache) == 0
+    assert original_get_values(racing, [5]) == [-1]
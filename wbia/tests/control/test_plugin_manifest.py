@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import subprocess
+import sys
+
+from wbia.control import plugin_manifest
+
+
+IMPORT_CODE = 'import json, sys; import wbia; print(json.dumps(sorted(sys.modules)))'
+
+
+def parse_importtime(stderr):
+    """
+    Parses the report of ``python -X importtime`` into a dict mapping module
+    names to (self, cumulative) import times in microseconds
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:') :].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header
+        times[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return times
+
+
+def run_importtime(lazy):
+    env = dict(os.environ, WBIA_LAZY_PLUGINS='ON' if lazy else 'OFF')
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', IMPORT_CODE],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    modules = json.loads(proc.stdout.strip().splitlines()[-1])
+    return parse_importtime(proc.stderr), modules
+
+
+def format_importtime_report(label, times, top=15):
+    lines = ['%s: import wbia took %.2fs' % (label, times['wbia'][1] / 1e6)]
+    slowest = sorted(times.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:top]:
+        lines.append('  %8.3fs %8.3fs  %s' % (cumulative_us / 1e6, self_us / 1e6, name))
+    return '\n'.join(lines)
+
+
+def test_parse_importtime():
+    stderr = '\n'.join(
+        [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   utool.util_arg',
+            'import time:      3000 |       3120 | wbia',
+        ]
+    )
+    assert parse_importtime(stderr) == {
+        'utool.util_arg': (120, 120),
+        'wbia': (3000, 3120),
+    }
+
+
+def test_manifest_is_current():
+    manifest = plugin_manifest.build_plugin_manifest()
+    assert manifest == plugin_manifest.load_plugin_manifest(), (
+        'The plugin manifest is stale. Regenerate it with: '
+        'python -m wbia.control.plugin_manifest dev_autogen_plugin_manifest'
+    )
+
+
+def test_lazy_plugins_import_time():
+    """
+    Benchmarks ``import wbia`` with and without lazy plugins. Run with
+    ``pytest -s`` to see the report of the slowest imports.
+    """
+    eager_times, eager_modules = run_importtime(lazy=False)
+    lazy_times, lazy_modules = run_importtime(lazy=True)
+    print(format_importtime_report('eager plugins', eager_times))
+    print(format_importtime_report('lazy plugins', lazy_times))
+
+    lazy_modnames = set(plugin_manifest.LAZY_PLUGIN_MODNAMES)
+    assert lazy_modnames <= set(eager_modules)
+    imported = sorted(lazy_modnames & set(lazy_modules))
+    assert imported == [], 'lazy plugins were imported: %r' % (imported,)
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from wbia.dtool.example_depcache import testdata_rowid_depc
+
+
+@pytest.fixture
+def new_depc(tmp_path):
+    """
+    Returns a factory of dependency caches with integer root rowids. Each call
+    with a new name gets its own cache directory in tmp_path. The preproc
+    worker pools of the caches are shut down at teardown.
+    """
+    depc_list = []
+
+    def _new_depc(root, name='cache'):
+        depc = testdata_rowid_depc(tmp_path / name, root)
+        depc_list.append(depc)
+        return depc
+
+    yield _new_depc
+    for depc in depc_list:
+        depc.close_preproc_pools()
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+import utool as ut
+
+
+ROOT = 'table_root'
+
+
+def make_depc(
+    new_depc, events, name='cache', fail_compute=None, fail_write=None, **kwargs
+):
+    depc = new_depc(ROOT, name)
+
+    def write_vecs(fpath, vecs):
+        rowid = int(vecs[0, 0])
+        if rowid == fail_write:
+            raise ValueError('failed to write %d' % (rowid,))
+        time.sleep(0.02)
+        np.save(fpath, vecs)
+        events.append(('write', rowid, threading.current_thread().name))
+
+    @depc.register_preproc(
+        'vecs',
+        [ROOT],
+        ['vecs', 'num'],
+        [('extern', np.load, write_vecs, '.npy'), int],
+        chunksize=2,
+        **kwargs,
+    )
+    def compute_vecs(depc, rowid_list, config=None):
+        for rowid in rowid_list:
+            if rowid == fail_compute:
+                raise ValueError('failed to compute %d' % (rowid,))
+            events.append(('compute', rowid, threading.current_thread().name))
+            yield (np.full((rowid, 3), rowid), rowid)
+
+    depc.initialize()
+    return depc
+
+
+def get_rowids(events, kind):
+    return [rowid for kind_, rowid, _ in events if kind_ == kind]
+
+
+def test_pipelined_writes(new_depc):
+    rowid_list = [1, 2, 3, 4, 5]
+    serial_events = []
+    depc = make_depc(new_depc, serial_events, 'serial')
+    expected = depc.get('vecs', rowid_list)
+
+    events = []
+    depc = make_depc(new_depc, events, 'pipelined', pipelined_writes=True)
+    result = depc.get('vecs', rowid_list)
+    assert [num for vecs, num in result] == [num for vecs, num in expected]
+    for (vecs1, _), (vecs2, _) in zip(result, expected):
+        assert np.all(vecs1 == vecs2)
+
+    assert get_rowids(events, 'compute') == rowid_list
+    assert get_rowids(events, 'write') == rowid_list
+    main_name = threading.current_thread().name
+    assert all(name == main_name for kind, _, name in events if kind == 'compute')
+    assert all(name != main_name for kind, _, name in events if kind == 'write')
+    # The second chunk is computed while the first one is written
+    steps = [event[0:2] for event in events]
+    assert steps.index(('compute', 3)) < steps.index(('write', 2))
+
+    # Nothing is recomputed
+    depc.get('vecs', rowid_list)
+    assert get_rowids(events, 'compute') == rowid_list
+
+
+def test_pipelined_compute_error(new_depc):
+    events = []
+    depc = make_depc(new_depc, events, fail_compute=5, pipelined_writes=True)
+    with pytest.raises(ValueError):
+        depc.get('vecs', [1, 2, 3, 4, 5])
+    # The chunks computed before the error are stored
+    assert get_rowids(events, 'write') == [1, 2, 3, 4]
+    assert [num for _, num in depc.get('vecs', [1, 2, 3, 4])] == [1, 2, 3, 4]
+    assert get_rowids(events, 'compute') == [1, 2, 3, 4]
+
+
+def test_pipelined_write_error(new_depc):
+    events = []
+    depc = make_depc(new_depc, events, fail_write=2, pipelined_writes=True)
+    with pytest.raises(ValueError):
+        depc.get('vecs', [1, 2, 3, 4, 5, 6, 7, 8])
+    assert 2 not in get_rowids(events, 'write')
+
+
+def make_rowwise_depc(
+    new_depc, name='cache', fail_rowid=None, crash_rowid=None, **kwargs
+):
+    depc = new_depc(ROOT, name)
+
+    @depc.register_preproc(
+        'double', [ROOT], ['double', 'pid'], [int, int], vectorized=False, **kwargs
+    )
+    def compute_double(depc, rowid, config=None):
+        if rowid == fail_rowid:
+            raise ValueError('failed to compute %d' % (rowid,))
+        if rowid == crash_rowid:
+            os._exit(1)
+        return (rowid * 2, os.getpid())
+
+    depc.initialize()
+    return depc
+
+
+def test_preproc_procs(new_depc):
+    depc = make_rowwise_depc(new_depc, fail_rowid=3, preproc_procs=2)
+    rowid_list = list(range(1, 21))
+    result = depc.get('double', rowid_list)
+    assert result[2] is None
+    result = ut.compress(result, [rowid != 3 for rowid in rowid_list])
+    assert [double for double, pid in result] == [
+        rowid * 2 for rowid in rowid_list if rowid != 3
+    ]
+    pids = {pid for double, pid in result}
+    assert os.getpid() not in pids and len(pids) <= 2
+
+    # The workers are reused
+    result = depc.get('double', [21, 22, 23, 24])
+    assert {pid for double, pid in result} <= pids
+    depc['double'].close_preproc_pool()
+    assert depc['double']._preproc_pool is None
+
+
+def test_preproc_procs_in_process(new_depc):
+    depc = make_rowwise_depc(new_depc, preproc_procs=0)
+    result = depc.get('double', [1, 2, 3])
+    assert result == [(2, os.getpid()), (4, os.getpid()), (6, os.getpid())]
+
+
+def test_preproc_procs_failed_rows(new_depc):
+    # A failing row gives the same result in process and in the workers
+    rowid_list = [1, 2, 3, 4]
+    for num_procs in [0, 2]:
+        name = 'procs%d' % (num_procs,)
+        depc = make_rowwise_depc(new_depc, name, fail_rowid=3, preproc_procs=num_procs)
+        result = depc.get('double', rowid_list)
+        assert result[2] is None
+        assert [double for double, pid in ut.take(result, [0, 1, 3])] == [2, 4, 8]
+
+
+def test_preproc_procs_crashed_worker(new_depc):
+    # Only the row that kills its worker is None
+    depc = make_rowwise_depc(new_depc, crash_rowid=3, preproc_procs=2)
+    rowid_list = list(range(1, 201))
+    result = depc.get('double', rowid_list)
+    assert result[2] is None
+    result = ut.compress(result, [rowid != 3 for rowid in rowid_list])
+    assert [double for double, pid in result] == [
+        rowid * 2 for rowid in rowid_list if rowid != 3
+    ]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+import os
+import threading
+from concurrent import futures
+
+import numpy as np
+
+from wbia.dtool.extern_storage import PackExternStorage
+
+
+ROOT = 'extern_root'
+
+
+def make_depc(new_depc, extern_storage, calls):
+    depc = new_depc(ROOT)
+
+    @depc.register_preproc(
+        'vecs',
+        [ROOT],
+        ['vecs'],
+        [('extern', np.load, np.save, '.npy')],
+        extern_storage=extern_storage,
+    )
+    def compute_vecs(depc, rowid_list, config=None):
+        for rowid in rowid_list:
+            calls.append(rowid)
+            yield (np.full((rowid, 3), rowid, dtype=np.float32),)
+
+    depc.initialize()
+    return depc
+
+
+def check_vecs(vecs_list, rowid_list):
+    assert len(vecs_list) == len(rowid_list)
+    for vecs, rowid in zip(vecs_list, rowid_list):
+        assert vecs.shape == (rowid, 3)
+        assert np.all(vecs == rowid)
+
+
+def test_pack_table(new_depc):
+    calls = []
+    depc = make_depc(new_depc, 'pack', calls)
+    table = depc['vecs']
+    rowid_list = [1, 2, 3, 4]
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert calls == rowid_list
+    # Nothing is written in the layout with one file per row
+    assert os.listdir(table.extern_dpath) == []
+    assert table.extern_store.get_stats()['num_blobs'] == 4
+
+    # Reads do not recompute and paths are materialized on request
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert calls == rowid_list
+    fpath_list = depc.get('vecs', rowid_list, 'vecs', read_extern=False)
+    check_vecs([np.load(fpath) for fpath in fpath_list], rowid_list)
+
+    tbl_rowids = depc.get_rowids('vecs', rowid_list[0:2])
+    table.delete_rows(tbl_rowids, delete_extern=True)
+    stats = table.extern_store.get_stats()
+    assert stats['num_blobs'] == 2 and stats['dead_bytes'] > 0
+    assert table.extern_store.compact(min_ratio=0.1) == 1
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert calls == rowid_list + rowid_list[0:2]
+
+
+def test_pack_table_hack_paths(new_depc):
+    calls = []
+    depc = make_depc(new_depc, 'pack', calls)
+    table = depc['vecs']
+    rowid_list = [1, 2, 3]
+    kwargs = dict(read_extern=False, ensure=False, hack_paths=True)
+    # Paths of rows that are not computed yet are in the extern directory
+    fpath_list = depc.get('vecs', rowid_list, 'vecs', **kwargs)
+    assert [os.path.dirname(fpath) for fpath in fpath_list] == [table.extern_dpath] * 3
+    assert calls == []
+
+    check_vecs(depc.get('vecs', rowid_list[0:2], 'vecs'), rowid_list[0:2])
+    fpath_list = depc.get('vecs', rowid_list, 'vecs', **kwargs)
+    check_vecs([np.load(fpath) for fpath in fpath_list[0:2]], rowid_list[0:2])
+    assert not os.path.exists(fpath_list[2])
+    assert calls == rowid_list[0:2]
+
+
+def test_migrate_file_table(new_depc):
+    calls = []
+    rowid_list = [1, 2, 3]
+    depc = make_depc(new_depc, 'file', calls)
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    extern_dpath = depc['vecs'].extern_dpath
+    assert len(os.listdir(extern_dpath)) == 3
+
+    # A pack table reads the files of the original layout until they migrate
+    depc = make_depc(new_depc, 'pack', calls)
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert depc.migrate_extern_storage() == {'vecs': 3}
+    assert os.listdir(extern_dpath) == []
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert calls == rowid_list
+
+
+def test_concurrent_readers(tmp_path):
+    store = PackExternStorage(str(tmp_path / 'pack'), segment_bytes=2 ** 12)
+    uri_list = ['blob_%d.bin' % (count,) for count in range(200)]
+    for count, uri in enumerate(uri_list):
+        store.write_bytes(uri, bytes([count % 256]) * (count + 1))
+    stop = threading.Event()
+
+    def rewrite():
+        # Rewrite and compact while the readers run
+        while not stop.is_set():
+            for count, uri in enumerate(uri_list[0:50]):
+                store.write_bytes(uri, bytes([count % 256]) * (count + 1))
+            store.compact(min_ratio=0.25)
+
+    def read(uri):
+        count = uri_list.index(uri)
+        return store.read_bytes(uri) == bytes([count % 256]) * (count + 1)
+
+    writer = threading.Thread(target=rewrite)
+    writer.start()
+    try:
+        with futures.ThreadPoolExecutor(8) as executor:
+            flags = list(executor.map(read, uri_list * 5))
+    finally:
+        stop.set()
+        writer.join()
+    assert all(flags)
+
+
+def test_materialized_blobs_are_bounded(tmp_path):
+    store = PackExternStorage(str(tmp_path / 'pack'), materialized_bytes=1000)
+    uri_list = ['blob_%d.bin' % (count,) for count in range(20)]
+    for count, uri in enumerate(uri_list):
+        store.write_bytes(uri, bytes([count]) * 100)
+    first_fpath = store.get_fpath(uri_list[0])
+    for count, uri in enumerate(uri_list[1:], start=1):
+        # The first blob is used all the time, so it is never removed
+        assert store.get_fpath(uri_list[0]) == first_fpath
+        with open(store.get_fpath(uri), 'rb') as file_:
+            assert file_.read() == bytes([count]) * 100
+        assert store.get_stats()['materialized_bytes'] <= 1000
+    assert os.path.exists(first_fpath)
+    assert not os.path.exists(os.path.join(store.materialized_dpath, uri_list[5]))
+    store.compact()
+    assert store.get_stats()['num_materialized'] == 0
+
+
+def test_parallel_reads_keep_order(new_depc):
+    calls = []
+    rowid_list = list(range(1, 60))
+    depc = make_depc(new_depc, 'pack', calls)
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    check_vecs(depc.get('vecs', rowid_list[::-1], 'vecs'), rowid_list[::-1])
+    # Streaming rows as they are decoded
+    tbl_rowids = depc.get_rowids('vecs', rowid_list)
+    vecs_gen = depc['vecs'].get_row_data(tbl_rowids, 'vecs', eager=False)
+    assert not isinstance(vecs_gen, list)
+    check_vecs(list(vecs_gen), rowid_list)
+    assert calls == rowid_list
+
+
+def test_missing_files_are_recomputed(new_depc):
+    calls = []
+    rowid_list = [1, 2, 3, 4]
+    depc = make_depc(new_depc, 'file', calls)
+    table = depc['vecs']
+    fpath_list = depc.get('vecs', rowid_list, 'vecs', read_extern=False)
+    os.remove(fpath_list[1])
+    check_vecs(depc.get('vecs', rowid_list, 'vecs'), rowid_list)
+    assert calls == rowid_list + [2]
+
+    os.remove(fpath_list[2])
+    tbl_rowids = depc.get_rowids('vecs', rowid_list)
+    vecs_gen = table.get_row_data(tbl_rowids, 'vecs', eager=False)
+    check_vecs(list(vecs_gen), rowid_list)
+    assert calls == rowid_list + [2, 3]
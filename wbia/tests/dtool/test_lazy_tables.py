@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import sys
+import textwrap
+
+import pytest
+
+from wbia.dtool import depcache_control
+from wbia.dtool.depcache_control import register_lazy_preprocs
+
+
+ROOT = 'lazy_root'
+MODNAME = '_wbia_test_lazy_tables_plugin'
+
+PLUGIN_SOURCE = """
+from wbia.dtool.depcache_control import make_depcache_decors
+
+register_preproc = make_depcache_decors({root!r})['preproc']
+
+
+@register_preproc('lazy_double', colnames=['double'], coltypes=[int])
+def compute_double(depc, rowid_list, config=None):
+    for rowid in rowid_list:
+        yield (rowid * 2,)
+"""
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    fpath = tmp_path / (MODNAME + '.py')
+    fpath.write_text(textwrap.dedent(PLUGIN_SOURCE.format(root=ROOT)))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield MODNAME
+    sys.modules.pop(MODNAME, None)
+    depcache_control.PREPROC_REGISTER.pop(ROOT, None)
+    depcache_control.LAZY_PREPROC_REGISTER.pop(ROOT, None)
+
+
+def test_lazy_table_imports_module_on_first_use(plugin, new_depc):
+    register_lazy_preprocs(ROOT, ['lazy_double'], plugin)
+    depc = new_depc(ROOT)
+    depc.initialize()
+    assert plugin not in sys.modules
+    assert dict.__len__(depc.cachetable_dict) == 0
+
+    assert depc.get('lazy_double', [1, 2, 3], 'double') == [2, 4, 6]
+    assert plugin in sys.modules
+    assert depc.d.get_lazy_double_double([4]) == [8]
+
+
+def test_lazy_tables_load_on_iteration(plugin, new_depc):
+    register_lazy_preprocs(ROOT, ['lazy_double'], plugin)
+    depc = new_depc(ROOT)
+    depc.initialize()
+    assert plugin not in sys.modules
+    assert depc.get_tablenames() == ['lazy_double']
+    assert plugin in sys.modules
+
+
+def test_imported_tables_are_not_lazy(plugin, new_depc):
+    register_lazy_preprocs(ROOT, ['lazy_double'], plugin)
+    __import__(plugin)
+    depc = new_depc(ROOT)
+    depc.initialize()
+    assert depc._lazy_tables == {}
+    assert 'lazy_double' in depc.cachetable_dict
+    with pytest.raises(KeyError):
+        depc['not_a_table']
@@ -851,6 +851,94 @@ class TestGettingAPI(BaseAPITestCase):
         assert data == expected
 
 
+    def make_uuid_table(self, name):
+        self.ctrlr.add_table(
+            name,
+            [
+                ('thing_rowid', 'INTEGER PRIMARY KEY'),
+                ('thing_uuid', 'UUID NOT NULL'),
+                ('kind', 'TEXT'),
+                ('num', 'INTEGER'),
+                ('data', 'NDARRAY'),
+            ],
+            superkeys=[('thing_uuid',), ('kind', 'num')],
+        )
+        uuids = [uuid.uuid4() for i in range(0, 10)]
+        table = self.ctrlr._reflect_table(name)
+        with self.ctrlr.connect() as conn:
+            for i, uuid_ in enumerate(uuids):
+                conn.execute(
+                    table.insert(),
+                    thing_uuid=uuid_,
+                    kind=(i % 2) and 'odd' or 'even',
+                    num=i,
+                    data=np.arange(i),
+                )
+        return uuids
+
+    def test_get_unique_in_input_order(self):
+        table_name = 'test_getting'
+        self.make_table(table_name)
+        self.populate_table(table_name)
+
+        # Unordered, duplicate, missing and numpy ids
+        requested_ids = [7, 2, 99, 2, None, np.int64(10), 1]
+        data = self.ctrlr.get(table_name, ['y', 'x'], requested_ids)
+        assert data == [(6, 'even'), (1, 'odd'), None, (1, 'odd'), None, (9, 'odd'), (0, 'even')]
+
+        data = self.ctrlr.get(table_name, ['y'], requested_ids, unpack_scalars=False)
+        assert data == [[6], [1], [], [1], [], [9], [0]]
+
+        data = self.ctrlr.get(table_name, ['y'], requested_ids, keepwrap=True)
+        assert data[:3] == [(6,), (1,), None]
+
+        # The grouping getter gives the same results
+        for kwargs in ({}, {'unpack_scalars': False}):
+            expected = self.ctrlr._get_grouped(
+                table_name, ['y', 'x'], requested_ids, **kwargs
+            )
+            assert self.ctrlr.get(table_name, ['y', 'x'], requested_ids, **kwargs) == expected
+
+        assert self.ctrlr.get(table_name, ['y'], []) == []
+
+    def test_get_unique_by_superkeys(self):
+        table_name = 'test_getting_uuids'
+        uuids = self.make_uuid_table(table_name)
+        assert self.ctrlr._is_unique_key(table_name, ('thing_uuid',))
+        assert self.ctrlr._is_unique_key(table_name, ('kind', 'num'))
+        assert not self.ctrlr._is_unique_key(table_name, ('kind',))
+
+        # uuids as objects or strings, including an unknown uuid
+        requested = [uuids[3], str(uuids[0]), uuid.uuid4()]
+        data = self.ctrlr.get(
+            table_name, ['thing_rowid', 'data'], requested, id_colname='thing_uuid'
+        )
+        assert [d and d[0] for d in data] == [4, 1, None]
+        assert data[0][1].tolist() == [0, 1, 2]
+
+        rowids = self.ctrlr.get_where_eq(
+            table_name,
+            ('thing_rowid',),
+            [('odd', 5), ('even', 5), ['even', 8]],
+            ('kind', 'num'),
+        )
+        assert rowids == [6, None, 9]
+
+        # Non-unique keys still group all the matching rows
+        nums = self.ctrlr.get(
+            table_name, ['num'], ['odd', 'even'], id_colname='kind', unpack_scalars=False
+        )
+        assert nums == [[1, 3, 5, 7, 9], [0, 2, 4, 6, 8]]
+
+    def test_reflection_is_cached(self):
+        table_name = 'test_getting'
+        self.make_table(table_name)
+        table = self.ctrlr._reflect_table(table_name)
+        assert self.ctrlr._reflect_table(table_name) is table
+        self.ctrlr.invalidate_tables_cache()
+        assert self.ctrlr._reflect_table(table_name) is not table
+
+
 class TestSettingAPI(BaseAPITestCase):
     def test_setting(self):
         # Note, this is not a comprehensive test. It only attempts to test the SQL logic.
@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import io
 import uuid
 
 import numpy as np
@@ -8,6 +9,7 @@ from sqlalchemy.sql import text, bindparam
 from sqlalchemy.types import Float
 
 from wbia.dtool.types import Dict, Integer, List, NDArray, Number, UUID
+from wbia.dtool.types import NDARRAY_MAGIC, decode_ndarray_list
 
 
 @pytest.fixture(autouse=True)
@@ -140,6 +142,39 @@ def test_numpy_ndarray(db):
     assert (selected_value == insert_value).all()
 
 
+def test_numpy_ndarray_codec(db):
+    db.execute(text('CREATE TABLE test(id INTEGER, x NDARRAY)'))
+
+    # Rows written with np.save by previous versions
+    old_value = np.arange(6, dtype=np.float32).reshape(2, 3)
+    out = io.BytesIO()
+    np.save(out, old_value)
+    db.execute(text('INSERT INTO test(id, x) VALUES (1, :x)'), x=out.getvalue())
+
+    new_value = np.ones((4, 128), np.uint8)
+    stmt = text('INSERT INTO test(id, x) VALUES (2, :x)')
+    stmt = stmt.bindparams(bindparam('x', type_=NDArray))
+    db.execute(stmt, x=new_value)
+
+    # New rows use the raw codec
+    blob = db.execute(text('SELECT x FROM test WHERE id = 2')).fetchone()[0]
+    assert blob.startswith(NDARRAY_MAGIC)
+    assert len(blob) == 16 + 2 * 8 + new_value.nbytes
+
+    stmt = text('SELECT x FROM test ORDER BY id').columns(x=NDArray)
+    old_value_, new_value_ = [row[0] for row in db.execute(stmt)]
+    assert old_value_.dtype == old_value.dtype and (old_value_ == old_value).all()
+    assert new_value_.dtype == new_value.dtype and (new_value_ == new_value).all()
+
+    # Bulk decoding gives writable views into one buffer
+    blobs = [row[0] for row in db.execute(text('SELECT x FROM test ORDER BY id'))]
+    arr_list = decode_ndarray_list(blobs + blobs)
+    assert (arr_list[2] == old_value).all() and (arr_list[3] == new_value).all()
+    assert arr_list[1].base is arr_list[3].base
+    arr_list[1][0, 0] = 0
+    assert arr_list[3][0, 0] == 1
+
+
 np_numbers = (
     np.int8(120),
     np.int16(32767),
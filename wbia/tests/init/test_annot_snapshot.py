@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+import uuid
+
+import numpy as np
+import utool as ut
+
+import wbia
+from wbia import constants as const
+from wbia.expt import annotation_configs
+from wbia.init import annot_snapshot, filter_annots
+
+
+def test_num_gt_global_ignores_staged(tmp_path, monkeypatch):
+    ibs = wbia.opendb(defaultdb='testdb1')
+    aid_list = ibs.get_valid_aids()
+    # Stage annotations of a name with groundtruth and of an unknown name
+    num_gt_list = ibs.get_annot_num_groundtruth(aid_list)
+    named_aid = ut.compress(aid_list, [num_gt > 0 for num_gt in num_gt_list])[0]
+    unknown_aid = ut.compress(
+        aid_list, [nid < 0 for nid in ibs.get_annot_nids(aid_list)]
+    )[0]
+    name = ibs.get_annot_names([named_aid])[0]
+    gid_list = ibs.get_annot_gids([named_aid, named_aid, unknown_aid])
+    staged_aids = ibs.add_annots(
+        gid_list,
+        bbox_list=[(0, 0, 10, 10), (0, 0, 12, 12), (0, 0, 14, 14)],
+        name_list=[name, name, const.UNKNOWN],
+        staged_uuid_list=[uuid.uuid4() for _ in gid_list],
+        staged_user_id_list=['tester'] * 3,
+    )
+    try:
+        assert all(ibs.get_annot_staged_flags(staged_aids))
+        snap = annot_snapshot.get_annot_snapshot(
+            ibs, use_cache=False, cache_dpath=str(tmp_path)
+        )
+        aids = aid_list + staged_aids
+        expected = ibs.get_annot_num_groundtruth(aids, noself=False)
+        assert snap.take('num_gt_global', aids).tolist() == expected
+
+        aidcfg = dict(
+            annotation_configs.default['dcfg'],
+            min_pername_global=2,
+            max_pername_global=2,
+        )
+        with_snapshot = filter_annots.filter_annots_independent(ibs, aids, aidcfg)
+        monkeypatch.setattr(annot_snapshot, 'USE_ANNOT_SNAPSHOT', False)
+        without_snapshot = filter_annots.filter_annots_independent(ibs, aids, aidcfg)
+        assert with_snapshot == without_snapshot
+        assert set(with_snapshot) <= set(np.array(aids)[np.array(expected) == 2].tolist())
+    finally:
+        ibs.delete_annots(staged_aids)
+        annot_snapshot._SNAPSHOT_CACHE.clear()
@@ -6,23 +6,33 @@ import utool
 (print, rrr, profile) = utool.inject2(__name__, '[web]')
 logger = logging.getLogger('wbia')
 
-from wbia.web import apis_detect
-from wbia.web import apis_engine
-from wbia.web import apis_json
-from wbia.web import apis_sync
-from wbia.web import apis_query
-from wbia.web import apis
-from wbia.web import app
-from wbia.web import appfuncs
-from wbia.web import routes_ajax
-from wbia.web import routes_demo
-from wbia.web import routes_csv
-from wbia.web import routes_experiments
-from wbia.web import routes_submit
-from wbia.web import routes
+from wbia import constants as const
+from wbia.control import controller_inject
 
 
-from wbia.control import controller_inject
+def import_web_modules():
+    """
+    Imports the modules that register the web API and routes. With lazy
+    plugins this happens when the web server starts instead of on import.
+    """
+    from wbia.web import apis_detect
+    from wbia.web import apis_engine
+    from wbia.web import apis_json
+    from wbia.web import apis_sync
+    from wbia.web import apis_query
+    from wbia.web import apis
+    from wbia.web import app
+    from wbia.web import appfuncs
+    from wbia.web import routes_ajax
+    from wbia.web import routes_demo
+    from wbia.web import routes_csv
+    from wbia.web import routes_experiments
+    from wbia.web import routes_submit
+    from wbia.web import routes
+
+    if controller_inject.MICROSOFT_API_ENABLED:
+        from wbia.web import apis_microsoft
+
 
-if controller_inject.MICROSOFT_API_ENABLED:
-    from wbia.web import apis_microsoft
+if not const.LAZY_PLUGINS:
+    import_web_modules()
@@ -3,11 +3,12 @@
 Dependencies: flask, tornado
 """
 import logging
+import os
+import hashlib
 from os.path import join, exists
 import zipfile
 import time
 from io import BytesIO
-from six.moves import cStringIO as StringIO
 from flask import request, current_app, send_file
 from wbia.control import controller_inject
 from wbia.web import appfuncs as appf
@@ -54,6 +55,66 @@ def web_embed(*args, **kwargs):
     ut.embed()
 
 
+def _send_image_src(gpath, cache_key):
+    """
+    Sends the image at gpath as an image/jpeg response.
+
+    The response carries an ETag derived from cache_key, the web resize
+    parameters, and the file's modification time and size, so clients that
+    revalidate with If-None-Match / If-Modified-Since get a 304 without the
+    image being read. JPEGs without EXIF data (e.g. thumbnails) that need no
+    resizing are streamed directly from disk. Everything else, including any
+    image whose EXIF data could carry orientation or GPS metadata, is decoded,
+    resized, and encoded once and then served from appf.ENCODED_IMAGE_CACHE.
+
+    Args:
+        gpath (str): path to the source image
+        cache_key (tuple): identifies the source, e.g. (kind, rowid, uuid)
+    """
+    from PIL import Image  # NOQA
+
+    assert gpath is not None, 'image path should not be None'
+    resize_params = appf.get_web_resize_parameters()
+    stat = os.stat(gpath)
+    key = tuple(cache_key) + (resize_params, gpath, stat.st_mtime_ns, stat.st_size)
+    etag = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+    last_modified = int(stat.st_mtime)
+
+    # Answer conditional requests without touching the image
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    elif request.if_modified_since is not None:
+        not_modified = request.if_modified_since.timestamp() >= last_modified
+    else:
+        not_modified = False
+
+    if not_modified:
+        response = current_app.response_class(status=304)
+    elif not any(resize_params[:4]) and appf.is_streamable_jpeg(gpath):
+        response = send_file(gpath, mimetype='image/jpeg')
+    else:
+        img_bytes = appf.ENCODED_IMAGE_CACHE.get(key)
+        if img_bytes is None:
+            # Load image
+            image = vt.imread(gpath, orient='auto')
+            image = appf.resize_via_web_parameters(image)
+            image = image[:, :, ::-1]
+
+            # Encode image
+            image_pil = Image.fromarray(image)
+            img_io = BytesIO()
+            image_pil.save(img_io, 'JPEG', quality=100)
+            img_bytes = img_io.getvalue()
+            appf.ENCODED_IMAGE_CACHE.put(key, img_bytes)
+        response = send_file(BytesIO(img_bytes), mimetype='image/jpeg')
+
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Allow the browser to store images, but have it revalidate every time
+    response.cache_control.no_cache = True
+    return response
+
+
 @register_route(
     '/api/image/src/<rowid>.jpg',
     methods=['GET'],
@@ -89,8 +150,6 @@ def image_src_api(rowid=None, thumbnail=False, fresh=False, **kwargs):
         Method: GET
         URL:    /api/image/src/<rowid>/
     """
-    from PIL import Image  # NOQA
-
     thumbnail = thumbnail or 'thumbnail' in request.args or 'thumbnail' in request.form
     ibs = current_app.ibs
     if thumbnail:
@@ -104,22 +163,9 @@ def image_src_api(rowid=None, thumbnail=False, fresh=False, **kwargs):
     else:
         gpath = ibs.get_image_paths(rowid)
 
-    # Load image
-    assert gpath is not None, 'image path should not be None'
-    image = vt.imread(gpath, orient='auto')
-    image = appf.resize_via_web_parameters(image)
-    image = image[:, :, ::-1]
-
-    # Encode image
-    image_pil = Image.fromarray(image)
-    if six.PY2:
-        img_io = StringIO()
-    else:
-        img_io = BytesIO()
-    image_pil.save(img_io, 'JPEG', quality=100)
-    img_io.seek(0)
-    return send_file(img_io, mimetype='image/jpeg')
-    # return send_file(gpath, mimetype='application/unknown')
+    image_uuid = ibs.get_image_uuids(rowid)
+    cache_key = ('image', rowid, image_uuid, bool(thumbnail))
+    return _send_image_src(gpath, cache_key)
 
 
 # Special function that is a route only to ignore the JSON response, but is
@@ -148,27 +194,12 @@ def annot_src_api(rowid=None, fresh=False, **kwargs):
         Method: GET
         URL:    /api/annot/src/<rowid>/
     """
-    from PIL import Image  # NOQA
-
     ibs = current_app.ibs
     gpath = ibs.get_annot_chip_fpath(rowid, ensure=True)
 
-    # Load image
-    assert gpath is not None, 'image path should not be None'
-    image = vt.imread(gpath, orient='auto')
-    image = appf.resize_via_web_parameters(image)
-    image = image[:, :, ::-1]
-
-    # Encode image
-    image_pil = Image.fromarray(image)
-    if six.PY2:
-        img_io = StringIO()
-    else:
-        img_io = BytesIO()
-    image_pil.save(img_io, 'JPEG', quality=100)
-    img_io.seek(0)
-    return send_file(img_io, mimetype='image/jpeg')
-    # return send_file(gpath, mimetype='application/unknown')
+    visual_uuid = ibs.get_annot_visual_uuids(rowid)
+    cache_key = ('annot', rowid, visual_uuid)
+    return _send_image_src(gpath, cache_key)
 
 
 # Special function that is a route only to ignore the JSON response, but is
@@ -197,27 +228,12 @@ def background_src_api(rowid=None, fresh=False, **kwargs):
         Method: GET
         URL:    /api/annot/src/<rowid>/
     """
-    from PIL import Image  # NOQA
-
     ibs = current_app.ibs
     gpath = ibs.get_annot_probchip_fpath(rowid)
 
-    # Load image
-    assert gpath is not None, 'image path should not be None'
-    image = vt.imread(gpath, orient='auto')
-    image = appf.resize_via_web_parameters(image)
-    image = image[:, :, ::-1]
-
-    # Encode image
-    image_pil = Image.fromarray(image)
-    if six.PY2:
-        img_io = StringIO()
-    else:
-        img_io = BytesIO()
-    image_pil.save(img_io, 'JPEG', quality=100)
-    img_io.seek(0)
-    return send_file(img_io, mimetype='image/jpeg')
-    # return send_file(gpath, mimetype='application/unknown')
+    visual_uuid = ibs.get_annot_visual_uuids(rowid)
+    cache_key = ('background', rowid, visual_uuid)
+    return _send_image_src(gpath, cache_key)
 
 
 # Special function that is a route only to ignore the JSON response, but is
@@ -6,6 +6,7 @@ import tornado.wsgi
 import tornado.httpserver
 import logging
 import socket
+from wbia import constants as const
 from wbia.control import controller_inject
 from wbia.web import apis_engine
 from wbia.web import job_engine
@@ -236,6 +237,13 @@ def start_from_wbia(
     """
     logger.info('[web] start_from_wbia()')
 
+    if const.LAZY_PLUGINS:
+        # Register every route and API method before serving
+        import wbia.web
+
+        wbia.web.import_web_modules()
+        ibs.load_lazy_plugins()
+
     if start_job_queue is None:
         if ut.get_argflag('--noengine'):
             start_job_queue = False
@@ -15,6 +15,8 @@ import pynmea2
 import simplejson as json
 import numpy as np
 import six
+import threading
+from collections import OrderedDict
 
 (print, rrr, profile) = ut.inject2(__name__)
 logger = logging.getLogger('wbia')
@@ -32,6 +34,11 @@ VALID_TURK_MODES = [
 
 
 ALLOW_STAGED = False
+
+# Upper bound on the total size of encoded images kept by ENCODED_IMAGE_CACHE
+ENCODED_IMAGE_CACHE_MAX_BYTES = ut.get_argval(
+    '--web-image-cache-mb', type_=int, default=256
+) * (2 ** 20)
 CANONICAL_PART_TYPE = '__CANONICAL__'
 
 
@@ -52,6 +59,80 @@ VIEWPOINT_MAPPING_INVERT = {
 }
 
 
+class EncodedImageCache(object):
+    """
+    Thread-safe LRU cache of encoded image bytes bounded by total size.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.appfuncs import *  # NOQA
+        >>> cache = EncodedImageCache(max_bytes=10)
+        >>> cache.put('a', b'12345')
+        >>> cache.put('b', b'12345')
+        >>> assert cache.get('a') == b'12345'
+        >>> cache.put('c', b'123')
+        >>> assert cache.get('b') is None
+        >>> assert cache.nbytes == 8
+        >>> cache.put('d', b'12345678901')
+        >>> assert cache.get('d') is None
+        >>> print(ut.repr2(cache.stats(), sorted_=True))
+        {'hits': 1, 'max_bytes': 10, 'misses': 2, 'nbytes': 8, 'size': 2}
+    """
+
+    def __init__(cache, max_bytes=ENCODED_IMAGE_CACHE_MAX_BYTES):
+        cache.max_bytes = max_bytes
+        cache.nbytes = 0
+        cache.hits = 0
+        cache.misses = 0
+        cache._data = OrderedDict()
+        cache._lock = threading.Lock()
+
+    def __len__(cache):
+        return len(cache._data)
+
+    def get(cache, key):
+        with cache._lock:
+            value = cache._data.get(key, None)
+            if value is None:
+                cache.misses += 1
+            else:
+                cache.hits += 1
+                cache._data.move_to_end(key)
+            return value
+
+    def put(cache, key, value):
+        nbytes = len(value)
+        if nbytes > cache.max_bytes:
+            # Never let a single item flush the entire cache
+            return
+        with cache._lock:
+            old_value = cache._data.pop(key, None)
+            if old_value is not None:
+                cache.nbytes -= len(old_value)
+            cache._data[key] = value
+            cache.nbytes += nbytes
+            while cache.nbytes > cache.max_bytes:
+                _, evicted = cache._data.popitem(last=False)
+                cache.nbytes -= len(evicted)
+
+    def clear(cache):
+        with cache._lock:
+            cache._data.clear()
+            cache.nbytes = 0
+
+    def stats(cache):
+        return {
+            'size': len(cache._data),
+            'nbytes': cache.nbytes,
+            'max_bytes': cache.max_bytes,
+            'hits': cache.hits,
+            'misses': cache.misses,
+        }
+
+
+ENCODED_IMAGE_CACHE = EncodedImageCache()
+
+
 class NavbarClass(object):
     def __init__(nav):
         nav.item_list = [
@@ -79,7 +160,8 @@ class NavbarClass(object):
             yield active, link, nice
 
 
-def resize_via_web_parameters(image):
+def get_web_resize_parameters():
+    """ Returns the resize parameters of the current request as a tuple """
     w_pix = request.args.get('resize_pix_w', request.form.get('resize_pix_w', None))
     h_pix = request.args.get('resize_pix_h', request.form.get('resize_pix_h', None))
     w_per = request.args.get('resize_per_w', request.form.get('resize_per_w', None))
@@ -98,6 +180,12 @@ def resize_via_web_parameters(image):
         _pix,
         _per,
     )
+    return args
+
+
+def resize_via_web_parameters(image):
+    args = get_web_resize_parameters()
+    w_pix, h_pix, w_per, h_per, _pix, _per = args
     logger.info('CHECKING RESIZING WITH %r pix, %r pix, %r %%, %r %% [%r, %r]' % args)
     # Check for nothing
     if not (w_pix or h_pix or w_per or h_per):
@@ -119,6 +207,25 @@ def resize_via_web_parameters(image):
     return _resize(image, t_width=w_pix, t_height=h_pix)
 
 
+def is_streamable_jpeg(gpath):
+    """
+    Checks if an image file can be sent as-is, i.e. it is an RGB or grayscale
+    JPEG without any EXIF data. Files with EXIF data may need to be rotated
+    and may carry metadata (e.g. GPS) that should not be served.
+    """
+    from PIL import Image
+
+    try:
+        # Only the header is parsed, the pixel data is not decoded
+        with Image.open(gpath) as pil_img:
+            if pil_img.format != 'JPEG' or pil_img.mode not in ['RGB', 'L']:
+                return False
+            has_exif = 'exif' in pil_img.info
+    except Exception:
+        return False
+    return not has_exif
+
+
 def embed_image_html(imgBGR, target_width=TARGET_WIDTH, target_height=TARGET_HEIGHT):
     """ Creates an image embedded in HTML base64 format. """
     import cv2
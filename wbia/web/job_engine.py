@@ -59,14 +59,14 @@ import time
 import zmq
 import uuid  # NOQA
 import numpy as np
-import shelve
 import random
 from datetime import datetime, timedelta
 import pytz
 import flask
-from os.path import join, exists, abspath, splitext, basename
+from os.path import join
 from functools import partial
 from wbia.control import controller_inject
+from wbia.web.job_store import JobStore, get_job_store_fpath
 import multiprocessing
 
 
@@ -90,15 +90,15 @@ NUM_ENGINES = 1 if ut.get_argflag('--serial-job-lanes') else 2
 VERBOSE_JOBS = False
 
 
-GLOBAL_SHELVE_LOCK = multiprocessing.Lock()
-
-
 TIMESTAMP_FMTSTR = '%Y-%m-%d %H:%M:%S %Z'
 TIMESTAMP_TIMEZONE = 'US/Pacific'
 
 
 JOB_STATUS_CACHE = {}
 
+# Latest resource stats reported by each engine process, kept by the collector
+ENGINE_STATS_DICT = {}
+
 
 def update_proctitle(procname, dbname=None):
     try:
@@ -115,13 +115,6 @@ def update_proctitle(procname, dbname=None):
         print('pip install setproctitle')
 
 
-def _get_engine_job_paths(ibs):
-    shelve_path = ibs.get_shelves_path()
-    ut.ensuredir(shelve_path)
-    record_filepath_list = list(ut.iglob(join(shelve_path, '*.pkl')))
-    return record_filepath_list
-
-
 def _get_engine_lock_paths(ibs):
     shelve_path = ibs.get_shelves_path()
     ut.ensuredir(shelve_path)
@@ -131,12 +124,9 @@ def _get_engine_lock_paths(ibs):
 
 @register_ibs_method
 def retry_job(ibs, jobid):
-    shelve_path = ibs.get_shelves_path()
-    job_record_filename = '%s.pkl' % (jobid,)
-    job_record_filepath = join(shelve_path, job_record_filename)
-    assert exists(job_record_filepath)
-
-    job_record = ut.load_cPkl(job_record_filepath)
+    store = JobStore(get_job_store_fpath(ibs))
+    job_record = store.get_record(jobid)
+    assert job_record is not None
 
     job_action = job_record['request']['action']
     job_args = job_record['request']['args']
@@ -362,6 +352,22 @@ def get_job_metadata(ibs, jobid):
     return status
 
 
+@register_ibs_method
+@register_api('/api/engine/stats/', methods=['GET', 'POST'], __api_plural_check__=False)
+def get_engine_stats(ibs):
+    """
+    Web call that returns the latest resource stats of each engine process
+
+    The neighbor index cache lives in the engine processes, so its size and
+    hit rate are reported to the collector after every job.
+
+    Returns:
+        dict: maps engine names to their stats
+    """
+    reply = ibs.job_manager.jobiface.get_engine_stats_dict()
+    return reply['json_result']
+
+
 @register_ibs_method
 @register_api('/api/engine/job/result/', methods=['GET', 'POST'])
 def get_job_result(ibs, jobid):
@@ -628,85 +634,17 @@ class JobBackend(object):
         return status_dict
 
 
-def get_shelve_lock_filepath(shelve_filepath):
-    shelve_lock_filepath = '%s.lock' % (shelve_filepath,)
-    return shelve_lock_filepath
-
-
-def touch_shelve_lock_file(shelve_filepath):
-    shelve_lock_filepath = get_shelve_lock_filepath(shelve_filepath)
-    assert not exists(shelve_lock_filepath)
-    ut.touch(shelve_lock_filepath, verbose=False)
-    assert exists(shelve_lock_filepath)
-
-
-def delete_shelve_lock_file(shelve_filepath):
-    shelve_lock_filepath = get_shelve_lock_filepath(shelve_filepath)
-    assert exists(shelve_lock_filepath)
-    ut.delete(shelve_lock_filepath, verbose=False)
-    assert not exists(shelve_lock_filepath)
-
-
-def wait_for_shelve_lock_file(shelve_filepath, timeout=600):
-    shelve_lock_filepath = get_shelve_lock_filepath(shelve_filepath)
-    start_time = time.time()
-    while exists(shelve_lock_filepath):
-        current_time = time.time()
-        elapsed = current_time - start_time
-        if elapsed >= timeout:
-            return False
-        time.sleep(1)
-        if int(elapsed) % 5 == 0:
-            print('Waiting for %0.02f seconds for lock so far' % (elapsed,))
-    return True
-
-
-def get_shelve_value(shelve_filepath, key):
-    wait_for_shelve_lock_file(shelve_filepath)
-    with GLOBAL_SHELVE_LOCK:
-        wait_for_shelve_lock_file(shelve_filepath)
-        touch_shelve_lock_file(shelve_filepath)
-    value = None
-    try:
-        with shelve.open(shelve_filepath, 'r') as shelf:
-            value = shelf.get(key)
-    except Exception:
-        pass
-    delete_shelve_lock_file(shelve_filepath)
-    return value
-
-
-def set_shelve_value(shelve_filepath, key, value):
-    wait_for_shelve_lock_file(shelve_filepath)
-    with GLOBAL_SHELVE_LOCK:
-        wait_for_shelve_lock_file(shelve_filepath)
-        touch_shelve_lock_file(shelve_filepath)
-    flag = False
-    try:
-        with shelve.open(shelve_filepath) as shelf:
-            shelf[key] = value
-        flag = True
-    except Exception:
-        pass
-    delete_shelve_lock_file(shelve_filepath)
-    return flag
-
-
-def get_shelve_filepaths(ibs, jobid):
-    shelve_path = ibs.get_shelves_path()
-    shelve_input_filepath = abspath(join(shelve_path, '%s.input.shelve' % (jobid,)))
-    shelve_output_filepath = abspath(join(shelve_path, '%s.output.shelve' % (jobid,)))
-    return shelve_input_filepath, shelve_output_filepath
-
-
-def initialize_process_record(
-    record_filepath,
-    shelve_input_filepath,
-    shelve_output_filepath,
-    shelve_path,
-    shelve_archive_path,
-    jobiface_id,
-):
+def initialize_process_record(store, jobid, record, metadata, jobiface_id):
+    """
+    Decides what to do with a job found in the job store on startup
+
+    Args:
+        store (JobStore): the job store
+        jobid (str): the job id
+        record (dict): the engine record (request, attempts, completed)
+        metadata (dict): the job metadata (or None if it was never stored)
+        jobiface_id (int): id of the client for logging
+    """
     MAX_ATTEMPTS = 20
     ARCHIVE_DAYS = 14
 
@@ -721,12 +659,8 @@ def initialize_process_record(
     archive_date = now - archive_delta
     archive_timestamp = archive_date.strftime(TIMESTAMP_FMTSTR)
 
-    jobid = splitext(basename(record_filepath))[0]
     jobcounter = None
 
-    # Load the engine record
-    record = ut.load_cPkl(record_filepath, verbose=False)
-
     # Load the record info
     engine_request = record.get('request', None)
     attempts = record.get('attempts', 0)
@@ -736,9 +670,6 @@ def initialize_process_record(
     suppressed = attempts >= MAX_ATTEMPTS
     corrupted = engine_request is None
 
-    # Load metadata
-    metadata = get_shelve_value(shelve_input_filepath, 'metadata')
-
     if metadata is None:
         print('Missing metadata...corrupted')
         corrupted = True
@@ -777,17 +708,7 @@ def initialize_process_record(
                     color = 'brightmagenta'
                     print_ = partial(ut.colorprint, color=color)
                     print_('ARCHIVING JOB (AGE: %d SECONDS)' % (job_age,))
-                    job_scr_filepath_list = list(
-                        ut.iglob(join(shelve_path, '%s*' % (jobid,)))
-                    )
-                    for job_scr_filepath in job_scr_filepath_list:
-                        job_dst_filepath = job_scr_filepath.replace(
-                            shelve_path, shelve_archive_path
-                        )
-                        ut.copy(
-                            job_scr_filepath, job_dst_filepath, overwrite=True
-                        )  # ut.copy allows for overwrite, ut.move does not
-                        ut.delete(job_scr_filepath)
+                    store.archive(jobid)
 
     if archived:
         # We have archived the job, don't bother registering it
@@ -805,8 +726,7 @@ def initialize_process_record(
                 print_(
                     'RESTARTING FAILED JOB FROM RESTART (ATTEMPT %d)' % (attempts + 1,)
                 )
-                print_(ut.repr3(record_filepath))
-                # print_(ut.repr3(record))
+                print_(ut.repr3(jobid))
 
                 times = metadata.get('times', {})
                 received = times['received']
@@ -814,9 +734,8 @@ def initialize_process_record(
                 engine_request['restart_jobid'] = jobid
                 engine_request['restart_jobcounter'] = jobcounter
                 engine_request['restart_received'] = received
-                record['attempts'] = attempts + 1
 
-                ut.save_cPkl(record_filepath, record, verbose=False)
+                store.update(jobid, attempts=attempts + 1)
 
     values = jobcounter, jobid, engine_request, archived, completed, suppressed, corrupted
     return values
@@ -826,6 +745,7 @@ class JobInterface(object):
     def __init__(jobiface, id_, port_dict, ibs=None):
         jobiface.id_ = id_
         jobiface.ibs = ibs
+        jobiface.store = None if ibs is None else JobStore(get_job_store_fpath(ibs))
         jobiface.verbose = 2 if VERBOSE_JOBS else 1
         jobiface.port_dict = port_dict
         print('JobInterface ports:')
@@ -884,43 +804,34 @@ class JobInterface(object):
         ibs = jobiface.ibs
 
         if ibs is not None:
+            store = jobiface.store
             shelve_path = ibs.get_shelves_path()
-            shelve_path = shelve_path.rstrip('/')
-            shelve_archive_path = '%s_ARCHIVE' % (shelve_path,)
-            ut.ensuredir(shelve_archive_path)
-
-            record_filepath_list = _get_engine_job_paths(ibs)
+            ut.ensuredir(shelve_path)
+
+            # Import any jobs still stored in the legacy per-job shelves
+            num_migrated = store.migrate_shelves(shelve_path)
+            if num_migrated > 0:
+                print('Migrated %d legacy engine jobs...' % (num_migrated,))
+
+            # Only jobs with an engine record were queued through this interface
+            job_list = list(
+                store.iter_jobs(
+                    columns=('jobid', 'request', 'attempts', 'completed', 'metadata'),
+                    records=True,
+                )
+            )
 
-            num_records = len(record_filepath_list)
+            num_records = len(job_list)
             print('Reloading %d engine jobs...' % (num_records,))
 
-            shelve_input_filepath_list = []
-            shelve_output_filepath_list = []
-            for record_filepath in record_filepath_list:
-                jobid = splitext(basename(record_filepath))[0]
-                shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(
-                    ibs, jobid
-                )
-                shelve_input_filepath_list.append(shelve_input_filepath)
-                shelve_output_filepath_list.append(shelve_output_filepath)
-
-            arg_iter = list(
-                zip(
-                    record_filepath_list,
-                    shelve_input_filepath_list,
-                    shelve_output_filepath_list,
-                    [shelve_path] * num_records,
-                    [shelve_archive_path] * num_records,
-                    [jobiface.id_] * num_records,
-                )
-            )
-            if len(arg_iter) > 0:
-                values_list = ut.util_parallel.generate2(
-                    initialize_process_record, arg_iter
+            values_list = []
+            for job in job_list:
+                record = ut.dict_subset(job, ['request', 'attempts', 'completed'])
+                values = initialize_process_record(
+                    store, job['jobid'], record, job['metadata'], jobiface.id_
                 )
-                values_list = list(values_list)
-            else:
-                values_list = []
+                values_list.append(values)
+            job_list = None  # Release memory
 
             print('Processed %d records' % (len(values_list),))
 
@@ -1076,19 +987,13 @@ class JobInterface(object):
             print('reply_notify = %r' % (reply_notify,))
             jobid = reply_notify['jobid']
 
-            ibs = jobiface.ibs
-            if ibs is not None:
-                shelve_path = ibs.get_shelves_path()
-                ut.ensuredir(shelve_path)
-
-                record_filename = '%s.pkl' % (jobid,)
-                record_filepath = join(shelve_path, record_filename)
+            if jobiface.store is not None:
                 record = {
                     'request': engine_request,
                     'attempts': 0,
                     'completed': False,
                 }
-                ut.save_cPkl(record_filepath, record, verbose=False)
+                jobiface.store.set_record(jobid, record)
 
             # Release memor
             action = None
@@ -1134,6 +1039,14 @@ class JobInterface(object):
             reply = jobiface.collect_recieve_socket.recv_json()
         return reply
 
+    def get_engine_stats_dict(jobiface):
+        with ut.Indenter('[client %d] ' % (jobiface.id_)):
+            pair_msg = dict(action='engine_stats_dict')
+            # CALLS: collector_request_engine_stats
+            jobiface.collect_recieve_socket.send_json(pair_msg)
+            reply = jobiface.collect_recieve_socket.recv_json()
+        return reply
+
     def get_job_metadata(jobiface, jobid):
         with ut.Indenter('[client %d] ' % (jobiface.id_)):
             if jobiface.verbose >= 1:
@@ -1554,6 +1467,10 @@ def engine_loop(id_, port_dict, dbdir, containerized, lane):
         ibs = wbia.opendb(dbdir=dbdir, use_cache=False, web=False)
         update_proctitle('engine_loop.%s.%s' % (lane, id_), dbname=ibs.dbname)
 
+        engine_name = 'engine.%s.%s' % (lane, id_)
+        # CALLS: collector_engine_stats
+        collect_recieve_socket.send_json(_engine_stats_request(engine_name))
+
         try:
             while True:
                 try:
@@ -1625,6 +1542,9 @@ def engine_loop(id_, port_dict, dbdir, containerized, lane):
                     }
                     collect_recieve_socket.send_json(reply_notify)
 
+                    # Report the caches that the job may have filled
+                    collect_recieve_socket.send_json(_engine_stats_request(engine_name))
+
                     # We no longer need the engine result, and can clear it's memory
                     engine_request = None
                     engine_result = None
@@ -1670,6 +1590,18 @@ def engine_loop(id_, port_dict, dbdir, containerized, lane):
             print('Exiting engine loop')
 
 
+def _engine_stats_request(engine_name):
+    """ Collector message with the resource stats of this engine process """
+    stats = {}
+    try:
+        from wbia.algo.hots import neighbor_index_cache
+
+        stats['nnindex_cache'] = neighbor_index_cache.get_memcache_stats()
+    except Exception as ex:
+        ut.printex(ex, 'Cannot get neighbor index cache stats', iswarning=True)
+    return {'action': 'engine_stats', 'engine': engine_name, 'stats': stats}
+
+
 def on_engine_request(
     ibs, jobid, action, args, kwargs, attempts=3, retry_delay_min=1, retry_delay_max=60
 ):
@@ -1759,10 +1691,7 @@ def collector_loop(port_dict, dbdir, containerized):
         ibs = wbia.opendb(dbdir=dbdir, use_cache=False, web=False)
         update_proctitle('collector_loop', dbname=ibs.dbname)
 
-        shelve_path = ibs.get_shelves_path()
-        ut.ensuredir(shelve_path)
-
-        collector_data = {}
+        store = JobStore(get_job_store_fpath(ibs))
 
         try:
             while True:
@@ -1779,8 +1708,7 @@ def collector_loop(port_dict, dbdir, containerized):
                     reply = on_collect_request(
                         ibs,
                         collect_request,
-                        collector_data,
-                        shelve_path,
+                        store,
                         containerized=containerized,
                     )
                 except Exception as ex:
@@ -1825,14 +1753,6 @@ def invalidate_global_cache(jobid):
     JOB_STATUS_CACHE.pop(jobid, None)
 
 
-def get_collector_shelve_filepaths(collector_data, jobid):
-    if jobid is None:
-        return None, None
-    shelve_input_filepath = collector_data.get(jobid, {}).get('input', None)
-    shelve_output_filepath = collector_data.get(jobid, {}).get('output', None)
-    return shelve_input_filepath, shelve_output_filepath
-
-
 def convert_to_date(timestamp):
     TIMESTAMP_FMTSTR_ = ' '.join(TIMESTAMP_FMTSTR.split(' ')[:-1])
     timestamp_ = ' '.join(timestamp.split(' ')[:-1])
@@ -1857,9 +1777,7 @@ def calculate_timedelta(start, end):
     return hours, minutes, seconds, total_seconds
 
 
-def on_collect_request(
-    ibs, collect_request, collector_data, shelve_path, containerized=False
-):
+def on_collect_request(ibs, collect_request, store, containerized=False):
     """ Run whenever the collector recieves a message """
     import requests
 
@@ -1872,21 +1790,6 @@ def on_collect_request(
         'jobid': jobid,
     }
 
-    # Ensure we have a collector record for the jobid
-    if jobid is not None:
-        if jobid not in collector_data:
-            collector_data[jobid] = {
-                'status': None,
-                'input': None,
-                'output': None,
-            }
-        runtime_lock_filepath = join(shelve_path, '%s.lock' % (jobid,))
-    else:
-        runtime_lock_filepath = None
-
-    args = get_collector_shelve_filepaths(collector_data, jobid)
-    collector_shelve_input_filepath, collector_shelve_output_filepath = args
-
     print(
         'on_collect_request action = %r, jobid = %r, status = %r'
         % (
@@ -1897,7 +1800,7 @@ def on_collect_request(
     )
 
     if action == 'notification':
-        assert None not in [jobid, runtime_lock_filepath]
+        assert jobid is not None
 
         # received
         # accepted
@@ -1909,33 +1812,18 @@ def on_collect_request(
         # suppressed
         # corrupted
 
-        current_status = collector_data[jobid].get('status', None)
+        current_status = store.get_status(jobid)
         print('Updating jobid = %r status %r -> %r' % (jobid, current_status, status))
-        collector_data[jobid]['status'] = status
-
-        print('Notify %s' % ut.repr3(collector_data[jobid]))
         invalidate_global_cache(jobid)
 
-        if status == 'received':
-            ut.touch(runtime_lock_filepath)
-
         if status == 'completed':
-            if exists(runtime_lock_filepath):
-                ut.delete(runtime_lock_filepath)
-
             # Mark the engine request as finished
-            record_filename = '%s.pkl' % (jobid,)
-            record_filepath = join(shelve_path, record_filename)
-            record = ut.load_cPkl(record_filepath, verbose=False)
-            record['completed'] = True
-            ut.save_cPkl(record_filepath, record, verbose=False)
-            record = None
-
-        # Update relevant times in the shelf
-        if collector_shelve_input_filepath is None:
-            metadata = None
+            store.update(jobid, status=status, completed=True)
         else:
-            metadata = get_shelve_value(collector_shelve_input_filepath, 'metadata')
+            store.update(jobid, status=status)
+
+        # Update relevant times in the metadata
+        metadata = store.get_value(jobid, 'metadata')
 
         if metadata is not None:
             times = metadata.get('times', {})
@@ -1981,7 +1869,7 @@ def on_collect_request(
                 times['turnaround_sec'] = total_seconds
 
             metadata['times'] = times
-            set_shelve_value(collector_shelve_input_filepath, 'metadata', metadata)
+            store.set_value(jobid, 'metadata', metadata)
 
             metadata = None  # Release memory
 
@@ -1990,23 +1878,14 @@ def on_collect_request(
 
         invalidate_global_cache(jobid)
 
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        metadata = get_shelve_value(shelve_input_filepath, 'metadata')
-        engine_result = get_shelve_value(shelve_output_filepath, 'result')
-
         if status == 'completed':
-            # Ensure we can read the data we expect out of a completed job
-            if None in [metadata, engine_result]:
+            # Ensure we have the data we expect out of a completed job
+            has_metadata, has_result = store.has_values(jobid, ('metadata', 'result'))
+            if not (has_metadata and has_result):
                 status = 'corrupted'
 
-        collector_data[jobid] = {
-            'status': status,
-            'input': shelve_input_filepath,
-            'output': shelve_output_filepath,
-        }
-        print('Register %s' % ut.repr3(collector_data[jobid]))
-
-        metadata, engine_result = None, None  # Release memory
+        store.update(jobid, status=status)
+        print('Register jobid = %r status = %r' % (jobid, status))
 
     elif action == 'metadata':
         invalidate_global_cache(jobid)
@@ -2014,12 +1893,9 @@ def on_collect_request(
         # From the Engine
         metadata = collect_request.get('metadata', None)
 
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        collector_data[jobid]['input'] = shelve_input_filepath
-
-        set_shelve_value(shelve_input_filepath, 'metadata', metadata)
+        store.set_value(jobid, 'metadata', metadata)
 
-        print('Stored Metadata %s' % ut.repr3(collector_data[jobid]))
+        print('Stored Metadata jobid = %r' % (jobid,))
 
         metadata = None  # Release memory
 
@@ -2033,14 +1909,11 @@ def on_collect_request(
 
         # Get the engine result jobid
         jobid = engine_result.get('jobid', jobid)
-        assert jobid in collector_data
+        assert store.exists(jobid)
 
-        shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(ibs, jobid)
-        collector_data[jobid]['output'] = shelve_output_filepath
+        store.set_value(jobid, 'result', engine_result)
 
-        set_shelve_value(shelve_output_filepath, 'result', engine_result)
-
-        print('Stored Result %s' % ut.repr3(collector_data[jobid]))
+        print('Stored Result jobid = %r' % (jobid,))
 
         engine_result = None  # Release memory
 
@@ -2091,23 +1964,28 @@ def on_collect_request(
             except Exception:
                 print('Callback FAILED!')
 
+    elif action == 'engine_stats':
+        # From the Engine
+        ENGINE_STATS_DICT[collect_request['engine']] = collect_request.get('stats', {})
+
+    elif action == 'engine_stats_dict':
+        reply['json_result'] = ENGINE_STATS_DICT.copy()
+
     elif action == 'job_status':
-        reply['jobstatus'] = collector_data.get(jobid, {}).get('status', 'unknown')
+        jobstatus = None if jobid is None else store.get_status(jobid)
+        reply['jobstatus'] = 'unknown' if jobstatus is None else jobstatus
 
     elif action == 'job_status_dict':
         json_result = {}
 
-        for jobid in collector_data:
+        for job in store.iter_jobs(columns=('jobid', 'status')):
+            jobid = job['jobid']
 
             if jobid in JOB_STATUS_CACHE:
                 job_status_data = JOB_STATUS_CACHE.get(jobid, None)
             else:
-                status = collector_data[jobid]['status']
-
-                shelve_input_filepath, shelve_output_filepath = get_shelve_filepaths(
-                    ibs, jobid
-                )
-                metadata = get_shelve_value(shelve_input_filepath, 'metadata')
+                status = job['status']
+                metadata = store.get_value(jobid, 'metadata')
 
                 cache = True
                 if metadata is None:
@@ -2157,14 +2035,14 @@ def on_collect_request(
         metadata = None  # Release memory
 
     elif action == 'job_id_list':
-        reply['jobid_list'] = sorted(list(collector_data.keys()))
+        reply['jobid_list'] = store.get_jobids()
 
     elif action == 'job_input':
-        if jobid not in collector_data:
+        if jobid is None or not store.exists(jobid):
             reply['status'] = 'invalid'
             metadata = None
         else:
-            metadata = get_shelve_value(collector_shelve_input_filepath, 'metadata')
+            metadata = store.get_value(jobid, 'metadata')
             if metadata is None:
                 reply['status'] = 'corrupted'
 
@@ -2173,13 +2051,13 @@ def on_collect_request(
         metadata = None  # Release memory
 
     elif action == 'job_result':
-        if jobid not in collector_data:
+        if jobid is None or not store.exists(jobid):
             reply['status'] = 'invalid'
             result = None
         else:
-            status = collector_data[jobid]['status']
+            status = store.get_status(jobid)
 
-            engine_result = get_shelve_value(collector_shelve_output_filepath, 'result')
+            engine_result = store.get_value(jobid, 'result')
 
             if engine_result is None:
                 if status in ['corrupted']:
@@ -2255,8 +2133,6 @@ if __name__ == '__main__':
         python -m ibeis.web.job_engine --allexamples
         python -m ibeis.web.job_engine --allexamples --noface --nosrc
     """
-    import multiprocessing
-
     multiprocessing.freeze_support()  # for win32
     import utool as ut  # NOQA
 
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Transactional storage for job engine records, metadata, and results.
+
+All jobs live in a single SQLite database in WAL mode inside the engine
+shelve directory. Readers never block writers, writers serialize on SQLite's
+own lock (with a busy timeout instead of polling lock files), and status and
+jobid lookups go through indexes instead of scanning per-job files.
+
+Values (the engine request, the metadata, and the engine result) are stored
+as pickled blobs, the same way the previous per-job shelves stored them.
+
+CommandLine:
+    python -m wbia.web.job_store --allexamples
+"""
+import logging
+import os
+import pickle
+import shelve
+import sqlite3
+import threading
+import time
+from os.path import join, exists, basename, splitext
+import utool as ut
+
+(print, rrr, profile) = ut.inject2(__name__)
+logger = logging.getLogger('wbia')
+
+
+JOB_STORE_FILENAME = 'jobs.sqlite3'
+
+# Seconds a writer waits on a locked database before giving up
+JOB_STORE_TIMEOUT = 600
+
+# Columns that hold pickled values
+VALUE_COLUMNS = ('request', 'metadata', 'result')
+
+# Columns that hold plain values and can be set with update
+FIELD_COLUMNS = ('jobcounter', 'status', 'attempts', 'completed', 'archived')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    jobid TEXT PRIMARY KEY NOT NULL,
+    jobcounter INTEGER,
+    status TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    archived INTEGER NOT NULL DEFAULT 0,
+    request BLOB,
+    metadata BLOB,
+    result BLOB,
+    time_updated REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_archived_status ON jobs (archived, status);
+CREATE INDEX IF NOT EXISTS jobs_jobcounter ON jobs (jobcounter);
+"""
+
+
+def _dumps(value):
+    if value is None:
+        return None
+    return sqlite3.Binary(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _loads(blob):
+    if blob is None:
+        return None
+    return pickle.loads(blob)
+
+
+class JobStore(ut.NiceRepr):
+    """
+    Embedded transactional job store.
+
+    Each thread (and each forked process) lazily opens its own connection, so
+    a single instance can be shared by the flask threads of the web process
+    while the collector and engines open the same file independently.
+
+    Example:
+        >>> # ENABLE_DOCTEST
+        >>> from wbia.web.job_store import *  # NOQA
+        >>> dpath = ut.ensure_app_resource_dir('wbia', 'tests', 'job_store')
+        >>> fpath = join(dpath, 'jobs_doctest.sqlite3')
+        >>> ut.delete(fpath, verbose=False)
+        >>> store = JobStore(fpath)
+        >>> record = {'request': {'action': 'helloworld'}, 'attempts': 0, 'completed': False}
+        >>> store.set_record('job1', record)
+        >>> store.set_value('job1', 'metadata', {'jobcounter': 1, 'times': {}})
+        >>> store.update('job1', status='working')
+        >>> assert store.get_status('job1') == 'working'
+        >>> assert store.get_value('job1', 'metadata')['jobcounter'] == 1
+        >>> assert store.get_value('job1', 'result') is None
+        >>> assert store.get_record('job1') == record
+        >>> assert store.get_status('badjob') is None
+        >>> store.archive('job1')
+        >>> assert store.get_jobids() == []
+        >>> assert store.get_jobids(archived=True) == ['job1']
+    """
+
+    def __init__(store, fpath, timeout=JOB_STORE_TIMEOUT):
+        store.fpath = fpath
+        store.timeout = timeout
+        store._local = threading.local()
+        store._init_lock = threading.Lock()
+        store._initialized = False
+
+    def __nice__(store):
+        return basename(store.fpath)
+
+    @property
+    def connection(store):
+        """ The connection for the current thread and process """
+        pid = os.getpid()
+        local = store._local
+        if getattr(local, 'pid', None) != pid:
+            local.connection = store._connect()
+            local.pid = pid
+        return local.connection
+
+    def _connect(store):
+        ut.ensuredir(os.path.dirname(store.fpath))
+        # isolation_level=None gives explicit control over transactions
+        connection = sqlite3.connect(
+            store.fpath, timeout=store.timeout, isolation_level=None
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute('PRAGMA busy_timeout=%d' % (int(store.timeout * 1000),))
+        with store._init_lock:
+            if not store._initialized:
+                connection.executescript(SCHEMA)
+                store._initialized = True
+        return connection
+
+    def _write(store, operations):
+        """
+        Runs (sql, params) operations in one immediate transaction. The
+        database write lock is taken up front, so concurrent writers queue on
+        SQLite's busy handler instead of failing halfway through.
+        """
+        connection = store.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for sql, params in operations:
+                connection.execute(sql, params)
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _ensure_op(store, jobid):
+        return ('INSERT OR IGNORE INTO jobs (jobid) VALUES (?)', (jobid,))
+
+    def _update_op(store, jobid, fields):
+        columns = sorted(fields.keys())
+        assignments = ', '.join(['%s = ?' % (column,) for column in columns])
+        sql = 'UPDATE jobs SET %s, time_updated = ? WHERE jobid = ?' % (assignments,)
+        params = tuple(fields[column] for column in columns) + (time.time(), jobid)
+        return (sql, params)
+
+    # --- Getters ---
+
+    def _get_column(store, jobid, column):
+        cursor = store.connection.execute(
+            'SELECT %s FROM jobs WHERE jobid = ?' % (column,), (jobid,)
+        )
+        row = cursor.fetchone()
+        return None if row is None else row[0]
+
+    def exists(store, jobid):
+        cursor = store.connection.execute(
+            'SELECT 1 FROM jobs WHERE jobid = ?', (jobid,)
+        )
+        return cursor.fetchone() is not None
+
+    def get_value(store, jobid, key):
+        """ Returns the unpickled request, metadata, or result of a job """
+        assert key in VALUE_COLUMNS, 'invalid key=%r' % (key,)
+        return _loads(store._get_column(jobid, key))
+
+    def has_values(store, jobid, keys=VALUE_COLUMNS):
+        """ Checks which values are stored without unpickling them """
+        assert all(key in VALUE_COLUMNS for key in keys)
+        select = ', '.join(['%s IS NOT NULL' % (key,) for key in keys])
+        cursor = store.connection.execute(
+            'SELECT %s FROM jobs WHERE jobid = ?' % (select,), (jobid,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return [False] * len(keys)
+        return [bool(flag) for flag in row]
+
+    def get_status(store, jobid):
+        return store._get_column(jobid, 'status')
+
+    def get_record(store, jobid):
+        """ Returns the engine record (request, attempts, completed) """
+        cursor = store.connection.execute(
+            'SELECT request, attempts, completed FROM jobs WHERE jobid = ?', (jobid,)
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] is None:
+            return None
+        record = {
+            'request': _loads(row[0]),
+            'attempts': row[1],
+            'completed': bool(row[2]),
+        }
+        return record
+
+    def get_jobids(store, archived=False, status=None):
+        sql = 'SELECT jobid FROM jobs WHERE archived = ?'
+        params = (int(archived),)
+        if status is not None:
+            sql += ' AND status = ?'
+            params += (status,)
+        sql += ' ORDER BY jobid'
+        cursor = store.connection.execute(sql, params)
+        return [row[0] for row in cursor]
+
+    def iter_jobs(store, columns=('jobid', 'status'), archived=False, records=False):
+        """
+        Yields a dict per job. Pickled columns are unpickled. If records is
+        True, only jobs that have an engine request are returned.
+        """
+        sql = 'SELECT %s FROM jobs WHERE archived = ?' % (', '.join(columns),)
+        if records:
+            sql += ' AND request IS NOT NULL'
+        sql += ' ORDER BY jobcounter, jobid'
+        cursor = store.connection.execute(sql, (int(archived),))
+        for row in cursor:
+            job = dict(zip(columns, row))
+            for key in VALUE_COLUMNS:
+                if key in job:
+                    job[key] = _loads(job[key])
+            yield job
+
+    # --- Setters ---
+
+    def set_value(store, jobid, key, value):
+        """ Atomically stores the request, metadata, or result of a job """
+        assert key in VALUE_COLUMNS, 'invalid key=%r' % (key,)
+        fields = {key: _dumps(value)}
+        if key == 'metadata' and value is not None:
+            fields['jobcounter'] = value.get('jobcounter', None)
+        store._write([store._ensure_op(jobid), store._update_op(jobid, fields)])
+        return True
+
+    def set_record(store, jobid, record):
+        fields = {
+            'request': _dumps(record.get('request', None)),
+            'attempts': record.get('attempts', 0),
+        }
+        # Never reset the flag if the collector already marked the job completed
+        if record.get('completed', False):
+            fields['completed'] = 1
+        store._write([store._ensure_op(jobid), store._update_op(jobid, fields)])
+
+    def update(store, jobid, **fields):
+        """ Atomically updates plain fields (e.g. status, attempts) of a job """
+        assert all(key in FIELD_COLUMNS for key in fields), 'invalid fields'
+        if 'completed' in fields:
+            fields['completed'] = int(fields['completed'])
+        if 'archived' in fields:
+            fields['archived'] = int(fields['archived'])
+        store._write([store._ensure_op(jobid), store._update_op(jobid, fields)])
+
+    def archive(store, jobid):
+        store.update(jobid, archived=True)
+
+    # --- Migration ---
+
+    def migrate_shelves(store, shelve_path, migrated_path=None):
+        """
+        Imports jobs from the legacy per-job layout (jobid.pkl records plus
+        jobid.input.shelve / jobid.output.shelve files) and moves the legacy
+        files out of the way. Jobs already in the store are not overwritten.
+
+        Returns:
+            int: number of migrated jobs
+        """
+        record_fpath_list = sorted(ut.iglob(join(shelve_path, '*.pkl')))
+        if len(record_fpath_list) == 0:
+            return 0
+        if migrated_path is None:
+            migrated_path = '%s_MIGRATED' % (shelve_path.rstrip('/'),)
+        ut.ensuredir(migrated_path)
+
+        logger.info(
+            'Migrating %d legacy job shelves into %r'
+            % (len(record_fpath_list), store.fpath)
+        )
+        num_migrated = 0
+        for record_fpath in record_fpath_list:
+            jobid = splitext(basename(record_fpath))[0]
+            if not store.exists(jobid):
+                try:
+                    record = ut.load_cPkl(record_fpath, verbose=False)
+                except Exception:
+                    record = {}
+                input_fpath = join(shelve_path, '%s.input.shelve' % (jobid,))
+                output_fpath = join(shelve_path, '%s.output.shelve' % (jobid,))
+                metadata = _read_legacy_shelve(input_fpath, 'metadata')
+                result = _read_legacy_shelve(output_fpath, 'result')
+                fields = {
+                    'request': _dumps(record.get('request', None)),
+                    'attempts': record.get('attempts', 0),
+                    'completed': int(record.get('completed', False)),
+                    'metadata': _dumps(metadata),
+                    'result': _dumps(result),
+                }
+                if metadata is not None:
+                    fields['jobcounter'] = metadata.get('jobcounter', None)
+                store._write([store._ensure_op(jobid), store._update_op(jobid, fields)])
+                num_migrated += 1
+            for fpath in ut.iglob(join(shelve_path, '%s.*' % (jobid,))):
+                dst_fpath = join(migrated_path, basename(fpath))
+                ut.copy(fpath, dst_fpath, overwrite=True, verbose=False)
+                ut.delete(fpath, verbose=False)
+        return num_migrated
+
+
+def _read_legacy_shelve(shelve_fpath, key):
+    # dbm backends may add their own extension to the shelve filename
+    if not exists(shelve_fpath) and not list(ut.iglob('%s.*' % (shelve_fpath,))):
+        return None
+    try:
+        with shelve.open(shelve_fpath, 'r') as shelf:
+            return shelf.get(key)
+    except Exception:
+        return None
+
+
+def get_job_store_fpath(ibs):
+    shelve_path = ibs.get_shelves_path()
+    return join(shelve_path, JOB_STORE_FILENAME)
+
+
+if __name__ == '__main__':
+    r"""
+    CommandLine:
+        python -m wbia.web.job_store
+        python -m wbia.web.job_store --allexamples
+    """
+    import multiprocessing
+
+    multiprocessing.freeze_support()  # for win32
+    import utool as ut  # NOQA
+
+    ut.doctest_funcs()
@@ -83,6 +83,21 @@ PROMETHEUS_DATA = {
         'Number of turnaround seconds for the current working job',
         ['name', 'endpoint'],
     ),
+    'nnindex_cache_bytes': Gauge(
+        'wbia_nnindex_cache_bytes',
+        'Number of bytes used by the in-memory neighbor index cache',
+        ['name', 'engine'],
+    ),
+    'nnindex_cache_entries': Gauge(
+        'wbia_nnindex_cache_entries',
+        'Number of neighbor indexes in the in-memory cache',
+        ['name', 'engine'],
+    ),
+    'nnindex_cache_hit_rate': Gauge(
+        'wbia_nnindex_cache_hit_rate',
+        'Hit rate of the in-memory neighbor index cache',
+        ['name', 'engine'],
+    ),
     'api': Counter(
         'wbia_api_counter',
         'Number of calls per IBEIS API',
@@ -143,6 +158,17 @@ def prometheus_increment_exception(ibs, tag):
         pass
 
 
+def _set_nnindex_cache_gauges(container_name, engine, nnindex_stats):
+    labels = {'name': container_name, 'engine': engine}
+    PROMETHEUS_DATA['nnindex_cache_bytes'].labels(**labels).set(nnindex_stats['nbytes'])
+    PROMETHEUS_DATA['nnindex_cache_entries'].labels(**labels).set(
+        nnindex_stats['num_entries']
+    )
+    PROMETHEUS_DATA['nnindex_cache_hit_rate'].labels(**labels).set(
+        nnindex_stats['hit_rate']
+    )
+
+
 @register_ibs_method
 @register_api(
     '/api/test/prometheus/',
@@ -363,6 +389,26 @@ def prometheus_update(ibs, *args, **kwargs):
                 except Exception:
                     pass
 
+                try:
+                    # The indexers are cached in the engine processes, which
+                    # report their cache stats to the collector after each job
+                    engine_stats_dict = ibs.get_engine_stats()
+                    totals = {'nbytes': 0, 'num_entries': 0, 'hits': 0, 'misses': 0}
+                    for engine in sorted(engine_stats_dict):
+                        nnindex_stats = engine_stats_dict[engine].get('nnindex_cache')
+                        if nnindex_stats is None:
+                            continue
+                        for key in totals:
+                            totals[key] += nnindex_stats[key]
+                        _set_nnindex_cache_gauges(container_name, engine, nnindex_stats)
+                    num_requests = totals['hits'] + totals['misses']
+                    totals['hit_rate'] = (
+                        totals['hits'] / num_requests if num_requests else 0.0
+                    )
+                    _set_nnindex_cache_gauges(container_name, '*', totals)
+                except Exception:
+                    pass
+
                 try:
                     # logger.info(ut.repr3(status_dict))
                     process_status_dict = ibs.get_process_alive_status()